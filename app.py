@@ -1,15 +1,8 @@
-import streamlit as st
-import pandas as pd
-import io
-from data_processor import leer_ml, leer_odoo, unir_y_validar, calcular, preparar_resultado_final, exportar_excel
+import importlib.util
+import tempfile
+from pathlib import Path
 
-# Configurar página
-st.set_page_config(
-    page_title="ML Precios y Stock Calculator",
-    page_icon="💰",
-    layout="wide",
-    initial_sidebar_state="collapsed",
-)
+from perfilado import perfilado_activo, perfilar_si_corresponde
 
 def main():
     """
@@ -17,7 +10,33 @@ def main():
     archivos Excel de MercadoLibre y Odoo. Todas las opciones de configuración
     se muestran en una única página para evitar reinicios al navegar entre
     diferentes secciones.
+
+    Streamlit, pandas y el procesamiento se importan acá y no al cargar el
+    módulo, así importar ``app`` (tests, scripts) no paga ese costo.
     """
+    import streamlit as st
+    from data_processor import (
+        leer_ml, leer_odoo, unir_y_validar, calcular, preparar_resultado_final, exportar_excel,
+        comparar_tipos_publicacion, exportar, FORMATOS_EXPORTACION, POLITICAS_DUPLICADOS,
+        sugerir_coincidencias, auditar_margenes, comparar_planes_cuotas,
+    )
+    from coincidencia_sku import leer_equivalencias
+    from kits import leer_lista_materiales, resolver_kits
+    from asignacion_stock import asignar_stock, REGLAS_ASIGNACION
+    from control_precios import controlar_cambios_precio, ACCIONES_CONTROL
+    from busqueda_resultados import IndiceResultados
+    from estrategia_carga import (
+        estimar_carga, elegir_estrategia, procesar_por_bloques, presupuesto_memoria_mb, ESTRATEGIAS,
+    )
+
+    # Configurar página (debe ser la primera llamada a Streamlit)
+    st.set_page_config(
+        page_title="ML Precios y Stock Calculator",
+        page_icon="💰",
+        layout="wide",
+        initial_sidebar_state="collapsed",
+    )
+
     st.title("💰 ML Precios y Stock Calculator")
     st.markdown("---")
 
@@ -61,6 +80,162 @@ def main():
                 format="%.2f",
                 help="Ingrese un porcentaje para aplicar sobre la tarifa (0-100)"
             )
+        st.markdown("#### 🔗 Códigos duplicados en Odoo")
+        politica_duplicados = st.selectbox(
+            "Si un código aparece más de una vez en Odoo, usar:",
+            options=list(POLITICAS_DUPLICADOS),
+            format_func={
+                'primero': 'La primera fila',
+                'ultimo': 'La última fila',
+                'mayor_stock': 'La fila con más stock',
+                'error': 'Detener y mostrar los códigos repetidos',
+            }.get,
+            index=0,
+            help="Cada publicación de ML recibe siempre un solo precio; las filas afectadas quedan marcadas en Notas/Flags"
+        )
+        normalizar_sku = st.checkbox(
+            "Vincular SKUs que solo difieren en formato",
+            value=True,
+            help="Ignora mayúsculas, espacios, guiones y ceros a la izquierda cuando no hay coincidencia exacta"
+        )
+        sugerir = st.checkbox(
+            "Sugerir códigos parecidos para los SKUs sin coincidencia",
+            value=True,
+            help="Genera una tabla para revisar; las sugerencias solo se aplican si se marcan en 'Aceptar' y se vuelve a subir"
+        )
+        equivalencias_file = st.file_uploader(
+            "Equivalencias aceptadas (opcional)",
+            type=['xlsx', 'csv'],
+            key="equivalencias_file",
+            help="Tabla de sugerencias descargada antes, con 'Aceptar' marcado en las filas correctas"
+        )
+        kits_file = st.file_uploader(
+            "Lista de materiales de kits (opcional)",
+            type=['xlsx', 'csv'],
+            key="kits_file",
+            help="Columnas Kit, Componente, Cantidad (y opcional Nombre): cada kit se cotiza con la suma de sus componentes de Odoo"
+        )
+        st.markdown("#### 📦 Reparto de stock")
+        regla_stock = st.selectbox(
+            "Si varias publicaciones usan el mismo código, repartir el stock:",
+            options=['ninguna'] + list(REGLAS_ASIGNACION),
+            format_func={
+                'ninguna': 'No repartir (cada publicación muestra el stock completo)',
+                'proporcional': 'Proporcional a la cantidad publicada actual',
+                'igual': 'En partes iguales',
+                'prioridad': 'Por prioridad de tipo (gold_pro, gold_special, free)',
+            }.get,
+            index=1,
+            help="Evita sobrevender: la suma del stock publicado nunca supera el de Odoo"
+        )
+        stock_seguridad = st.number_input(
+            "Stock de seguridad por código",
+            min_value=0,
+            value=0,
+            step=1,
+            help="Unidades que se reservan y no se publican"
+        )
+        tope_por_publicacion = st.number_input(
+            "Tope de stock por publicación (0 = sin tope)",
+            min_value=0,
+            value=0,
+            step=1,
+            help="Lo que excede el tope se reparte entre las demás publicaciones del código"
+        )
+        asignacion = None
+        if regla_stock != 'ninguna':
+            asignacion = {
+                'regla': regla_stock,
+                'stock_seguridad': stock_seguridad,
+                'tope_por_publicacion': tope_por_publicacion or None,
+            }
+        st.markdown("#### 🛡️ Control de cambios de precio")
+        accion_control = st.selectbox(
+            "Precios nuevos atípicos respecto del actual:",
+            options=['ninguno'] + list(ACCIONES_CONTROL),
+            format_func={
+                'ninguno': 'No controlar',
+                'marcar': 'Marcarlos en Notas/Flags',
+                'retener': 'Marcarlos y mantener el precio actual',
+            }.get,
+            index=0,
+            help="Compara el cambio de cada publicación con el de su tipo y comisión (ver control_precios.py)"
+        )
+        control_precios = {'accion': accion_control} if accion_control != 'ninguno' else None
+        st.markdown("#### 🧠 Memoria")
+        arrow_disponible = importlib.util.find_spec("pyarrow") is not None
+        cadenas_arrow = st.checkbox(
+            "Guardar SKU, títulos y nombres como texto Arrow",
+            value=False,
+            disabled=not arrow_disponible,
+            help="Reduce la memoria y acelera el cruce por SKU en archivos grandes (requiere pyarrow)"
+        )
+        estrategia_carga = st.selectbox(
+            "Estrategia de carga:",
+            options=['auto'] + list(ESTRATEGIAS),
+            format_func={
+                'auto': 'Automática (según tamaño y presupuesto)',
+                'memoria': 'Todo en memoria',
+                'deduplicado': 'Lectura por bloques con parseo deduplicado',
+                'bloques': 'Procesar y escribir por bloques (archivos muy grandes)',
+            }.get,
+            index=0,
+            help="La automática estima filas y memoria a partir de la dimensión de la hoja antes de leerla"
+        )
+        presupuesto_mb = st.number_input(
+            "Presupuesto de memoria (MB)",
+            min_value=64.0,
+            value=presupuesto_memoria_mb(),
+            step=64.0,
+            help="Memoria máxima para el procesamiento; por defecto ML_PRESUPUESTO_MEMORIA_MB o 1024"
+        )
+        perfilar = st.checkbox(
+            "Perfilar esta ejecución (diagnóstico)",
+            value=perfilado_activo(),
+            help="Ejecuta el cálculo bajo cProfile + tracemalloc y permite descargar el perfil para adjuntarlo a un reporte"
+        )
+        st.markdown("#### 📤 Formato de descarga")
+        formatos_disponibles = [
+            f for f in FORMATOS_EXPORTACION if f != 'parquet' or arrow_disponible
+        ]
+        formato_salida = st.selectbox(
+            "Formato del archivo resultado:",
+            options=formatos_disponibles,
+            index=0,
+            help="xlsx para revisar a mano; csv, parquet o jsonl para cargas automáticas (mucho más rápidos)"
+        )
+        generar_libro_ml = st.checkbox(
+            "Generar también el Excel de ML listo para subir",
+            value=False,
+            help="Copia el archivo de MercadoLibre subido reemplazando solo PRICE y QUANTITY de las publicaciones encontradas en Odoo"
+        )
+        st.markdown("#### 🔀 Comparación de tipos de publicación")
+        comparar_tipos = st.checkbox(
+            "Comparar precios bajo todos los tipos de publicación",
+            value=False,
+            help="Calcula cada SKU con la comisión de cada tipo (gold_special, gold_pro, ...) observada en el archivo"
+        )
+        st.markdown("#### 💳 Planes de cuotas")
+        tabla_cuotas = st.text_input(
+            "Costo de financiación por plan (vacío = no comparar)",
+            value="",
+            placeholder="3: 4.5%, 6: 9%, 9: 13%, 12: 17%",
+            help="Calcula cada SKU con el costo de cada plan de cuotas y recomienda el de más cuotas "
+                 "cuyo precio no supera en más de la tolerancia al del plan más barato"
+        ).strip()
+        tolerancia_cuotas = st.number_input(
+            "Tolerancia sobre el plan más barato (%)",
+            min_value=0.0,
+            value=10.0,
+            step=1.0,
+            disabled=not tabla_cuotas
+        )
+        st.markdown("#### 🧾 Auditoría de márgenes")
+        auditar = st.checkbox(
+            "Auditar los precios actuales de ML contra la tarifa",
+            value=False,
+            help="Calcula lo que se recibe con el PRICE publicado hoy y el margen frente a la tarifa de Odoo"
+        )
 
     st.markdown("### 📋 Instrucciones")
     st.markdown(
@@ -97,75 +272,267 @@ def main():
 
     if ml_file and odoo_file:
         if st.button("🚀 Calcular y exportar", type="primary", use_container_width=True):
-            with st.spinner("Procesando archivos..."):
+            # La búsqueda es sobre el último resultado: un cálculo nuevo descarta el anterior
+            st.session_state.pop('busqueda_resultado', None)
+            with st.spinner("Procesando archivos..."), perfilar_si_corresponde(perfilar) as perfil:
                 try:
-                    st.info("📖 Leyendo archivo MercadoLibre...")
-                    df_ml = leer_ml(ml_file)
-                    st.success(f"✅ ML: {len(df_ml)} filas válidas encontradas")
-                    st.info("📖 Leyendo archivo Odoo...")
-                    df_odoo = leer_odoo(odoo_file)
-                    st.success(f"✅ Odoo: {len(df_odoo)} productos encontrados")
-                    st.info("🔗 Cruzando datos por SKU...")
-                    df_merged = unir_y_validar(df_ml, df_odoo)
-                    total_items = len(df_merged)
-                    matched_items = len(df_merged[df_merged['Código Neored'].notna()])
-                    match_rate = (matched_items / total_items * 100) if total_items > 0 else 0
-                    col_a, col_b, col_c = st.columns(3)
-                    with col_a:
-                        st.metric("Total Items ML", total_items)
-                    with col_b:
-                        st.metric("SKUs Encontrados", matched_items)
-                    with col_c:
-                        st.metric("Tasa de Match", f"{match_rate:.1f}%")
-                    if matched_items == 0:
-                        st.error("❌ No se encontraron coincidencias de SKU entre los archivos.")
-                        st.stop()
-                    st.info("💰 Calculando precios finales...")
-                    df_calculated = calcular(
-                        df_merged,
-                        base_financiacion=base_financiacion,
-                        incluir_impuestos=incluir_impuestos,
-                        tipo_recargo_envio=tipo_recargo_envio,
-                        valor_recargo_envio=valor_recargo_envio
-                    )
-                    st.info("📊 Preparando resultado final...")
-                    df_resultado = preparar_resultado_final(
-                        df_calculated,
-                        incluir_impuestos=incluir_impuestos,
-                        incluir_envio=(tipo_recargo_envio != 'Ninguno')
-                    )
-                    st.success("✅ ¡Cálculo completado!")
-                    items_con_precio = len(df_resultado[df_resultado['Precio final'] > 0])
-                    items_con_errores = len(df_resultado[df_resultado['Notas/Flags'] != ''])
-                    col_x, col_y, col_z = st.columns(3)
-                    with col_x:
-                        st.metric("Items Procesados", len(df_resultado))
-                    with col_y:
-                        st.metric("Con Precio Final", items_con_precio)
-                    with col_z:
-                        st.metric("Con Advertencias", items_con_errores)
-                    st.subheader("👀 Vista previa del resultado")
-                    st.dataframe(
-                        df_resultado.head(20),
-                        use_container_width=True,
-                        hide_index=True
-                    )
-                    if len(df_resultado) > 20:
-                        st.info(f"Mostrando las primeras 20 filas de {len(df_resultado)} totales")
-                    if items_con_errores > 0:
-                        st.subheader("⚠️ Resumen de advertencias")
-                        warnings_df = df_resultado[df_resultado['Notas/Flags'] != ''][['SKU', 'Descripción del producto', 'Notas/Flags']]
-                        st.dataframe(warnings_df, use_container_width=True, hide_index=True)
-                    st.info("📤 Generando archivo Excel...")
-                    excel_bytes = exportar_excel(df_resultado)
-                    st.download_button(
-                        label="📥 Descargar ML_precios_y_stock_calculados.xlsx",
-                        data=excel_bytes,
-                        file_name="ML_precios_y_stock_calculados.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        type="primary",
-                        use_container_width=True
-                    )
+                    st.info("📏 Estimando el tamaño de los archivos...")
+                    try:
+                        estimacion_ml = estimar_carga(ml_file, 'ml')
+                        estimacion_odoo = estimar_carga(odoo_file, 'odoo')
+                    except Exception:
+                        # .xls u otro formato que no es un zip de Office Open XML
+                        estimacion_ml = estimacion_odoo = None
+                    if estrategia_carga != 'auto':
+                        estrategia = estrategia_carga
+                    elif estimacion_ml is None:
+                        estrategia = 'memoria'
+                    else:
+                        estrategia = elegir_estrategia(estimacion_ml, presupuesto_mb, estimacion_odoo)
+                    if estimacion_ml is not None:
+                        st.info(
+                            f"📏 ML: {estimacion_ml.resumen(estrategia)} | Odoo: {estimacion_odoo.resumen()} "
+                            f"| presupuesto {presupuesto_mb:.0f} MB"
+                        )
+                    else:
+                        st.info(f"📏 No se pudo estimar el tamaño de los archivos; estrategia '{estrategia}'")
+                    equivalencias = leer_equivalencias(equivalencias_file) if equivalencias_file else None
+                    if estrategia == 'bloques':
+                        st.info("📖 Leyendo archivo Odoo...")
+                        df_odoo = leer_odoo(odoo_file, cadenas_arrow=cadenas_arrow)
+                        st.success(f"✅ Odoo: {len(df_odoo)} productos encontrados")
+                        if kits_file:
+                            n_productos = len(df_odoo)
+                            df_odoo, kits_no_resueltos = resolver_kits(df_odoo, leer_lista_materiales(kits_file))
+                            st.success(f"✅ Kits: {len(df_odoo) - n_productos} agregados al catálogo")
+                            if len(kits_no_resueltos):
+                                st.warning(f"⚠️ {len(kits_no_resueltos)} kits sin resolver")
+                                st.dataframe(kits_no_resueltos.head(50), use_container_width=True, hide_index=True)
+                        extension, mime, _ = FORMATOS_EXPORTACION[formato_salida]
+                        nombre_salida = f"ML_precios_y_stock_calculados{extension}"
+                        st.info(f"💰 Procesando MercadoLibre por bloques y escribiendo {formato_salida}...")
+                        with tempfile.TemporaryDirectory() as carpeta:
+                            ruta_salida = Path(carpeta) / nombre_salida
+                            resumen = procesar_por_bloques(
+                                ml_file,
+                                df_odoo,
+                                str(ruta_salida),
+                                opciones={
+                                    'politica_duplicados': politica_duplicados,
+                                    'normalizar_sku': normalizar_sku,
+                                    'equivalencias': equivalencias,
+                                    'asignacion': asignacion,
+                                    'control_precios': control_precios,
+                                    'base_financiacion': base_financiacion,
+                                    'incluir_impuestos': incluir_impuestos,
+                                    'tipo_recargo_envio': tipo_recargo_envio,
+                                    'valor_recargo_envio': valor_recargo_envio,
+                                },
+                                formato=formato_salida,
+                                cadenas_arrow=cadenas_arrow,
+                            )
+                            archivo_bytes = ruta_salida.read_bytes()
+                        st.success("✅ ¡Cálculo completado!")
+                        col_x, col_y, col_z = st.columns(3)
+                        with col_x:
+                            st.metric("Items Procesados", resumen['filas'])
+                        with col_y:
+                            st.metric("SKUs Encontrados", resumen['encontrados'])
+                        with col_z:
+                            st.metric("Con Advertencias", resumen['con_advertencias'])
+                        st.subheader("👀 Vista previa del resultado")
+                        st.dataframe(resumen['vista_previa'], use_container_width=True, hide_index=True)
+                        st.caption(
+                            "Procesado por bloques: las repeticiones de SKU se marcan dentro de cada bloque y "
+                            "no se generan sugerencias, resumen de advertencias ni comparación de tipos."
+                        )
+                        st.download_button(
+                            label=f"📥 Descargar {nombre_salida}",
+                            data=archivo_bytes,
+                            file_name=nombre_salida,
+                            mime=mime,
+                            type="primary",
+                            use_container_width=True
+                        )
+                    else:
+                        st.info("📖 Leyendo archivo MercadoLibre...")
+                        df_ml = leer_ml(ml_file, cadenas_arrow=cadenas_arrow, deduplicar=(estrategia == 'deduplicado'))
+                        st.success(f"✅ ML: {len(df_ml)} filas válidas encontradas")
+                        st.info("📖 Leyendo archivo Odoo...")
+                        df_odoo = leer_odoo(odoo_file, cadenas_arrow=cadenas_arrow)
+                        st.success(f"✅ Odoo: {len(df_odoo)} productos encontrados")
+                        if kits_file:
+                            n_productos = len(df_odoo)
+                            df_odoo, kits_no_resueltos = resolver_kits(df_odoo, leer_lista_materiales(kits_file))
+                            st.success(f"✅ Kits: {len(df_odoo) - n_productos} agregados al catálogo")
+                            if len(kits_no_resueltos):
+                                st.warning(f"⚠️ {len(kits_no_resueltos)} kits sin resolver")
+                                st.dataframe(kits_no_resueltos.head(50), use_container_width=True, hide_index=True)
+                        st.info("🔗 Cruzando datos por SKU...")
+                        df_merged = unir_y_validar(
+                            df_ml,
+                            df_odoo,
+                            politica_duplicados,
+                            normalizar_sku=normalizar_sku,
+                            equivalencias=equivalencias
+                        )
+                        if asignacion is not None:
+                            asignar_stock(df_merged, **asignacion)
+                        total_items = len(df_merged)
+                        matched_items = len(df_merged[df_merged['Código Neored'].notna()])
+                        match_rate = (matched_items / total_items * 100) if total_items > 0 else 0
+                        col_a, col_b, col_c = st.columns(3)
+                        with col_a:
+                            st.metric("Total Items ML", total_items)
+                        with col_b:
+                            st.metric("SKUs Encontrados", matched_items)
+                        with col_c:
+                            st.metric("Tasa de Match", f"{match_rate:.1f}%")
+                        if matched_items == 0:
+                            st.error("❌ No se encontraron coincidencias de SKU entre los archivos.")
+                            st.stop()
+                        st.info("💰 Calculando precios finales...")
+                        df_calculated = calcular(
+                            df_merged,
+                            base_financiacion=base_financiacion,
+                            incluir_impuestos=incluir_impuestos,
+                            tipo_recargo_envio=tipo_recargo_envio,
+                            valor_recargo_envio=valor_recargo_envio
+                        )
+                        if control_precios is not None:
+                            controlar_cambios_precio(df_calculated, **control_precios)
+                        st.info("📊 Preparando resultado final...")
+                        df_resultado = preparar_resultado_final(
+                            df_calculated,
+                            incluir_impuestos=incluir_impuestos,
+                            incluir_envio=(tipo_recargo_envio != 'Ninguno')
+                        )
+                        st.success("✅ ¡Cálculo completado!")
+                        items_con_precio = len(df_resultado[df_resultado['Precio final'] > 0])
+                        items_con_errores = len(df_resultado[df_resultado['Notas/Flags'] != ''])
+                        col_x, col_y, col_z = st.columns(3)
+                        with col_x:
+                            st.metric("Items Procesados", len(df_resultado))
+                        with col_y:
+                            st.metric("Con Precio Final", items_con_precio)
+                        with col_z:
+                            st.metric("Con Advertencias", items_con_errores)
+                        st.subheader("👀 Vista previa del resultado")
+                        st.dataframe(
+                            df_resultado.head(20),
+                            use_container_width=True,
+                            hide_index=True
+                        )
+                        if len(df_resultado) > 20:
+                            st.info(
+                                f"Mostrando las primeras 20 filas de {len(df_resultado)} totales; "
+                                "use el panel de búsqueda de abajo para encontrar el resto"
+                            )
+                        # El índice se arma una vez y queda en la sesión para las búsquedas
+                        st.session_state['busqueda_resultado'] = (df_resultado, IndiceResultados(df_resultado))
+                        if items_con_errores > 0:
+                            st.subheader("⚠️ Resumen de advertencias")
+                            warnings_df = df_resultado[df_resultado['Notas/Flags'] != ''][['SKU', 'Descripción del producto', 'Notas/Flags']]
+                            st.dataframe(warnings_df, use_container_width=True, hide_index=True)
+                        if sugerir and matched_items < total_items:
+                            df_sugerencias = sugerir_coincidencias(df_merged, df_odoo)
+                            if not df_sugerencias.empty:
+                                st.subheader("🔎 Sugerencias para SKUs sin coincidencia")
+                                st.dataframe(df_sugerencias.head(50), use_container_width=True, hide_index=True)
+                                st.download_button(
+                                    label="📥 Descargar ML_sugerencias_sku.xlsx",
+                                    data=exportar_excel(df_sugerencias),
+                                    file_name="ML_sugerencias_sku.xlsx",
+                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                    use_container_width=True
+                                )
+                                st.caption(
+                                    "Marque 'Aceptar' en las sugerencias correctas y suba el archivo en "
+                                    "'Equivalencias aceptadas' para usarlas en el próximo cálculo."
+                                )
+                        if comparar_tipos:
+                            st.subheader("🔀 Comparación por tipo de publicación")
+                            df_comparacion = comparar_tipos_publicacion(
+                                df_merged,
+                                incluir_impuestos=incluir_impuestos,
+                                tipo_recargo_envio=tipo_recargo_envio,
+                                valor_recargo_envio=valor_recargo_envio
+                            )
+                            st.dataframe(df_comparacion.head(20), use_container_width=True, hide_index=True)
+                            st.download_button(
+                                label="📥 Descargar ML_comparacion_tipos_publicacion.xlsx",
+                                data=exportar_excel(df_comparacion),
+                                file_name="ML_comparacion_tipos_publicacion.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                use_container_width=True
+                            )
+                        if tabla_cuotas:
+                            st.subheader("💳 Comparación por plan de cuotas")
+                            try:
+                                df_cuotas = comparar_planes_cuotas(
+                                    df_merged,
+                                    tabla_cuotas,
+                                    incluir_impuestos=incluir_impuestos,
+                                    tipo_recargo_envio=tipo_recargo_envio,
+                                    valor_recargo_envio=valor_recargo_envio,
+                                    tolerancia=tolerancia_cuotas / 100
+                                )
+                            except ValueError as e:
+                                st.error(f"❌ Tabla de cuotas inválida: {e}")
+                            else:
+                                st.dataframe(df_cuotas.head(20), use_container_width=True, hide_index=True)
+                                st.download_button(
+                                    label="📥 Descargar ML_comparacion_planes_cuotas.xlsx",
+                                    data=exportar_excel(df_cuotas),
+                                    file_name="ML_comparacion_planes_cuotas.xlsx",
+                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                    use_container_width=True
+                                )
+                        extension, mime, _ = FORMATOS_EXPORTACION[formato_salida]
+                        if auditar:
+                            st.subheader("🧾 Auditoría de márgenes (precios actuales)")
+                            df_auditoria = auditar_margenes(
+                                df_merged,
+                                incluir_impuestos=incluir_impuestos,
+                                tipo_recargo_envio=tipo_recargo_envio,
+                                valor_recargo_envio=valor_recargo_envio
+                            )
+                            perdidas = int((df_auditoria['Margen ($)'] < 0).sum())
+                            st.metric("Publicaciones con pérdida", perdidas)
+                            st.dataframe(df_auditoria.head(50), use_container_width=True, hide_index=True)
+                            st.download_button(
+                                label=f"📥 Descargar ML_auditoria_margenes{extension}",
+                                data=exportar(df_auditoria, formato_salida, por_bloques=(estrategia == 'deduplicado')),
+                                file_name=f"ML_auditoria_margenes{extension}",
+                                mime=mime,
+                                use_container_width=True
+                            )
+                        nombre_salida = f"ML_precios_y_stock_calculados{extension}"
+                        st.info(f"📤 Generando archivo {formato_salida}...")
+                        archivo_bytes = exportar(df_resultado, formato_salida, por_bloques=(estrategia == 'deduplicado'))
+                        st.download_button(
+                            label=f"📥 Descargar {nombre_salida}",
+                            data=archivo_bytes,
+                            file_name=nombre_salida,
+                            mime=mime,
+                            type="primary",
+                            use_container_width=True
+                        )
+                        if generar_libro_ml and ml_file.name.lower().endswith('.xlsx'):
+                            from parche_ml import actualizar_libro_ml
+                            ml_file.seek(0)
+                            libro = actualizar_libro_ml(ml_file, df_resultado)
+                            st.caption(
+                                f"Excel de ML: {libro['precios']} precios y {libro['stock']} stocks actualizados, "
+                                f"{libro['sin_cambios']} publicaciones sin cambios"
+                            )
+                            st.download_button(
+                                label=f"📥 Descargar {ml_file.name} actualizado",
+                                data=libro['datos'],
+                                file_name=ml_file.name,
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                use_container_width=True
+                            )
                     with st.expander("ℹ️ Información sobre el cálculo"):
                         st.markdown(f"""
                         **Configuración utilizada:**
@@ -189,6 +556,43 @@ def main():
                 except Exception as e:
                     st.error(f"❌ Error al procesar archivos: {str(e)}")
                     st.exception(e)
+            if perfil is not None:
+                with st.expander("🔬 Perfil de la ejecución"):
+                    st.code(perfil.resumen)
+                    st.download_button(
+                        label=f"📥 Descargar {perfil.ruta_perfil.name}",
+                        data=perfil.ruta_perfil.read_bytes(),
+                        file_name=perfil.ruta_perfil.name,
+                        mime="application/octet-stream",
+                    )
+                    st.download_button(
+                        label=f"📥 Descargar {perfil.ruta_resumen.name}",
+                        data=perfil.resumen,
+                        file_name=perfil.ruta_resumen.name,
+                        mime="text/plain",
+                    )
+
+        # Fuera del botón: cada tecla vuelve a ejecutar el script y solo se consulta el índice
+        busqueda = st.session_state.get('busqueda_resultado')
+        if busqueda is not None:
+            df_busqueda, indice = busqueda
+            st.subheader("🔍 Buscar en el resultado")
+            texto_busqueda = st.text_input(
+                "SKU, número de publicación o palabras de la descripción",
+                help="El SKU y el número de publicación deben ser exactos; las palabras valen como comienzo"
+            )
+            col_p1, col_p2, col_c1, col_c2 = st.columns(4)
+            with col_p1:
+                precio_min = st.number_input("Precio final desde", min_value=0.0, value=None, step=100.0)
+            with col_p2:
+                precio_max = st.number_input("Precio final hasta", min_value=0.0, value=None, step=100.0)
+            with col_c1:
+                cambio_min = st.number_input("Cambio de precio desde (%)", value=None, step=5.0)
+            with col_c2:
+                cambio_max = st.number_input("Cambio de precio hasta (%)", value=None, step=5.0)
+            posiciones = indice.buscar(texto_busqueda, precio_min, precio_max, cambio_min, cambio_max)
+            st.caption(f"{len(posiciones)} de {len(indice)} publicaciones (se muestran hasta 200)")
+            st.dataframe(indice.filas(df_busqueda, posiciones, 200), use_container_width=True, hide_index=True)
     else:
         st.info("📁 Por favor, sube ambos archivos Excel para comenzar el procesamiento.")
         with st.expander("📋 Formato de archivos esperado"):
@@ -0,0 +1,221 @@
+"""
+Reparto del stock de Odoo entre las publicaciones de ML que comparten SKU.
+
+Variaciones y publicaciones de distinto ``LISTING_TYPE_V3`` suelen apuntar al
+mismo código; sin reparto cada una recibe el 'Cantidad a mano' completo y se
+sobrevende. ``asignar_stock`` corre después de ``unir_y_validar`` y agrega
+'Stock asignado', que ``preparar_resultado_final`` usa como 'Stock'.
+
+Reglas (``REGLAS_ASIGNACION``):
+
+- 'proporcional': según el QUANTITY actual de cada publicación (si todas
+  tienen 0, en partes iguales).
+- 'igual': en partes iguales.
+- 'prioridad': por tipo de publicación en el orden de ``prioridad_tipos``;
+  cada publicación recibe hasta su tope antes de pasar a la siguiente.
+
+Antes de repartir se reserva ``stock_seguridad`` unidades por código, y
+``tope_por_publicacion`` (número o dict por tipo) limita lo que recibe cada
+publicación; lo que no entra en una se redistribuye entre las demás del
+mismo código. El resultado es entero y nunca supera el disponible.
+
+Todo el cálculo es por arrays sobre códigos factorizados (``np.bincount``,
+``np.cumsum`` sobre el orden por grupo): no hay bucles por SKU. El reparto
+proporcional con topes hace una ronda por cada nivel de topes alcanzados
+(``MAX_RONDAS`` como máximo).
+
+Las corridas por bloques reparten con ``asignar_stock_por_bloques`` sobre
+todos los bloques unidos (solo las columnas del reparto) y después copian a
+cada bloque su parte con ``aplicar_stock_asignado``.
+"""
+import numpy as np
+import pandas as pd
+
+from data_processor import _agregar_nota
+
+REGLAS_ASIGNACION = ('proporcional', 'igual', 'prioridad')
+PRIORIDAD_TIPOS = ['gold_pro', 'gold_special', 'free']
+MAX_RONDAS = 20
+# Columnas de ``unir_y_validar`` que usa el reparto
+COLUMNAS_REPARTO = ['Código Neored', 'Cantidad a mano', 'QUANTITY', 'LISTING_TYPE_V3']
+
+
+def _topes(df: pd.DataFrame, tope_por_publicacion) -> np.ndarray:
+    """Tope por fila (inf si no hay)."""
+    n = len(df)
+    if tope_por_publicacion is None:
+        return np.full(n, np.inf)
+    if isinstance(tope_por_publicacion, dict):
+        tipos = df['LISTING_TYPE_V3'] if 'LISTING_TYPE_V3' in df.columns else pd.Series([None] * n)
+        topes = tipos.map(tope_por_publicacion).to_numpy(dtype=float, na_value=np.inf)
+        return np.where(np.isnan(topes), np.inf, np.maximum(np.floor(topes), 0))
+    return np.full(n, max(float(np.floor(tope_por_publicacion)), 0.0))
+
+
+def _repartir_proporcional(grupo, disponible, pesos, topes, n_grupos) -> np.ndarray:
+    """Reparto proporcional con topes ("water filling") y redondeo por mayor resto."""
+    asignado = np.zeros(len(grupo))
+    restante = disponible.astype(float)
+    activo = topes > 0
+    for _ in range(MAX_RONDAS):
+        peso_activo = np.where(activo, pesos, 0.0)
+        suma_pesos = np.bincount(grupo, weights=peso_activo, minlength=n_grupos)
+        # Grupos cuyas publicaciones activas tienen todas peso 0: partes iguales
+        sin_peso = suma_pesos[grupo] == 0
+        peso_activo = np.where(sin_peso & activo, 1.0, peso_activo)
+        suma_pesos = np.bincount(grupo, weights=peso_activo, minlength=n_grupos)
+        cuota = np.divide(
+            restante[grupo] * peso_activo, suma_pesos[grupo],
+            out=np.zeros(len(grupo)), where=suma_pesos[grupo] > 0,
+        )
+        agregado = np.minimum(cuota, topes - asignado)
+        asignado += agregado
+        restante -= np.bincount(grupo, weights=agregado, minlength=n_grupos)
+        activo &= asignado < topes
+        quedan = np.bincount(grupo, weights=activo.astype(float), minlength=n_grupos) > 0
+        if not np.any(quedan & (restante > 1e-9)):
+            break
+
+    # Enteros: piso y las unidades sobrantes a los mayores restos de cada grupo
+    base = np.floor(asignado + 1e-9)
+    total = np.floor(np.bincount(grupo, weights=asignado, minlength=n_grupos) + 1e-6)
+    sobrante = total - np.bincount(grupo, weights=base, minlength=n_grupos)
+    resto = np.where(base + 1 <= topes, asignado - base, -1.0)
+    orden = np.lexsort((-resto, grupo))
+    inicio_grupo = np.searchsorted(grupo[orden], np.arange(n_grupos))
+    posicion = np.arange(len(orden)) - inicio_grupo[grupo[orden]]
+    extra = np.zeros(len(grupo))
+    extra[orden] = (posicion < sobrante[grupo[orden]]) & (resto[orden] > 0)
+    return base + extra
+
+
+def _repartir_por_prioridad(grupo, disponible, rango, topes, n_grupos) -> np.ndarray:
+    """Cada publicación, en orden de prioridad, toma hasta su tope de lo que queda."""
+    topes = np.minimum(topes, disponible[grupo])
+    orden = np.lexsort((np.arange(len(grupo)), rango, grupo))
+    topes_ordenados = topes[orden]
+    acumulado = np.cumsum(topes_ordenados)
+    inicio_grupo = np.searchsorted(grupo[orden], np.arange(n_grupos))
+    previo_grupo = np.concatenate(([0.0], acumulado))[inicio_grupo]
+    antes = acumulado - topes_ordenados - previo_grupo[grupo[orden]]
+    asignado = np.zeros(len(grupo))
+    asignado[orden] = np.clip(disponible[grupo[orden]] - antes, 0, topes_ordenados)
+    return asignado
+
+
+def asignar_stock(
+    df_merged: pd.DataFrame,
+    regla: str = 'proporcional',
+    stock_seguridad: float = 0,
+    tope_por_publicacion=None,
+    prioridad_tipos: list = None,
+    ya_asignado: pd.Series = None
+) -> pd.DataFrame:
+    """
+    Reparte in situ el stock de cada código de Odoo entre sus publicaciones.
+
+    Args:
+        df_merged: Resultado de ``unir_y_validar``
+        regla: 'proporcional', 'igual' o 'prioridad'
+        stock_seguridad: Unidades por código que no se publican
+        tope_por_publicacion: Máximo por publicación (número, o dict
+            {LISTING_TYPE_V3: tope}); None sin tope
+        prioridad_tipos: Orden de los tipos para la regla 'prioridad' (por
+            defecto ``PRIORIDAD_TIPOS``; los no listados van al final)
+        ya_asignado: Stock ya repartido por código en llamadas anteriores
+            (procesamiento por bloques); se descuenta del disponible
+
+    Returns:
+        El mismo DataFrame con 'Stock asignado' (0 sin coincidencia en Odoo) y
+        una nota en las publicaciones que comparten código
+    """
+    if regla not in REGLAS_ASIGNACION:
+        raise ValueError(f"Regla de asignación no soportada: {regla}. Opciones: {', '.join(REGLAS_ASIGNACION)}")
+
+    n = len(df_merged)
+    grupo, codigos = pd.factorize(df_merged['Código Neored'])
+    asignado = np.zeros(n)
+    con_codigo = grupo >= 0
+    if con_codigo.any():
+        g = grupo[con_codigo]
+        n_grupos = len(codigos)
+        stock = pd.to_numeric(df_merged['Cantidad a mano'], errors='coerce').fillna(0).to_numpy(dtype=float)
+        # Todas las filas de un código tienen el mismo stock: se toma una por grupo
+        disponible = np.zeros(n_grupos)
+        disponible[g] = stock[con_codigo]
+        disponible = np.floor(np.maximum(disponible - stock_seguridad, 0))
+        if ya_asignado is not None:
+            previo = pd.Series(ya_asignado).reindex(codigos).fillna(0).to_numpy(dtype=float)
+            disponible = np.maximum(disponible - previo, 0)
+        topes = _topes(df_merged, tope_por_publicacion)[con_codigo]
+
+        if regla == 'prioridad':
+            orden_tipos = {tipo: i for i, tipo in enumerate(prioridad_tipos or PRIORIDAD_TIPOS)}
+            tipos = df_merged['LISTING_TYPE_V3'] if 'LISTING_TYPE_V3' in df_merged.columns else pd.Series([None] * n)
+            rango = tipos.map(orden_tipos).fillna(len(orden_tipos)).to_numpy()[con_codigo]
+            asignado[con_codigo] = _repartir_por_prioridad(g, disponible, rango, topes, n_grupos)
+        else:
+            if regla == 'igual' or 'QUANTITY' not in df_merged.columns:
+                pesos = np.ones(len(g))
+            else:
+                cantidad = pd.to_numeric(df_merged['QUANTITY'], errors='coerce').fillna(0).to_numpy(dtype=float)
+                pesos = np.maximum(cantidad[con_codigo], 0)
+            asignado[con_codigo] = _repartir_proporcional(g, disponible, pesos, topes, n_grupos)
+
+    df_merged['Stock asignado'] = asignado.astype(np.int64)
+    if con_codigo.any():
+        compartido = np.zeros(n, dtype=bool)
+        compartido[con_codigo] = np.bincount(g, minlength=n_grupos)[g] > 1
+        notas = df_merged['Notas/Flags'].fillna('').to_numpy(dtype=object, copy=True)
+        _agregar_nota(notas, compartido, f'Stock repartido entre publicaciones del mismo código ({regla})')
+        df_merged['Notas/Flags'] = notas
+    return df_merged
+
+
+def stock_asignado_por_codigo(df: pd.DataFrame) -> pd.Series:
+    """Total de 'Stock asignado' por código (para ``ya_asignado`` del bloque siguiente)."""
+    return df.groupby('Código Neored', sort=False)['Stock asignado'].sum()
+
+
+def asignar_stock_por_bloques(bloques_unidos, **asignacion) -> pd.DataFrame:
+    """
+    Reparte el stock de todos los bloques de una corrida a la vez.
+
+    Da lo mismo que ``asignar_stock`` sobre el archivo entero: el reparto no
+    depende de en qué bloque cae cada publicación. De cada bloque solo se
+    conservan las columnas que usa el reparto.
+
+    Args:
+        bloques_unidos: Bloques de ``unir_y_validar``, en orden
+        **asignacion: Argumentos de ``asignar_stock``
+
+    Returns:
+        DataFrame con 'Stock asignado' y 'Notas/Flags' (solo la nota del
+        reparto) por publicación, en el orden de los bloques
+    """
+    partes = [df[[col for col in COLUMNAS_REPARTO if col in df.columns]] for df in bloques_unidos]
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUMNAS_REPARTO[:2])
+    df['Notas/Flags'] = ''
+    return asignar_stock(df, **asignacion)[['Stock asignado', 'Notas/Flags']]
+
+
+def aplicar_stock_asignado(df_merged: pd.DataFrame, asignado: pd.DataFrame, desde: int) -> pd.DataFrame:
+    """
+    Copia in situ a un bloque su parte de ``asignar_stock_por_bloques``.
+
+    Args:
+        df_merged: Bloque de ``unir_y_validar``
+        asignado: Resultado de ``asignar_stock_por_bloques``
+        desde: Posición de la primera publicación del bloque en la corrida
+
+    Returns:
+        El mismo DataFrame con 'Stock asignado' y la nota del reparto
+    """
+    parte = asignado.iloc[desde:desde + len(df_merged)]
+    df_merged['Stock asignado'] = parte['Stock asignado'].to_numpy()
+    notas = df_merged['Notas/Flags'].fillna('').to_numpy(dtype=object, copy=True)
+    nota_reparto = parte['Notas/Flags'].to_numpy(dtype=object)
+    for mensaje in pd.unique(nota_reparto[nota_reparto != '']):
+        _agregar_nota(notas, nota_reparto == mensaje, mensaje)
+    df_merged['Notas/Flags'] = notas
+    return df_merged
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Benchmark del pipeline con datos sintéticos.
+
+Mide tiempo y pico de memoria (tracemalloc) de cada etapa sobre DataFrames
+generados en memoria, sin pasar por Excel salvo en la exportación.
+
+Con ``--importacion`` mide en cambio el tiempo de importación en frío de los
+puntos de entrada contra ``PRESUPUESTO_IMPORTACION_MS`` y verifica que los
+livianos no carguen pandas, numpy, openpyxl ni Streamlit.
+
+Uso:
+    python benchmark.py [--filas-ml 100000] [--filas-odoo 120000] [--sin-exportar]
+                        [--formatos xlsx,csv,parquet,jsonl] [--arrow]
+    python benchmark.py --importacion
+"""
+import argparse
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from data_processor import (
+    unir_y_validar, calcular, preparar_resultado_final, exportar, auditar_margenes, comparar_planes_cuotas,
+)
+from control_precios import controlar_cambios_precio
+from utils import parse_fee_combo, parse_pct, extract_tax_percentage, clean_ml_data, convertir_columnas_arrow
+
+# Tiempo máximo de importación en frío (ms) por módulo
+PRESUPUESTO_IMPORTACION_MS = {
+    'utils': 50,
+    'consulta': 60,
+    'app': 60,
+    'data_processor': 1000,
+}
+# Módulos que los puntos de entrada livianos no deben cargar al importarse
+MODULOS_PESADOS = ('pandas', 'numpy', 'openpyxl', 'streamlit')
+ENTRADAS_LIVIANAS = ('utils', 'consulta', 'app')
+
+TIPOS_PUBLICACION = ['gold_special', 'gold_pro', 'free']
+FEES = ['14.50% + $1095.00', '12.00% + $800.00', '15.00% + $500.00', '13.50% + $750.00']
+FINANCIACION = ['0.00%', '3.50%', '4.00%', '5.00%']
+ENVIOS = ['Mercado Envíos por mi cuenta', 'Mercado Envíos Clásico', None]
+PLANES_CUOTAS = {3: '4.50%', 6: '9.00%', 9: '13.00%', 12: '17.00%'}
+
+
+def generar_datos_sinteticos(filas_ml: int, filas_odoo: int, seed: int = 0):
+    """
+    Genera DataFrames ML y Odoo "crudos" con la estructura de los Excel reales.
+
+    Args:
+        filas_ml: Cantidad de publicaciones de MercadoLibre
+        filas_odoo: Cantidad de productos de Odoo
+        seed: Semilla del generador aleatorio
+
+    Returns:
+        (df_ml, df_odoo) sin parsear
+    """
+    rng = np.random.default_rng(seed)
+    codigos = np.array([f'SKU{i:08d}' for i in range(filas_odoo)], dtype=object)
+    # ~90% de las publicaciones apuntan a un código existente
+    idx = rng.integers(0, int(filas_odoo / 0.9) + 1, size=filas_ml)
+    skus = np.array([f'SKU{i:08d}' for i in idx], dtype=object)
+
+    df_ml = pd.DataFrame({
+        'ITEM_ID': [f'MLA{i:09d}' for i in range(filas_ml)],
+        'VARIATION_ID': rng.integers(10**10, 10**11, size=filas_ml).astype(str),
+        'SKU': skus,
+        'TITLE': [f'Producto {s} publicación' for s in skus],
+        'QUANTITY': rng.integers(0, 500, size=filas_ml),
+        'PRICE': np.round(rng.uniform(100, 50000, size=filas_ml), 2),
+        'CURRENCY_ID': '$',
+        'FEE_PER_SALE_MARKETPLACE_V2': rng.choice(FEES, size=filas_ml),
+        'COST_OF_FINANCING_MARKETPLACE': rng.choice(FINANCIACION, size=filas_ml),
+        'LISTING_TYPE_V3': rng.choice(TIPOS_PUBLICACION, size=filas_ml),
+        'SHIPPING_METHOD ': rng.choice(np.array(ENVIOS, dtype=object), size=filas_ml),
+    })
+    df_odoo = pd.DataFrame({
+        'Código Neored': codigos,
+        'Nombre': [f'Nombre Odoo {c}' for c in codigos],
+        'Cantidad a mano': rng.integers(0, 1000, size=filas_odoo),
+        'Precio Tarifa': np.round(rng.uniform(50, 30000, size=filas_odoo), 2),
+        'Impuestos del cliente': 'IVA Ventas 21%',
+    })
+    return df_ml, df_odoo
+
+
+def parsear_sinteticos(df_ml: pd.DataFrame, df_odoo: pd.DataFrame, cadenas_arrow: bool = False):
+    """Aplica a los DataFrames sintéticos el mismo parseo que ``leer_ml``/``leer_odoo``."""
+    df_ml = clean_ml_data(df_ml)
+    df_ml['fee_pct'], df_ml['fee_fixed'] = zip(*df_ml['FEE_PER_SALE_MARKETPLACE_V2'].apply(parse_fee_combo))
+    df_ml['financing_pct'] = df_ml['COST_OF_FINANCING_MARKETPLACE'].apply(parse_pct)
+    df_odoo = df_odoo.copy()
+    df_odoo['tax_pct'] = df_odoo['Impuestos del cliente'].apply(extract_tax_percentage)
+    if cadenas_arrow:
+        convertir_columnas_arrow(df_ml)
+        convertir_columnas_arrow(df_odoo)
+    return df_ml, df_odoo
+
+
+def medir(nombre: str, funcion, *args, **kwargs):
+    """Ejecuta ``funcion`` midiendo tiempo y pico de memoria; imprime el resultado."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{nombre:<28} {duracion * 1000:>10.1f} ms {pico / 2**20:>10.1f} MiB")
+    return resultado
+
+
+def medir_importacion(modulo: str, repeticiones: int = 3):
+    """
+    Mide la importación de ``modulo`` en un intérprete nuevo con ``-X importtime``.
+
+    Args:
+        modulo: Nombre del módulo a importar
+        repeticiones: Corridas a realizar (se informa la más rápida)
+
+    Returns:
+        (milisegundos, lista de ``MODULOS_PESADOS`` cargados)
+    """
+    codigo = (
+        f"import sys, {modulo}; "
+        f"print(','.join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))"
+    )
+    mejor, pesados = None, []
+    for _ in range(repeticiones):
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            capture_output=True, text=True, cwd=BASE_DIR, check=True,
+        )
+        linea = next(
+            l for l in reversed(proceso.stderr.splitlines())
+            if l.startswith('import time:') and l.rsplit('|', 1)[-1].strip() == modulo
+        )
+        microsegundos = int(linea.split('|')[1])
+        mejor = microsegundos if mejor is None else min(mejor, microsegundos)
+        pesados = [m for m in proceso.stdout.strip().split(',') if m]
+    return mejor / 1000, pesados
+
+
+def verificar_importacion() -> int:
+    """Imprime el tiempo de importación de cada módulo contra su presupuesto."""
+    print(f"{'Módulo':<18} {'Tiempo':>10} {'Presupuesto':>13}  Pesados cargados")
+    excedidos = 0
+    for modulo, presupuesto in PRESUPUESTO_IMPORTACION_MS.items():
+        ms, pesados = medir_importacion(modulo)
+        fuera = ms > presupuesto or (modulo in ENTRADAS_LIVIANAS and pesados)
+        excedidos += bool(fuera)
+        print(f"{modulo:<18} {ms:>7.1f} ms {presupuesto:>10} ms  {', '.join(pesados) or '-'}{'  ❌' if fuera else ''}")
+    return 1 if excedidos else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas-ml', type=int, default=100_000)
+    parser.add_argument('--filas-odoo', type=int, default=120_000)
+    parser.add_argument('--sin-exportar', action='store_true', help='Omitir la exportación')
+    parser.add_argument('--formatos', default='xlsx', help='Formatos a exportar, separados por coma')
+    parser.add_argument('--arrow', action='store_true', help='Usar texto Arrow en las columnas de texto')
+    parser.add_argument('--importacion', action='store_true', help='Medir tiempos de importación')
+    args = parser.parse_args(argv)
+
+    if args.importacion:
+        return verificar_importacion()
+
+    df_ml_raw, df_odoo_raw = generar_datos_sinteticos(args.filas_ml, args.filas_odoo)
+    print(f"ML: {len(df_ml_raw)} filas | Odoo: {len(df_odoo_raw)} filas")
+    print(f"{'Etapa':<28} {'Tiempo':>13} {'Pico mem.':>14}")
+
+    df_ml, df_odoo = medir('parseo', parsear_sinteticos, df_ml_raw, df_odoo_raw, args.arrow)
+    memoria = (df_ml.memory_usage(deep=True).sum() + df_odoo.memory_usage(deep=True).sum()) / 2**20
+    print(f"{'memoria entradas':<28} {'':>13} {memoria:>10.1f} MiB")
+    df_merged = medir('unir_y_validar', unir_y_validar, df_ml, df_odoo)
+    df_calc = medir('calcular', calcular, df_merged)
+    medir('controlar_cambios_precio', controlar_cambios_precio, df_calc)
+    medir('auditar_margenes', auditar_margenes, df_merged)
+    medir('comparar_planes_cuotas', comparar_planes_cuotas, df_merged, PLANES_CUOTAS)
+    df_res = medir('preparar_resultado_final', preparar_resultado_final, df_calc)
+    if not args.sin_exportar:
+        for formato in args.formatos.split(','):
+            medir(f'exportar ({formato})', exportar, df_res, formato.strip())
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
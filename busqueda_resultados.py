@@ -0,0 +1,186 @@
+"""
+Búsqueda sobre el resultado calculado sin recorrer el DataFrame en cada consulta.
+
+``IndiceResultados`` se arma una vez por resultado de
+``preparar_resultado_final`` y después cada búsqueda cuesta milisegundos,
+aunque el resultado tenga 100k filas (en la app cada tecla vuelve a ejecutar
+el script, así que el índice se guarda en la sesión):
+
+- SKU y 'Numero de publicación': búsqueda exacta por hash (sin distinguir
+  mayúsculas) sobre las claves factorizadas; las filas de cada clave quedan
+  contiguas (CSR), así un SKU repetido devuelve todas sus publicaciones.
+- 'Descripción del producto': índice invertido de palabras (minúsculas, sin
+  acentos) con el vocabulario ordenado. Cada palabra de la consulta vale
+  como prefijo: las palabras que empiezan igual son un tramo contiguo del
+  vocabulario y sus filas un tramo contiguo de las listas. Todas las
+  palabras deben aparecer.
+- 'Precio final' y cambio de precio (%) respecto de 'Precio actual en ML':
+  rangos por búsqueda binaria sobre los valores ordenados, o filtrando los
+  candidatos de la búsqueda de texto.
+"""
+import numpy as np
+import pandas as pd
+
+from data_processor import _columna_numerica
+from utils import _texto_clave
+
+COLUMNAS_CLAVE = ('SKU', 'Numero de publicación')
+COLUMNA_TEXTO = 'Descripción del producto'
+COLUMNA_CAMBIO = 'Cambio de precio (%)'
+# Caracter mayor que cualquiera de las palabras normalizadas (cota de los prefijos)
+_FIN_PREFIJO = '{'
+_PALABRA = r'[a-z0-9]+'
+
+
+def _clave(valor) -> str:
+    """Clave de búsqueda exacta: la de ``_texto_clave`` en mayúsculas."""
+    return _texto_clave(valor).upper()
+
+
+def _normalizar_texto(textos: pd.Series) -> pd.Series:
+    """Minúsculas y sin acentos (se descartan las marcas de la forma NFKD)."""
+    return (
+        textos.fillna('').astype(str).str.normalize('NFKD')
+        .str.encode('ascii', errors='ignore').str.decode('ascii').str.lower()
+    )
+
+
+def _palabras(texto: str) -> list:
+    return _normalizar_texto(pd.Series([texto])).str.findall(_PALABRA).iloc[0]
+
+
+def _csr(grupos: np.ndarray, filas: np.ndarray, n_grupos: int) -> tuple:
+    """(listas, inicios): las filas de cada grupo contiguas y en orden."""
+    orden = np.argsort(grupos, kind='stable')
+    inicios = np.concatenate(([0], np.cumsum(np.bincount(grupos, minlength=n_grupos))))
+    return filas[orden], inicios
+
+
+class IndiceResultados:
+    """
+    Índice de búsqueda sobre el resultado final.
+
+    Args:
+        df_resultado: DataFrame de ``preparar_resultado_final`` (se usan las
+            columnas de ``COLUMNAS_CLAVE``, ``COLUMNA_TEXTO``, 'Precio final' y
+            'Precio actual en ML' que tenga)
+    """
+
+    def __init__(self, df_resultado: pd.DataFrame):
+        self.n = len(df_resultado)
+
+        # Claves exactas de todas las columnas en un mismo espacio
+        columnas = [col for col in COLUMNAS_CLAVE if col in df_resultado.columns]
+        claves = np.array([_clave(v) for col in columnas for v in df_resultado[col].tolist()], dtype=object)
+        filas = np.tile(np.arange(self.n), len(columnas))
+        codigos, unicas = pd.factorize(claves)
+        self._claves = pd.Index(unicas)
+        # La tabla hash del índice se arma en la primera búsqueda: se la fuerza acá
+        self._claves.get_indexer([''])
+        self._filas_clave, self._inicios_clave = _csr(codigos, filas, len(unicas))
+
+        # Índice invertido de palabras con el vocabulario ordenado
+        if COLUMNA_TEXTO in df_resultado.columns:
+            palabras = _normalizar_texto(df_resultado[COLUMNA_TEXTO].reset_index(drop=True)).str.findall(_PALABRA)
+            palabras = palabras.explode().dropna()
+        else:
+            palabras = pd.Series([], dtype=object)
+        codigos, vocabulario = pd.factorize(palabras.to_numpy(dtype=object), sort=True)
+        filas = palabras.index.to_numpy(dtype=np.int64)
+        # Una entrada por (palabra, fila): la lista de cada palabra queda ordenada y sin repetidos
+        unicas = ~pd.Series(codigos.astype(np.int64) * max(self.n, 1) + filas).duplicated().to_numpy()
+        self._vocabulario = np.asarray(vocabulario, dtype=object)
+        self._filas_palabra, self._inicios_palabra = _csr(codigos[unicas], filas[unicas], len(vocabulario))
+
+        # Valores para los rangos, ordenados (los NaN quedan al final)
+        precio = _columna_numerica(df_resultado, 'Precio final')
+        actual = _columna_numerica(df_resultado, 'Precio actual en ML')
+        # Sin precio actual el cambio no está definido (NaN: no entra en ningún rango)
+        cambio = np.full(self.n, np.nan)
+        con_actual = actual > 0
+        cambio[con_actual] = (precio[con_actual] / actual[con_actual] - 1) * 100
+        self.valores = {'Precio final': precio, COLUMNA_CAMBIO: cambio}
+        self._ordenes = {}
+        for nombre, valores in self.valores.items():
+            orden = np.argsort(valores, kind='stable')
+            self._ordenes[nombre] = (orden, valores[orden])
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _por_clave(self, texto: str) -> np.ndarray:
+        posicion = self._claves.get_indexer([_clave(texto)])[0]
+        if posicion < 0:
+            return np.array([], dtype=np.int64)
+        return self._filas_clave[self._inicios_clave[posicion]:self._inicios_clave[posicion + 1]]
+
+    def _por_palabras(self, texto: str) -> np.ndarray:
+        """Filas cuya descripción tiene una palabra que empieza con cada palabra del texto."""
+        listas = []
+        for palabra in _palabras(texto):
+            desde, hasta = np.searchsorted(self._vocabulario, [palabra, palabra + _FIN_PREFIJO])
+            filas = self._filas_palabra[self._inicios_palabra[desde]:self._inicios_palabra[hasta]]
+            # Con una sola palabra del vocabulario la lista ya está ordenada y sin repetidos
+            listas.append(filas if hasta - desde == 1 else np.unique(filas))
+        if not listas:
+            return np.array([], dtype=np.int64)
+        # Intersección empezando por la lista más corta
+        listas.sort(key=len)
+        resultado = listas[0]
+        for filas in listas[1:]:
+            if not len(resultado):
+                break
+            resultado = np.intersect1d(resultado, filas, assume_unique=True)
+        return resultado
+
+    def _en_rango(self, nombre: str, minimo, maximo, candidatas: np.ndarray = None) -> np.ndarray:
+        minimo = -np.inf if minimo is None else minimo
+        maximo = np.inf if maximo is None else maximo
+        if candidatas is not None:
+            valores = self.valores[nombre][candidatas]
+            return candidatas[(valores >= minimo) & (valores <= maximo)]
+        orden, ordenados = self._ordenes[nombre]
+        desde = np.searchsorted(ordenados, minimo, side='left')
+        hasta = np.searchsorted(ordenados, maximo, side='right')
+        return np.sort(orden[desde:hasta])
+
+    def buscar(
+        self,
+        texto: str = '',
+        precio_min: float = None,
+        precio_max: float = None,
+        cambio_min: float = None,
+        cambio_max: float = None
+    ) -> np.ndarray:
+        """
+        Filas que cumplen todos los criterios indicados.
+
+        Args:
+            texto: SKU o número de publicación exactos, o palabras (o comienzos
+                de palabras) de la descripción; vacío = sin filtro de texto
+            precio_min, precio_max: Rango de 'Precio final' (None = abierto)
+            cambio_min, cambio_max: Rango del cambio de precio en % respecto del
+                precio actual en ML (None = abierto)
+
+        Returns:
+            Posiciones de las filas en el resultado, en orden ascendente
+        """
+        candidatas = None
+        texto = (texto or '').strip()
+        if texto:
+            candidatas = np.union1d(self._por_clave(texto), self._por_palabras(texto))
+        for nombre, minimo, maximo in (
+            ('Precio final', precio_min, precio_max),
+            (COLUMNA_CAMBIO, cambio_min, cambio_max),
+        ):
+            if minimo is not None or maximo is not None:
+                candidatas = self._en_rango(nombre, minimo, maximo, candidatas)
+        return np.arange(self.n) if candidatas is None else candidatas.astype(np.int64)
+
+    def filas(self, df_resultado: pd.DataFrame, posiciones: np.ndarray, limite: int = None) -> pd.DataFrame:
+        """Filas de ``df_resultado`` en ``posiciones`` con la columna de cambio de precio."""
+        posiciones = posiciones[:limite]
+        df = df_resultado.take(posiciones)
+        ubicacion = df.columns.get_loc('Precio actual en ML') + 1 if 'Precio actual en ML' in df.columns else len(df.columns)
+        df.insert(ubicacion, COLUMNA_CAMBIO, np.round(self.valores[COLUMNA_CAMBIO][posiciones], 2))
+        return df
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Catálogo de Odoo compilado en un archivo binario para mapear en memoria.
+
+Varios procesos (sesiones de Streamlit, workers de ``vigilante.py``) pueden
+abrir el mismo archivo en modo solo lectura: el sistema operativo comparte las
+páginas entre todos, así que la memoria no crece con la cantidad de procesos.
+Abrirlo solo lee el encabezado; los datos se cargan bajo demanda.
+
+Formato (little-endian):
+    8 bytes   firma ``MLCAT002``
+    8 bytes   uint64 inicio de los datos
+    8 bytes   uint64 largo del encabezado
+    N bytes   encabezado JSON con filas, dtype de 'Código Neored' y
+              {nombre: {dtype, offset, shape}}
+    ...       arrays alineados a 64 bytes, ordenados por hash del código
+
+Las claves son el hash de 64 bits (``pd.util.hash_array``) de 'Código Neored'
+como texto, ordenadas para buscar con ``np.searchsorted``; cada coincidencia se
+verifica contra el código real para descartar colisiones. Los códigos
+numéricos llevan un prefijo propio: 123 y 123.0 coinciden entre sí pero no con
+'123', igual que en ``merge``. Los textos se guardan
+como bytes UTF-8 concatenados más un array de offsets.
+
+Uso:
+    python catalogo_compilado.py "Producto (product.template) (1).xlsx" catalogo.mlcat
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from utils import _texto_clave
+
+FIRMA = b'MLCAT002'
+ALINEACION = 64
+# Prefijo de la clave de los códigos numéricos (no aparece en códigos de texto)
+_PREFIJO_NUMERICO = '\x00'
+
+# Columnas numéricas de Odoo que se guardan en el catálogo
+COLUMNAS_NUMERICAS = ['Precio Tarifa', 'Cantidad a mano', 'tax_pct']
+# Columnas de texto que se guardan en el catálogo
+COLUMNAS_TEXTO = ['Código Neored', 'Nombre']
+
+
+def _hash_codigos(codigos: np.ndarray) -> np.ndarray:
+    return pd.util.hash_array(codigos.astype(object), categorize=False)
+
+
+def _claves_codigos(valores) -> np.ndarray:
+    """Clave de texto de cada código: los textos tal cual y los números con prefijo."""
+    return np.array([
+        _PREFIJO_NUMERICO + _texto_clave(v) if isinstance(v, numbers.Number) else str(v)
+        for v in valores
+    ], dtype=object)
+
+
+def _valores_codigos(claves: np.ndarray) -> np.ndarray:
+    """Inversa de ``_claves_codigos``: los códigos numéricos vuelven a ser números."""
+    valores = np.array(claves, dtype=object)
+    for i, clave in enumerate(valores):
+        if isinstance(clave, str) and clave.startswith(_PREFIJO_NUMERICO):
+            numero = clave[len(_PREFIJO_NUMERICO):]
+            try:
+                valores[i] = int(numero)
+            except ValueError:
+                valores[i] = float(numero)
+    return valores
+
+
+def _codificar_textos(valores) -> tuple:
+    """Devuelve (offsets, datos, validos) para una secuencia de textos."""
+    validos = np.fromiter((isinstance(v, str) for v in valores), dtype=bool, count=len(valores))
+    codificados = [v.encode('utf-8') if ok else b'' for v, ok in zip(valores, validos)]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, codificados), dtype=np.int64, count=len(codificados)), out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(codificados), dtype=np.uint8), validos.astype(np.uint8)
+
+
+def compilar_catalogo(df_odoo: pd.DataFrame, ruta) -> Path:
+    """
+    Escribe el catálogo de Odoo en formato compilado.
+
+    El archivo se escribe con nombre temporal y se renombra al final; los
+    procesos que ya tienen mapeada la versión anterior la siguen viendo intacta.
+
+    Args:
+        df_odoo: DataFrame devuelto por ``leer_odoo``
+        ruta: Archivo de destino
+
+    Returns:
+        Ruta del archivo generado
+    """
+    ruta = Path(ruta)
+    df = df_odoo[df_odoo['Código Neored'].notna()]
+    codigos = _claves_codigos(df['Código Neored'].tolist())
+    hashes = _hash_codigos(codigos)
+    orden = np.argsort(hashes, kind='stable')
+
+    arrays = {'hash': hashes[orden]}
+    for col in COLUMNAS_NUMERICAS:
+        valores = df[col] if col in df.columns else pd.Series(0.0, index=df.index)
+        arrays[col] = pd.to_numeric(valores, errors='coerce').to_numpy(dtype=np.float64)[orden]
+    for col in COLUMNAS_TEXTO:
+        if col == 'Código Neored':
+            valores = codigos[orden]
+        else:
+            valores = df[col].to_numpy(dtype=object)[orden]
+        offsets, datos, validos = _codificar_textos(valores)
+        arrays[f'{col}.offsets'] = offsets
+        arrays[f'{col}.datos'] = datos
+        arrays[f'{col}.validos'] = validos
+
+    descripcion = {}
+    posicion = 0
+    for nombre, arr in arrays.items():
+        descripcion[nombre] = {'dtype': arr.dtype.str, 'offset': posicion, 'shape': list(arr.shape)}
+        posicion += -(-arr.nbytes // ALINEACION) * ALINEACION
+    dtype_codigo = df_odoo['Código Neored'].dtype
+    if isinstance(dtype_codigo, pd.StringDtype):
+        dtype_codigo = f'string[{dtype_codigo.storage}]'
+    encabezado = json.dumps({
+        'filas': int(len(df)),
+        'dtype_codigo': str(dtype_codigo),
+        'arrays': descripcion,
+    }).encode('utf-8')
+    inicio_datos = -(-(24 + len(encabezado)) // ALINEACION) * ALINEACION
+
+    temporal = ruta.with_name(f".{ruta.name}.tmp")
+    with open(temporal, 'wb') as f:
+        f.write(FIRMA)
+        f.write(struct.pack('<QQ', inicio_datos, len(encabezado)))
+        f.write(encabezado)
+        for nombre, arr in arrays.items():
+            f.seek(inicio_datos + descripcion[nombre]['offset'])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(inicio_datos + posicion)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+class CatalogoCompilado:
+    """
+    Vista de solo lectura sobre un catálogo compilado mapeado en memoria.
+
+    Se puede pasar directamente a ``unir_y_validar`` en lugar del DataFrame de
+    Odoo: el join se resuelve sobre los arrays mapeados y solo se leen las
+    filas del catálogo que coinciden con algún SKU.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        with open(self.ruta, 'rb') as f:
+            if f.read(8) != FIRMA:
+                raise ValueError(f"{self.ruta} no es un catálogo compilado")
+            inicio_datos, largo = struct.unpack('<QQ', f.read(16))
+            encabezado = json.loads(f.read(largo).decode('utf-8'))
+        self.filas = encabezado['filas']
+        self.dtype_codigo = encabezado['dtype_codigo']
+        self._mapa = np.memmap(self.ruta, dtype=np.uint8, mode='r')
+        self._arrays = {}
+        for nombre, info in encabezado['arrays'].items():
+            dtype = np.dtype(info['dtype'])
+            inicio = inicio_datos + info['offset']
+            cantidad = int(np.prod(info['shape'])) if info['shape'] else 0
+            bruto = self._mapa[inicio:inicio + cantidad * dtype.itemsize]
+            self._arrays[nombre] = bruto.view(dtype).reshape(info['shape'])
+
+    def __len__(self) -> int:
+        return self.filas
+
+    def _textos(self, col: str, posiciones: np.ndarray) -> np.ndarray:
+        """Decodifica los textos de ``col`` en ``posiciones`` (-1 = faltante)."""
+        offsets = self._arrays[f'{col}.offsets']
+        validos = self._arrays[f'{col}.validos']
+        resultado = np.full(len(posiciones), np.nan, dtype=object)
+        seguras = np.where(posiciones >= 0, posiciones, 0)
+        sel = np.flatnonzero((posiciones >= 0) & (validos[seguras] == 1)) if len(validos) else []
+        if len(sel):
+            datos = memoryview(np.asarray(self._arrays[f'{col}.datos']))
+            inicios = offsets[posiciones[sel]].tolist()
+            finales = offsets[posiciones[sel] + 1].tolist()
+            resultado[sel] = [str(datos[a:b], 'utf-8') for a, b in zip(inicios, finales)]
+        return resultado
+
+    def buscar(self, skus) -> tuple:
+        """
+        Resuelve un join izquierdo de ``skus`` contra el catálogo.
+
+        Args:
+            skus: Secuencia de SKUs de ML
+
+        Returns:
+            (indices_ml, posiciones_catalogo) con una entrada por fila del
+            resultado; la posición es -1 cuando el SKU no está en el catálogo.
+            Los SKUs repetidos en el catálogo multiplican filas, como ``merge``
+            (``unir`` luego deja una sola).
+        """
+        skus = pd.Series(skus).reset_index(drop=True)
+        validos = skus.notna().to_numpy()
+        texto = _claves_codigos(skus.tolist())
+        hashes = self._arrays['hash']
+        h = _hash_codigos(texto)
+        izquierda = np.searchsorted(hashes, h, side='left')
+        derecha = np.searchsorted(hashes, h, side='right')
+        cantidad = np.where(validos, derecha - izquierda, 0)
+
+        # Expandir candidatos (una entrada por coincidencia de hash)
+        idx_cand = np.repeat(np.arange(len(skus)), cantidad)
+        desplazamiento = np.arange(len(idx_cand)) - np.repeat(np.cumsum(cantidad) - cantidad, cantidad)
+        pos_cand = izquierda[idx_cand] + desplazamiento
+        # Verificar el código real para descartar colisiones de hash
+        verificados = self._textos('Código Neored', pos_cand) == texto[idx_cand]
+        idx_cand, pos_cand = idx_cand[verificados], pos_cand[verificados]
+
+        sin_match = np.setdiff1d(np.arange(len(skus)), idx_cand, assume_unique=False)
+        indices = np.concatenate([idx_cand, sin_match])
+        posiciones = np.concatenate([pos_cand, np.full(len(sin_match), -1, dtype=pos_cand.dtype)])
+        orden = np.argsort(indices, kind='stable')
+        return indices[orden], posiciones[orden]
+
+    def codigos(self) -> np.ndarray:
+        """Todos los códigos del catálogo (en el orden interno, por hash)."""
+        return _valores_codigos(self._textos('Código Neored', np.arange(self.filas)))
+
+    def codigos_duplicados(self) -> np.ndarray:
+        """
+        Códigos que aparecen más de una vez en el catálogo.
+
+        Como las claves están ordenadas por hash, los repetidos quedan contiguos
+        y alcanza con comparar cada hash con el siguiente; los candidatos se
+        verifican contra el código real.
+        """
+        hashes = self._arrays['hash']
+        contiguos = np.flatnonzero(hashes[1:] == hashes[:-1]) if len(hashes) else np.array([], dtype=np.int64)
+        if not len(contiguos):
+            return np.array([], dtype=object)
+        izquierda = self._textos('Código Neored', contiguos)
+        derecha = self._textos('Código Neored', contiguos + 1)
+        return _valores_codigos(pd.unique(izquierda[izquierda == derecha]))
+
+    def _resolver_duplicados(self, indices: np.ndarray, posiciones: np.ndarray, politica: str) -> np.ndarray:
+        """Máscara que deja una posición del catálogo por fila de ML según ``politica``."""
+        nuevo = np.ones(len(indices), dtype=bool)
+        nuevo[1:] = indices[1:] != indices[:-1]
+        if nuevo.all():
+            return nuevo
+        if politica == 'ultimo':
+            return np.append(nuevo[1:], True)
+        if politica == 'mayor_stock':
+            stock = self._arrays['Cantidad a mano'][np.where(posiciones >= 0, posiciones, 0)]
+            stock = np.where(np.isnan(stock) | (posiciones < 0), -np.inf, stock)
+            # Por fila de ML: mayor stock primero y, ante empate, la primera fila del catálogo
+            orden = np.lexsort((posiciones, -stock, indices))
+            conservar = np.zeros(len(indices), dtype=bool)
+            conservar[orden[nuevo]] = True
+            return conservar
+        return nuevo
+
+    def _columna_codigos(self, posiciones: np.ndarray, dtype_sku) -> pd.Series:
+        """
+        'Código Neored' de las ``posiciones`` (-1 = sin match) con el dtype que
+        le daría ``merge``: el del catálogo, float si un entero queda con
+        faltantes, y el texto Arrow del SKU si los códigos eran texto en objeto.
+        """
+        codigos = pd.Series(_valores_codigos(self._textos('Código Neored', posiciones)))
+        dtype = pd.api.types.pandas_dtype(self.dtype_codigo)
+        if pd.api.types.is_integer_dtype(dtype) and (posiciones < 0).any():
+            dtype = np.dtype(np.float64)
+        elif dtype == object and isinstance(dtype_sku, pd.StringDtype):
+            if pd.api.types.infer_dtype(codigos, skipna=True) in ('string', 'empty'):
+                dtype = dtype_sku
+        return codigos.astype(dtype).array
+
+    def unir(self, df_ml: pd.DataFrame, politica_duplicados: str = 'primero') -> pd.DataFrame:
+        """
+        Equivalente a ``df_ml.merge(df_odoo, left_on='SKU', right_on='Código Neored', how='left')``
+        con los códigos repetidos del catálogo resueltos como en ``resolver_duplicados_odoo``.
+
+        Args:
+            df_ml: DataFrame de MercadoLibre
+            politica_duplicados: 'primero', 'ultimo' o 'mayor_stock' ('error'
+                se valida antes, en ``unir_y_validar``, y aquí equivale a 'primero')
+
+        Returns:
+            DataFrame unido (sin flags de validación), una fila por fila de ML
+        """
+        indices, posiciones = self.buscar(df_ml['SKU'])
+        conservar = self._resolver_duplicados(indices, posiciones, politica_duplicados)
+        indices, posiciones = indices[conservar], posiciones[conservar]
+        df_merged = df_ml.take(indices)
+        df_merged.index = pd.RangeIndex(len(df_merged))
+        hay_match = posiciones >= 0
+        seguras = np.where(hay_match, posiciones, 0)
+        columnas = {
+            'Código Neored': self._columna_codigos(posiciones, df_ml['SKU'].dtype),
+            'Nombre': self._textos('Nombre', posiciones),
+        }
+        for col in COLUMNAS_NUMERICAS:
+            valores = self._arrays[col]
+            columnas[col] = np.where(hay_match, valores[seguras] if len(valores) else np.nan, np.nan)
+        return pd.concat([df_merged, pd.DataFrame(columnas, index=df_merged.index)], axis=1)
+
+
+def abrir_catalogo(ruta) -> CatalogoCompilado:
+    """Mapea un catálogo compilado en modo solo lectura."""
+    return CatalogoCompilado(ruta)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('odoo', help='Excel de Odoo (product.template)')
+    parser.add_argument('destino', help='Archivo de catálogo compilado a generar')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from data_processor import leer_odoo
+
+    df_odoo = leer_odoo(args.odoo)
+    ruta = compilar_catalogo(df_odoo, args.destino)
+    print(f"✅ Catálogo compilado: {ruta} ({len(df_odoo)} productos, {ruta.stat().st_size / 2**20:.1f} MiB)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+"""
+Catálogo de Odoo leído desde una base SQL en lugar del Excel exportado.
+
+``leer_odoo_sql`` devuelve el mismo DataFrame que ``leer_odoo`` (columnas de
+Odoo, filas sin código descartadas, 'Precio Tarifa'/'Cantidad a mano'
+numéricos y 'tax_pct'), pero solo con los productos cuyos códigos aparecen en
+``skus``: la lista se envía a la base en lotes de ``WHERE codigo IN (...)``, así
+que no se lee el catálogo completo.
+
+``mapeo`` indica qué columna de la tabla (o vista) corresponde a cada columna
+de Odoo; por defecto se usan los nombres de ``product.template``. En la réplica
+de Odoo lo habitual es apuntar ``tabla`` a una vista que ya resuelva el stock y
+el nombre del impuesto. SQLite sirve como base local de prueba; con otros
+motores alcanza con pasar la conexión DB-API y su ``marcador`` de parámetros.
+
+Si se va a usar ``unir_y_validar(..., normalizar_sku=True)`` conviene leer el
+catálogo completo (``skus=None``): el filtro por lista solo trae coincidencias
+exactas.
+"""
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_processor import parsear_campos_odoo
+from utils import COLUMNAS_REQUERIDAS, convertir_columnas_arrow
+
+TABLA_PREDETERMINADA = 'product_template'
+# Columna de Odoo -> columna de la tabla
+MAPEO_PREDETERMINADO = {
+    'Código Neored': 'default_code',
+    'Nombre': 'name',
+    'Cantidad a mano': 'qty_available',
+    'Precio Tarifa': 'list_price',
+    'Impuestos del cliente': 'taxes',
+}
+# SQLite admite 999 parámetros por consulta en versiones antiguas
+SKUS_POR_LOTE = 500
+
+
+def _identificador(nombre: str) -> str:
+    """Cita un identificador SQL (admite ``esquema.tabla``)."""
+    return '.'.join('"' + parte.replace('"', '""') + '"' for parte in str(nombre).split('.'))
+
+
+def leer_odoo_sql(
+    conexion,
+    skus=None,
+    tabla: str = TABLA_PREDETERMINADA,
+    mapeo: dict = None,
+    skus_por_lote: int = SKUS_POR_LOTE,
+    marcador: str = '?',
+    orden: str = None,
+    cadenas_arrow: bool = False
+) -> pd.DataFrame:
+    """
+    Lee el catálogo de Odoo desde una base SQL.
+
+    Args:
+        conexion: Conexión DB-API abierta o ruta a un archivo SQLite (se abre
+            en solo lectura y se cierra al terminar)
+        skus: SKUs de ML a buscar (p. ej. ``df_ml['SKU']``); None lee todo
+        tabla: Tabla o vista con el catálogo
+        mapeo: Columnas de la tabla por columna de Odoo; se combina con
+            ``MAPEO_PREDETERMINADO``
+        skus_por_lote: SKUs por consulta
+        marcador: Marcador de parámetro del driver ('?' sqlite3, '%s' psycopg2)
+        orden: Columna de la tabla para ordenar (p. ej. 'id'); define qué fila
+            es la "primera" cuando un código está repetido
+        cadenas_arrow: Si guardar 'Código Neored' y 'Nombre' como texto Arrow
+
+    Returns:
+        DataFrame con la misma forma que ``leer_odoo``
+    """
+    mapeo = {**MAPEO_PREDETERMINADO, **(mapeo or {})}
+    faltantes = [col for col in COLUMNAS_REQUERIDAS['odoo'] if not mapeo.get(col)]
+    if faltantes:
+        raise ValueError(f"Falta el mapeo de: {', '.join(faltantes)}")
+
+    propia = isinstance(conexion, (str, Path))
+    if propia:
+        conexion = sqlite3.connect(f"{Path(conexion).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        columnas = ', '.join(f"{_identificador(origen)} AS {_identificador(destino)}" for destino, origen in mapeo.items())
+        consulta = f"SELECT {columnas} FROM {_identificador(tabla)}"
+        sufijo = f" ORDER BY {_identificador(orden)}" if orden else ''
+
+        cursor = conexion.cursor()
+        filas = []
+        if skus is None:
+            cursor.execute(consulta + sufijo)
+            filas = cursor.fetchall()
+        else:
+            codigo = _identificador(mapeo['Código Neored'])
+            unicos = pd.unique(pd.Series(skus).dropna().to_numpy()).tolist()
+            for inicio in range(0, len(unicos), skus_por_lote):
+                lote = unicos[inicio:inicio + skus_por_lote]
+                marcadores = ', '.join([marcador] * len(lote))
+                cursor.execute(f"{consulta} WHERE {codigo} IN ({marcadores}){sufijo}", lote)
+                filas.extend(cursor.fetchall())
+        cursor.close()
+    finally:
+        if propia:
+            conexion.close()
+
+    df = pd.DataFrame.from_records(filas, columns=list(mapeo))
+    # Mismo filtro que ``leer_odoo``
+    df_clean = df.take(np.flatnonzero(df['Código Neored'].notna()))
+    if cadenas_arrow:
+        convertir_columnas_arrow(df_clean)
+    return parsear_campos_odoo(df_clean)
@@ -0,0 +1,319 @@
+"""
+Coincidencia de SKUs de ML con códigos de Odoo más allá de la igualdad exacta.
+
+Dos niveles:
+
+1. Clave normalizada (``normalizar_sku``): mayúsculas, sin espacios ni
+   puntuación y sin ceros a la izquierda en los tramos numéricos. Un SKU sin
+   coincidencia exacta se vincula al código de Odoo con la misma clave,
+   siempre que esa clave no sea ambigua (varios códigos distintos).
+2. Sugerencias aproximadas (``IndiceNgramas``): índice invertido de trigramas
+   de las claves de Odoo, construido una vez. Cada consulta solo recorre las
+   listas de sus trigramas menos frecuentes (filtro por prefijo), descarta
+   candidatos por tamaño y verifica la similitud de Dice exacta, sin comparar
+   todos los SKUs contra todos los códigos. Si esos n-gramas son muy comunes
+   se recorren solo los más raros hasta ``PRESUPUESTO_CANDIDATOS`` entradas
+   por consulta (siempre al menos uno) y se verifican los ``MAX_CANDIDATOS``
+   que más n-gramas comparten: el tiempo queda acotado a cambio de poder
+   omitir algún candidato en catálogos muy homogéneos. Las sugerencias
+   nunca se aplican solas: deben aceptarse explícitamente (ver
+   ``equivalencias_aceptadas``).
+"""
+import numpy as np
+import pandas as pd
+
+TAMANO_NGRAMA = 3
+UMBRAL_SIMILITUD = 0.6
+MAX_SUGERENCIAS = 3
+# Largo máximo de clave considerado para los n-gramas
+LARGO_MAXIMO_CLAVE = 64
+# Consultas procesadas por bloque (acota la memoria de la verificación)
+CONSULTAS_POR_BLOQUE = 4096
+# Entradas de listas invertidas a recorrer por consulta como máximo
+PRESUPUESTO_CANDIDATOS = 2000
+# Candidatos por consulta que pasan a la verificación de similitud
+MAX_CANDIDATOS = 64
+
+_BITS_GRAMA = 24
+_INICIO, _FIN = b'\x02', b'\x03'
+
+
+def normalizar_sku(skus) -> pd.Series:
+    """
+    Normaliza SKUs/códigos para compararlos sin diferencias de formato.
+
+    Args:
+        skus: Secuencia de SKUs (los faltantes se conservan como NaN)
+
+    Returns:
+        Serie de claves normalizadas (NaN si el valor falta o queda vacío)
+    """
+    serie = pd.Series(skus, dtype=object).reset_index(drop=True)
+    validos = serie.notna()
+    texto = serie[validos].astype(str).str.upper()
+    texto = texto.str.replace(r'[\W_]+', '', regex=True)
+    texto = texto.str.replace(r'(?<!\d)0+(?=\d)', '', regex=True)
+    claves = pd.Series(np.nan, index=serie.index, dtype=object)
+    claves[validos] = texto
+    claves[claves == ''] = np.nan
+    return claves
+
+
+def vincular_por_clave_normalizada(skus, codigos) -> tuple:
+    """
+    Resuelve la clave de unión de cada SKU: exacta primero, luego normalizada.
+
+    Args:
+        skus: SKUs de ML
+        codigos: Códigos de Odoo
+
+    Returns:
+        (claves, vinculados): array con el código de Odoo a usar en el join
+        (o el SKU original si no hay coincidencia) y máscara de las filas
+        vinculadas por clave normalizada
+    """
+    skus = pd.Series(skus).reset_index(drop=True)
+    codigos = pd.Series(pd.unique(pd.Series(codigos).dropna().to_numpy()), dtype=object)
+    claves = skus.to_numpy(dtype=object).copy()
+    vinculados = np.zeros(len(skus), dtype=bool)
+
+    pendientes = np.flatnonzero((~skus.isin(codigos) & skus.notna()).to_numpy())
+    if not len(pendientes) or not len(codigos):
+        return claves, vinculados
+
+    normalizados = normalizar_sku(codigos)
+    tabla = pd.DataFrame({'clave': normalizados, 'codigo': codigos}).dropna(subset=['clave'])
+    # Claves que corresponden a más de un código distinto: no se vinculan
+    tabla = tabla[~tabla['clave'].duplicated(keep=False)]
+    mapa = pd.Series(tabla['codigo'].to_numpy(), index=tabla['clave'].to_numpy())
+
+    encontrados = normalizar_sku(skus.iloc[pendientes]).map(mapa).to_numpy()
+    ok = pd.notna(encontrados)
+    claves[pendientes[ok]] = encontrados[ok]
+    vinculados[pendientes[ok]] = True
+    return claves, vinculados
+
+
+def _ngramas(claves, n: int) -> tuple:
+    """
+    Trigramas (u n-gramas) de cada clave como enteros, sin repetir por fila.
+
+    Returns:
+        (filas, gramas) ordenados por fila y luego por grama
+    """
+    codificadas = [
+        _INICIO + (c[:LARGO_MAXIMO_CLAVE].encode('utf-8') if isinstance(c, str) else b'') + _FIN
+        for c in claves
+    ]
+    if not codificadas:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    largos = np.fromiter(map(len, codificadas), dtype=np.int64, count=len(codificadas))
+    ancho = max(int(largos.max()), n)
+    matriz = np.array(codificadas, dtype=f'S{ancho}').view(np.uint8).reshape(len(codificadas), ancho)
+    matriz = matriz.astype(np.int64)
+
+    ventanas = ancho - n + 1
+    gramas = np.zeros((len(codificadas), ventanas), dtype=np.int64)
+    for k in range(n):
+        gramas = (gramas << 8) | matriz[:, k:k + ventanas]
+    validas = np.arange(ventanas) < (largos - n + 1)[:, None]
+    filas, _ = np.nonzero(validas)
+    unicos = np.unique((filas.astype(np.int64) << _BITS_GRAMA) | gramas[validas])
+    return unicos >> _BITS_GRAMA, unicos & ((1 << _BITS_GRAMA) - 1)
+
+
+def _expandir(inicios: np.ndarray, cantidades: np.ndarray) -> np.ndarray:
+    """Concatena los rangos [inicio, inicio + cantidad) sin bucles de Python."""
+    total = int(cantidades.sum())
+    desplazamiento = np.arange(total) - np.repeat(np.cumsum(cantidades) - cantidades, cantidades)
+    return np.repeat(inicios, cantidades) + desplazamiento
+
+
+def _primeros_por_grupo(grupos: np.ndarray, k: int) -> np.ndarray:
+    """Máscara de los primeros ``k`` elementos de cada grupo (``grupos`` ordenado)."""
+    nuevo = np.ones(len(grupos), dtype=bool)
+    nuevo[1:] = grupos[1:] != grupos[:-1]
+    inicio_grupo = np.maximum.accumulate(np.where(nuevo, np.arange(len(grupos)), 0))
+    return (np.arange(len(grupos)) - inicio_grupo) < k
+
+
+class IndiceNgramas:
+    """
+    Índice invertido de n-gramas sobre los códigos de Odoo.
+
+    Args:
+        codigos: Códigos de Odoo ('Código Neored'); los repetidos y faltantes se ignoran
+        n: Tamaño de los n-gramas (3 por defecto)
+    """
+
+    def __init__(self, codigos, n: int = TAMANO_NGRAMA):
+        if n * 8 > _BITS_GRAMA:
+            raise ValueError(f"n-gramas de hasta {_BITS_GRAMA // 8} bytes")
+        self.n = n
+        self.codigos = pd.unique(pd.Series(codigos).dropna().astype(str).to_numpy(dtype=object))
+        filas, gramas = _ngramas(normalizar_sku(self.codigos), n)
+
+        # Pares (código, grama) ordenados: verificación por búsqueda binaria
+        self._pares = (filas << _BITS_GRAMA) | gramas
+        self._tamanos = np.bincount(filas, minlength=len(self.codigos))
+
+        # Listas invertidas (CSR por grama)
+        orden = np.argsort(gramas, kind='stable')
+        self._gramas, self._inicios, self._frecuencias = np.unique(
+            gramas[orden], return_index=True, return_counts=True
+        )
+        self._listas = filas[orden]
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    def buscar(
+        self,
+        skus,
+        umbral: float = UMBRAL_SIMILITUD,
+        max_sugerencias: int = MAX_SUGERENCIAS,
+        presupuesto: int = PRESUPUESTO_CANDIDATOS,
+        max_candidatos: int = MAX_CANDIDATOS
+    ) -> pd.DataFrame:
+        """
+        Busca los códigos más parecidos a cada SKU.
+
+        Args:
+            skus: SKUs a consultar
+            umbral: Similitud de Dice mínima entre conjuntos de n-gramas (0-1)
+            max_sugerencias: Sugerencias por SKU como máximo
+            presupuesto: Entradas de listas invertidas a recorrer por SKU
+            max_candidatos: Candidatos por SKU (los que más n-gramas sondeados
+                comparten) cuya similitud se calcula
+
+        Returns:
+            DataFrame con 'consulta' (posición en ``skus``), 'codigo' y
+            'similitud', ordenado por consulta y similitud descendente
+        """
+        if not 0 < umbral <= 1:
+            raise ValueError("El umbral debe estar entre 0 y 1")
+        claves = normalizar_sku(skus).to_numpy(dtype=object)
+        bloques = [
+            self._buscar_bloque(
+                claves[inicio:inicio + CONSULTAS_POR_BLOQUE], inicio, umbral, max_sugerencias, presupuesto,
+                max_candidatos
+            )
+            for inicio in range(0, len(claves), CONSULTAS_POR_BLOQUE)
+        ]
+        if not bloques:
+            return pd.DataFrame({'consulta': [], 'codigo': [], 'similitud': []})
+        consultas, posiciones, similitudes = (np.concatenate(partes) for partes in zip(*bloques))
+        return pd.DataFrame({
+            'consulta': consultas,
+            'codigo': self.codigos[posiciones],
+            'similitud': np.round(similitudes, 3),
+        })
+
+    def _buscar_bloque(
+        self, claves, desfase: int, umbral: float, max_sugerencias: int, presupuesto: int, max_candidatos: int
+    ) -> tuple:
+        vacio = (np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=float))
+        q_filas, q_gramas = _ngramas(claves, self.n)
+        if not len(q_filas) or not len(self._gramas):
+            return vacio
+        tam_q = np.bincount(q_filas, minlength=len(claves))
+        inicio_q = np.cumsum(tam_q) - tam_q
+
+        pos = np.minimum(np.searchsorted(self._gramas, q_gramas), len(self._gramas) - 1)
+        presente = self._gramas[pos] == q_gramas
+        frecuencia = np.where(presente, self._frecuencias[pos], 0)
+
+        # Filtro por prefijo: con Dice >= t hacen falta al menos ceil(t·|q| / (2 - t))
+        # n-gramas en común, así que alcanza con sondear los |q| - mínimo + 1 más raros
+        minimo = np.ceil(umbral * tam_q / (2 - umbral) - 1e-9).astype(np.int64)
+        sondeo = tam_q - np.maximum(minimo, 1) + 1
+        orden = np.lexsort((frecuencia, q_filas))
+        filas_orden = q_filas[orden]
+        rango = np.arange(len(orden)) - inicio_q[filas_orden]
+        acumulado = np.cumsum(frecuencia[orden])
+        previo = acumulado - frecuencia[orden] - (acumulado - frecuencia[orden])[inicio_q[filas_orden]]
+        # Los n-gramas ausentes del índice quedan primeros (frecuencia 0); se sondea
+        # siempre al menos el primero presente aunque supere el presupuesto
+        ausentes = np.bincount(q_filas, weights=~presente, minlength=len(claves)).astype(np.int64)
+        primero_presente = rango == ausentes[filas_orden]
+        dentro = (rango < sondeo[filas_orden]) & (primero_presente | (previo + frecuencia[orden] <= presupuesto))
+        elegidos = orden[dentro & presente[orden]]
+
+        # Candidatos: unión de las listas sondeadas, contando en cuántas aparece cada uno
+        cantidades = self._frecuencias[pos[elegidos]]
+        idx_listas = _expandir(self._inicios[pos[elegidos]], cantidades)
+        pares, aciertos = np.unique(
+            np.repeat(q_filas[elegidos], cantidades) * len(self.codigos) + self._listas[idx_listas],
+            return_counts=True
+        )
+        p_q, p_c = pares // len(self.codigos), pares % len(self.codigos)
+
+        # Filtro por tamaño: Dice >= t exige t/(2-t) <= |c|/|q| <= (2-t)/t
+        tq, tc = tam_q[p_q], self._tamanos[p_c]
+        ok = (tc * (2 - umbral) >= umbral * tq) & (tc * umbral <= (2 - umbral) * tq)
+        p_q, p_c, tq, tc, aciertos = p_q[ok], p_c[ok], tq[ok], tc[ok], aciertos[ok]
+        if not len(p_q):
+            return vacio
+
+        # Solo se verifican los candidatos con más n-gramas sondeados en común
+        orden = np.lexsort((-aciertos, p_q))
+        orden = orden[_primeros_por_grupo(p_q[orden], max_candidatos)]
+        p_q, p_c, tq, tc = p_q[orden], p_c[orden], tq[orden], tc[orden]
+
+        # Verificación: n-gramas de la consulta presentes en el candidato
+        idx_par = np.repeat(np.arange(len(p_q)), tq)
+        llaves = (p_c[idx_par] << _BITS_GRAMA) | q_gramas[_expandir(inicio_q[p_q], tq)]
+        ubic = np.minimum(np.searchsorted(self._pares, llaves), len(self._pares) - 1)
+        comunes = np.bincount(idx_par, weights=self._pares[ubic] == llaves, minlength=len(p_q))
+        similitud = 2 * comunes / (tq + tc)
+
+        ok = similitud >= umbral - 1e-9
+        p_q, p_c, similitud = p_q[ok], p_c[ok], similitud[ok]
+        orden = np.lexsort((p_c, -similitud, p_q))
+        orden = orden[_primeros_por_grupo(p_q[orden], max_sugerencias)]
+        return p_q[orden] + desfase, p_c[orden], similitud[orden]
+
+
+def equivalencias_aceptadas(sugerencias: pd.DataFrame) -> dict:
+    """
+    Convierte la tabla de sugerencias revisada en un mapa SKU → código de Odoo.
+
+    Solo se toman las filas con 'Aceptar' verdadero (acepta True, 1, 'si',
+    'sí', 'x', ...). Si un SKU tiene más de una sugerencia aceptada se usa la
+    de mayor similitud.
+
+    Args:
+        sugerencias: DataFrame con 'SKU', 'Código sugerido' y 'Aceptar'
+
+    Returns:
+        dict {SKU de ML: Código Neored}
+    """
+    faltantes = {'SKU', 'Código sugerido', 'Aceptar'} - set(sugerencias.columns)
+    if faltantes:
+        raise ValueError(f"Faltan columnas en las equivalencias: {', '.join(sorted(faltantes))}")
+    aceptar = sugerencias['Aceptar']
+    if aceptar.dtype != bool:
+        aceptar = aceptar.astype(str).str.strip().str.lower().isin(['true', '1', 'si', 'sí', 'x', 'yes', 'verdadero'])
+    aceptadas = sugerencias[aceptar.to_numpy()]
+    if 'Similitud' in aceptadas.columns:
+        aceptadas = aceptadas.sort_values('Similitud', ascending=False, kind='stable')
+    aceptadas = aceptadas.drop_duplicates('SKU')
+    return dict(zip(aceptadas['SKU'].astype(str), aceptadas['Código sugerido'].astype(str)))
+
+
+def leer_equivalencias(archivo) -> dict:
+    """
+    Lee una tabla de sugerencias revisada (xlsx o csv) y devuelve las aceptadas.
+
+    Args:
+        archivo: Ruta o archivo subido; se lee como CSV si el nombre termina en .csv
+
+    Returns:
+        dict {SKU de ML: Código Neored}
+    """
+    nombre = str(getattr(archivo, 'name', archivo)).lower()
+    if nombre.endswith('.csv'):
+        tabla = pd.read_csv(archivo, dtype={'SKU': str, 'Código sugerido': str})
+    else:
+        tabla = pd.read_excel(archivo, dtype={'SKU': str, 'Código sugerido': str})
+    return equivalencias_aceptadas(tabla)
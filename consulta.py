@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Consultas rápidas por línea de comandos sin cargar pandas, openpyxl ni Streamlit.
+
+Subcomandos:
+    encabezados   Valida las columnas de un Excel de ML u Odoo leyendo solo la
+                  primera fila del .xlsx
+    precio        Calcula el precio de publicación de un SKU con la misma
+                  fórmula que ``calcular``
+
+Uso:
+    python consulta.py encabezados MercadoLibre-cambiodeprecios.xlsx --tipo ml
+    python consulta.py precio --tarifa 18500 --comision "14.50% + $1095.00" --financiacion 4%
+                              [--impuestos 21%] [--incluir-impuestos] [--envio 500]
+
+El tiempo de importación se mide con ``python benchmark.py --importacion``.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from utils import (
+    leer_encabezados_xlsx,
+    validar_columnas,
+    HOJA_POR_TIPO,
+    parse_fee_combo,
+    parse_pct,
+    parse_money,
+    calcular_precio_publicacion_ml,
+)
+
+
+def consultar_encabezados(ruta, tipo: str) -> int:
+    columnas = leer_encabezados_xlsx(ruta, HOJA_POR_TIPO[tipo])
+    es_valido, mensaje = validar_columnas(columnas, tipo)
+    if es_valido:
+        print(f"✅ {ruta}: {len(columnas)} columnas, estructura {tipo} válida")
+        return 0
+    print(f"❌ {ruta}: {mensaje}")
+    return 1
+
+
+def consultar_precio(args) -> int:
+    porcentaje_comision, costo_fijo = parse_fee_combo(args.comision)
+    if args.fijo is not None:
+        costo_fijo = parse_money(args.fijo)
+    tarifa = parse_money(args.tarifa)
+    impuestos = parse_pct(args.impuestos)
+    tarifa_neta = tarifa * (1 + impuestos) if args.incluir_impuestos else tarifa
+
+    precio, cargo, cuotas, retenciones, recibis, invalido = calcular_precio_publicacion_ml(
+        tarifa_neta + parse_money(args.envio),
+        porcentaje_comision,
+        parse_pct(args.financiacion),
+        parse_pct(args.retenciones),
+        costo_fijo,
+    )
+    if invalido:
+        print("❌ Porcentajes ML sin solución (denominador <= 0)")
+        return 1
+    iva = precio * impuestos / (1 + impuestos) if impuestos > 0 else 0.0
+    for etiqueta, valor in (
+        ('Precio final', precio),
+        ('Cargo por vender ($)', cargo),
+        ('Recargo financiación (importe)', cuotas),
+        ('Retenciones ML ($)', retenciones),
+        ('IVA', iva),
+        ('Recibis ($)', recibis),
+    ):
+        print(f"{etiqueta:<32} {round(valor, 2):>14,.2f}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    p_encabezados = subparsers.add_parser('encabezados', help='Validar columnas de un Excel')
+    p_encabezados.add_argument('archivo')
+    p_encabezados.add_argument('--tipo', required=True, choices=list(HOJA_POR_TIPO))
+
+    p_precio = subparsers.add_parser('precio', help='Precio de publicación de un SKU')
+    p_precio.add_argument('--tarifa', required=True, help='Precio Tarifa de Odoo')
+    p_precio.add_argument('--comision', default='', help='Comisión ML, p. ej. "14.50%% + $1095.00"')
+    p_precio.add_argument('--fijo', help='Cargo fijo ML (reemplaza el de --comision)')
+    p_precio.add_argument('--financiacion', default='0', help='Costo de cuotas, p. ej. 4%%')
+    p_precio.add_argument('--retenciones', default='0')
+    p_precio.add_argument('--impuestos', default='0', help='Impuestos del cliente, p. ej. 21%%')
+    p_precio.add_argument('--incluir-impuestos', action='store_true')
+    p_precio.add_argument('--envio', default='0', help='Recargo de envío ($)')
+
+    args = parser.parse_args(argv)
+    if args.comando == 'encabezados':
+        return consultar_encabezados(args.archivo, args.tipo)
+    return consultar_precio(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
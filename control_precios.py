@@ -0,0 +1,186 @@
+"""
+Control de cambios de precio: marca o retiene los precios nuevos atípicos.
+
+``calcular`` devuelve el precio que da la fórmula aunque sea varias veces el
+PRICE actual (una comisión mal parseada o porcentajes que dejan el
+denominador cerca de 0). ``controlar_cambios_precio`` corre después de
+``calcular`` y compara 'Precio final' con PRICE: el cambio de cada
+publicación se mide como log(Precio final / PRICE) y se compara con la
+mediana y la MAD (desvío absoluto mediano) de su grupo, que es
+``LISTING_TYPE_V3`` × tramo de comisión ('% ML aplicado' en tramos de
+``ancho_tramo_comision`` puntos). Una suba pareja de tarifas mueve la
+mediana del grupo y no marca nada; lo que marca es lo que se aparta.
+
+Cada motivo es un bit de la columna 'Control de precio' (``MOTIVOS_CONTROL``):
+
+- ``CAMBIO_ATIPICO``: |z robusto| > ``umbral_z`` en un grupo con al menos
+  ``minimo_grupo`` publicaciones comparables.
+- ``CAMBIO_EXCESIVO``: el precio nuevo es más de ``cambio_maximo`` veces el
+  actual (o menos de 1/``cambio_maximo``), sin importar el grupo.
+- ``DENOMINADOR_BAJO``: 1 − (comisión + financiación + retenciones) menor
+  que ``denominador_minimo``; el precio queda muy sensible a los porcentajes.
+- ``PRECIO_NULO``: hay precio publicado pero el nuevo es 0.
+
+Con ``accion='retener'`` las filas marcadas vuelven al PRICE actual y su
+desglose se recalcula sobre ese precio (``parche_ml`` las ve sin cambios).
+
+Las estadísticas por grupo salen de ordenar por grupo factorizado y valor y
+de ``np.bincount``: no hay bucles por grupo ni ``groupby``.
+"""
+import numpy as np
+import pandas as pd
+
+from data_processor import _agregar_nota, _columna_numerica
+from utils import desglosar_precio_publicacion_ml_vectorizado
+
+ACCIONES_CONTROL = ('marcar', 'retener')
+
+CAMBIO_ATIPICO = 1
+CAMBIO_EXCESIVO = 2
+DENOMINADOR_BAJO = 4
+PRECIO_NULO = 8
+MOTIVOS_CONTROL = {
+    CAMBIO_ATIPICO: 'Cambio de precio atípico para su tipo y comisión',
+    CAMBIO_EXCESIVO: 'Cambio de precio mayor al máximo permitido',
+    DENOMINADOR_BAJO: 'Porcentajes ML cerca del 100% (precio inestable)',
+    PRECIO_NULO: 'Precio nuevo en 0 con precio publicado',
+}
+NOTA_RETENIDO = 'Precio retenido: se mantiene el actual'
+
+# Factor que lleva la MAD a la escala de un desvío estándar normal
+ESCALA_MAD = 1.4826
+
+
+def _medianas_por_grupo(grupo: np.ndarray, valores: np.ndarray, n_grupos: int) -> np.ndarray:
+    """Mediana de ``valores`` por grupo (NaN en grupos vacíos)."""
+    # Orden por valor y después, estable, por grupo (más rápido que ``np.lexsort``)
+    orden = np.argsort(valores)
+    orden = orden[np.argsort(grupo[orden], kind='stable')]
+    ordenados = valores[orden]
+    cantidad = np.bincount(grupo, minlength=n_grupos)
+    inicio = np.concatenate(([0], np.cumsum(cantidad)[:-1]))
+    con_filas = cantidad > 0
+    bajo = inicio + np.maximum(cantidad - 1, 0) // 2
+    alto = inicio + cantidad // 2
+    medianas = np.full(n_grupos, np.nan)
+    medianas[con_filas] = (ordenados[bajo[con_filas]] + ordenados[alto[con_filas]]) / 2
+    return medianas
+
+
+def controlar_cambios_precio(
+    df_calc: pd.DataFrame,
+    accion: str = 'marcar',
+    umbral_z: float = 5.0,
+    cambio_maximo: float = 3.0,
+    denominador_minimo: float = 0.25,
+    minimo_grupo: int = 5,
+    ancho_tramo_comision: float = 1.0,
+    mad_minima: float = 0.05
+) -> pd.DataFrame:
+    """
+    Marca (o retiene) los precios nuevos que se apartan de su grupo.
+
+    Args:
+        df_calc: DataFrame de ``calcular``; se modifica in situ
+        accion: 'marcar' (solo bit y nota) o 'retener' (además vuelve al PRICE actual)
+        umbral_z: |z robusto| a partir del cual un cambio es atípico
+        cambio_maximo: Factor máximo entre precio nuevo y actual (None = sin límite)
+        denominador_minimo: Mínimo de 1 − porcentajes ML (None = sin control)
+        minimo_grupo: Publicaciones comparables que necesita un grupo para
+            usar sus estadísticas
+        ancho_tramo_comision: Ancho en puntos de los tramos de '% ML aplicado'
+        mad_minima: Piso de la MAD (en log) para grupos con cambios casi
+            idénticos, donde una MAD ~0 marcaría cualquier diferencia
+
+    Returns:
+        El mismo DataFrame con 'Control de precio' (bits de ``MOTIVOS_CONTROL``)
+        y las notas agregadas a 'Notas/Flags'
+    """
+    if accion not in ACCIONES_CONTROL:
+        raise ValueError(f"Acción de control desconocida: {accion!r} (opciones: {', '.join(ACCIONES_CONTROL)})")
+
+    n = len(df_calc)
+    precio_nuevo = _columna_numerica(df_calc, 'Precio final')
+    precio_actual = _columna_numerica(df_calc, 'PRICE')
+    motivos = np.zeros(n, dtype=np.int64)
+
+    comparable = (precio_nuevo > 0) & (precio_actual > 0)
+    log_cambio = np.zeros(n)
+    np.log(precio_nuevo / precio_actual, out=log_cambio, where=comparable)
+
+    # Grupos: tipo de publicación × tramo de comisión
+    tipos = df_calc['LISTING_TYPE_V3'] if 'LISTING_TYPE_V3' in df_calc.columns else pd.Series([None] * n)
+    codigo_tipo, tipos_unicos = pd.factorize(tipos.to_numpy(dtype=object), use_na_sentinel=False)
+    tramo = np.floor(_columna_numerica(df_calc, '% ML aplicado') / ancho_tramo_comision)
+    codigo_tramo, tramos_unicos = pd.factorize(tramo)
+    grupo = codigo_tipo.astype(np.int64) * len(tramos_unicos) + codigo_tramo
+    grupo, grupos_unicos = pd.factorize(grupo[comparable])
+    n_grupos = len(grupos_unicos)
+
+    if n_grupos:
+        valores = log_cambio[comparable]
+        mediana = _medianas_por_grupo(grupo, valores, n_grupos)
+        desvio = np.abs(valores - mediana[grupo])
+        mad = _medianas_por_grupo(grupo, desvio, n_grupos)
+        escala = ESCALA_MAD * np.maximum(mad, mad_minima)
+        suficientes = np.bincount(grupo, minlength=n_grupos) >= minimo_grupo
+        atipico = suficientes[grupo] & (desvio > umbral_z * escala[grupo])
+        motivos[np.flatnonzero(comparable)[atipico]] |= CAMBIO_ATIPICO
+
+    if cambio_maximo is not None:
+        motivos[comparable & (np.abs(log_cambio) > np.log(cambio_maximo))] |= CAMBIO_EXCESIVO
+
+    if denominador_minimo is not None:
+        # recibis = precio × denominador − fijo
+        recibis = _columna_numerica(df_calc, 'Recibis ($)')
+        fijo = _columna_numerica(df_calc, 'Recargo fijo ML ($)')
+        denominador = np.divide(recibis + fijo, precio_nuevo, out=np.ones(n), where=precio_nuevo > 0)
+        motivos[(precio_nuevo > 0) & (denominador < denominador_minimo)] |= DENOMINADOR_BAJO
+
+    motivos[(precio_nuevo <= 0) & (precio_actual > 0)] |= PRECIO_NULO
+
+    if 'Notas/Flags' in df_calc.columns:
+        notas = df_calc['Notas/Flags'].fillna('').to_numpy(dtype=object, copy=True)
+    else:
+        notas = np.full(n, '', dtype=object)
+    for bit, mensaje in MOTIVOS_CONTROL.items():
+        _agregar_nota(notas, motivos & bit, mensaje)
+
+    if accion == 'retener':
+        retenidas = (motivos != 0) & (precio_actual > 0)
+        if retenidas.any():
+            _retener_precio_actual(df_calc, retenidas, precio_actual, precio_nuevo)
+            _agregar_nota(notas, retenidas, NOTA_RETENIDO)
+
+    df_calc['Control de precio'] = motivos
+    df_calc['Notas/Flags'] = notas
+    return df_calc
+
+
+def _retener_precio_actual(df_calc: pd.DataFrame, filas: np.ndarray, precio_actual: np.ndarray,
+                           precio_nuevo: np.ndarray) -> None:
+    """Vuelve las ``filas`` al PRICE actual y recalcula su desglose sobre ese precio."""
+    precio = precio_actual[filas]
+    fee_pct = _columna_numerica(df_calc, '% ML aplicado')[filas] / 100
+    financing_pct = _columna_numerica(df_calc, '% financiación aplicado')[filas] / 100
+    fijo = _columna_numerica(df_calc, 'Recargo fijo ML ($)')[filas]
+    # ``calcular`` no arrastra retenciones_pct: sale de las retenciones sobre el precio calculado
+    retenciones_pct = np.divide(
+        _columna_numerica(df_calc, 'Retenciones ML ($)')[filas], precio_nuevo[filas],
+        out=np.zeros(len(precio)), where=precio_nuevo[filas] > 0,
+    )
+    cargo, cuotas, retenciones, recibis = desglosar_precio_publicacion_ml_vectorizado(
+        precio, fee_pct, financing_pct, retenciones_pct, fijo
+    )
+    tax_pct = _columna_numerica(df_calc, 'tax_pct')[filas]
+    for col, valores in (
+        ('Precio final', precio),
+        ('Cargo por vender ($)', cargo),
+        ('Recargo % ML (importe)', precio * fee_pct),
+        ('Recargo financiación (importe)', cuotas),
+        ('Retenciones ML ($)', retenciones),
+        ('Recibis ($)', recibis),
+        ('IVA', np.where(tax_pct > 0, precio * tax_pct / (1 + tax_pct), 0.0)),
+    ):
+        if col in df_calc.columns:
+            df_calc.loc[filas, col] = np.round(valores, 2)
@@ -1,3 +1,6 @@
+import itertools
+
+import numpy as np
 import pandas as pd
 from utils import (
     parse_fee_combo,
@@ -6,20 +9,296 @@ from utils import (
     clean_ml_data,
     validate_excel_structure,
     extract_tax_percentage,
-    calcular_precio_publicacion_ml,
+    calcular_precio_publicacion_ml_vectorizado,
+    desglosar_precio_publicacion_ml_vectorizado,
+    convertir_columnas_arrow,
+)
+from coincidencia_sku import (
+    IndiceNgramas,
+    vincular_por_clave_normalizada,
+    UMBRAL_SIMILITUD,
+    MAX_SUGERENCIAS,
 )
 
-def leer_ml(file_path_or_buffer) -> pd.DataFrame:
+# Columnas de ``unir_y_validar``/``leer_ml`` que ``calcular`` deja pasar sin cambios
+COLUMNAS_PASO_CALCULO = [
+    'ITEM_ID',
+    'VARIATION_ID',
+    'SKU',
+    'TITLE',
+    'QUANTITY',
+    'PRICE',
+    'CURRENCY_ID',
+    'LISTING_TYPE_V3',
+    'SHIPPING_METHOD ',
+    'Código Neored',
+    'Nombre',
+    'Cantidad a mano',
+    'Stock asignado',
+    'tax_pct',
+]
+
+# Columnas de ML que necesitan ``clean_ml_data`` y ``parsear_campos_ml``
+COLUMNAS_PARSEO_ML = [
+    'ITEM_ID',
+    'SKU',
+    'QUANTITY',
+    'PRICE',
+    'FEE_PER_SALE_MARKETPLACE_V2',
+    'COST_OF_FINANCING_MARKETPLACE',
+]
+
+# Columnas numéricas que produce ``calcular`` (redondeadas a 2 decimales)
+COLUMNAS_NUMERICAS_CALCULO = [
+    'Precio de Tarifa',
+    'Tarifa + impuestos',
+    'Recargo % ML (importe)',
+    'Recargo fijo ML ($)',
+    'Cargo por vender ($)',
+    'Recargo financiación (importe)',
+    'Recargo envío ($)',
+    'Retenciones ML ($)',
+    'Recibis ($)',
+    'IVA',
+    'Precio final',
+    '% ML aplicado',
+    '% financiación aplicado',
+]
+
+# Columnas de Odoo que se incorporan en el join
+COLUMNAS_ODOO_UNION = [
+    'Código Neored',
+    'Nombre',
+    'Cantidad a mano',
+    'Precio Tarifa',
+    'Impuestos del cliente',
+    'tax_pct',
+]
+
+# Políticas para resolver códigos repetidos en Odoo (ver ``resolver_duplicados_odoo``)
+POLITICAS_DUPLICADOS = ('primero', 'ultimo', 'mayor_stock', 'error')
+
+def _agregar_nota(notas: np.ndarray, mask, mensaje: str) -> None:
+    """
+    Agrega ``mensaje`` a las notas de las filas indicadas, separado por '; '.
+
+    Args:
+        notas: Array de objetos (str) que se modifica in situ
+        mask: Máscara booleana de filas afectadas
+        mensaje: Texto a agregar
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return
+    vacias = notas == ''
+    notas[mask & vacias] = mensaje
+    con_texto = mask & ~vacias
+    notas[con_texto] = notas[con_texto] + f'; {mensaje}'
+
+def _alinear_claves_texto(df_izq: pd.DataFrame, col_izq: str, df_der: pd.DataFrame, col_der: str):
+    """
+    Igualar el dtype de las claves de un join cuando una sola es texto Arrow.
+
+    Si un lado quedó como texto Arrow y el otro como objeto con solo cadenas,
+    se convierte el segundo para que el join trabaje sobre Arrow en ambos lados.
+    Si no es posible (claves numéricas o mixtas) se vuelve a objeto.
+    """
+    tipo_izq, tipo_der = df_izq[col_izq].dtype, df_der[col_der].dtype
+    es_arrow_izq = isinstance(tipo_izq, pd.StringDtype)
+    es_arrow_der = isinstance(tipo_der, pd.StringDtype)
+    if es_arrow_izq == es_arrow_der:
+        return df_izq, df_der
+
+    destino, col, dtype = (df_der, col_der, tipo_izq) if es_arrow_izq else (df_izq, col_izq, tipo_der)
+    if pd.api.types.infer_dtype(destino[col], skipna=True) in ('string', 'empty'):
+        convertido = destino[col].astype(dtype)
+    else:
+        df_izq = df_izq.assign(**{col_izq: df_izq[col_izq].astype(object)})
+        df_der = df_der.assign(**{col_der: df_der[col_der].astype(object)})
+        return df_izq, df_der
+
+    if es_arrow_izq:
+        return df_izq, df_der.assign(**{col_der: convertido})
+    return df_izq.assign(**{col_izq: convertido}), df_der
+
+def _parsear_unicos(serie: pd.Series, funcion) -> list:
+    """Aplica ``funcion`` una vez por valor distinto de ``serie`` y lo reparte a las filas."""
+    codigos, unicos = pd.factorize(serie)
+    # Los nulos quedan con código -1: se resuelven con el último elemento
+    valores = [funcion(v) for v in unicos] + [funcion(None)]
+    return [valores[c] for c in codigos]
+
+def parsear_campos_ml(df_clean: pd.DataFrame, deduplicar: bool = False) -> pd.DataFrame:
+    """
+    Parsea in situ las comisiones, la financiación, el precio y el stock de ML.
+
+    Args:
+        df_clean: DataFrame de MercadoLibre ya limpio
+        deduplicar: Si parsear cada texto de comisión/financiación una sola
+            vez (se repiten en casi todas las filas); el resultado es el mismo
+
+    Returns:
+        El mismo DataFrame con fee_pct, fee_fixed y financing_pct agregados
+    """
+    # Parsear campos específicos
+    if deduplicar:
+        comisiones = _parsear_unicos(df_clean['FEE_PER_SALE_MARKETPLACE_V2'], parse_fee_combo)
+        df_clean['fee_pct'], df_clean['fee_fixed'] = zip(*comisiones) if comisiones else ((), ())
+        df_clean['financing_pct'] = np.array(
+            _parsear_unicos(df_clean['COST_OF_FINANCING_MARKETPLACE'], parse_pct), dtype=float
+        )
+    else:
+        df_clean['fee_pct'], df_clean['fee_fixed'] = zip(*df_clean['FEE_PER_SALE_MARKETPLACE_V2'].apply(parse_fee_combo))
+        df_clean['financing_pct'] = df_clean['COST_OF_FINANCING_MARKETPLACE'].apply(parse_pct)
+
+    # Convertir tipos de datos
+    df_clean['PRICE'] = df_clean['PRICE'].apply(parse_money)
+    df_clean['QUANTITY'] = pd.to_numeric(df_clean['QUANTITY'], errors='coerce').fillna(0)
+
+    return df_clean
+
+def parsear_campos_odoo(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte in situ tarifa y stock a número y parsea el impuesto de Odoo.
+
+    Args:
+        df_clean: DataFrame de Odoo ya filtrado
+
+    Returns:
+        El mismo DataFrame con tax_pct agregado
+    """
+    # Convertir tipos de datos
+    df_clean['Precio Tarifa'] = pd.to_numeric(df_clean['Precio Tarifa'], errors='coerce').fillna(0)
+    df_clean['Cantidad a mano'] = pd.to_numeric(df_clean['Cantidad a mano'], errors='coerce').fillna(0)
+
+    # Parsear porcentaje de impuestos
+    df_clean['tax_pct'] = df_clean['Impuestos del cliente'].apply(extract_tax_percentage)
+
+    return df_clean
+
+def leer_ml_por_bloques(
+    file_path_or_buffer,
+    filas_por_bloque: int = None,
+    cadenas_arrow: bool = False,
+    columnas: list = None,
+    desde_bloque: int = 0,
+    numerados: bool = False
+):
+    """
+    Lee el Excel de MercadoLibre por bloques, sin cargar la hoja completa.
+
+    Recorre la hoja con openpyxl en modo solo lectura y arma cada bloque por
+    columnas; cada bloque sale limpio y parseado como ``leer_ml`` (con el
+    parseo deduplicado de comisiones y financiación). La memoria depende del
+    tamaño de bloque y no del archivo.
+
+    Las filas que ``clean_ml_data`` descartaría seguro (ITEM_ID que no es un
+    texto 'ML...' o SKU vacío) se saltean antes de convertir sus celdas, y
+    ``clean_ml_data`` se aplica igual sobre cada bloque.
+
+    Args:
+        file_path_or_buffer: Ruta al archivo o buffer de bytes
+        filas_por_bloque: Filas de la hoja por bloque (por defecto ``FILAS_POR_BLOQUE``)
+        cadenas_arrow: Si guardar SKU, TITLE, ITEM_ID y VARIATION_ID como
+            texto Arrow (requiere pyarrow)
+        columnas: Columnas de ML a conservar además de ``COLUMNAS_PARSEO_ML``
+            (None = todas); las demás no se convierten ni se guardan
+        desde_bloque: Bloques de la hoja a saltear al principio (sus filas se
+            recorren sin convertirlas)
+        numerados: Si devolver (número de bloque de la hoja, DataFrame)
+
+    Yields:
+        DataFrames limpios (los bloques sin filas válidas se omiten)
+    """
+    from openpyxl import load_workbook
+    from pandas.io.parsers import TextParser
+
+    filas_por_bloque = filas_por_bloque or FILAS_POR_BLOQUE
+    wb = load_workbook(file_path_or_buffer, read_only=True, data_only=True)
+    try:
+        ws = wb['Hoja1'] if 'Hoja1' in wb.sheetnames else wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+        encabezado = [_valor_celda(v) for v in next(filas, ())]
+        # TextParser es lo que usa ``pd.read_excel``: mismos nombres, nulos y tipos
+        df_encabezado = TextParser([encabezado], header=0).read()
+        is_valid, error_msg = validate_excel_structure(df_encabezado, 'ml')
+        if not is_valid:
+            raise ValueError(f"Error en estructura ML: {error_msg}")
+        nombres = list(df_encabezado.columns)
+        indices = [
+            i for i, nombre in enumerate(nombres)
+            if columnas is None or nombre in columnas or nombre in COLUMNAS_PARSEO_ML
+        ]
+        nombres = [nombres[i] for i in indices]
+        i_item, i_sku = df_encabezado.columns.get_loc('ITEM_ID'), df_encabezado.columns.get_loc('SKU')
+        minimo = max(i_item, i_sku) + 1
+        for _ in itertools.islice(filas, desde_bloque * filas_por_bloque):
+            pass
+        numero = desde_bloque - 1
+        while True:
+            numero += 1
+            leidas = 0
+            bloque = []
+            for fila in itertools.islice(filas, filas_por_bloque):
+                leidas += 1
+                if len(fila) < minimo:
+                    continue
+                item, sku = fila[i_item], fila[i_sku]
+                if not (isinstance(item, str) and item.startswith('ML')) or sku is None or str(sku).strip() == '':
+                    continue
+                bloque.append([_valor_celda(fila[i]) if i < len(fila) else '' for i in indices])
+            if not leidas:
+                break
+            if not bloque:
+                continue
+            df = TextParser(bloque, header=None, names=nombres).read()
+            del bloque
+            df_clean = clean_ml_data(df)
+            if not df_clean.empty:
+                if cadenas_arrow:
+                    convertir_columnas_arrow(df_clean)
+                df_clean = parsear_campos_ml(df_clean, deduplicar=True)
+                yield (numero, df_clean) if numerados else df_clean
+    finally:
+        wb.close()
+
+def _valor_celda(valor):
+    """Convierte un valor de openpyxl como el lector de Excel de pandas."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def leer_ml(
+    file_path_or_buffer,
+    cadenas_arrow: bool = False,
+    deduplicar: bool = False,
+    columnas: list = None
+) -> pd.DataFrame:
     """
     Lee el archivo Excel de MercadoLibre y lo limpia.
 
     Args:
         file_path_or_buffer: Ruta al archivo o buffer de bytes
+        cadenas_arrow: Si guardar SKU, TITLE, ITEM_ID y VARIATION_ID como
+            texto Arrow (requiere pyarrow)
+        deduplicar: Si leer por bloques con ``leer_ml_por_bloques`` y parsear
+            cada comisión una sola vez; evita tener la hoja entera como filas
+            de Python además del DataFrame (menos memoria en archivos grandes)
+        columnas: Columnas de ML a conservar además de ``COLUMNAS_PARSEO_ML``
+            (None = todas); con ``deduplicar`` las demás ni se leen
 
     Returns:
         DataFrame limpio con datos válidos de ML
     """
     try:
+        if deduplicar:
+            bloques = list(leer_ml_por_bloques(file_path_or_buffer, cadenas_arrow=cadenas_arrow, columnas=columnas))
+            if not bloques:
+                raise ValueError("No hay publicaciones válidas (ITEM_ID 'ML...' con SKU)")
+            return pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else bloques[0]
+
         # Intentar leer la hoja "Hoja1"
         try:
             df = pd.read_excel(file_path_or_buffer, sheet_name='Hoja1')
@@ -34,26 +313,26 @@ def leer_ml(file_path_or_buffer) -> pd.DataFrame:
 
         # Limpiar datos
         df_clean = clean_ml_data(df)
+        if columnas is not None:
+            df_clean = df_clean.drop(
+                columns=[col for col in df_clean.columns if col not in columnas and col not in COLUMNAS_PARSEO_ML]
+            )
+        if cadenas_arrow:
+            convertir_columnas_arrow(df_clean)
 
-        # Parsear campos específicos
-        df_clean['fee_pct'], df_clean['fee_fixed'] = zip(*df_clean['FEE_PER_SALE_MARKETPLACE_V2'].apply(parse_fee_combo))
-        df_clean['financing_pct'] = df_clean['COST_OF_FINANCING_MARKETPLACE'].apply(parse_pct)
-
-        # Convertir tipos de datos
-        df_clean['PRICE'] = df_clean['PRICE'].apply(parse_money)
-        df_clean['QUANTITY'] = pd.to_numeric(df_clean['QUANTITY'], errors='coerce').fillna(0)
-
-        return df_clean
+        return parsear_campos_ml(df_clean)
 
     except Exception as e:
         raise Exception(f"Error al leer archivo MercadoLibre: {str(e)}")
 
-def leer_odoo(file_path_or_buffer) -> pd.DataFrame:
+def leer_odoo(file_path_or_buffer, cadenas_arrow: bool = False) -> pd.DataFrame:
     """
     Lee el archivo Excel de Odoo.
 
     Args:
         file_path_or_buffer: Ruta al archivo o buffer de bytes
+        cadenas_arrow: Si guardar 'Código Neored' y 'Nombre' como texto Arrow
+            (requiere pyarrow)
 
     Returns:
         DataFrame con datos de Odoo
@@ -73,137 +352,344 @@ def leer_odoo(file_path_or_buffer) -> pd.DataFrame:
 
         # Limpiar datos
         # Filtrar filas donde al menos el código no esté vacío
-        df_clean = df[df['Código Neored'].notna()].copy()
+        df_clean = df.take(np.flatnonzero(df['Código Neored'].notna()))
+        if cadenas_arrow:
+            convertir_columnas_arrow(df_clean)
 
-        # Convertir tipos de datos
-        df_clean['Precio Tarifa'] = pd.to_numeric(df_clean['Precio Tarifa'], errors='coerce').fillna(0)
-        df_clean['Cantidad a mano'] = pd.to_numeric(df_clean['Cantidad a mano'], errors='coerce').fillna(0)
-
-        # Parsear porcentaje de impuestos
-        df_clean['tax_pct'] = df_clean['Impuestos del cliente'].apply(extract_tax_percentage)
-
-        return df_clean
+        return parsear_campos_odoo(df_clean)
 
     except Exception as e:
         raise Exception(f"Error al leer archivo Odoo: {str(e)}")
 
-def unir_y_validar(df_ml: pd.DataFrame, df_odoo: pd.DataFrame) -> pd.DataFrame:
+def leer_odoo_por_bloques(
+    file_path_or_buffer,
+    filas_por_bloque: int = None,
+    cadenas_arrow: bool = False
+):
+    """
+    Lee el Excel de Odoo por bloques, como ``leer_ml_por_bloques``.
+
+    Args:
+        file_path_or_buffer: Ruta al archivo o buffer de bytes
+        filas_por_bloque: Filas de la hoja por bloque (por defecto ``FILAS_POR_BLOQUE``)
+        cadenas_arrow: Si guardar 'Código Neored' y 'Nombre' como texto Arrow
+
+    Yields:
+        DataFrames con la forma de ``leer_odoo`` (los bloques sin códigos se omiten)
+    """
+    from openpyxl import load_workbook
+    from pandas.io.parsers import TextParser
+
+    filas_por_bloque = filas_por_bloque or FILAS_POR_BLOQUE
+    wb = load_workbook(file_path_or_buffer, read_only=True, data_only=True)
+    try:
+        ws = wb['Sheet1'] if 'Sheet1' in wb.sheetnames else wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+        encabezado = [_valor_celda(v) for v in next(filas, ())]
+        df_encabezado = TextParser([encabezado], header=0).read()
+        is_valid, error_msg = validate_excel_structure(df_encabezado, 'odoo')
+        if not is_valid:
+            raise ValueError(f"Error en estructura Odoo: {error_msg}")
+        nombres = list(df_encabezado.columns)
+        ancho = len(encabezado)
+        i_codigo = df_encabezado.columns.get_loc('Código Neored')
+        while True:
+            leidas = 0
+            bloque = []
+            for fila in itertools.islice(filas, filas_por_bloque):
+                leidas += 1
+                if i_codigo >= len(fila) or fila[i_codigo] is None:
+                    continue
+                bloque.append([_valor_celda(v) for v in fila[:ancho]] + [''] * (ancho - len(fila)))
+            if not leidas:
+                break
+            if not bloque:
+                continue
+            df = TextParser(bloque, header=None, names=nombres).read()
+            del bloque
+            df_clean = df.take(np.flatnonzero(df['Código Neored'].notna()))
+            if not df_clean.empty:
+                if cadenas_arrow:
+                    convertir_columnas_arrow(df_clean)
+                yield parsear_campos_odoo(df_clean)
+    finally:
+        wb.close()
+
+def _error_duplicados(codigos) -> ValueError:
+    codigos = [str(c) for c in codigos]
+    muestra = ', '.join(codigos[:10]) + (f' (y {len(codigos) - 10} más)' if len(codigos) > 10 else '')
+    return ValueError(f"Códigos duplicados en Odoo usados por publicaciones de ML: {muestra}")
+
+def resolver_duplicados_odoo(df_odoo: pd.DataFrame, politica: str = 'primero'):
+    """
+    Deja una sola fila de Odoo por 'Código Neored'.
+
+    La detección usa ``duplicated`` (hash, tiempo lineal). Las filas sin código
+    se descartan porque nunca pueden coincidir con un SKU.
+
+    Args:
+        df_odoo: DataFrame de Odoo
+        politica: 'primero', 'ultimo' o 'mayor_stock' (la fila con más
+            'Cantidad a mano'; ante empate, la primera)
+
+    Returns:
+        (DataFrame sin códigos repetidos, array con los códigos que estaban repetidos)
+    """
+    if politica not in POLITICAS_DUPLICADOS or politica == 'error':
+        raise ValueError(f"Política de duplicados no soportada: {politica}")
+    codigos = df_odoo['Código Neored']
+    con_codigo = codigos.notna().to_numpy()
+    repetidos = codigos.duplicated(keep=False).to_numpy() & con_codigo
+    if not repetidos.any():
+        if con_codigo.all():
+            return df_odoo, np.array([], dtype=object)
+        return df_odoo.take(np.flatnonzero(con_codigo)), np.array([], dtype=object)
+
+    if politica == 'mayor_stock':
+        posiciones = np.flatnonzero(repetidos)
+        if 'Cantidad a mano' in df_odoo.columns:
+            stock = pd.to_numeric(df_odoo['Cantidad a mano'], errors='coerce').to_numpy(dtype=float)
+        else:
+            stock = np.zeros(len(df_odoo))
+        stock = np.nan_to_num(stock[posiciones], nan=-np.inf)
+        # Máximo por código y, entre las filas que lo alcanzan, la primera
+        grupos = pd.factorize(codigos.to_numpy()[posiciones])[0]
+        maximos = pd.Series(stock).groupby(grupos).max().to_numpy()
+        candidatas = np.flatnonzero(stock == maximos[grupos])
+        ganadoras = candidatas[~pd.Series(grupos[candidatas]).duplicated().to_numpy()]
+        conservar = con_codigo & ~repetidos
+        conservar[posiciones[ganadoras]] = True
+    else:
+        conservar = con_codigo & ~codigos.duplicated(keep='first' if politica == 'primero' else 'last').to_numpy()
+
+    return df_odoo.take(np.flatnonzero(conservar)), pd.unique(codigos.to_numpy()[repetidos])
+
+def _codigos_odoo(df_odoo) -> pd.Series:
+    """Códigos de Odoo de un DataFrame o de un catálogo compilado."""
+    if isinstance(df_odoo, pd.DataFrame):
+        return df_odoo['Código Neored']
+    return pd.Series(df_odoo.codigos(), dtype=object)
+
+def _claves_union(skus: pd.Series, df_odoo, normalizar_sku: bool, equivalencias: dict) -> tuple:
+    """
+    Clave de unión de cada publicación: equivalencia aceptada, SKU exacto o clave normalizada.
+
+    Returns:
+        (claves, por_equivalencia, por_normalizacion)
+    """
+    claves = skus.to_numpy(dtype=object).copy()
+    por_equivalencia = np.zeros(len(skus), dtype=bool)
+    por_normalizacion = np.zeros(len(skus), dtype=bool)
+    if equivalencias:
+        mapeados = skus.astype(str).map({str(k): v for k, v in equivalencias.items()}).to_numpy()
+        por_equivalencia = pd.notna(mapeados) & skus.notna().to_numpy()
+        claves[por_equivalencia] = mapeados[por_equivalencia]
+    if normalizar_sku:
+        claves, por_normalizacion = vincular_por_clave_normalizada(claves, _codigos_odoo(df_odoo))
+        por_normalizacion &= ~por_equivalencia
+    return claves, por_equivalencia, por_normalizacion
+
+def unir_y_validar(
+    df_ml: pd.DataFrame,
+    df_odoo,
+    politica_duplicados: str = 'primero',
+    normalizar_sku: bool = False,
+    equivalencias: dict = None
+) -> pd.DataFrame:
     """
     Une los DataFrames de ML y Odoo por SKU y valida el resultado.
 
+    El resultado tiene siempre una fila por publicación de ML: si un código
+    aparece más de una vez en Odoo se elige una fila según
+    ``politica_duplicados`` y las publicaciones afectadas quedan marcadas.
+
     Args:
         df_ml: DataFrame de MercadoLibre
-        df_odoo: DataFrame de Odoo
+        df_odoo: DataFrame de Odoo, o un catálogo compilado abierto con
+            ``catalogo_compilado.abrir_catalogo`` (el join se hace sobre los
+            arrays mapeados sin construir el DataFrame completo)
+        politica_duplicados: 'primero', 'ultimo', 'mayor_stock' o 'error'
+            (ValueError si alguna publicación usa un código repetido)
+        normalizar_sku: Si True, los SKUs sin coincidencia exacta se vinculan
+            por clave normalizada (mayúsculas, sin espacios, puntuación ni
+            ceros a la izquierda)
+        equivalencias: dict {SKU de ML: Código Neored} con sugerencias
+            aceptadas (ver ``sugerir_coincidencias``); tienen prioridad
 
     Returns:
-        DataFrame unido con flags de validación
-    """
-    # Hacer join por SKU
-    df_merged = df_ml.merge(
-        df_odoo,
-        left_on='SKU',
-        right_on='Código Neored',
-        how='left',
-        suffixes=('_ml', '_odoo')
-    )
+        DataFrame unido con flags de validación (la columna 'SKU' conserva el
+        valor original de ML)
+    """
+    if politica_duplicados not in POLITICAS_DUPLICADOS:
+        raise ValueError(f"Política de duplicados no soportada: {politica_duplicados}")
+
+    skus_originales = None
+    if normalizar_sku or equivalencias:
+        skus_originales = df_ml['SKU']
+        claves, por_equivalencia, por_normalizacion = _claves_union(
+            skus_originales, df_odoo, normalizar_sku, equivalencias
+        )
+        df_ml = df_ml.assign(SKU=claves)
+
+    if not isinstance(df_odoo, pd.DataFrame):
+        duplicados = df_odoo.codigos_duplicados()
+    else:
+        # Hacer join por SKU (de Odoo solo se incorporan las columnas necesarias)
+        columnas_odoo = [col for col in COLUMNAS_ODOO_UNION if col in df_odoo.columns]
+        if len(columnas_odoo) < len(df_odoo.columns):
+            df_odoo = df_odoo[columnas_odoo]
+        df_ml, df_odoo = _alinear_claves_texto(df_ml, 'SKU', df_odoo, 'Código Neored')
+        politica_resolucion = 'primero' if politica_duplicados == 'error' else politica_duplicados
+        df_odoo, duplicados = resolver_duplicados_odoo(df_odoo, politica_resolucion)
+
+    if politica_duplicados == 'error' and len(duplicados):
+        usados = pd.unique(df_ml['SKU'][df_ml['SKU'].isin(duplicados)].to_numpy())
+        if len(usados):
+            raise _error_duplicados(usados)
+
+    if not isinstance(df_odoo, pd.DataFrame):
+        df_merged = df_odoo.unir(df_ml, politica_duplicados)
+    else:
+        df_merged = df_ml.merge(
+            df_odoo,
+            left_on='SKU',
+            right_on='Código Neored',
+            how='left',
+            suffixes=('_ml', '_odoo')
+        )
 
     # Crear columna de flags/notas
-    df_merged['Notas/Flags'] = ''
+    notas = np.full(len(df_merged), '', dtype=object)
 
     # Validar matcheo
-    no_match_mask = df_merged['Código Neored'].isna()
-    df_merged.loc[no_match_mask, 'Notas/Flags'] = 'SKU no encontrado en Odoo'
+    _agregar_nota(notas, df_merged['Código Neored'].isna(), 'SKU no encontrado en Odoo')
+    if skus_originales is not None:
+        # Hay una fila por publicación y en el mismo orden: se restituye el SKU de ML
+        df_merged['SKU'] = skus_originales.array
+        encontrado = df_merged['Código Neored'].notna().to_numpy()
+        _agregar_nota(notas, por_equivalencia & encontrado, 'SKU vinculado por equivalencia aceptada')
+        _agregar_nota(notas, por_normalizacion & encontrado, 'SKU vinculado por clave normalizada')
+
+    # Códigos repetidos: en Odoo se resolvieron con la política; en ML se informan
+    if len(duplicados):
+        _agregar_nota(
+            notas,
+            df_merged['Código Neored'].isin(duplicados),
+            f'Código duplicado en Odoo (se usó: {politica_duplicados})'
+        )
+    sku_ml = df_merged['SKU']
+    _agregar_nota(notas, sku_ml.duplicated(keep=False) & sku_ml.notna(), 'SKU repetido en otras publicaciones de ML')
 
     # Validar datos críticos
     missing_price_mask = (df_merged['Precio Tarifa'].isna()) | (df_merged['Precio Tarifa'] == 0)
-    df_merged.loc[missing_price_mask, 'Notas/Flags'] += '; Precio Tarifa faltante'
+    _agregar_nota(notas, missing_price_mask, 'Precio Tarifa faltante')
 
     # Validar stock
-    missing_stock_mask = df_merged['Cantidad a mano'].isna()
-    df_merged.loc[missing_stock_mask, 'Notas/Flags'] += '; Stock faltante'
+    _agregar_nota(notas, df_merged['Cantidad a mano'].isna(), 'Stock faltante')
 
-    # Limpiar flags vacías
-    df_merged['Notas/Flags'] = df_merged['Notas/Flags'].str.strip('; ')
+    df_merged['Notas/Flags'] = notas
 
     return df_merged
 
-def calcular(
-    df: pd.DataFrame,
-    base_financiacion: str = 'tarifa',
-    incluir_impuestos: bool = False,
-    tipo_recargo_envio: str = 'Ninguno',
-    valor_recargo_envio: float = 0.0
+def sugerir_coincidencias(
+    df_merged: pd.DataFrame,
+    df_odoo,
+    umbral: float = UMBRAL_SIMILITUD,
+    max_sugerencias: int = MAX_SUGERENCIAS,
+    indice: IndiceNgramas = None
 ) -> pd.DataFrame:
     """
-    Calcula los precios finales con el desglose de recargos.
+    Sugiere códigos de Odoo para los SKUs que quedaron sin coincidencia.
+
+    Las sugerencias no se aplican: la columna 'Aceptar' se marca a mano y la
+    tabla revisada se pasa por ``coincidencia_sku.equivalencias_aceptadas``
+    para obtener las ``equivalencias`` de ``unir_y_validar``.
 
     Args:
-        df: DataFrame unido y validado
-        base_financiacion: 'tarifa' o 'tarifa_mas_ml'
-        incluir_impuestos: Si incluir impuestos del cliente en la tarifa
-        tipo_recargo_envio: 'Ninguno', 'Fijo ($)' o 'Porcentaje (%)'
-        valor_recargo_envio: Monto fijo o porcentaje según corresponda
+        df_merged: Resultado de ``unir_y_validar``
+        df_odoo: DataFrame de Odoo o catálogo compilado usado en la unión
+        umbral: Similitud mínima (0-1) entre trigramas de las claves normalizadas
+        max_sugerencias: Sugerencias por SKU como máximo
+        indice: ``IndiceNgramas`` ya construido sobre los códigos de Odoo (opcional)
 
     Returns:
-        DataFrame con cálculos completados
+        DataFrame con 'SKU', 'Publicaciones', 'Código sugerido',
+        'Nombre sugerido', 'Similitud' y 'Aceptar' (False)
+    """
+    columnas = ['SKU', 'Publicaciones', 'Código sugerido', 'Nombre sugerido', 'Similitud', 'Aceptar']
+    sin_match = df_merged.loc[df_merged['Código Neored'].isna().to_numpy(), 'SKU'].dropna()
+    if sin_match.empty:
+        return pd.DataFrame(columns=columnas)
+    publicaciones = sin_match.astype(str).value_counts(sort=False)
+
+    if indice is None:
+        indice = IndiceNgramas(_codigos_odoo(df_odoo))
+    encontradas = indice.buscar(publicaciones.index, umbral=umbral, max_sugerencias=max_sugerencias)
+    skus = publicaciones.index.to_numpy(dtype=object)[encontradas['consulta'].to_numpy()]
+
+    if isinstance(df_odoo, pd.DataFrame):
+        unicos = df_odoo.drop_duplicates('Código Neored')
+        nombres = pd.Series(unicos['Nombre'].to_numpy(), index=unicos['Código Neored'].astype(str))
+        nombre_sugerido = encontradas['codigo'].map(nombres).to_numpy()
+    else:
+        nombre_sugerido = df_odoo.unir(pd.DataFrame({'SKU': encontradas['codigo']}))['Nombre'].to_numpy()
+
+    return pd.DataFrame({
+        'SKU': skus,
+        'Publicaciones': publicaciones.to_numpy()[encontradas['consulta'].to_numpy()],
+        'Código sugerido': encontradas['codigo'].to_numpy(),
+        'Nombre sugerido': nombre_sugerido,
+        'Similitud': encontradas['similitud'].to_numpy(),
+        'Aceptar': False,
+    }, columns=columnas)
+
+def _calcular_recargo_envio(
+    df: pd.DataFrame,
+    tarifa_neta_base: pd.Series,
+    tipo_recargo_envio: str,
+    valor_recargo_envio: float
+) -> pd.Series:
     """
-    df_calc = df.copy()
+    Calcula el recargo de envío por fila.
 
-    if 'Notas/Flags' not in df_calc.columns:
-        df_calc['Notas/Flags'] = ''
-    df_calc['Notas/Flags'] = df_calc['Notas/Flags'].fillna('')
+    Solo se aplica a las publicaciones con "Mercado Envíos por mi cuenta".
 
-    df_calc['Precio de Tarifa'] = pd.to_numeric(
-        df_calc['Precio Tarifa'], errors='coerce'
-    ).fillna(0.0)
+    Args:
+        df: DataFrame con la columna de método de envío (si existe)
+        tarifa_neta_base: Tarifa sobre la que se aplica un recargo porcentual
+        tipo_recargo_envio: 'Ninguno', 'Fijo ($)' o 'Porcentaje (%)'
+        valor_recargo_envio: Monto fijo o porcentaje según corresponda
 
-    tax_pct = pd.to_numeric(df_calc.get('tax_pct', 0.0), errors='coerce').fillna(0.0)
-    tarifa_base = df_calc['Precio de Tarifa']
-    tarifa_con_impuestos = tarifa_base * (1 + tax_pct)
-    if incluir_impuestos:
-        tarifa_neta_base = tarifa_con_impuestos
-        df_calc['Tarifa + impuestos'] = tarifa_con_impuestos
-    else:
-        tarifa_neta_base = tarifa_base
-        df_calc['Tarifa + impuestos'] = tarifa_con_impuestos
-
-    # Inicializar columnas
-    df_calc['Recargo % ML (importe)'] = 0.0
-    df_calc['Recargo fijo ML ($)'] = 0.0
-    df_calc['Cargo por vender ($)'] = 0.0
-    df_calc['Recargo financiación (importe)'] = 0.0
-    df_calc['Recargo envío ($)'] = 0.0
-    df_calc['Retenciones ML ($)'] = 0.0
-    df_calc['Recibis ($)'] = 0.0
-    df_calc['IVA'] = 0.0
-    df_calc['Precio final'] = 0.0
+    Returns:
+        Serie con el recargo de envío (0 donde no aplica)
+    """
+    recargo = pd.Series(0.0, index=df.index)
+    tipo_envio = tipo_recargo_envio.lower() if isinstance(tipo_recargo_envio, str) else 'ninguno'
+    if not (tipo_envio.startswith(('fijo', 'porcentaje')) and valor_recargo_envio):
+        return recargo
 
     # Identificar filas a las que se les debe aplicar recargo de envío
     shipping_column = next(
-        (col for col in ['SHIPPING_METHOD ', 'SHIPPING_METHOD'] if col in df_calc.columns),
+        (col for col in ['SHIPPING_METHOD ', 'SHIPPING_METHOD'] if col in df.columns),
         None
     )
     if shipping_column:
-        shipping_values = df_calc[shipping_column].fillna('').astype(str)
+        shipping_values = df[shipping_column].fillna('').astype(str)
         aplica_envio = shipping_values.str.contains(
             'Mercado Envíos por mi cuenta',
             case=False,
             regex=False
         )
     else:
-        aplica_envio = pd.Series(False, index=df_calc.index, dtype=bool)
+        aplica_envio = pd.Series(False, index=df.index, dtype=bool)
 
     # Calcular recargo de envío solo para las filas aplicables
-    tipo_envio = tipo_recargo_envio.lower() if isinstance(tipo_recargo_envio, str) else 'ninguno'
     if tipo_envio.startswith('fijo') and valor_recargo_envio:
         try:
             monto_fijo = float(valor_recargo_envio)
         except (TypeError, ValueError):
             monto_fijo = 0.0
-        if monto_fijo != 0.0:
-            df_calc.loc[aplica_envio, 'Recargo envío ($)'] = monto_fijo
-        else:
-            df_calc.loc[aplica_envio, 'Recargo envío ($)'] = 0.0
+        recargo[aplica_envio] = monto_fijo
     elif tipo_envio.startswith('porcentaje') and valor_recargo_envio:
         try:
             pct_envio = float(valor_recargo_envio)
@@ -211,105 +697,494 @@ def calcular(
             pct_envio = 0.0
         if pct_envio > 1:
             pct_envio = pct_envio / 100.0
-        df_calc.loc[aplica_envio, 'Recargo envío ($)'] = tarifa_neta_base[aplica_envio] * pct_envio
+        recargo[aplica_envio] = tarifa_neta_base[aplica_envio] * pct_envio
+
+    return recargo
+
+def _columna_numerica(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Columna como array float (0 si falta la columna o el valor no es numérico)."""
+    if col not in df.columns:
+        return np.zeros(len(df))
+    return pd.to_numeric(df[col], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+
+def calcular(
+    df: pd.DataFrame,
+    base_financiacion: str = 'tarifa',
+    incluir_impuestos: bool = False,
+    tipo_recargo_envio: str = 'Ninguno',
+    valor_recargo_envio: float = 0.0,
+    columnas: list = None
+) -> pd.DataFrame:
+    """
+    Calcula los precios finales con el desglose de recargos.
 
-    tarifa_objetivo = tarifa_neta_base + df_calc['Recargo envío ($)']
+    Args:
+        df: DataFrame unido y validado
+        base_financiacion: 'tarifa' o 'tarifa_mas_ml'
+        incluir_impuestos: Si incluir impuestos del cliente en la tarifa
+        tipo_recargo_envio: 'Ninguno', 'Fijo ($)' o 'Porcentaje (%)'
+        valor_recargo_envio: Monto fijo o porcentaje según corresponda
+        columnas: Columnas de salida a producir (None = todas); las numéricas
+            que no están y no hacen falta para otras no se calculan.
+            'Notas/Flags' siempre se incluye
 
-    fee_pct = pd.to_numeric(df_calc.get('fee_pct', 0.0), errors='coerce').fillna(0.0)
-    fee_fixed = pd.to_numeric(df_calc.get('fee_fixed', 0.0), errors='coerce').fillna(0.0)
-    financing_pct = pd.to_numeric(df_calc.get('financing_pct', 0.0), errors='coerce').fillna(0.0)
-    if 'retenciones_pct' in df_calc.columns:
-        retenciones_pct = pd.to_numeric(df_calc['retenciones_pct'], errors='coerce').fillna(0.0)
+    Returns:
+        DataFrame con cálculos completados
+    """
+    n = len(df)
+    if columnas is None:
+        numericas = COLUMNAS_NUMERICAS_CALCULO
     else:
-        retenciones_pct = pd.Series(0.0, index=df_calc.index)
-
-    calculos = [
-        calcular_precio_publicacion_ml(
-            tarifa_neta=tarifa_objetivo.iat[idx],
-            porcentaje_comision=fee_pct.iat[idx],
-            porcentaje_financiacion=financing_pct.iat[idx],
-            porcentaje_retenciones=retenciones_pct.iat[idx],
-            costo_fijo=fee_fixed.iat[idx],
+        numericas = [col for col in COLUMNAS_NUMERICAS_CALCULO if col in columnas]
+
+    tarifa_base = _columna_numerica(df, 'Precio Tarifa')
+    tax_pct = _columna_numerica(df, 'tax_pct')
+    fee_pct = _columna_numerica(df, 'fee_pct')
+    fee_fixed = _columna_numerica(df, 'fee_fixed')
+    financing_pct = _columna_numerica(df, 'financing_pct')
+    retenciones_pct = _columna_numerica(df, 'retenciones_pct')
+
+    # Todas las salidas numéricas se escriben en un único bloque preasignado;
+    # las intermedias que no se piden van a arrays sueltos
+    bloque = np.empty((n, len(numericas)), dtype=float)
+    columna = {col: bloque[:, j] for j, col in enumerate(numericas)}
+    for col in ('Tarifa + impuestos', 'Recargo envío ($)'):
+        if col not in columna:
+            columna[col] = np.empty(n)
+
+    if 'Precio de Tarifa' in columna:
+        columna['Precio de Tarifa'][:] = tarifa_base
+    if incluir_impuestos or 'Tarifa + impuestos' in numericas:
+        np.multiply(tarifa_base, 1 + tax_pct, out=columna['Tarifa + impuestos'])
+    tarifa_neta_base = columna['Tarifa + impuestos'] if incluir_impuestos else tarifa_base
+
+    columna['Recargo envío ($)'][:] = _calcular_recargo_envio(
+        df, pd.Series(tarifa_neta_base, index=df.index), tipo_recargo_envio, valor_recargo_envio
+    ).to_numpy()
+
+    (
+        precio_final,
+        cargo_por_vender,
+        recargo_financiacion,
+        retenciones,
+        recibis,
+        invalid_mask,
+    ) = calcular_precio_publicacion_ml_vectorizado(
+        tarifa_neta=tarifa_neta_base + columna['Recargo envío ($)'],
+        porcentaje_comision=fee_pct,
+        porcentaje_financiacion=financing_pct,
+        porcentaje_retenciones=retenciones_pct,
+        costo_fijo=fee_fixed,
+    )
+
+    for col, valores in (
+        ('Precio final', precio_final),
+        ('Cargo por vender ($)', cargo_por_vender),
+        ('Recargo financiación (importe)', recargo_financiacion),
+        ('Retenciones ML ($)', retenciones),
+        ('Recibis ($)', recibis),
+    ):
+        if col in columna:
+            columna[col][:] = valores
+    if 'Recargo % ML (importe)' in columna:
+        np.multiply(precio_final, fee_pct, out=columna['Recargo % ML (importe)'])
+    if 'Recargo fijo ML ($)' in columna:
+        np.copyto(columna['Recargo fijo ML ($)'], np.where(invalid_mask, 0.0, fee_fixed))
+    if 'IVA' in columna:
+        np.copyto(
+            columna['IVA'],
+            np.where(tax_pct > 0, precio_final * tax_pct / (1 + tax_pct), 0.0)
         )
-        for idx in range(len(df_calc))
-    ]
+    if '% ML aplicado' in columna:
+        np.multiply(fee_pct, 100, out=columna['% ML aplicado'])
+    if '% financiación aplicado' in columna:
+        np.multiply(financing_pct, 100, out=columna['% financiación aplicado'])
 
-    calculos_df = pd.DataFrame(
-        calculos,
-        columns=[
-            'Precio final',
-            'Cargo por vender ($)',
-            'Recargo financiación (importe)',
-            'Retenciones ML ($)',
-            'Recibis ($)',
-            'Denominador inválido',
+    # Redondear a 2 decimales
+    np.round(bloque, 2, out=bloque)
+
+    if 'Notas/Flags' in df.columns:
+        notas = df['Notas/Flags'].fillna('').to_numpy(dtype=object, copy=True)
+    else:
+        notas = np.full(n, '', dtype=object)
+    _agregar_nota(notas, invalid_mask, 'Porcentajes ML sin solución (denominador <= 0)')
+
+    # Solo se arrastran las columnas que usan las etapas siguientes
+    columnas_paso = [
+        col for col in COLUMNAS_PASO_CALCULO
+        if col in df.columns and (columnas is None or col in columnas)
+    ]
+    df_calc = pd.concat(
+        [
+            df[columnas_paso],
+            pd.DataFrame(bloque, columns=numericas, index=df.index, copy=False),
         ],
-        index=df_calc.index,
+        axis=1,
+        copy=False,
     )
+    df_calc['Notas/Flags'] = notas
 
-    df_calc['Precio final'] = calculos_df['Precio final']
-    df_calc['Cargo por vender ($)'] = calculos_df['Cargo por vender ($)']
-    df_calc['Recargo financiación (importe)'] = calculos_df['Recargo financiación (importe)']
-    df_calc['Retenciones ML ($)'] = calculos_df['Retenciones ML ($)']
-    df_calc['Recibis ($)'] = calculos_df['Recibis ($)']
-    df_calc['Recargo fijo ML ($)'] = fee_fixed
-    df_calc['Recargo % ML (importe)'] = df_calc['Precio final'] * fee_pct
-
-    invalid_mask = calculos_df['Denominador inválido']
-    if invalid_mask.any():
-        mensaje = 'Porcentajes ML sin solución (denominador <= 0)'
-        df_calc.loc[invalid_mask, 'Notas/Flags'] = df_calc.loc[invalid_mask, 'Notas/Flags'].apply(
-            lambda x: mensaje if not x else f"{x}; {mensaje}"
-        )
-        df_calc.loc[invalid_mask, 'Recargo fijo ML ($)'] = 0.0
-
-    df_calc['IVA'] = 0.0
-    positive_tax = tax_pct > 0
-    if positive_tax.any():
-        df_calc.loc[positive_tax, 'IVA'] = (
-            df_calc.loc[positive_tax, 'Precio final']
-            * tax_pct[positive_tax]
-            / (1 + tax_pct[positive_tax])
+    return df_calc
+
+def construir_tabla_comisiones(df_ml: pd.DataFrame, tabla=None) -> pd.DataFrame:
+    """
+    Construye la tabla de comisiones por tipo de publicación.
+
+    Si no se indica ``tabla``, se deduce de los datos: para cada
+    ``LISTING_TYPE_V3`` se toma la combinación (porcentaje, fijo) más frecuente
+    entre los valores observados de FEE_PER_SALE_MARKETPLACE_V2.
+
+    Args:
+        df_ml: DataFrame de MercadoLibre (o ya unido con Odoo)
+        tabla: Opcional. Diccionario {tipo: "14.50% + $1095.00" | (pct, fijo)}
+            o DataFrame con columnas LISTING_TYPE_V3 y fee_pct/fee_fixed
+            (o FEE_PER_SALE_MARKETPLACE_V2)
+
+    Returns:
+        DataFrame indexado por tipo de publicación con columnas fee_pct y fee_fixed
+    """
+    if tabla is None:
+        if 'fee_pct' in df_ml.columns and 'fee_fixed' in df_ml.columns:
+            observadas = df_ml[['LISTING_TYPE_V3', 'fee_pct', 'fee_fixed']]
+        else:
+            fees = df_ml['FEE_PER_SALE_MARKETPLACE_V2'].apply(parse_fee_combo)
+            observadas = pd.DataFrame({
+                'LISTING_TYPE_V3': df_ml['LISTING_TYPE_V3'],
+                'fee_pct': [pct for pct, _ in fees],
+                'fee_fixed': [fijo for _, fijo in fees],
+            })
+        conteo = (
+            observadas.dropna(subset=['LISTING_TYPE_V3'])
+            .groupby(['LISTING_TYPE_V3', 'fee_pct', 'fee_fixed'], sort=False)
+            .size()
+            .reset_index(name='n')
         )
+        # Para cada tipo, quedarse con la combinación más frecuente
+        conteo = conteo.sort_values('n', ascending=False, kind='stable')
+        tabla_df = conteo.drop_duplicates('LISTING_TYPE_V3')[['LISTING_TYPE_V3', 'fee_pct', 'fee_fixed']]
+    elif isinstance(tabla, dict):
+        filas = []
+        for tipo, fee in tabla.items():
+            if isinstance(fee, str):
+                pct, fijo = parse_fee_combo(fee)
+            else:
+                pct, fijo = fee
+            filas.append((tipo, float(pct), float(fijo)))
+        tabla_df = pd.DataFrame(filas, columns=['LISTING_TYPE_V3', 'fee_pct', 'fee_fixed'])
+    else:
+        tabla_df = tabla.copy()
+        if 'fee_pct' not in tabla_df.columns or 'fee_fixed' not in tabla_df.columns:
+            fees = tabla_df['FEE_PER_SALE_MARKETPLACE_V2'].apply(parse_fee_combo)
+            tabla_df['fee_pct'] = [pct for pct, _ in fees]
+            tabla_df['fee_fixed'] = [fijo for _, fijo in fees]
+        tabla_df = tabla_df[['LISTING_TYPE_V3', 'fee_pct', 'fee_fixed']]
 
-    # Redondear a 2 decimales
-    numeric_cols = [
-        'Precio de Tarifa',
-        'Tarifa + impuestos',
-        'Recargo % ML (importe)',
-        'Recargo fijo ML ($)',
-        'Cargo por vender ($)',
-        'Recargo financiación (importe)',
-        'Recargo envío ($)',
-        'Retenciones ML ($)',
-        'Recibis ($)',
-        'IVA',
-        'Precio final',
-    ]
-    for col in numeric_cols:
-        df_calc[col] = df_calc[col].round(2)
+    tabla_df = tabla_df.sort_values('LISTING_TYPE_V3').set_index('LISTING_TYPE_V3')
+    return tabla_df.astype(float)
 
-    # Preparar columnas adicionales
-    df_calc['% ML aplicado'] = (fee_pct * 100).round(2)
-    df_calc['% financiación aplicado'] = (financing_pct * 100).round(2)
+def comparar_tipos_publicacion(
+    df: pd.DataFrame,
+    tabla_comisiones=None,
+    incluir_impuestos: bool = False,
+    tipo_recargo_envio: str = 'Ninguno',
+    valor_recargo_envio: float = 0.0
+) -> pd.DataFrame:
+    """
+    Calcula el precio de cada SKU encontrado bajo todos los tipos de publicación.
 
-    return df_calc
+    El cálculo se hace en una sola operación matricial (publicaciones × tipos),
+    manteniendo la financiación, retenciones e impuestos de cada fila y
+    reemplazando solo la comisión por la del tipo evaluado.
 
-def preparar_resultado_final(
-    df_calc: pd.DataFrame,
+    Args:
+        df: DataFrame unido y validado
+        tabla_comisiones: Tabla aceptada por ``construir_tabla_comisiones``.
+            Si es None se deduce de los datos observados
+        incluir_impuestos: Si incluir impuestos del cliente en la tarifa
+        tipo_recargo_envio: 'Ninguno', 'Fijo ($)' o 'Porcentaje (%)'
+        valor_recargo_envio: Monto fijo o porcentaje según corresponda
+
+    Returns:
+        DataFrame comparativo con "Precio final" y "Recibis ($)" por tipo y el
+        tipo de publicación más económico para cada fila
+    """
+    if not isinstance(tabla_comisiones, pd.DataFrame) or 'fee_pct' not in tabla_comisiones.columns:
+        tabla_comisiones = construir_tabla_comisiones(df, tabla_comisiones)
+    tipos = list(tabla_comisiones.index)
+
+    df_match = df[df['Código Neored'].notna()]
+
+    tarifa_base = _columna_numerica(df_match, 'Precio Tarifa')
+    tax_pct = _columna_numerica(df_match, 'tax_pct')
+    tarifa_neta_base = tarifa_base * (1 + tax_pct) if incluir_impuestos else tarifa_base
+    tarifa_objetivo = tarifa_neta_base + _calcular_recargo_envio(
+        df_match, pd.Series(tarifa_neta_base, index=df_match.index), tipo_recargo_envio, valor_recargo_envio
+    ).to_numpy()
+
+    financing_pct = _columna_numerica(df_match, 'financing_pct')
+    retenciones_pct = _columna_numerica(df_match, 'retenciones_pct')
+
+    # Matriz (filas × tipos) en una sola pasada
+    precio, _, _, _, recibis, invalido = calcular_precio_publicacion_ml_vectorizado(
+        tarifa_neta=tarifa_objetivo[:, None],
+        porcentaje_comision=tabla_comisiones['fee_pct'].to_numpy()[None, :],
+        porcentaje_financiacion=financing_pct[:, None],
+        porcentaje_retenciones=retenciones_pct[:, None],
+        costo_fijo=tabla_comisiones['fee_fixed'].to_numpy()[None, :],
+    )
+    precio = np.round(precio, 2)
+    recibis = np.round(recibis, 2)
+
+    columnas = {
+        'Numero de publicación': df_match['ITEM_ID'].array,
+        'SKU': df_match['SKU'].array,
+        'Descripción del producto': df_match['Nombre'].fillna(df_match['TITLE']).array,
+        'Tipo de publicación': df_match['LISTING_TYPE_V3'].to_numpy(),
+        'Precio actual en ML': df_match['PRICE'].to_numpy(),
+    }
+    for j, tipo in enumerate(tipos):
+        columnas[f'Precio final ({tipo})'] = precio[:, j]
+        columnas[f'Recibis ($) ({tipo})'] = recibis[:, j]
+
+    if tipos:
+        precio_valido = np.where(invalido, np.inf, precio)
+        mas_economico = np.asarray(tipos, dtype=object)[np.argmin(precio_valido, axis=1)]
+        mas_economico[invalido.all(axis=1)] = ''
+    else:
+        mas_economico = np.full(len(df_match), '', dtype=object)
+    columnas['Tipo más económico'] = mas_economico
+
+    return pd.DataFrame(columnas)
+
+def construir_tabla_cuotas(tabla) -> pd.DataFrame:
+    """
+    Normaliza la tabla de costos de los planes de cuotas.
+
+    Args:
+        tabla: Diccionario {cuotas: "9.50%" | 0.095}, texto "3: 4.5%, 6: 9%"
+            o DataFrame con columnas 'Cuotas' y financing_pct (o 'Costo'
+            como texto de porcentaje)
+
+    Returns:
+        DataFrame indexado por 'Cuotas' (de menos a más) con la columna financing_pct
+    """
+    if isinstance(tabla, str):
+        tabla = dict(parte.split(':', 1) for parte in tabla.replace(';', ',').split(',') if parte.strip())
+    if isinstance(tabla, dict):
+        tabla_df = pd.DataFrame({
+            'Cuotas': [int(str(cuotas).strip()) for cuotas in tabla],
+            'financing_pct': [
+                parse_pct(costo) if isinstance(costo, str) else float(costo) for costo in tabla.values()
+            ],
+        })
+    else:
+        tabla_df = tabla.copy()
+        if 'financing_pct' not in tabla_df.columns:
+            tabla_df['financing_pct'] = tabla_df['Costo'].apply(parse_pct)
+        tabla_df = tabla_df[['Cuotas', 'financing_pct']].astype({'Cuotas': int, 'financing_pct': float})
+
+    if tabla_df.empty:
+        raise ValueError("La tabla de cuotas está vacía")
+    if tabla_df['Cuotas'].duplicated().any():
+        raise ValueError("La tabla de cuotas repite planes")
+    return tabla_df.sort_values('Cuotas').set_index('Cuotas')
+
+def comparar_planes_cuotas(
+    df: pd.DataFrame,
+    tabla_cuotas,
     incluir_impuestos: bool = False,
-    incluir_envio: bool = False
+    tipo_recargo_envio: str = 'Ninguno',
+    valor_recargo_envio: float = 0.0,
+    tolerancia: float = 0.10
 ) -> pd.DataFrame:
     """
-    Prepara el DataFrame final con las columnas en el orden exacto especificado.
+    Calcula el precio de cada SKU encontrado bajo todos los planes de cuotas.
+
+    Igual que ``comparar_tipos_publicacion``, en una sola operación matricial
+    (publicaciones × planes): cada fila mantiene su comisión y retenciones y
+    solo se reemplaza la financiación por la del plan. Como el precio se
+    despeja para recibir la tarifa objetivo, lo que se recibe con el precio
+    nuevo es igual en todos los planes; por eso el desglose por plan informa
+    lo que se recibiría manteniendo el precio actual de ML.
+
+    Args:
+        df: DataFrame unido y validado
+        tabla_cuotas: Tabla aceptada por ``construir_tabla_cuotas``
+        incluir_impuestos: Si incluir impuestos del cliente en la tarifa
+        tipo_recargo_envio: 'Ninguno', 'Fijo ($)' o 'Porcentaje (%)'
+        valor_recargo_envio: Monto fijo o porcentaje según corresponda
+        tolerancia: Aumento máximo sobre el precio del plan más barato para
+            recomendar un plan con más cuotas (0.10 = 10%)
+
+    Returns:
+        DataFrame con "Precio final" y "Recibis con precio actual ($)" por plan,
+        el plan recomendado (el de más cuotas dentro de la tolerancia) y su precio
+    """
+    if not isinstance(tabla_cuotas, pd.DataFrame) or 'financing_pct' not in tabla_cuotas.columns:
+        tabla_cuotas = construir_tabla_cuotas(tabla_cuotas)
+    planes = list(tabla_cuotas.index)
+    financing_planes = tabla_cuotas['financing_pct'].to_numpy()[None, :]
+
+    df_match = df[df['Código Neored'].notna()]
+
+    tarifa_base = _columna_numerica(df_match, 'Precio Tarifa')
+    tax_pct = _columna_numerica(df_match, 'tax_pct')
+    tarifa_neta_base = tarifa_base * (1 + tax_pct) if incluir_impuestos else tarifa_base
+    tarifa_objetivo = tarifa_neta_base + _calcular_recargo_envio(
+        df_match, pd.Series(tarifa_neta_base, index=df_match.index), tipo_recargo_envio, valor_recargo_envio
+    ).to_numpy()
+    fee_pct = _columna_numerica(df_match, 'fee_pct')[:, None]
+    fee_fixed = _columna_numerica(df_match, 'fee_fixed')[:, None]
+    retenciones_pct = _columna_numerica(df_match, 'retenciones_pct')[:, None]
+    precio_actual = _columna_numerica(df_match, 'PRICE')
+
+    # Matrices (filas × planes) en una sola pasada
+    precio, _, _, _, _, invalido = calcular_precio_publicacion_ml_vectorizado(
+        tarifa_neta=tarifa_objetivo[:, None],
+        porcentaje_comision=fee_pct,
+        porcentaje_financiacion=financing_planes,
+        porcentaje_retenciones=retenciones_pct,
+        costo_fijo=fee_fixed,
+    )
+    recibis_actual = desglosar_precio_publicacion_ml_vectorizado(
+        precio_actual[:, None], fee_pct, financing_planes, retenciones_pct, fee_fixed
+    )[3]
+    precio = np.round(precio, 2)
+    recibis_actual = np.round(recibis_actual, 2)
+
+    columnas = {
+        'Numero de publicación': df_match['ITEM_ID'].array,
+        'SKU': df_match['SKU'].array,
+        'Descripción del producto': df_match['Nombre'].fillna(df_match['TITLE']).array,
+        'Tipo de publicación': df_match['LISTING_TYPE_V3'].to_numpy(),
+        'Precio actual en ML': df_match['PRICE'].to_numpy(),
+    }
+    for j, cuotas in enumerate(planes):
+        columnas[f'Precio final ({cuotas} cuotas)'] = precio[:, j]
+        columnas[f'Recibis con precio actual ($) ({cuotas} cuotas)'] = recibis_actual[:, j]
+
+    # Recomendado: el de más cuotas cuyo precio no supera al más barato en más de ``tolerancia``
+    precio_valido = np.where(invalido | (precio <= 0), np.inf, precio)
+    tope = precio_valido.min(axis=1, keepdims=True) * (1 + tolerancia)
+    dentro = np.isfinite(precio_valido) & (precio_valido <= tope)
+    ultimo = len(planes) - 1 - np.argmax(dentro[:, ::-1], axis=1)
+    sin_plan = ~dentro.any(axis=1)
+    recomendado = np.asarray(planes, dtype=object)[ultimo]
+    recomendado[sin_plan] = None
+    precio_recomendado = precio[np.arange(len(precio)), ultimo]
+    precio_recomendado[sin_plan] = 0.0
+    columnas['Plan recomendado (cuotas)'] = pd.array(recomendado, dtype='Int64')
+    columnas['Precio plan recomendado'] = precio_recomendado
+
+    return pd.DataFrame(columnas)
+
+def auditar_margenes(
+    df_merged: pd.DataFrame,
+    incluir_impuestos: bool = False,
+    tipo_recargo_envio: str = 'Ninguno',
+    valor_recargo_envio: float = 0.0,
+    margen_maximo: float = None
+) -> pd.DataFrame:
+    """
+    Audita los precios publicados hoy en ML contra la tarifa de Odoo.
+
+    Es la fórmula de ``calcular`` al revés: a partir de PRICE calcula cargo
+    por vender, costo de cuotas, retenciones y lo que se recibe, y lo compara
+    con la tarifa objetivo (tarifa, más impuestos si corresponde, más recargo
+    de envío). Todo son operaciones sobre arrays, igual que ``calcular``, y se
+    puede correr junto con ella o en su lugar sobre el mismo ``df_merged``.
+
+    Args:
+        df_merged: DataFrame de ``unir_y_validar``
+        incluir_impuestos: Si la tarifa objetivo incluye los impuestos del cliente
+        tipo_recargo_envio: 'Ninguno', 'Fijo ($)' o 'Porcentaje (%)'
+        valor_recargo_envio: Monto fijo o porcentaje según corresponda
+        margen_maximo: Si se indica, solo las publicaciones con 'Margen (%)'
+            menor (0 = solo las que venden con pérdida)
+
+    Returns:
+        DataFrame ordenado de menor a mayor 'Margen ($)' (sin tarifa al final).
+        'Precio final' es el precio que daría ``calcular``.
+    """
+    tarifa_base = _columna_numerica(df_merged, 'Precio Tarifa')
+    tax_pct = _columna_numerica(df_merged, 'tax_pct')
+    fee_pct = _columna_numerica(df_merged, 'fee_pct')
+    fee_fixed = _columna_numerica(df_merged, 'fee_fixed')
+    financing_pct = _columna_numerica(df_merged, 'financing_pct')
+    retenciones_pct = _columna_numerica(df_merged, 'retenciones_pct')
+    precio_actual = _columna_numerica(df_merged, 'PRICE')
+
+    tarifa_neta = tarifa_base * (1 + tax_pct) if incluir_impuestos else tarifa_base
+    objetivo = tarifa_neta + _calcular_recargo_envio(
+        df_merged, pd.Series(tarifa_neta, index=df_merged.index), tipo_recargo_envio, valor_recargo_envio
+    ).to_numpy()
+
+    cargo_por_vender, recargo_financiacion, retenciones, recibis = desglosar_precio_publicacion_ml_vectorizado(
+        precio_actual, fee_pct, financing_pct, retenciones_pct, fee_fixed
+    )
+    precio_final = calcular_precio_publicacion_ml_vectorizado(
+        objetivo, fee_pct, financing_pct, retenciones_pct, fee_fixed
+    )[0]
+
+    con_tarifa = objetivo > 0
+    margen = np.where(con_tarifa, recibis - objetivo, np.nan)
+    margen_pct = np.divide(margen, objetivo, out=np.full(len(margen), np.nan), where=con_tarifa) * 100
+
+    if 'Notas/Flags' in df_merged.columns:
+        notas = df_merged['Notas/Flags'].fillna('').to_numpy(dtype=object, copy=True)
+    else:
+        notas = np.full(len(df_merged), '', dtype=object)
+    _agregar_nota(notas, precio_actual <= 0, 'Sin precio publicado en ML')
+    _agregar_nota(notas, (precio_actual > 0) & (margen < 0), 'Vende con pérdida')
+
+    def _redondear(valores):
+        return np.round(valores, 2)
+
+    df_auditoria = pd.DataFrame(
+        {
+            'Numero de publicación': df_merged['ITEM_ID'].array,
+            'SKU': df_merged['SKU'].array,
+            'Descripción del producto': df_merged['Nombre'].fillna(df_merged['TITLE']).array,
+            'Tipo de publicación': df_merged['LISTING_TYPE_V3'].to_numpy(),
+            'Precio actual en ML': _redondear(precio_actual),
+            'Cargo por vender ($)': _redondear(cargo_por_vender),
+            'Recargo financiación (importe)': _redondear(recargo_financiacion),
+            'Retenciones ML ($)': _redondear(retenciones),
+            'Recibis ($)': _redondear(recibis),
+            'Tarifa objetivo': _redondear(objetivo),
+            'Margen ($)': _redondear(margen),
+            'Margen (%)': _redondear(margen_pct),
+            'Precio final': _redondear(precio_final),
+            'Notas/Flags': notas,
+        },
+        copy=False,
+    )
+
+    if margen_maximo is not None:
+        df_auditoria = df_auditoria[df_auditoria['Margen (%)'] < margen_maximo]
+    return df_auditoria.sort_values('Margen ($)', kind='stable', na_position='last', ignore_index=True)
+
+# Columnas del resultado final que no salen de una columna de ``calcular`` con
+# el mismo nombre -> columnas de las que se arman
+ORIGEN_RESULTADO_FINAL = {
+    'Numero de publicación': ('ITEM_ID',),
+    'Descripción del producto': ('Nombre', 'TITLE'),
+    'Stock': ('Stock asignado', 'Cantidad a mano'),
+    'Tipo de publicación': ('LISTING_TYPE_V3',),
+    'Precio actual en ML': ('PRICE',),
+    'Moneda': ('CURRENCY_ID',),
+}
+
+def columnas_resultado_final(incluir_impuestos: bool = False, incluir_envio: bool = False) -> list:
+    """
+    Columnas de ``preparar_resultado_final`` en el orden exacto especificado.
 
     Args:
-        df_calc: DataFrame con cálculos completados
         incluir_impuestos: Si se incluyeron impuestos en el cálculo
         incluir_envio: Si se incluyó recargo de envío en el cálculo
 
     Returns:
-        DataFrame con estructura final para exportar
+        Lista de nombres de columna
     """
     # Definir columnas fijas
     columnas_finales = [
@@ -350,39 +1225,54 @@ def preparar_resultado_final(
 
     # Agregar columna de notas al final
     columnas_finales.append('Notas/Flags')
+    return columnas_finales
 
-    # Crear DataFrame resultado
-    df_resultado = pd.DataFrame()
+def columnas_calculo_necesarias(columnas_finales: list) -> list:
+    """Columnas de ``calcular`` que hacen falta para armar ``columnas_finales``."""
+    necesarias = []
+    for col in columnas_finales:
+        for origen in ORIGEN_RESULTADO_FINAL.get(col, (col,)):
+            if origen not in necesarias:
+                necesarias.append(origen)
+    return necesarias
 
-    # Mapear campos
-    df_resultado['Numero de publicación'] = df_calc['ITEM_ID']
-    df_resultado['SKU'] = df_calc['SKU']
-    df_resultado['Descripción del producto'] = df_calc['Nombre'].fillna(df_calc['TITLE'])
-    df_resultado['Stock'] = df_calc['Cantidad a mano'].fillna(0).astype(int)
-    df_resultado['Precio de Tarifa'] = df_calc['Precio de Tarifa']
+def preparar_resultado_final(
+    df_calc: pd.DataFrame,
+    incluir_impuestos: bool = False,
+    incluir_envio: bool = False
+) -> pd.DataFrame:
+    """
+    Prepara el DataFrame final con las columnas en el orden exacto especificado.
 
-    if incluir_impuestos:
-        df_resultado['Tarifa + impuestos'] = df_calc['Tarifa + impuestos']
-
-    df_resultado['Precio final'] = df_calc['Precio final']
-    df_resultado['IVA'] = df_calc['IVA']
-    df_resultado['Recargo % ML (importe)'] = df_calc['Recargo % ML (importe)']
-    df_resultado['Recargo fijo ML ($)'] = df_calc['Recargo fijo ML ($)']
-    df_resultado['Cargo por vender ($)'] = df_calc['Cargo por vender ($)']
-    df_resultado['Recargo financiación (importe)'] = df_calc['Recargo financiación (importe)']
-    df_resultado['Retenciones ML ($)'] = df_calc['Retenciones ML ($)']
-    df_resultado['Recibis ($)'] = df_calc['Recibis ($)']
-    if incluir_envio:
-        df_resultado['Recargo envío ($)'] = df_calc['Recargo envío ($)']
-    df_resultado['% ML aplicado'] = df_calc['% ML aplicado']
-    df_resultado['% financiación aplicado'] = df_calc['% financiación aplicado']
-    df_resultado['Tipo de publicación'] = df_calc['LISTING_TYPE_V3']
-    df_resultado['Precio actual en ML'] = df_calc['PRICE']
-    df_resultado['Moneda'] = df_calc['CURRENCY_ID']
-    df_resultado['Notas/Flags'] = df_calc['Notas/Flags'].fillna('')
+    Args:
+        df_calc: DataFrame con cálculos completados (alcanza con las columnas
+            de ``columnas_calculo_necesarias``)
+        incluir_impuestos: Si se incluyeron impuestos en el cálculo
+        incluir_envio: Si se incluyó recargo de envío en el cálculo
 
-    # Reordenar columnas
-    df_resultado = df_resultado[columnas_finales]
+    Returns:
+        DataFrame con estructura final para exportar
+    """
+    columnas_finales = columnas_resultado_final(incluir_impuestos, incluir_envio)
+
+    # Mapear campos y construir el DataFrame resultado en una sola operación
+    # (``.array`` conserva el almacenamiento Arrow de las columnas de texto)
+    columnas = {}
+    for col in columnas_finales:
+        if col == 'Descripción del producto':
+            columnas[col] = df_calc['Nombre'].fillna(df_calc['TITLE']).array
+        elif col == 'Stock':
+            # Con ``asignacion_stock.asignar_stock`` cada publicación lleva su parte del stock
+            origen = 'Stock asignado' if 'Stock asignado' in df_calc.columns else 'Cantidad a mano'
+            columnas[col] = df_calc[origen].fillna(0).to_numpy().astype(int)
+        elif col == 'Notas/Flags':
+            columnas[col] = df_calc['Notas/Flags'].fillna('').to_numpy()
+        elif col in ('Numero de publicación', 'SKU'):
+            columnas[col] = df_calc[ORIGEN_RESULTADO_FINAL.get(col, (col,))[0]].array
+        else:
+            columnas[col] = df_calc[ORIGEN_RESULTADO_FINAL.get(col, (col,))[0]].to_numpy()
+    # ``copy=False`` evita consolidar (y copiar) los arrays en bloques nuevos
+    df_resultado = pd.DataFrame(columnas, copy=False)
 
     return df_resultado
 
@@ -402,6 +1292,13 @@ def exportar_excel(df: pd.DataFrame, output_path: str = None) -> bytes:
     from openpyxl.utils.dataframe import dataframe_to_rows
     from openpyxl.styles import Font, Alignment, PatternFill
 
+    # Las columnas de texto Arrow se escriben igual que las de objeto (nulos como NaN)
+    columnas_arrow = [col for col in df.columns if isinstance(df[col].dtype, pd.StringDtype)]
+    if columnas_arrow:
+        df = df.assign(**{
+            col: df[col].to_numpy(dtype=object, na_value=np.nan) for col in columnas_arrow
+        })
+
     wb = Workbook()
     ws = wb.active
     ws.title = "resultado"
@@ -440,4 +1337,310 @@ def exportar_excel(df: pd.DataFrame, output_path: str = None) -> bytes:
             f.write(buffer.getvalue())
         buffer.seek(0)
 
-    return buffer.getvalue()
\ No newline at end of file
+    return buffer.getvalue()
+
+# Tamaño de bloque (filas) para las exportaciones en streaming
+FILAS_POR_BLOQUE = 50_000
+
+def _abrir_destino(output_path):
+    """
+    Devuelve (archivo, temporal) para escribir en ``output_path`` o en memoria.
+
+    Con ruta se escribe en ``temporal`` (junto a ``output_path``) y se renombra
+    al cerrar; en memoria ``temporal`` es None.
+    """
+    import io
+    from pathlib import Path
+
+    if output_path:
+        temporal = Path(output_path).with_name(f".{Path(output_path).name}.tmp")
+        return open(temporal, 'wb'), temporal
+    return io.BytesIO(), None
+
+class EscritorPorBloques:
+    """
+    Escribe un resultado de a bloques en ``output_path`` o en memoria.
+
+    Uso: ``escribir(bloque)`` por cada DataFrame (mismas columnas) y
+    ``cerrar()``, que devuelve los bytes si no se indicó ruta. También sirve
+    como context manager. El archivo se escribe con nombre temporal y se
+    renombra a ``output_path`` al cerrar; si algo falla antes, se borra y
+    ``output_path`` no se toca.
+    """
+
+    def __init__(self, output_path: str = None):
+        self.output_path = output_path
+        self.archivo, self._temporal = _abrir_destino(output_path)
+        self._en_memoria = self._temporal is None
+        self.filas = 0
+        self._primero = True
+
+    def escribir(self, bloque: pd.DataFrame) -> None:
+        self._escribir(bloque, self._primero)
+        self._primero = False
+        self.filas += len(bloque)
+
+    def _escribir(self, bloque: pd.DataFrame, primero: bool) -> None:
+        raise NotImplementedError
+
+    def _finalizar(self) -> None:
+        pass
+
+    def _descartar(self) -> None:
+        self.archivo.close()
+        if self._temporal is not None:
+            self._temporal.unlink(missing_ok=True)
+
+    def cerrar(self):
+        import os
+
+        try:
+            self._finalizar()
+            datos = self.archivo.getvalue() if self._en_memoria else None
+        except BaseException:
+            self._descartar()
+            raise
+        self.archivo.close()
+        if self._temporal is not None:
+            os.replace(self._temporal, self.output_path)
+        return datos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is not None:
+            self._descartar()
+        elif not self.archivo.closed:
+            self.cerrar()
+        return False
+
+
+class EscritorCsv(EscritorPorBloques):
+    """CSV UTF-8; el encabezado se escribe con el primer bloque."""
+
+    def _escribir(self, bloque, primero):
+        self.archivo.write(bloque.to_csv(index=False, header=primero).encode('utf-8'))
+
+
+class EscritorJsonl(EscritorPorBloques):
+    """JSON Lines: un objeto por fila."""
+
+    def _escribir(self, bloque, primero):
+        if bloque.empty:
+            return
+        texto = bloque.to_json(orient='records', lines=True, force_ascii=False)
+        self.archivo.write(texto.encode('utf-8'))
+        if not texto.endswith('\n'):
+            self.archivo.write(b'\n')
+
+
+class EscritorParquet(EscritorPorBloques):
+    """
+    Parquet con un row group por bloque (requiere pyarrow).
+
+    El esquema sale del primer bloque: las columnas numéricas conservan su
+    tipo y el resto se guarda como texto.
+    """
+
+    def __init__(self, output_path: str = None):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as e:
+            raise ImportError("La exportación a Parquet requiere el paquete 'pyarrow' (pip install pyarrow)") from e
+        super().__init__(output_path)
+        self._escritor = None
+
+    def _escribir(self, bloque, primero):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if primero:
+            campos = []
+            self._columnas_texto = set()
+            for col in bloque.columns:
+                dtype = bloque[col].dtype
+                if pd.api.types.is_bool_dtype(dtype) or (
+                    pd.api.types.is_numeric_dtype(dtype) and not isinstance(dtype, pd.StringDtype)
+                ):
+                    campos.append(pa.field(col, pa.from_numpy_dtype(np.dtype(dtype))))
+                else:
+                    campos.append(pa.field(col, pa.string()))
+                    self._columnas_texto.add(col)
+            self._esquema = pa.schema(campos)
+            self._escritor = pq.ParquetWriter(self.archivo, self._esquema)
+
+        arrays = []
+        for campo in self._esquema:
+            serie = bloque[campo.name]
+            if campo.name in self._columnas_texto:
+                valores = [
+                    None if pd.isna(v) else (v if isinstance(v, str) else str(v))
+                    for v in serie.to_numpy(dtype=object)
+                ]
+                arrays.append(pa.array(valores, type=pa.string()))
+            else:
+                arrays.append(pa.array(serie.to_numpy(), type=campo.type))
+        self._escritor.write_table(pa.Table.from_arrays(arrays, schema=self._esquema))
+
+    def _finalizar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+
+    def _descartar(self):
+        # El ParquetWriter abierto intentaría cerrarse sobre el archivo ya cerrado
+        if self._escritor is not None:
+            self._escritor.close()
+        super()._descartar()
+
+
+class EscritorExcel(EscritorPorBloques):
+    """
+    Excel en modo "write only" de openpyxl: las filas van directo al archivo
+    en lugar de quedar como celdas en memoria.
+
+    Mismo formato de encabezado que ``exportar_excel``; el ancho de columna
+    se calcula con el primer bloque.
+    """
+
+    def __init__(self, output_path: str = None):
+        from openpyxl import Workbook
+
+        super().__init__(output_path)
+        self._libro = Workbook(write_only=True)
+        self._hoja = self._libro.create_sheet("resultado")
+
+    def _escribir(self, bloque, primero):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment, PatternFill
+        from openpyxl.utils import get_column_letter
+
+        if primero:
+            for i, col in enumerate(bloque.columns, start=1):
+                largo = max([len(str(col))] + [len(str(v)) for v in bloque[col].head(1000).tolist()])
+                self._hoja.column_dimensions[get_column_letter(i)].width = min(largo + 2, 50)
+            encabezado = []
+            for col in bloque.columns:
+                celda = WriteOnlyCell(self._hoja, value=col)
+                celda.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                celda.font = Font(color="FFFFFF", bold=True)
+                celda.alignment = Alignment(horizontal="center")
+                encabezado.append(celda)
+            self._hoja.append(encabezado)
+
+        valores = bloque.astype(object)
+        valores = valores.where(bloque.notna(), None)
+        for fila in valores.itertuples(index=False, name=None):
+            self._hoja.append(fila)
+
+    def _finalizar(self):
+        self._libro.save(self.archivo)
+
+
+def _exportar_por_bloques(escritor: EscritorPorBloques, df: pd.DataFrame, filas_por_bloque: int):
+    """Escribe ``df`` con ``escritor`` de a ``filas_por_bloque`` filas."""
+    with escritor:
+        for inicio in range(0, max(len(df), 1), filas_por_bloque):
+            escritor.escribir(df.iloc[inicio:inicio + filas_por_bloque])
+        return escritor.cerrar()
+
+def exportar_csv(df: pd.DataFrame, output_path: str = None, filas_por_bloque: int = FILAS_POR_BLOQUE):
+    """
+    Exporta el DataFrame a CSV (UTF-8) escribiendo por bloques.
+
+    Args:
+        df: DataFrame a exportar
+        output_path: Ruta opcional; si se indica se escribe directo al archivo
+        filas_por_bloque: Filas por bloque escrito
+
+    Returns:
+        bytes del CSV si no se indicó ``output_path``; None en caso contrario
+    """
+    return _exportar_por_bloques(EscritorCsv(output_path), df, filas_por_bloque)
+
+def exportar_jsonl(df: pd.DataFrame, output_path: str = None, filas_por_bloque: int = FILAS_POR_BLOQUE):
+    """
+    Exporta el DataFrame a JSON Lines (un objeto por fila) escribiendo por bloques.
+
+    Args:
+        df: DataFrame a exportar
+        output_path: Ruta opcional; si se indica se escribe directo al archivo
+        filas_por_bloque: Filas por bloque escrito
+
+    Returns:
+        bytes del archivo si no se indicó ``output_path``; None en caso contrario
+    """
+    return _exportar_por_bloques(EscritorJsonl(output_path), df, filas_por_bloque)
+
+def exportar_parquet(df: pd.DataFrame, output_path: str = None, filas_por_bloque: int = FILAS_POR_BLOQUE):
+    """
+    Exporta el DataFrame a Parquet escribiendo un row group por bloque.
+
+    Las columnas numéricas conservan su tipo; el resto se guarda como texto.
+    Requiere pyarrow.
+
+    Args:
+        df: DataFrame a exportar
+        output_path: Ruta opcional; si se indica se escribe directo al archivo
+        filas_por_bloque: Filas por row group
+
+    Returns:
+        bytes del archivo si no se indicó ``output_path``; None en caso contrario
+    """
+    return _exportar_por_bloques(EscritorParquet(output_path), df, filas_por_bloque)
+
+def exportar_excel_por_bloques(df: pd.DataFrame, output_path: str = None, filas_por_bloque: int = FILAS_POR_BLOQUE):
+    """
+    Exporta el DataFrame a Excel sin armar la hoja en memoria (ver ``EscritorExcel``).
+
+    Args:
+        df: DataFrame a exportar
+        output_path: Ruta opcional; si se indica se escribe directo al archivo
+        filas_por_bloque: Filas por bloque escrito
+
+    Returns:
+        bytes del archivo si no se indicó ``output_path``; None en caso contrario
+    """
+    return _exportar_por_bloques(EscritorExcel(output_path), df, filas_por_bloque)
+
+# Escritor por bloques de cada formato (la exportación .xlsx en streaming usa ``EscritorExcel``)
+ESCRITORES_POR_BLOQUES = {
+    'xlsx': EscritorExcel,
+    'csv': EscritorCsv,
+    'parquet': EscritorParquet,
+    'jsonl': EscritorJsonl,
+}
+
+# Formatos de exportación: extensión, tipo MIME y función
+FORMATOS_EXPORTACION = {
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', exportar_excel),
+    'csv': ('.csv', 'text/csv', exportar_csv),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet', exportar_parquet),
+    'jsonl': ('.jsonl', 'application/x-ndjson', exportar_jsonl),
+}
+
+def exportar(df: pd.DataFrame, formato: str = 'xlsx', output_path: str = None, por_bloques: bool = False):
+    """
+    Exporta el resultado en el formato indicado.
+
+    Args:
+        df: DataFrame a exportar
+        formato: 'xlsx', 'csv', 'parquet' o 'jsonl'
+        output_path: Ruta opcional para guardar el archivo
+        por_bloques: Si escribir el .xlsx en streaming (``exportar_excel_por_bloques``);
+            los demás formatos ya se escriben por bloques
+
+    Returns:
+        bytes del archivo si no se indicó ``output_path``; None si se escribió
+        en ``output_path`` (igual en todos los formatos)
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(
+            f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS_EXPORTACION)}"
+        )
+    if por_bloques and formato == 'xlsx':
+        return exportar_excel_por_bloques(df, output_path=output_path)
+    datos = FORMATOS_EXPORTACION[formato][2](df, output_path=output_path)
+    # ``exportar_excel`` devuelve los bytes aunque haya escrito el archivo
+    return None if output_path else datos
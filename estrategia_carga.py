@@ -0,0 +1,348 @@
+"""
+Elección automática del camino de procesamiento según el tamaño del archivo.
+
+``estimar_carga`` lee solo la dimensión de la hoja (``utils.leer_dimension_xlsx``)
+y el tamaño del archivo, y estima filas, memoria y tiempo de cada estrategia
+antes de cargar nada. ``elegir_estrategia`` toma la primera que entra en el
+presupuesto de memoria (``ML_PRESUPUESTO_MEMORIA_MB``, por defecto 1024):
+
+- 'memoria': ``leer_ml`` + ``exportar`` en memoria; el .xlsx sale con el
+  formato completo de ``exportar_excel``.
+- 'deduplicado': ``leer_ml(..., deduplicar=True)`` lee la hoja por bloques y
+  parsea cada comisión una sola vez; el .xlsx se escribe en streaming. Mismo
+  resultado con bastante menos memoria.
+- 'bloques': todo el pipeline por bloques (``procesar_por_bloques``) escribiendo
+  directo al archivo; la memoria depende del tamaño de bloque y del catálogo.
+  La marca 'SKU repetido en otras publicaciones de ML' solo ve repeticiones
+  dentro del mismo bloque y las estadísticas de ``control_precios`` se
+  calculan sobre cada bloque. El reparto de stock (``asignacion_stock``) da
+  lo mismo que en memoria: antes se hace una pasada liviana por la hoja (solo
+  las columnas del join y del reparto) para repartir sobre todas las
+  publicaciones.
+
+Los factores por celda se midieron con ``tracemalloc`` sobre los datos de
+``benchmark.py``; son aproximados y conservadores.
+"""
+from __future__ import annotations
+
+import os
+
+from utils import leer_dimension_xlsx, HOJA_POR_TIPO
+
+VARIABLE_PRESUPUESTO = 'ML_PRESUPUESTO_MEMORIA_MB'
+PRESUPUESTO_MEMORIA_MB = 1024
+
+# En orden de preferencia (la primera que entra en el presupuesto); 'memoria'
+# va primero porque es la única que ajusta el ancho de columna del .xlsx a todas las filas
+ESTRATEGIAS = ('memoria', 'deduplicado', 'bloques')
+# Pico de memoria (bytes) por celda de la hoja de ML en cada estrategia
+BYTES_POR_CELDA = {'memoria': 750, 'deduplicado': 120, 'bloques': 200}
+# Segundos por cada 1000 celdas de la hoja de ML (lectura, cálculo y exportación .xlsx)
+SEGUNDOS_POR_MIL_CELDAS = {'memoria': 0.07, 'deduplicado': 0.035, 'bloques': 0.035}
+# Catálogo de Odoo: siempre se carga entero con ``leer_odoo``
+BYTES_POR_CELDA_ODOO = 120
+# Filas de ML por bloque en la estrategia 'bloques'
+FILAS_POR_BLOQUE_CARGA = 20_000
+
+
+def presupuesto_memoria_mb() -> float:
+    """Presupuesto de memoria configurado en ``ML_PRESUPUESTO_MEMORIA_MB``."""
+    try:
+        return float(os.environ.get(VARIABLE_PRESUPUESTO, PRESUPUESTO_MEMORIA_MB))
+    except ValueError:
+        return float(PRESUPUESTO_MEMORIA_MB)
+
+
+class EstimacionCarga:
+    """Tamaño estimado de un Excel y costo de procesarlo con cada estrategia."""
+
+    def __init__(self, tipo: str, filas: int, columnas: int, bytes_archivo: int, exacta: bool,
+                 filas_por_bloque: int = FILAS_POR_BLOQUE_CARGA):
+        self.tipo = tipo
+        self.filas = filas
+        self.columnas = columnas
+        self.bytes_archivo = bytes_archivo
+        self.exacta = exacta
+        celdas = filas * columnas
+        if tipo == 'odoo':
+            self.memoria_mb = {'memoria': celdas * BYTES_POR_CELDA_ODOO / 2**20}
+            self.segundos = {}
+        else:
+            celdas_bloque = min(filas, filas_por_bloque) * columnas
+            self.memoria_mb = {
+                'memoria': celdas * BYTES_POR_CELDA['memoria'] / 2**20,
+                'deduplicado': celdas * BYTES_POR_CELDA['deduplicado'] / 2**20,
+                'bloques': celdas_bloque * BYTES_POR_CELDA['bloques'] / 2**20,
+            }
+            self.segundos = {e: celdas / 1000 * SEGUNDOS_POR_MIL_CELDAS[e] for e in ESTRATEGIAS}
+
+    def resumen(self, estrategia: str = None) -> str:
+        """Texto de una línea para mostrar al usuario."""
+        filas = f"{self.filas:,}" if self.exacta else f"~{self.filas:,}"
+        texto = (
+            f"{filas} filas × {self.columnas} columnas, "
+            f"{self.bytes_archivo / 2**20:.1f} MB en disco"
+        )
+        if estrategia:
+            texto += (
+                f" → estrategia '{estrategia}': ~{self.memoria_mb[estrategia]:.0f} MB de memoria"
+                f", ~{self.segundos[estrategia]:.0f} s"
+            )
+        return texto
+
+
+def _tamano_archivo(file_path_or_buffer) -> int:
+    if isinstance(file_path_or_buffer, (str, os.PathLike)):
+        return os.path.getsize(file_path_or_buffer)
+    posicion = file_path_or_buffer.tell()
+    file_path_or_buffer.seek(0, os.SEEK_END)
+    tamano = file_path_or_buffer.tell()
+    file_path_or_buffer.seek(posicion)
+    return tamano
+
+
+def estimar_carga(file_path_or_buffer, tipo: str = 'ml', filas_por_bloque: int = FILAS_POR_BLOQUE_CARGA) -> EstimacionCarga:
+    """
+    Estima el tamaño de un Excel de ML u Odoo sin cargarlo.
+
+    Args:
+        file_path_or_buffer: Ruta o archivo binario (p. ej. el de Streamlit);
+            un buffer queda en la misma posición
+        tipo: 'ml' u 'odoo'
+        filas_por_bloque: Filas por bloque de la estrategia 'bloques'
+
+    Returns:
+        EstimacionCarga (las filas no incluyen el encabezado)
+    """
+    posicion = None if isinstance(file_path_or_buffer, (str, os.PathLike)) else file_path_or_buffer.tell()
+    try:
+        dimension = leer_dimension_xlsx(file_path_or_buffer, HOJA_POR_TIPO[tipo])
+    finally:
+        if posicion is not None:
+            file_path_or_buffer.seek(posicion)
+    return EstimacionCarga(
+        tipo,
+        max(dimension['filas'] - 1, 0),
+        dimension['columnas'],
+        _tamano_archivo(file_path_or_buffer),
+        dimension['exacta'],
+        filas_por_bloque,
+    )
+
+
+def elegir_estrategia(estimacion: EstimacionCarga, presupuesto_mb: float = None,
+                      estimacion_odoo: EstimacionCarga = None) -> str:
+    """
+    Elige la primera estrategia de ``ESTRATEGIAS`` que entra en el presupuesto.
+
+    Args:
+        estimacion: Estimación del Excel de ML
+        presupuesto_mb: Memoria disponible (por defecto ``presupuesto_memoria_mb()``)
+        estimacion_odoo: Estimación del catálogo, que se suma a todas
+
+    Returns:
+        'memoria', 'deduplicado' o 'bloques' (si nada entra, 'bloques')
+    """
+    if presupuesto_mb is None:
+        presupuesto_mb = presupuesto_memoria_mb()
+    fijo = estimacion_odoo.memoria_mb['memoria'] if estimacion_odoo is not None else 0.0
+    for estrategia in ESTRATEGIAS:
+        if fijo + estimacion.memoria_mb[estrategia] <= presupuesto_mb:
+            return estrategia
+    return 'bloques'
+
+
+def separar_opciones(opciones: dict = None) -> tuple:
+    """
+    Separa las opciones del pipeline por etapa.
+
+    Args:
+        opciones: Argumentos de ``calcular`` y opcionalmente 'politica_duplicados',
+            'normalizar_sku' y 'equivalencias' para ``unir_y_validar`` y
+            'asignacion' (argumentos de ``asignar_stock``) y 'control_precios'
+            (argumentos de ``controlar_cambios_precio``)
+
+    Returns:
+        (argumentos de ``unir_y_validar``, asignacion o None, control o None,
+        argumentos de ``calcular``)
+    """
+    calculo = dict(opciones or {})
+    union = {
+        'politica_duplicados': calculo.pop('politica_duplicados', 'primero'),
+        'normalizar_sku': calculo.pop('normalizar_sku', False),
+        'equivalencias': calculo.pop('equivalencias', None),
+    }
+    return union, calculo.pop('asignacion', None), calculo.pop('control_precios', None), calculo
+
+
+def unir_y_repartir(df_ml, df_odoo, union: dict, asignacion: dict = None, asignado=None, desde: int = 0):
+    """
+    ``unir_y_validar`` y el reparto de stock de un bloque (o del archivo entero).
+
+    Args:
+        df_ml: Bloque de ML
+        df_odoo: DataFrame de Odoo o catálogo compilado
+        union: Argumentos de ``unir_y_validar`` (de ``separar_opciones``)
+        asignacion: Argumentos de ``asignar_stock``; se reparte solo sobre
+            este bloque (None = sin reparto)
+        asignado: Reparto de ``asignar_stock_por_bloques`` para toda la
+            corrida; tiene prioridad sobre ``asignacion``
+        desde: Posición de la primera publicación del bloque en la corrida
+
+    Returns:
+        DataFrame unido
+    """
+    from data_processor import unir_y_validar
+
+    df_merged = unir_y_validar(df_ml, df_odoo, **union)
+    if asignado is not None:
+        from asignacion_stock import aplicar_stock_asignado
+        aplicar_stock_asignado(df_merged, asignado, desde)
+    elif asignacion is not None:
+        from asignacion_stock import asignar_stock
+        asignar_stock(df_merged, **asignacion)
+    return df_merged
+
+
+def calcular_resultado(df_merged, calculo: dict, control: dict = None):
+    """
+    ``calcular`` → [``controlar_cambios_precio``] → ``preparar_resultado_final``.
+
+    Args:
+        df_merged: DataFrame unido (con el stock ya repartido si corresponde)
+        calculo: Argumentos de ``calcular`` (de ``separar_opciones``)
+        control: Argumentos de ``controlar_cambios_precio`` (None = sin control)
+
+    Returns:
+        DataFrame del resultado final
+    """
+    from data_processor import calcular, preparar_resultado_final
+
+    df_calc = calcular(df_merged, **calculo)
+    if control is not None:
+        from control_precios import controlar_cambios_precio
+        controlar_cambios_precio(df_calc, **control)
+    return preparar_resultado_final(
+        df_calc,
+        incluir_impuestos=calculo.get('incluir_impuestos', False),
+        incluir_envio=calculo.get('tipo_recargo_envio', 'Ninguno') != 'Ninguno',
+    )
+
+
+def agregar_argumentos_pipeline(parser) -> None:
+    """Agrega a un ``argparse.ArgumentParser`` las opciones del pipeline (ver ``opciones_de_argumentos``)."""
+    from data_processor import POLITICAS_DUPLICADOS
+    from asignacion_stock import REGLAS_ASIGNACION
+    from control_precios import ACCIONES_CONTROL
+
+    parser.add_argument('--base-financiacion', default='tarifa', choices=['tarifa', 'tarifa_mas_ml'])
+    parser.add_argument('--incluir-impuestos', action='store_true')
+    parser.add_argument('--tipo-recargo-envio', default='Ninguno', choices=['Ninguno', 'Fijo ($)', 'Porcentaje (%)'])
+    parser.add_argument('--valor-recargo-envio', type=float, default=0.0)
+    parser.add_argument(
+        '--politica-duplicados', default='primero', choices=list(POLITICAS_DUPLICADOS),
+        help='Fila de Odoo a usar cuando un código está repetido'
+    )
+    parser.add_argument(
+        '--normalizar-sku', action='store_true',
+        help='Vincular SKUs que solo difieren en mayúsculas, espacios, puntuación o ceros a la izquierda'
+    )
+    parser.add_argument(
+        '--asignar-stock', choices=list(REGLAS_ASIGNACION),
+        help='Repartir el stock de cada código entre sus publicaciones (ver asignacion_stock.py)'
+    )
+    parser.add_argument('--stock-seguridad', type=float, default=0, help='Unidades por código que no se publican')
+    parser.add_argument('--tope-por-publicacion', type=float, help='Máximo de stock por publicación')
+    parser.add_argument(
+        '--control-precios', choices=list(ACCIONES_CONTROL),
+        help='Marcar o retener los precios nuevos atípicos (ver control_precios.py)'
+    )
+
+
+def opciones_de_argumentos(args) -> dict:
+    """Opciones del pipeline a partir de los argumentos de ``agregar_argumentos_pipeline``."""
+    asignacion = None
+    if args.asignar_stock:
+        asignacion = {
+            'regla': args.asignar_stock,
+            'stock_seguridad': args.stock_seguridad,
+            'tope_por_publicacion': args.tope_por_publicacion,
+        }
+    return {
+        'base_financiacion': args.base_financiacion,
+        'incluir_impuestos': args.incluir_impuestos,
+        'tipo_recargo_envio': args.tipo_recargo_envio,
+        'valor_recargo_envio': args.valor_recargo_envio,
+        'politica_duplicados': args.politica_duplicados,
+        'normalizar_sku': args.normalizar_sku,
+        'asignacion': asignacion,
+        'control_precios': {'accion': args.control_precios} if args.control_precios else None,
+    }
+
+
+def procesar_por_bloques(
+    file_path_or_buffer,
+    df_odoo,
+    output_path: str,
+    opciones: dict = None,
+    formato: str = 'xlsx',
+    filas_por_bloque: int = FILAS_POR_BLOQUE_CARGA,
+    cadenas_arrow: bool = False,
+    filas_vista_previa: int = 20
+) -> dict:
+    """
+    Ejecuta el pipeline completo por bloques de ML y escribe el resultado.
+
+    Args:
+        file_path_or_buffer: Excel de MercadoLibre
+        df_odoo: DataFrame de Odoo ya leído o catálogo compilado
+        output_path: Archivo de salida
+        opciones: Argumentos de ``calcular`` y opcionalmente 'politica_duplicados',
+            'normalizar_sku' y 'equivalencias' para ``unir_y_validar`` y
+            'asignacion' (argumentos de ``asignar_stock``) y 'control_precios'
+            (argumentos de ``controlar_cambios_precio``) (mismo formato que
+            ``vigilante.procesar_archivo_ml``)
+        formato: 'xlsx', 'csv', 'parquet' o 'jsonl'
+        filas_por_bloque: Filas de ML por bloque
+        cadenas_arrow: Si guardar los textos de ML como texto Arrow
+        filas_vista_previa: Filas del resultado que se devuelven para mostrar
+
+    Returns:
+        dict con 'filas', 'encontrados', 'con_precio', 'con_advertencias' y
+        'vista_previa' (DataFrame con las primeras filas)
+    """
+    from data_processor import leer_ml_por_bloques, ESCRITORES_POR_BLOQUES
+    from asignacion_stock import asignar_stock_por_bloques
+
+    union, asignacion, control, calculo = separar_opciones(opciones)
+
+    asignado, desde = None, 0
+    if asignacion is not None:
+        # Primera pasada: el reparto no puede depender del orden de los bloques
+        asignado = asignar_stock_por_bloques(
+            (
+                unir_y_repartir(df_ml, df_odoo, union)
+                for df_ml in leer_ml_por_bloques(
+                    file_path_or_buffer, filas_por_bloque, cadenas_arrow=cadenas_arrow, columnas=['LISTING_TYPE_V3']
+                )
+            ),
+            **asignacion,
+        )
+
+    resumen = {'filas': 0, 'encontrados': 0, 'con_precio': 0, 'con_advertencias': 0, 'vista_previa': None}
+    with ESCRITORES_POR_BLOQUES[formato](output_path) as escritor:
+        for df_ml in leer_ml_por_bloques(file_path_or_buffer, filas_por_bloque, cadenas_arrow=cadenas_arrow):
+            df_merged = unir_y_repartir(df_ml, df_odoo, union, asignado=asignado, desde=desde)
+            desde += len(df_merged)
+            resumen['encontrados'] += int(df_merged['Código Neored'].notna().sum())
+            df_resultado = calcular_resultado(df_merged, calculo, control)
+            escritor.escribir(df_resultado)
+            resumen['filas'] += len(df_resultado)
+            resumen['con_precio'] += int((df_resultado['Precio final'] > 0).sum())
+            resumen['con_advertencias'] += int((df_resultado['Notas/Flags'] != '').sum())
+            if resumen['vista_previa'] is None:
+                resumen['vista_previa'] = df_resultado.head(filas_vista_previa)
+        if not resumen['filas']:
+            raise ValueError("No hay publicaciones válidas (ITEM_ID 'ML...' con SKU)")
+        escritor.cerrar()
+    return resumen
@@ -0,0 +1,247 @@
+"""
+Kits: SKUs de ML que se arman con varios productos de Odoo.
+
+La lista de materiales (``leer_lista_materiales``) tiene una fila por
+componente: 'Kit', 'Componente', 'Cantidad' y opcionalmente 'Nombre' (del
+kit). Un componente puede ser a su vez un kit. ``resolver_kits`` agrega al
+catálogo de Odoo una fila por kit, de modo que ``unir_y_validar`` y
+``calcular`` lo tratan como un producto más:
+
+- 'Precio Tarifa': suma de cantidad × tarifa de los componentes.
+- 'tax_pct': tasa ponderada por tarifa, así 'Tarifa + impuestos' es la suma
+  de las tarifas con impuestos de los componentes.
+- 'Cantidad a mano': kits que se pueden armar, el mínimo de
+  stock del componente // cantidad (nunca negativo).
+
+Antes de expandir, el grafo kit → kit se ordena por niveles (Kahn, con los
+grados de salida por ``np.bincount``): los kits en un ciclo, los que usan
+uno o los que superan ``max_niveles`` de anidamiento se descartan sin
+expandir nada. Los demás se aplanan por niveles: en cada ronda las aristas
+que apuntan a otro kit se reemplazan, todas juntas, por los componentes de
+ese kit con las cantidades multiplicadas (``np.repeat`` sobre la lista
+ordenada por kit); si la lista aplanada superaría ``MAX_ARISTAS`` filas,
+los kits que faltan expandir se descartan. Después se agrega con
+``np.bincount`` y ``np.minimum.reduceat`` sin bucles por kit. Un código que
+ya existe en Odoo se usa como producto aunque figure como kit. Los kits con
+componentes que no están en Odoo, ciclos o demasiado grandes no se agregan
+y se informan aparte.
+"""
+import numpy as np
+import pandas as pd
+
+from coincidencia_sku import _expandir
+from data_processor import resolver_duplicados_odoo
+from utils import _texto_clave
+
+COLUMNAS_LISTA_MATERIALES = ['Kit', 'Componente', 'Cantidad']
+# Niveles de anidamiento permitidos
+MAX_NIVELES = 20
+# Filas de la lista aplanada como máximo (kits anidados con muchas repeticiones)
+MAX_ARISTAS = 20_000_000
+IMPUESTOS_MIXTOS = 'Impuestos de los componentes'
+
+
+def leer_lista_materiales(archivo) -> pd.DataFrame:
+    """
+    Lee la lista de materiales de los kits (xlsx o csv).
+
+    Args:
+        archivo: Ruta o archivo subido; se lee como CSV si el nombre termina en .csv
+
+    Returns:
+        DataFrame con 'Kit', 'Componente', 'Cantidad' (y 'Nombre' si está)
+    """
+    nombre = str(getattr(archivo, 'name', archivo)).lower()
+    tipos = {'Kit': str, 'Componente': str}
+    if nombre.endswith('.csv'):
+        tabla = pd.read_csv(archivo, dtype=tipos)
+    else:
+        tabla = pd.read_excel(archivo, dtype=tipos)
+    faltantes = [col for col in COLUMNAS_LISTA_MATERIALES if col not in tabla.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en la lista de materiales: {', '.join(faltantes)}")
+    return tabla
+
+
+def _anotar_motivo(motivos: np.ndarray, kits: np.ndarray, prefijo: str, componentes: np.ndarray) -> None:
+    """Anota a cada kit sin motivo el primero de sus componentes con problemas."""
+    primeros = ~pd.Series(kits).duplicated().to_numpy()
+    kits, componentes = kits[primeros], componentes[primeros]
+    libres = pd.isna(motivos[kits])
+    motivos[kits[libres]] = prefijo + componentes[libres].astype(str).astype(object)
+
+
+def _niveles_kits(padres: np.ndarray, hijos: np.ndarray, n_kits: int) -> np.ndarray:
+    """
+    Nivel de cada kit en el grafo kit → kit (1 = solo productos de Odoo).
+
+    Kahn por rondas: un kit queda listo cuando todos sus kits componentes lo
+    están; cada ronda solo recorre las aristas que llegan a los recién listos.
+
+    Returns:
+        Array con el nivel de cada kit; -1 si está en un ciclo o usa uno
+    """
+    pares = np.unique(padres.astype(np.int64) * n_kits + hijos)
+    padres, hijos = pares // n_kits, pares % n_kits
+    pendientes = np.bincount(padres, minlength=n_kits)
+    # Aristas ordenadas por kit hijo: las que llegan a cada kit quedan contiguas
+    entrantes = np.argsort(hijos, kind='stable')
+    inicio = np.concatenate(([0], np.cumsum(np.bincount(hijos, minlength=n_kits))))
+    nivel = np.full(n_kits, -1, dtype=np.int64)
+    listos, ronda = np.flatnonzero(pendientes == 0), 1
+    while len(listos):
+        nivel[listos] = ronda
+        padres_listos = padres[entrantes[_expandir(inicio[listos], inicio[listos + 1] - inicio[listos])]]
+        pendientes -= np.bincount(padres_listos, minlength=n_kits)
+        candidatos = np.unique(padres_listos)
+        listos, ronda = candidatos[pendientes[candidatos] == 0], ronda + 1
+    return nivel
+
+
+def resolver_kits(
+    df_odoo: pd.DataFrame,
+    lista_materiales: pd.DataFrame,
+    max_niveles: int = MAX_NIVELES,
+    max_aristas: int = MAX_ARISTAS
+):
+    """
+    Agrega al catálogo de Odoo una fila por kit con tarifa, impuestos y stock.
+
+    Args:
+        df_odoo: DataFrame de ``leer_odoo`` (si un código está repetido se usa
+            la primera fila)
+        lista_materiales: DataFrame de ``leer_lista_materiales``
+        max_niveles: Niveles de anidamiento permitidos
+        max_aristas: Filas de la lista aplanada como máximo
+
+    Returns:
+        (DataFrame de Odoo con los kits al final, DataFrame con 'Kit' y
+        'Motivo' de los kits que no se pudieron resolver)
+    """
+    bom = lista_materiales.dropna(subset=['Kit', 'Componente'])
+    kit_texto = np.array([_texto_clave(v) for v in bom['Kit']], dtype=object)
+    comp_texto = np.array([_texto_clave(v) for v in bom['Componente']], dtype=object)
+    cantidad = pd.to_numeric(bom['Cantidad'], errors='coerce').to_numpy(dtype=float)
+
+    catalogo, _ = resolver_duplicados_odoo(df_odoo, 'primero')
+    indice_odoo = pd.Index([_texto_clave(v) for v in catalogo['Código Neored']])
+
+    # Kits: los códigos de la lista que no son productos de Odoo
+    es_kit = indice_odoo.get_indexer(kit_texto) < 0
+    kits = pd.unique(kit_texto[es_kit])
+    indice_kits = pd.Index(kits)
+    n_kits = len(kits)
+    motivos = np.full(n_kits, None, dtype=object)
+
+    kit = indice_kits.get_indexer(kit_texto[es_kit])
+    comp_texto = comp_texto[es_kit]
+    cantidad = cantidad[es_kit]
+    invalida = ~(cantidad > 0)
+    cantidad = np.where(invalida, 0.0, cantidad)
+    _anotar_motivo(motivos, kit[invalida], 'Cantidad inválida del componente ', comp_texto[invalida])
+
+    # Cada arista apunta a un producto de Odoo (hoja) o a otro kit
+    hoja = indice_odoo.get_indexer(comp_texto)
+    hijo = np.where(hoja < 0, indice_kits.get_indexer(comp_texto), -1)
+
+    # Ciclos y anidamiento excesivo: se descartan antes de expandir
+    anidadas = hijo >= 0
+    nivel = _niveles_kits(kit[anidadas], hijo[anidadas], n_kits)
+    en_ciclo = (nivel < 0) & pd.isna(motivos)
+    motivos[en_ciclo] = 'Ciclo en la lista de materiales (en el kit o en un kit componente)'
+    profundo = (nivel - 1 > max_niveles) & pd.isna(motivos)
+    motivos[profundo] = f'Más de {max_niveles} niveles de kits anidados'
+    expandible = (nivel > 0) & (nivel - 1 <= max_niveles)
+
+    # Aristas originales ordenadas por kit, para expandir los anidados
+    orden = np.argsort(kit, kind='stable')
+    aristas_por_kit = np.bincount(kit, minlength=n_kits)
+    inicio_kit = np.concatenate(([0], np.cumsum(aristas_por_kit)[:-1]))
+
+    validas = np.flatnonzero(expandible[kit])
+    padre, arista, factor = kit[validas], validas, cantidad[validas]
+    while True:
+        anidada = hijo[arista] >= 0
+        if not anidada.any():
+            break
+        hijos = hijo[arista[anidada]]
+        repeticiones = aristas_por_kit[hijos]
+        if len(arista) - anidada.sum() + repeticiones.sum() > max_aristas:
+            grandes = np.unique(padre[anidada])
+            motivos[grandes[pd.isna(motivos[grandes])]] = (
+                f'Lista de materiales demasiado grande (más de {max_aristas} componentes al expandir)'
+            )
+            quedan = ~np.isin(padre, grandes)
+            padre, arista, factor = padre[quedan], arista[quedan], factor[quedan]
+            break
+        nuevas = orden[_expandir(inicio_kit[hijos], repeticiones)]
+        padre = np.concatenate((padre[~anidada], np.repeat(padre[anidada], repeticiones)))
+        factor = np.concatenate((factor[~anidada], np.repeat(factor[anidada], repeticiones) * cantidad[nuevas]))
+        arista = np.concatenate((arista[~anidada], nuevas))
+
+    hojas = hoja[arista]
+    faltante = hojas < 0
+    _anotar_motivo(motivos, padre[faltante], 'Componente sin producto en Odoo: ', comp_texto[arista[faltante]])
+
+    # Agregado por kit sobre las aristas aplanadas
+    tarifa_odoo = pd.to_numeric(catalogo['Precio Tarifa'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    tax_odoo = pd.to_numeric(catalogo['tax_pct'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    stock_odoo = pd.to_numeric(catalogo['Cantidad a mano'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    padre, factor, hojas = padre[~faltante], factor[~faltante], hojas[~faltante]
+
+    tarifa_linea = factor * tarifa_odoo[hojas]
+    tarifa = np.bincount(padre, weights=tarifa_linea, minlength=n_kits)
+    impuestos = np.bincount(padre, weights=tarifa_linea * tax_odoo[hojas], minlength=n_kits)
+    tax_pct = np.divide(impuestos, tarifa, out=np.zeros(n_kits), where=tarifa > 0)
+
+    # Mínimos y máximos por kit sobre las aristas ordenadas por kit
+    armables = np.full(n_kits, np.inf)
+    texto_impuestos = np.full(n_kits, IMPUESTOS_MIXTOS, dtype=object)
+    if len(padre):
+        orden_padre = np.argsort(padre, kind='stable')
+        padre_ordenado = padre[orden_padre]
+        cortes = np.flatnonzero(np.r_[True, padre_ordenado[1:] != padre_ordenado[:-1]])
+        con_aristas = padre_ordenado[cortes]
+
+        # Stock: cantidad total de cada producto por kit (un producto puede venir de
+        # varias líneas o de varios kits anidados); los pares quedan ordenados por kit
+        n_productos = len(catalogo)
+        pares, par_de_arista = np.unique(padre.astype(np.int64) * n_productos + hojas, return_inverse=True)
+        cantidad_par = np.bincount(par_de_arista, weights=factor, minlength=len(pares))
+        padre_par = pares // n_productos
+        por_producto = np.floor(stock_odoo[pares % n_productos] / np.where(cantidad_par > 0, cantidad_par, np.inf))
+        cortes_par = np.flatnonzero(np.r_[True, padre_par[1:] != padre_par[:-1]])
+        armables[padre_par[cortes_par]] = np.minimum.reduceat(por_producto, cortes_par)
+
+        # Texto de impuestos: el del primer componente si todos tienen la misma tasa
+        if 'Impuestos del cliente' in catalogo.columns:
+            tax_linea = tax_odoo[hojas][orden_padre]
+            uniforme = np.minimum.reduceat(tax_linea, cortes) == np.maximum.reduceat(tax_linea, cortes)
+            primero = hojas[orden_padre][cortes]
+            texto_impuestos[con_aristas[uniforme]] = (
+                catalogo['Impuestos del cliente'].to_numpy(dtype=object)[primero[uniforme]]
+            )
+    sin_componentes = ~np.isfinite(armables)
+    motivos[sin_componentes & pd.isna(motivos)] = 'Kit sin componentes'
+    armables = np.maximum(np.where(sin_componentes, 0, armables), 0)
+
+    resueltos = pd.isna(motivos)
+    nombres = pd.Series([f'Kit {k}' for k in kits], dtype=object)
+    if 'Nombre' in lista_materiales.columns:
+        dados = (
+            pd.Series(lista_materiales['Nombre'].to_numpy(), index=[_texto_clave(v) for v in lista_materiales['Kit']])
+            .dropna()
+        )
+        dados = dados[~dados.index.duplicated()]
+        nombres = pd.Series(dados.reindex(kits).to_numpy(), dtype=object).fillna(nombres)
+
+    df_kits = pd.DataFrame({
+        'Código Neored': kits[resueltos],
+        'Nombre': nombres.to_numpy()[resueltos],
+        'Cantidad a mano': armables[resueltos].astype(int),
+        'Precio Tarifa': np.round(tarifa[resueltos], 2),
+        'Impuestos del cliente': texto_impuestos[resueltos],
+        'tax_pct': tax_pct[resueltos],
+    })
+    no_resueltos = pd.DataFrame({'Kit': kits[~resueltos], 'Motivo': motivos[~resueltos]})
+    return pd.concat([df_odoo, df_kits], ignore_index=True), no_resueltos
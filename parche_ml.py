@@ -0,0 +1,283 @@
+"""
+Actualiza PRICE y QUANTITY en el mismo Excel de MercadoLibre que se descargó.
+
+Lo que se sube a ML es el libro ``cambiodeprecios`` original con los precios
+y el stock editados. ``actualizar_libro_ml`` copia el .xlsx entrada por
+entrada y solo reescribe la hoja de publicaciones: el XML se recorre en
+trozos, fila por fila, y las filas que no cambian se copian byte a byte. En
+las filas con coincidencia se reemplaza solo el ``<c>`` de PRICE y/o
+QUANTITY, conservando el estilo de la celda. Estilos, validaciones, otras
+hojas y propiedades del libro quedan intactos.
+
+Cada publicación del resultado se ubica por (ITEM_ID, SKU) y, si el par se
+repite, por orden de aparición, que es el mismo de ``leer_ml``. Se actualiza:
+
+- PRICE: con 'Precio final' si el SKU está en Odoo y el precio es > 0.
+- QUANTITY: con 'Stock' si el SKU está en Odoo y no falta el stock.
+
+Las celdas con fórmula no se tocan. Solo usa la biblioteca estándar: no
+carga pandas ni openpyxl.
+"""
+import html
+import io
+import re
+import shutil
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import defaultdict, deque
+
+from utils import _NS_XLSX, _ruta_hoja_xlsx, _posicion_columna, _texto_clave, HOJA_POR_TIPO
+
+TAMANO_TROZO = 1 << 20
+# Notas de ``unir_y_validar`` que impiden actualizar cada campo
+NOTA_SIN_ODOO = 'SKU no encontrado en Odoo'
+NOTA_SIN_STOCK = 'Stock faltante'
+
+_CELDA = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_REFERENCIA = re.compile(rb'\br="([A-Z]+)\d*"')
+_TIPO = re.compile(rb'\bt="([^"]*)"')
+_ESTILO = re.compile(rb'\bs="[^"]*"')
+_VALOR = re.compile(rb'<v>(.*?)</v>', re.S)
+_TEXTO = re.compile(rb'<t\b[^>]*>(.*?)</t>', re.S)
+_FILA = re.compile(rb'\br="(\d+)"')
+_INICIO_FILA = re.compile(rb'<row[\s>/]')
+
+
+def _leer_compartidas(z: zipfile.ZipFile) -> list:
+    """Cadenas compartidas del libro (texto plano de cada ``<si>``)."""
+    compartidas = []
+    if 'xl/sharedStrings.xml' not in z.namelist():
+        return compartidas
+    with z.open('xl/sharedStrings.xml') as f:
+        for evento, elem in ET.iterparse(f, events=('end',)):
+            if elem.tag == f'{_NS_XLSX}si':
+                compartidas.append(''.join(t.text or '' for t in elem.iter(f'{_NS_XLSX}t')))
+                elem.clear()
+    return compartidas
+
+
+_COLUMNA_POR_LETRAS = {}
+
+
+def _celdas(fila: bytes):
+    """(columna, inicio, fin, atributos, contenido) de cada ``<c>`` de una fila."""
+    columna = 0
+    for m in _CELDA.finditer(fila):
+        referencia = _REFERENCIA.search(m.group(1))
+        if referencia:
+            letras = referencia.group(1)
+            columna = _COLUMNA_POR_LETRAS.get(letras)
+            if columna is None:
+                columna = _COLUMNA_POR_LETRAS[letras] = _posicion_columna(letras.decode())
+        else:
+            columna += 1
+        yield columna, m.start(), m.end(), m.group(1), m.group(2) or b''
+
+
+def _clave_fila(fila: bytes, columna_item: int, columna_sku: int, compartidas: list) -> tuple:
+    """(ITEM_ID, SKU) de una fila; deja de leer celdas después de la última de las dos."""
+    ultima = max(columna_item, columna_sku)
+    valores = {}
+    for columna, _, _, atributos, contenido in _celdas(fila):
+        if columna > ultima:
+            break
+        if columna == columna_item or columna == columna_sku:
+            valores[columna] = _valor_celda(atributos, contenido, compartidas)
+    return valores.get(columna_item, ''), valores.get(columna_sku, '')
+
+
+def _valor_celda(atributos: bytes, contenido: bytes, compartidas: list) -> str:
+    tipo = _TIPO.search(atributos)
+    tipo = tipo.group(1) if tipo else b'n'
+    if tipo == b'inlineStr':
+        return html.unescape(b''.join(_TEXTO.findall(contenido)).decode('utf-8')).strip()
+    valor = _VALOR.search(contenido)
+    if valor is None:
+        return ''
+    texto = valor.group(1).decode('utf-8')
+    if '&' in texto:
+        texto = html.unescape(texto)
+    if tipo == b's':
+        return compartidas[int(texto)].strip()
+    if tipo == b'n':
+        try:
+            return _texto_clave(float(texto))
+        except ValueError:
+            pass
+    return texto.strip()
+
+
+def _cambios_por_publicacion(df_resultado, actualizar_precio: bool, actualizar_stock: bool) -> dict:
+    """{(ITEM_ID, SKU): deque de (precio o None, stock o None)} en el orden del resultado."""
+    cambios = defaultdict(deque)
+    columnas = zip(
+        df_resultado['Numero de publicación'].tolist(),
+        df_resultado['SKU'].tolist(),
+        df_resultado['Precio final'].tolist(),
+        df_resultado['Stock'].tolist(),
+        df_resultado['Notas/Flags'].tolist(),
+    )
+    for item, sku, precio, stock, notas in columnas:
+        notas = notas or ''
+        en_odoo = NOTA_SIN_ODOO not in notas
+        nuevo_precio = round(float(precio), 2) if actualizar_precio and en_odoo and precio > 0 else None
+        nuevo_stock = int(stock) if actualizar_stock and en_odoo and NOTA_SIN_STOCK not in notas else None
+        cambios[(_texto_clave(item), _texto_clave(sku))].append((nuevo_precio, nuevo_stock))
+    return cambios
+
+
+def _nueva_celda(columna: int, numero: bytes, valor: str, atributos: bytes = b'') -> bytes:
+    """``<c>`` numérico en la columna/fila indicada, con el estilo de ``atributos``."""
+    estilo = _ESTILO.search(atributos)
+    letras = ''
+    while columna:
+        columna, resto = divmod(columna - 1, 26)
+        letras = chr(65 + resto) + letras
+    return (
+        b'<c r="' + letras.encode() + numero + b'"' + (b' ' + estilo.group(0) if estilo else b'')
+        + b'><v>' + valor.encode() + b'</v></c>'
+    )
+
+
+def _reemplazar_celdas(fila: bytes, numero: bytes, nuevos: dict, celdas) -> tuple:
+    """
+    Reescribe en ``fila`` las celdas de ``nuevos`` {columna: texto numérico}.
+
+    ``celdas`` es ``_celdas(fila)``; se deja de recorrer al terminar los cambios.
+
+    Returns:
+        (fila nueva, columnas efectivamente cambiadas)
+    """
+    partes, cambiadas, cursor = [], set(), 0
+    pendientes = dict(nuevos)
+    for columna, inicio, fin, atributos, contenido in celdas:
+        if not pendientes:
+            break
+        # Celdas que faltan en la fila: se insertan antes de la columna siguiente
+        while pendientes and min(pendientes) < columna:
+            faltante = min(pendientes)
+            partes += [fila[cursor:inicio], _nueva_celda(faltante, numero, pendientes.pop(faltante))]
+            cursor = inicio
+            cambiadas.add(faltante)
+        if columna in pendientes:
+            valor = pendientes.pop(columna)
+            if b'<f' in contenido:
+                continue
+            partes += [fila[cursor:inicio], _nueva_celda(columna, numero, valor, atributos)]
+            cursor = fin
+            cambiadas.add(columna)
+    if pendientes:
+        cierre = fila.rindex(b'</row>')
+        partes.append(fila[cursor:cierre])
+        partes += [_nueva_celda(faltante, numero, pendientes[faltante]) for faltante in sorted(pendientes)]
+        cambiadas.update(pendientes)
+        cursor = cierre
+    partes.append(fila[cursor:])
+    return b''.join(partes), cambiadas
+
+
+def _filas(origen):
+    """Parte el XML de la hoja en (texto previo, ``<row>`` completo) leyendo de a trozos."""
+    buffer, pos, fin_archivo = b'', 0, False
+    while True:
+        m = _INICIO_FILA.search(buffer, pos)
+        if m:
+            cierre_etiqueta = buffer.find(b'>', m.start())
+            fin = -1
+            if cierre_etiqueta != -1:
+                if buffer[cierre_etiqueta - 1:cierre_etiqueta] == b'/':
+                    fin = cierre_etiqueta + 1
+                else:
+                    cierre = buffer.find(b'</row>', cierre_etiqueta)
+                    fin = cierre + len(b'</row>') if cierre != -1 else -1
+            if fin != -1:
+                yield buffer[pos:m.start()], buffer[m.start():fin]
+                pos = fin
+                continue
+        if fin_archivo:
+            yield buffer[pos:], None
+            return
+        trozo = origen.read(TAMANO_TROZO)
+        fin_archivo = not trozo
+        buffer = buffer[pos:] + trozo
+        pos = 0
+
+
+def _parchar_hoja(origen, salida, cambios: dict, compartidas: list, resumen: dict) -> None:
+    """Copia el XML de la hoja de ``origen`` a ``salida`` aplicando ``cambios``."""
+    columnas = None
+    partes, tamano = [], 0
+    for previo, fila in _filas(origen):
+        partes.append(previo)
+        tamano += len(previo)
+        if fila is not None:
+            if columnas is None:
+                # Primera fila: encabezados
+                columnas = {_valor_celda(a, c, compartidas): col for col, _, _, a, c in _celdas(fila)}
+                faltantes = [n for n in ('ITEM_ID', 'SKU', 'PRICE', 'QUANTITY') if n not in columnas]
+                if faltantes:
+                    raise ValueError(f"Error en estructura ML: faltan columnas {', '.join(faltantes)}")
+            elif fila.endswith(b'</row>'):
+                pendientes = cambios.get(_clave_fila(fila, columnas['ITEM_ID'], columnas['SKU'], compartidas))
+                if pendientes:
+                    precio, stock = pendientes.popleft()
+                    nuevos = {}
+                    if precio is not None:
+                        nuevos[columnas['PRICE']] = repr(precio)
+                    if stock is not None:
+                        nuevos[columnas['QUANTITY']] = str(stock)
+                    if nuevos:
+                        numero = _FILA.search(fila[:fila.index(b'>')])
+                        fila, cambiadas = _reemplazar_celdas(
+                            fila, numero.group(1) if numero else b'', nuevos, _celdas(fila)
+                        )
+                        resumen['precios'] += columnas['PRICE'] in cambiadas
+                        resumen['stock'] += columnas['QUANTITY'] in cambiadas
+                    else:
+                        resumen['sin_cambios'] += 1
+            partes.append(fila)
+            tamano += len(fila)
+        if tamano >= TAMANO_TROZO or fila is None:
+            salida.write(b''.join(partes))
+            partes, tamano = [], 0
+
+
+def actualizar_libro_ml(
+    archivo_ml,
+    df_resultado,
+    output_path=None,
+    actualizar_precio: bool = True,
+    actualizar_stock: bool = True
+) -> dict:
+    """
+    Escribe 'Precio final' y 'Stock' en el Excel de ML original.
+
+    Args:
+        archivo_ml: Excel de MercadoLibre descargado (ruta o archivo binario)
+        df_resultado: DataFrame de ``preparar_resultado_final`` para ese archivo
+        output_path: Archivo de salida; None devuelve los bytes en 'datos'
+        actualizar_precio: Si reescribir PRICE
+        actualizar_stock: Si reescribir QUANTITY
+
+    Returns:
+        dict con 'precios' y 'stock' (celdas actualizadas), 'sin_cambios'
+        (publicaciones del resultado que no se tocaron) y 'datos' (bytes o None)
+    """
+    cambios = _cambios_por_publicacion(df_resultado, actualizar_precio, actualizar_stock)
+    resumen = {'precios': 0, 'stock': 0, 'sin_cambios': 0, 'datos': None}
+    destino = io.BytesIO() if output_path is None else output_path
+
+    with zipfile.ZipFile(archivo_ml) as zin, zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as zout:
+        ruta_hoja = _ruta_hoja_xlsx(zin, HOJA_POR_TIPO['ml'])
+        compartidas = _leer_compartidas(zin)
+        for info in zin.infolist():
+            with zin.open(info) as origen, zout.open(info, 'w', force_zip64=info.file_size > 2**30) as salida:
+                if info.filename != ruta_hoja:
+                    shutil.copyfileobj(origen, salida, TAMANO_TROZO)
+                    continue
+                _parchar_hoja(origen, salida, cambios, compartidas, resumen)
+
+    resumen['sin_cambios'] += sum(len(pendientes) for pendientes in cambios.values())
+    if output_path is None:
+        resumen['datos'] = destino.getvalue()
+    return resumen
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Procesamiento particionado por hash de SKU para exportaciones muy grandes.
+
+Cuando una exportación consolidada de ML no entra cómoda en un proceso, se
+divide en N particiones por hash de la clave de unión. Todas las
+publicaciones de un SKU y todas las filas de Odoo de ese código caen en la
+misma partición, así que el join, los duplicados de Odoo, la marca 'SKU
+repetido' y el reparto de stock son locales y dan lo mismo que sobre el
+archivo entero.
+
+Tres etapas que comparten un directorio:
+
+1. ``dividir``: lee ML y Odoo por bloques (``leer_ml_por_bloques`` /
+   ``leer_odoo_por_bloques``) y escribe cada bloque repartido en
+   ``particion_NNN/``, junto con ``plan.json`` (particiones y opciones).
+   Cada publicación lleva su posición en el archivo original.
+2. ``procesar``: ``unir_y_validar`` → [``asignar_stock``] → ``calcular`` →
+   [``controlar_cambios_precio``] → ``preparar_resultado_final`` sobre una
+   partición (las estadísticas del control de precios son de la partición,
+   como en los bloques de ``estrategia_carga``). Cada partición es
+   independiente: pueden correrlas procesos locales (``procesar_particionado``)
+   o máquinas distintas que vean el mismo directorio.
+3. ``combinar``: junta los resultados en el orden del archivo original.
+
+El hash es ``pd.util.hash_array`` sobre el texto de la clave, estable entre
+procesos y máquinas. Con ``normalizar_sku`` se particiona por la clave
+normalizada y con ``equivalencias`` por el código equivalente, para que esos
+vínculos también queden dentro de la partición. La división es secuencial
+(el .xlsx se lee de principio a fin); lo que escala con los workers es el
+join, el cálculo y la escritura de cada partición.
+
+Los bloques intermedios son pickles de pandas, como los puntos de control de
+``reanudable`` (misma advertencia sobre el directorio de trabajo).
+
+Uso:
+    python particionado.py dividir ML.xlsx Odoo.xlsx trabajo/ --particiones 8 [--incluir-impuestos]
+    python particionado.py procesar trabajo/ --particion 3      (en cada worker)
+    python particionado.py combinar trabajo/ salida.xlsx
+    python particionado.py todo ML.xlsx Odoo.xlsx trabajo/ salida.xlsx --particiones 8 --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+import pandas as pd
+
+from data_processor import (
+    leer_ml_por_bloques,
+    leer_odoo_por_bloques,
+    exportar,
+    COLUMNAS_ODOO_UNION,
+    FORMATOS_EXPORTACION,
+)
+from estrategia_carga import (
+    separar_opciones,
+    unir_y_repartir,
+    calcular_resultado,
+    agregar_argumentos_pipeline,
+    opciones_de_argumentos,
+)
+from coincidencia_sku import normalizar_sku as clave_normalizada
+from utils import _texto_clave
+
+ARCHIVO_PLAN = 'plan.json'
+ARCHIVO_RESULTADO = 'resultado.pkl'
+COLUMNA_POSICION = '_posicion'
+
+
+def _carpeta_particion(directorio, indice: int) -> Path:
+    return Path(directorio) / f"particion_{indice:03d}"
+
+
+def particion_por_clave(claves, n_particiones: int, normalizar: bool = False,
+                        equivalencias: dict = None) -> np.ndarray:
+    """
+    Partición de cada clave (SKU de ML o código de Odoo).
+
+    Args:
+        claves: SKUs o códigos
+        n_particiones: Cantidad de particiones
+        normalizar: Si particionar por la clave normalizada (``normalizar_sku``)
+        equivalencias: dict {SKU de ML: Código Neored}; los SKUs se
+            particionan por su código equivalente
+
+    Returns:
+        Array de enteros en [0, n_particiones)
+    """
+    claves = pd.Series(claves, dtype=object).reset_index(drop=True)
+    if equivalencias:
+        equivalentes = claves.astype(str).map({str(k): v for k, v in equivalencias.items()})
+        claves = equivalentes.where(equivalentes.notna() & claves.notna(), claves)
+    if normalizar:
+        normalizadas = clave_normalizada(claves)
+        claves = normalizadas.where(normalizadas.notna(), claves)
+    # Un texto por valor distinto: el hash no depende del dtype de cada bloque
+    codigos, unicos = pd.factorize(claves)
+    textos = np.array([_texto_clave(v) for v in unicos] + [''], dtype=object)
+    hashes = pd.util.hash_array(textos[codigos], categorize=False)
+    return (hashes % np.uint64(n_particiones)).astype(np.int64)
+
+
+def _repartir(df: pd.DataFrame, particiones: np.ndarray, directorio, nombre: str) -> None:
+    """Escribe las filas de ``df`` de cada partición en ``particion_NNN/nombre``."""
+    orden = np.argsort(particiones, kind='stable')
+    presentes, inicios = np.unique(particiones[orden], return_index=True)
+    limites = np.append(inicios, len(orden))
+    for indice, inicio, fin in zip(presentes, limites[:-1], limites[1:]):
+        df.take(orden[inicio:fin]).to_pickle(_carpeta_particion(directorio, int(indice)) / nombre)
+
+
+def dividir(
+    archivo_ml,
+    archivo_odoo,
+    directorio,
+    n_particiones: int,
+    opciones: dict = None,
+    filas_por_bloque: int = None
+) -> dict:
+    """
+    Reparte ML y Odoo en particiones por hash de SKU.
+
+    Args:
+        archivo_ml: Excel de MercadoLibre
+        archivo_odoo: Excel de Odoo
+        directorio: Directorio de trabajo (se crea; no debe tener particiones previas)
+        n_particiones: Cantidad de particiones
+        opciones: Argumentos de ``calcular`` y opcionalmente 'politica_duplicados',
+            'normalizar_sku', 'equivalencias', 'asignacion' y 'control_precios'
+            (mismo formato que ``estrategia_carga.procesar_por_bloques``); se
+            guardan en ``plan.json``
+        filas_por_bloque: Filas de la hoja por bloque de lectura
+
+    Returns:
+        El contenido de ``plan.json`` con 'filas_ml' y 'filas_odoo' por partición
+    """
+    if n_particiones < 1:
+        raise ValueError("n_particiones debe ser al menos 1")
+    opciones = dict(opciones or {})
+    normalizar = opciones.get('normalizar_sku', False)
+    equivalencias = opciones.get('equivalencias')
+    directorio = Path(directorio)
+    if (directorio / ARCHIVO_PLAN).exists():
+        raise ValueError(f"{directorio} ya tiene particiones; usar un directorio vacío")
+    for indice in range(n_particiones):
+        _carpeta_particion(directorio, indice).mkdir(parents=True, exist_ok=True)
+
+    filas_ml = np.zeros(n_particiones, dtype=np.int64)
+    filas_odoo = np.zeros(n_particiones, dtype=np.int64)
+    posicion = 0
+    for numero, df_ml in enumerate(leer_ml_por_bloques(archivo_ml, filas_por_bloque)):
+        df_ml[COLUMNA_POSICION] = np.arange(posicion, posicion + len(df_ml))
+        posicion += len(df_ml)
+        particiones = particion_por_clave(df_ml['SKU'], n_particiones, normalizar, equivalencias)
+        _repartir(df_ml, particiones, directorio, f"ml_{numero:05d}.pkl")
+        filas_ml += np.bincount(particiones, minlength=n_particiones)
+    if not posicion:
+        raise ValueError("No hay publicaciones válidas (ITEM_ID 'ML...' con SKU)")
+
+    for numero, df_odoo in enumerate(leer_odoo_por_bloques(archivo_odoo, filas_por_bloque)):
+        particiones = particion_por_clave(df_odoo['Código Neored'], n_particiones, normalizar)
+        _repartir(df_odoo, particiones, directorio, f"odoo_{numero:05d}.pkl")
+        filas_odoo += np.bincount(particiones, minlength=n_particiones)
+
+    plan = {
+        'particiones': n_particiones,
+        'opciones': opciones,
+        'filas_ml': filas_ml.tolist(),
+        'filas_odoo': filas_odoo.tolist(),
+    }
+    (directorio / ARCHIVO_PLAN).write_text(json.dumps(plan, ensure_ascii=False, indent=2), encoding='utf-8')
+    return plan
+
+
+def leer_plan(directorio) -> dict:
+    """Lee el ``plan.json`` que escribió ``dividir``."""
+    ruta = Path(directorio) / ARCHIVO_PLAN
+    if not ruta.exists():
+        raise ValueError(f"{directorio} no tiene {ARCHIVO_PLAN}; correr 'dividir' primero")
+    return json.loads(ruta.read_text(encoding='utf-8'))
+
+
+def _leer_bloques(carpeta: Path, prefijo: str):
+    bloques = [pd.read_pickle(ruta) for ruta in sorted(carpeta.glob(f"{prefijo}_*.pkl"))]
+    if not bloques:
+        return None
+    return pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else bloques[0]
+
+
+def procesar_particion(directorio, indice: int) -> int:
+    """
+    Ejecuta el pipeline sobre una partición y deja ``resultado.pkl`` en su carpeta.
+
+    Args:
+        directorio: Directorio de trabajo de ``dividir``
+        indice: Número de partición (0 a particiones - 1)
+
+    Returns:
+        Filas del resultado (0 si la partición no tiene publicaciones)
+    """
+    plan = leer_plan(directorio)
+    if not 0 <= indice < plan['particiones']:
+        raise ValueError(f"Partición fuera de rango: {indice} (hay {plan['particiones']})")
+    carpeta = _carpeta_particion(directorio, indice)
+    df_ml = _leer_bloques(carpeta, 'ml')
+    if df_ml is None:
+        return 0
+    df_odoo = _leer_bloques(carpeta, 'odoo')
+    if df_odoo is None:
+        df_odoo = pd.DataFrame(columns=COLUMNAS_ODOO_UNION)
+
+    union, asignacion, control, calculo = separar_opciones(plan['opciones'])
+
+    posiciones = df_ml.pop(COLUMNA_POSICION).to_numpy()
+    df_merged = unir_y_repartir(df_ml, df_odoo, union, asignacion)
+    del df_ml, df_odoo
+    df_resultado = calcular_resultado(df_merged, calculo, control)
+    # ``unir_y_validar`` conserva el orden de ML: la posición original va como índice
+    df_resultado.index = posiciones
+
+    # Nombre temporal + rename: un resultado a medio escribir nunca se combina
+    temporal = carpeta / f".{ARCHIVO_RESULTADO}.tmp"
+    df_resultado.to_pickle(temporal)
+    os.replace(temporal, carpeta / ARCHIVO_RESULTADO)
+    return len(df_resultado)
+
+
+def combinar(directorio, output_path=None, formato: str = 'xlsx') -> pd.DataFrame:
+    """
+    Junta los resultados de las particiones en el orden del archivo original.
+
+    Args:
+        directorio: Directorio de trabajo de ``dividir``
+        output_path: Si se indica, exporta el resultado ahí (en streaming)
+        formato: 'xlsx', 'csv', 'parquet' o 'jsonl'
+
+    Returns:
+        DataFrame igual al de procesar el archivo entero
+    """
+    plan = leer_plan(directorio)
+    resultados = []
+    for indice in range(plan['particiones']):
+        if not plan['filas_ml'][indice]:
+            continue
+        ruta = _carpeta_particion(directorio, indice) / ARCHIVO_RESULTADO
+        if not ruta.exists():
+            raise ValueError(f"Falta procesar la partición {indice}")
+        resultados.append(pd.read_pickle(ruta))
+    df_resultado = pd.concat(resultados) if len(resultados) > 1 else resultados[0]
+    df_resultado = df_resultado.sort_index(kind='stable').reset_index(drop=True)
+    if output_path is not None:
+        exportar(df_resultado, formato, output_path=str(output_path), por_bloques=True)
+    return df_resultado
+
+
+def procesar_particionado(
+    archivo_ml,
+    archivo_odoo,
+    directorio,
+    n_particiones: int = None,
+    workers: int = None,
+    opciones: dict = None,
+    output_path=None,
+    formato: str = 'xlsx'
+) -> pd.DataFrame:
+    """
+    Divide, procesa las particiones en procesos locales y combina.
+
+    Args:
+        archivo_ml: Excel de MercadoLibre
+        archivo_odoo: Excel de Odoo
+        directorio: Directorio de trabajo
+        n_particiones: Cantidad de particiones (por defecto, ``workers``)
+        workers: Procesos en paralelo (por defecto, la cantidad de CPUs); con
+            1 todo corre en este proceso
+        opciones: Como en ``dividir``
+        output_path: Archivo de salida (opcional)
+        formato: Formato de salida
+
+    Returns:
+        DataFrame de ``combinar``
+    """
+    workers = workers or os.cpu_count() or 1
+    n_particiones = n_particiones or workers
+    dividir(archivo_ml, archivo_odoo, directorio, n_particiones, opciones)
+    if workers == 1:
+        for indice in range(n_particiones):
+            procesar_particion(directorio, indice)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(procesar_particion, [str(directorio)] * n_particiones, range(n_particiones)))
+    return combinar(directorio, output_path, formato)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    def _opciones_pipeline(p):
+        p.add_argument('--particiones', type=int, default=os.cpu_count() or 1)
+        agregar_argumentos_pipeline(p)
+
+    p_dividir = subparsers.add_parser('dividir', help='Repartir ML y Odoo en particiones')
+    p_dividir.add_argument('ml')
+    p_dividir.add_argument('odoo')
+    p_dividir.add_argument('directorio')
+    _opciones_pipeline(p_dividir)
+
+    p_procesar = subparsers.add_parser('procesar', help='Procesar una partición')
+    p_procesar.add_argument('directorio')
+    p_procesar.add_argument('--particion', type=int, required=True)
+
+    p_combinar = subparsers.add_parser('combinar', help='Juntar los resultados')
+    p_combinar.add_argument('directorio')
+    p_combinar.add_argument('salida')
+    p_combinar.add_argument('--formato', default='xlsx', choices=list(FORMATOS_EXPORTACION))
+
+    p_todo = subparsers.add_parser('todo', help='Dividir, procesar con procesos locales y combinar')
+    p_todo.add_argument('ml')
+    p_todo.add_argument('odoo')
+    p_todo.add_argument('directorio')
+    p_todo.add_argument('salida')
+    p_todo.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    p_todo.add_argument('--formato', default='xlsx', choices=list(FORMATOS_EXPORTACION))
+    _opciones_pipeline(p_todo)
+
+    args = parser.parse_args(argv)
+    if args.comando == 'procesar':
+        filas = procesar_particion(args.directorio, args.particion)
+        print(f"✅ Partición {args.particion}: {filas} filas")
+        return 0
+    if args.comando == 'combinar':
+        df = combinar(args.directorio, args.salida, args.formato)
+        print(f"✅ {args.salida}: {len(df)} filas")
+        return 0
+
+    opciones = opciones_de_argumentos(args)
+    if args.comando == 'dividir':
+        plan = dividir(args.ml, args.odoo, args.directorio, args.particiones, opciones)
+        print(f"✅ {sum(plan['filas_ml'])} publicaciones en {plan['particiones']} particiones")
+        return 0
+    df = procesar_particionado(
+        args.ml, args.odoo, args.directorio, args.particiones, args.workers, opciones, args.salida, args.formato
+    )
+    print(f"✅ {args.salida}: {len(df)} filas")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+"""
+Modo de perfilado bajo demanda del pipeline.
+
+Se activa con la variable de entorno ``ML_PERFILADO=1`` (o ``--perfilar`` en
+``run_test.py`` y una casilla en la app). Ejecuta el bloque bajo ``cProfile``
+y ``tracemalloc`` y deja en ``ML_PERFILADO_DIR`` (por defecto ``./perfiles``):
+
+- ``perfil-<fecha>.prof``: volcado de pstats (abrir con ``python -m pstats`` o snakeviz)
+- ``perfil-<fecha>.txt``: resumen con el tiempo atribuido a los parsers de
+  ``utils``, a ``calcular`` y a openpyxl dentro de ``exportar_excel``, las N
+  funciones más costosas, el pico de memoria, los N sitios de asignación con
+  más memoria en el pico y los N que más memoria retienen al terminar.
+
+La memoria en el pico sale de una instantánea de tracemalloc que un hilo toma
+cada vez que la memoria trazada crece un ``CRECIMIENTO_INSTANTANEA`` sobre la
+anterior (muestreo cada ``INTERVALO_MUESTREO`` s), así que es aproximada.
+tracemalloc es de todo el proceso: solo puede haber un perfilado a la vez.
+"""
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pstats
+
+VARIABLE_ENTORNO = 'ML_PERFILADO'
+VARIABLE_DIRECTORIO = 'ML_PERFILADO_DIR'
+# Muestreo de la memoria trazada para la instantánea del pico
+INTERVALO_MUESTREO = 0.05
+CRECIMIENTO_INSTANTANEA = 1.1
+
+# tracemalloc y el perfilador son de todo el proceso
+_PERFILADO_EN_CURSO = threading.Lock()
+
+# Funciones de utils que se agrupan como "parsers"
+PARSERS_UTILS = (
+    'parse_money',
+    'parse_pct',
+    'parse_fee_combo',
+    'extract_tax_percentage',
+    'clean_ml_data',
+    'validate_excel_structure',
+)
+
+
+def perfilado_activo() -> bool:
+    """Indica si la variable de entorno ``ML_PERFILADO`` pide perfilar."""
+    return os.environ.get(VARIABLE_ENTORNO, '').strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+
+
+class Perfil:
+    """Resultado de una ejecución perfilada."""
+
+    def __init__(self):
+        self.ruta_perfil = None
+        self.ruta_resumen = None
+        self.resumen = ''
+
+
+class _MuestreoPico(threading.Thread):
+    """Instantánea de tracemalloc cada vez que la memoria trazada crece sobre la última."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._fin = threading.Event()
+        self.instantanea = None
+        self.memoria = 0
+
+    def _muestrear(self) -> None:
+        import tracemalloc
+
+        actual, _ = tracemalloc.get_traced_memory()
+        if actual > self.memoria * CRECIMIENTO_INSTANTANEA:
+            self.instantanea = tracemalloc.take_snapshot()
+            self.memoria = actual
+
+    def run(self) -> None:
+        while not self._fin.wait(INTERVALO_MUESTREO):
+            self._muestrear()
+
+    def detener(self) -> None:
+        """Termina el muestreo con una última muestra (por si el pico fue al final)."""
+        self._fin.set()
+        self.join()
+        self._muestrear()
+
+
+def _atribuir_tiempos(estadisticas: pstats.Stats) -> dict:
+    """
+    Agrupa el tiempo de pstats por área del pipeline.
+
+    Se suma el tiempo acumulado de las llamadas que entran a cada área desde
+    afuera, para no contar dos veces las llamadas internas (p. ej.
+    ``parse_fee_combo`` → ``parse_pct``).
+    """
+    openpyxl = f'{os.sep}openpyxl{os.sep}'
+
+    def es_parser(clave):
+        return clave[0].endswith('utils.py') and clave[2] in PARSERS_UTILS
+
+    def es_calcular(clave):
+        return clave[0].endswith('data_processor.py') and clave[2] == 'calcular'
+
+    def es_exportar(clave):
+        return clave[0].endswith('data_processor.py') and clave[2] == 'exportar_excel'
+
+    grupos = {
+        'utils (parsers)': 0.0,
+        'calcular': 0.0,
+        'exportar_excel (total)': 0.0,
+        'openpyxl en exportar_excel': 0.0,
+    }
+    for clave, (_, _, _, cumtime, llamadores) in estadisticas.stats.items():
+        if es_calcular(clave):
+            grupos['calcular'] += cumtime
+        elif es_exportar(clave):
+            grupos['exportar_excel (total)'] += cumtime
+        for llamador, (_, _, _, cumtime_arista) in llamadores.items():
+            if es_parser(clave) and not es_parser(llamador):
+                grupos['utils (parsers)'] += cumtime_arista
+            elif openpyxl in clave[0] and es_exportar(llamador):
+                grupos['openpyxl en exportar_excel'] += cumtime_arista
+    return grupos
+
+
+def _lineas_asignacion(diferencias, top_n: int) -> list:
+    lineas = []
+    for stat in diferencias[:top_n]:
+        marco = stat.traceback[0]
+        lineas.append(
+            f"  {stat.size_diff / 2**20:>+9.2f} MiB {stat.count_diff:>+9} bloques  {marco.filename}:{marco.lineno}"
+        )
+    return lineas
+
+
+def _resumen(estadisticas: pstats.Stats, en_pico, retenidas, pico: int, memoria_muestra: int,
+             duracion: float, top_n: int) -> str:
+    lineas = [
+        f"Duración total: {duracion:.3f} s",
+        f"Pico de memoria (tracemalloc): {pico / 2**20:.1f} MiB",
+        "",
+        "Tiempo por área:",
+    ]
+    for grupo, segundos in _atribuir_tiempos(estadisticas).items():
+        lineas.append(f"  {grupo:<30} {segundos:>10.3f} s")
+
+    lineas += ["", f"Top {top_n} funciones (tiempo acumulado):"]
+    salida = io.StringIO()
+    estadisticas.stream = salida
+    estadisticas.sort_stats('cumulative').print_stats(top_n)
+    lineas.append(salida.getvalue().strip())
+
+    lineas += [
+        "",
+        f"Top {top_n} sitios de asignación en el pico (instantánea con "
+        f"{memoria_muestra / 2**20:.1f} MiB trazados, respecto del inicio):",
+    ]
+    lineas += _lineas_asignacion(en_pico, top_n)
+    lineas += ["", f"Top {top_n} sitios de asignación (memoria retenida al terminar, respecto del inicio):"]
+    lineas += _lineas_asignacion(retenidas, top_n)
+    return "\n".join(lineas) + "\n"
+
+
+@contextmanager
+def perfilar(directorio=None, top_n: int = 25, etiqueta: str = 'perfil'):
+    """
+    Perfila el bloque con cProfile + tracemalloc y escribe el volcado y el resumen.
+
+    Args:
+        directorio: Carpeta de salida (por defecto ``ML_PERFILADO_DIR`` o ./perfiles)
+        top_n: Cantidad de funciones y sitios de asignación en el resumen
+        etiqueta: Prefijo de los archivos generados
+
+    Yields:
+        ``Perfil`` cuyas rutas y resumen se completan al salir del bloque
+
+    Raises:
+        RuntimeError: Si ya hay un perfilado en curso en el proceso (anidado o
+            desde otro hilo)
+    """
+    # Se importan acá: pstats sola duplica el tiempo de importación de la app
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    if not _PERFILADO_EN_CURSO.acquire(blocking=False):
+        raise RuntimeError("Ya hay un perfilado en curso en este proceso (tracemalloc es de todo el proceso)")
+    try:
+        directorio = Path(directorio or os.environ.get(VARIABLE_DIRECTORIO) or 'perfiles')
+        directorio.mkdir(parents=True, exist_ok=True)
+        perfil = Perfil()
+        perfilador = cProfile.Profile()
+
+        tracemalloc_previo = tracemalloc.is_tracing()
+        if not tracemalloc_previo:
+            tracemalloc.start(1)
+        tracemalloc.reset_peak()
+        instantanea_inicial = tracemalloc.take_snapshot()
+        muestreo = _MuestreoPico()
+        muestreo.start()
+        inicio = time.perf_counter()
+        perfilador.enable()
+        try:
+            yield perfil
+        finally:
+            perfilador.disable()
+            duracion = time.perf_counter() - inicio
+            muestreo.detener()
+            _, pico = tracemalloc.get_traced_memory()
+            retenidas = tracemalloc.take_snapshot().compare_to(instantanea_inicial, 'lineno')
+            en_pico = (muestreo.instantanea or instantanea_inicial).compare_to(instantanea_inicial, 'lineno')
+            if not tracemalloc_previo:
+                tracemalloc.stop()
+
+            nombre = f"{etiqueta}-{time.strftime('%Y%m%d-%H%M%S')}"
+            perfil.ruta_perfil = directorio / f"{nombre}.prof"
+            perfil.ruta_resumen = directorio / f"{nombre}.txt"
+            perfilador.dump_stats(str(perfil.ruta_perfil))
+            perfil.resumen = _resumen(
+                pstats.Stats(perfilador), en_pico, retenidas, pico, muestreo.memoria, duracion, top_n
+            )
+            perfil.ruta_resumen.write_text(perfil.resumen, encoding='utf-8')
+    finally:
+        _PERFILADO_EN_CURSO.release()
+
+
+@contextmanager
+def perfilar_si_corresponde(activar: bool = None, **kwargs):
+    """
+    Igual que ``perfilar`` pero solo si ``activar`` (o ``ML_PERFILADO``) lo pide.
+
+    Yields:
+        ``Perfil`` o None si el perfilado está desactivado
+    """
+    if activar is None:
+        activar = perfilado_activo()
+    if not activar:
+        yield None
+        return
+    with perfilar(**kwargs) as perfil:
+        yield perfil
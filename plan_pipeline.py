@@ -0,0 +1,205 @@
+"""
+Pipeline diferido: se anotan los pasos y al ejecutar se hace solo lo necesario.
+
+Encadenar a mano ``leer_ml`` → ``unir_y_validar`` → ``calcular`` →
+``preparar_resultado_final`` materializa en cada paso un DataFrame completo:
+``leer_ml`` convierte todas las filas y columnas antes de filtrar, y
+``calcular`` produce columnas que el resultado final descarta.
+``PlanPipeline`` solo registra los pasos; ``ejecutar`` parte del último,
+deduce qué columnas y filas necesita y recién entonces:
+
+- lee el Excel de ML por bloques salteando las filas que ``clean_ml_data``
+  descartaría (ITEM_ID que no es 'ML...' o SKU vacío) antes de convertirlas,
+  y guardando solo las columnas que usan los pasos anotados (sin
+  VARIATION_ID ni columnas extra del export; sin SHIPPING_METHOD si no hay
+  recargo de envío);
+- ``calcular`` produce solo las columnas que se exportan ('Tarifa +
+  impuestos' solo con impuestos, 'Recargo envío ($)' solo con recargo);
+- si el plan termina en ``auditar_margenes``, ``calcular`` no se ejecuta.
+
+El resultado es el mismo que encadenar las funciones a mano. ``explicar``
+describe lo que se va a ejecutar.
+
+Ejemplo:
+    plan = (
+        PlanPipeline('MercadoLibre.xlsx', 'Odoo.xlsx')
+        .unir(politica_duplicados='primero')
+        .calcular(incluir_impuestos=True)
+        .resultado_final()
+    )
+    print(plan.explicar())
+    df = plan.ejecutar()
+"""
+import os
+
+import pandas as pd
+
+from data_processor import (
+    leer_ml,
+    leer_odoo,
+    unir_y_validar,
+    calcular,
+    auditar_margenes,
+    preparar_resultado_final,
+    columnas_resultado_final,
+    columnas_calculo_necesarias,
+    COLUMNAS_PARSEO_ML,
+    COLUMNAS_NUMERICAS_CALCULO,
+)
+
+# Posición de cada paso en el plan; un paso solo puede ir después de los de menor posición
+ORDEN_PASOS = {'unir': 0, 'asignar_stock': 1, 'calcular': 2, 'resultado_final': 3, 'auditar_margenes': 3}
+REQUISITO_PASOS = {'asignar_stock': 'unir', 'calcular': 'unir', 'resultado_final': 'calcular', 'auditar_margenes': 'unir'}
+PASOS_FINALES = ('resultado_final', 'auditar_margenes')
+
+# Columnas de ML que usa cada paso (además de ``COLUMNAS_PARSEO_ML``)
+COLUMNAS_ML_POR_PASO = {
+    'asignar_stock': ['LISTING_TYPE_V3'],
+    'auditar_margenes': ['TITLE', 'LISTING_TYPE_V3'],
+}
+
+
+class PlanPipeline:
+    """Plan diferido del pipeline ML + Odoo (ver el docstring del módulo)."""
+
+    def __init__(self, archivo_ml, odoo, cadenas_arrow: bool = False):
+        """
+        Args:
+            archivo_ml: Excel de MercadoLibre (ruta o buffer)
+            odoo: Excel de Odoo (ruta o buffer), DataFrame de ``leer_odoo`` o
+                catálogo compilado
+            cadenas_arrow: Si guardar los textos como texto Arrow
+        """
+        self.archivo_ml = archivo_ml
+        self.odoo = odoo
+        self.cadenas_arrow = cadenas_arrow
+        self.pasos = []
+
+    def _agregar(self, nombre: str, opciones: dict) -> 'PlanPipeline':
+        if self.pasos and ORDEN_PASOS[self.pasos[-1][0]] >= ORDEN_PASOS[nombre]:
+            raise ValueError(f"'{nombre}' no puede ir después de '{self.pasos[-1][0]}'")
+        requisito = REQUISITO_PASOS.get(nombre)
+        if requisito and requisito not in dict(self.pasos):
+            raise ValueError(f"'{nombre}' necesita '{requisito}' antes")
+        self.pasos.append((nombre, opciones))
+        return self
+
+    def unir(self, **opciones) -> 'PlanPipeline':
+        """Anota ``unir_y_validar`` (politica_duplicados, normalizar_sku, equivalencias)."""
+        return self._agregar('unir', opciones)
+
+    def asignar_stock(self, **opciones) -> 'PlanPipeline':
+        """Anota ``asignacion_stock.asignar_stock`` con sus argumentos."""
+        return self._agregar('asignar_stock', opciones)
+
+    def calcular(self, **opciones) -> 'PlanPipeline':
+        """Anota ``calcular`` con sus argumentos (salvo ``columnas``, que decide el plan)."""
+        return self._agregar('calcular', opciones)
+
+    def resultado_final(self) -> 'PlanPipeline':
+        """Termina el plan en ``preparar_resultado_final``."""
+        return self._agregar('resultado_final', {})
+
+    def auditar_margenes(self, **opciones) -> 'PlanPipeline':
+        """Termina el plan en ``auditar_margenes`` con sus argumentos."""
+        return self._agregar('auditar_margenes', opciones)
+
+    def _final(self) -> str:
+        if not self.pasos or self.pasos[-1][0] not in PASOS_FINALES:
+            raise ValueError("El plan tiene que terminar en 'resultado_final' o 'auditar_margenes'")
+        return self.pasos[-1][0]
+
+    def proyeccion(self) -> dict:
+        """
+        Columnas que necesita cada etapa según el paso final.
+
+        Returns:
+            dict con 'ml' (columnas de ML a leer), 'calcular' (columnas que
+            produce ``calcular``; None si no se ejecuta) y 'final'
+        """
+        final = self._final()
+        pasos = dict(self.pasos)
+        opciones = pasos.get(final if final == 'auditar_margenes' else 'calcular', {})
+        incluir_envio = opciones.get('tipo_recargo_envio', 'Ninguno') != 'Ninguno'
+
+        columnas_ml = list(COLUMNAS_PARSEO_ML)
+        if final == 'resultado_final':
+            columnas_finales = columnas_resultado_final(opciones.get('incluir_impuestos', False), incluir_envio)
+            columnas_calculo = columnas_calculo_necesarias(columnas_finales)
+            columnas_ml += [col for col in columnas_calculo if col not in COLUMNAS_NUMERICAS_CALCULO]
+        else:
+            columnas_finales = None
+            columnas_calculo = None
+            columnas_ml += COLUMNAS_ML_POR_PASO['auditar_margenes']
+        if 'asignar_stock' in pasos:
+            columnas_ml += COLUMNAS_ML_POR_PASO['asignar_stock']
+        if incluir_envio:
+            columnas_ml.append('SHIPPING_METHOD ')
+        return {
+            'ml': list(dict.fromkeys(columnas_ml)),
+            'calcular': columnas_calculo,
+            'final': columnas_finales,
+        }
+
+    def explicar(self) -> str:
+        """Describe lo que hará ``ejecutar``, una etapa por línea."""
+        proyeccion = self.proyeccion()
+        pasos = dict(self.pasos)
+        lineas = [
+            "leer_ml: filas con ITEM_ID 'ML...' y SKU filtradas al leer; columnas: "
+            + ', '.join(proyeccion['ml'])
+        ]
+        if self._odoo_es_archivo():
+            lineas.append('leer_odoo')
+        lineas.append(f"unir_y_validar({_argumentos(pasos['unir'])})")
+        if 'asignar_stock' in pasos:
+            lineas.append(f"asignar_stock({_argumentos(pasos['asignar_stock'])})")
+        if proyeccion['calcular'] is None:
+            lineas.append(f"auditar_margenes({_argumentos(pasos['auditar_margenes'])}); calcular no se ejecuta")
+        else:
+            omitidas = [col for col in COLUMNAS_NUMERICAS_CALCULO if col not in proyeccion['calcular']]
+            linea = f"calcular({_argumentos(pasos['calcular'])})"
+            if omitidas:
+                linea += '; no calcula: ' + ', '.join(omitidas)
+            lineas.append(linea)
+            lineas.append(f"preparar_resultado_final: {len(proyeccion['final'])} columnas")
+        return '\n'.join(f"{i}. {linea}" for i, linea in enumerate(lineas, 1))
+
+    def _odoo_es_archivo(self) -> bool:
+        return isinstance(self.odoo, (str, os.PathLike)) or hasattr(self.odoo, 'read')
+
+    def ejecutar(self) -> pd.DataFrame:
+        """
+        Ejecuta el plan.
+
+        Returns:
+            DataFrame de ``preparar_resultado_final`` o de ``auditar_margenes``
+        """
+        final = self._final()
+        pasos = dict(self.pasos)
+        proyeccion = self.proyeccion()
+
+        df_ml = leer_ml(self.archivo_ml, cadenas_arrow=self.cadenas_arrow, deduplicar=True, columnas=proyeccion['ml'])
+        df_odoo = leer_odoo(self.odoo, cadenas_arrow=self.cadenas_arrow) if self._odoo_es_archivo() else self.odoo
+        df_merged = unir_y_validar(df_ml, df_odoo, **pasos['unir'])
+        del df_ml
+
+        if 'asignar_stock' in pasos:
+            from asignacion_stock import asignar_stock
+            asignar_stock(df_merged, **pasos['asignar_stock'])
+
+        if final == 'auditar_margenes':
+            return auditar_margenes(df_merged, **pasos['auditar_margenes'])
+
+        opciones = pasos['calcular']
+        df_calc = calcular(df_merged, **opciones, columnas=proyeccion['calcular'])
+        del df_merged
+        return preparar_resultado_final(
+            df_calc,
+            incluir_impuestos=opciones.get('incluir_impuestos', False),
+            incluir_envio=opciones.get('tipo_recargo_envio', 'Ninguno') != 'Ninguno',
+        )
+
+
+def _argumentos(opciones: dict) -> str:
+    return ', '.join(f"{clave}={valor!r}" for clave, valor in opciones.items())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: N sesiones simultáneas sobre el pipeline o el servidor.
+
+Streamlit corre todas las sesiones en un solo proceso, un hilo por sesión.
+El objetivo 'pipeline' reproduce eso: cada sesión es un hilo que hace el
+mismo recorrido que la rama en memoria de ``app.main`` (subir ML y Odoo →
+``leer_ml`` → ``leer_odoo`` → ``unir_y_validar`` → ``calcular`` →
+``preparar_resultado_final`` → descargar con ``exportar_excel``) sobre
+libros sintéticos (``benchmark.generar_datos_sinteticos``) escritos a .xlsx.
+Así aparecen la contención por el GIL y la memoria de varias subidas a la
+vez sin depender de un navegador. El objetivo 'servidor' manda pedidos
+``POST /calcular`` a ``servidor.py`` (uno levantado en este proceso con el
+catálogo sintético, o ``--url`` para uno existente).
+
+Informa percentiles de latencia por etapa y total, sesiones por minuto,
+filas por segundo y la memoria residente (RSS) del proceso medido a lo largo
+de la prueba (``--pid`` para un servidor externo; Linux). ``--json`` guarda
+el informe completo para comparar corridas y detectar regresiones.
+
+Uso:
+    python prueba_carga.py --sesiones 8 --filas-ml 20000,100000 --filas-odoo 120000
+    python prueba_carga.py --objetivo servidor --sesiones 32 --repeticiones 20 --filas-pedido 200
+    python prueba_carga.py --objetivo servidor --url http://127.0.0.1:8765 --pid 12345
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+
+from benchmark import generar_datos_sinteticos
+from data_processor import (
+    leer_ml, leer_odoo, unir_y_validar, calcular, preparar_resultado_final, exportar_excel,
+)
+
+OBJETIVOS = ('pipeline', 'servidor')
+PERCENTILES = (50, 90, 95, 99)
+# Segundos entre muestras de memoria
+INTERVALO_MEMORIA = 0.2
+# Puntos de la serie de memoria que se imprimen
+PUNTOS_MEMORIA = 20
+
+
+def libros_sinteticos(filas_ml: int, filas_odoo: int, seed: int = 0):
+    """
+    Excel de ML ('Hoja1') y Odoo ('Sheet1') sintéticos, como los que sube el usuario.
+
+    Returns:
+        (bytes del .xlsx de ML, bytes del .xlsx de Odoo, DataFrame de ML)
+    """
+    df_ml, df_odoo = generar_datos_sinteticos(filas_ml, filas_odoo, seed)
+    libros = []
+    for df, hoja in ((df_ml, 'Hoja1'), (df_odoo, 'Sheet1')):
+        buffer = io.BytesIO()
+        df.to_excel(buffer, sheet_name=hoja, index=False)
+        libros.append(buffer.getvalue())
+    return libros[0], libros[1], df_ml
+
+
+def memoria_rss_mb(pid: int = None) -> float:
+    """RSS actual del proceso en MiB (Linux); sin /proc, el pico del proceso actual."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status", encoding='ascii') as f:
+            for linea in f:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (2**20 if sys.platform == 'darwin' else 1024)
+
+
+class MonitorMemoria(threading.Thread):
+    """Muestrea la memoria de un proceso cada ``intervalo`` segundos hasta ``detener``."""
+
+    def __init__(self, pid: int = None, intervalo: float = INTERVALO_MEMORIA):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.muestras = []
+        self._parar = threading.Event()
+        self._inicio = time.perf_counter()
+
+    def run(self):
+        while True:
+            self.muestras.append((time.perf_counter() - self._inicio, memoria_rss_mb(self.pid)))
+            if self._parar.wait(self.intervalo):
+                break
+
+    def detener(self) -> list:
+        self._parar.set()
+        self.join()
+        return self.muestras
+
+
+def sesion_pipeline(ml_bytes: bytes, odoo_bytes: bytes) -> tuple:
+    """
+    Recorrido de una sesión de la app: subir, calcular y descargar.
+
+    Returns:
+        (dict etapa -> ms, filas procesadas)
+    """
+    tiempos = {}
+    marca = time.perf_counter()
+
+    def _etapa(nombre):
+        nonlocal marca
+        ahora = time.perf_counter()
+        tiempos[nombre] = (ahora - marca) * 1000
+        marca = ahora
+
+    # Streamlit entrega cada archivo subido como un buffer en memoria
+    df_ml = leer_ml(io.BytesIO(ml_bytes))
+    _etapa('leer_ml')
+    df_odoo = leer_odoo(io.BytesIO(odoo_bytes))
+    _etapa('leer_odoo')
+    df_merged = unir_y_validar(df_ml, df_odoo)
+    _etapa('unir_y_validar')
+    df_resultado = preparar_resultado_final(calcular(df_merged))
+    _etapa('calcular')
+    exportar_excel(df_resultado)
+    _etapa('descargar')
+    return tiempos, len(df_resultado)
+
+
+def sesion_servidor(url: str, cuerpo: bytes, filas: int) -> tuple:
+    """Un pedido ``POST /calcular``; devuelve (dict etapa -> ms, filas)."""
+    inicio = time.perf_counter()
+    pedido = urllib.request.Request(
+        f"{url}/calcular", data=cuerpo, headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    with urllib.request.urlopen(pedido) as respuesta:
+        json.loads(respuesta.read())
+    return {'calcular': (time.perf_counter() - inicio) * 1000}, filas
+
+
+def _percentiles(valores) -> dict:
+    valores = np.asarray(valores, dtype=float)
+    resumen = {f'p{p}': float(np.percentile(valores, p)) for p in PERCENTILES}
+    resumen['max'] = float(valores.max())
+    return resumen
+
+
+def ejecutar_carga(sesion, cargas: list, sesiones: int, repeticiones: int = 1,
+                   escalonado: float = 0.0, pid: int = None) -> dict:
+    """
+    Corre ``sesiones`` hilos simultáneos; cada uno ejecuta ``sesion`` ``repeticiones`` veces.
+
+    Args:
+        sesion: Función que devuelve (dict etapa -> ms, filas)
+        cargas: Argumentos de ``sesion``; la sesión i usa ``cargas[i % len(cargas)]``
+        sesiones: Sesiones simultáneas
+        repeticiones: Recorridos por sesión
+        escalonado: Segundos entre el arranque de una sesión y la siguiente
+        pid: Proceso cuya memoria se mide (por defecto, este)
+
+    Returns:
+        dict con 'latencias_ms' (percentiles por etapa y 'total'), 'recorridos',
+        'errores', 'segundos', 'recorridos_por_minuto', 'filas_por_segundo' y
+        'memoria_mb' (lista de [segundo, MiB])
+    """
+    registros = []
+    errores = []
+    candado = threading.Lock()
+
+    def _correr(indice: int) -> None:
+        time.sleep(indice * escalonado)
+        argumentos = cargas[indice % len(cargas)]
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            try:
+                tiempos, filas = sesion(*argumentos)
+            except Exception as e:
+                with candado:
+                    errores.append(f"sesión {indice}: {e}")
+                continue
+            tiempos['total'] = (time.perf_counter() - inicio) * 1000
+            with candado:
+                registros.append((tiempos, filas))
+
+    monitor = MonitorMemoria(pid)
+    monitor.start()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sesiones) as executor:
+        list(executor.map(_correr, range(sesiones)))
+    segundos = time.perf_counter() - inicio
+    muestras = monitor.detener()
+
+    etapas = list(dict.fromkeys(etapa for tiempos, _ in registros for etapa in tiempos))
+    return {
+        'sesiones': sesiones,
+        'latencias_ms': {
+            etapa: _percentiles([tiempos[etapa] for tiempos, _ in registros if etapa in tiempos])
+            for etapa in etapas
+        },
+        'recorridos': len(registros),
+        'errores': errores,
+        'segundos': segundos,
+        'recorridos_por_minuto': len(registros) / segundos * 60,
+        'filas_por_segundo': sum(filas for _, filas in registros) / segundos,
+        'memoria_mb': [[round(t, 3), round(mb, 1)] for t, mb in muestras],
+    }
+
+
+def imprimir_informe(informe: dict) -> None:
+    """Imprime latencias, rendimiento y la serie de memoria."""
+    print(f"{'Etapa':<18}" + ''.join(f"{f'p{p}':>11}" for p in PERCENTILES) + f"{'max':>11}")
+    for etapa, valores in informe['latencias_ms'].items():
+        print(f"{etapa:<18}" + ''.join(f"{valores[f'p{p}']:>8.0f} ms" for p in PERCENTILES) + f"{valores['max']:>8.0f} ms")
+    print(
+        f"{informe['recorridos']} recorridos en {informe['segundos']:.1f} s con {informe['sesiones']} sesiones: "
+        f"{informe['recorridos_por_minuto']:.1f}/min, {informe['filas_por_segundo']:,.0f} filas/s, "
+        f"{len(informe['errores'])} errores"
+    )
+    memoria = informe['memoria_mb']
+    if memoria:
+        pico = max(mb for _, mb in memoria)
+        print(f"Memoria: inicio {memoria[0][1]:.0f} MiB, pico {pico:.0f} MiB, final {memoria[-1][1]:.0f} MiB")
+        paso = max(1, len(memoria) // PUNTOS_MEMORIA)
+        print('  ' + '  '.join(f"{t:.0f}s:{mb:.0f}" for t, mb in memoria[::paso]))
+    for error in informe['errores'][:5]:
+        print(f"  ❌ {error}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objetivo', default='pipeline', choices=list(OBJETIVOS))
+    parser.add_argument('--sesiones', type=int, default=4, help='Sesiones simultáneas')
+    parser.add_argument('--repeticiones', type=int, default=1, help='Recorridos por sesión')
+    parser.add_argument('--escalonado', type=float, default=0.0, help='Segundos entre arranques de sesión')
+    parser.add_argument('--filas-ml', default='20000', help='Filas de ML por libro, separadas por coma (una por tamaño)')
+    parser.add_argument('--filas-odoo', type=int, default=24000)
+    parser.add_argument('--filas-pedido', type=int, default=100, help="Filas por pedido con --objetivo servidor")
+    parser.add_argument('--url', help='Servidor existente (por defecto se levanta uno en este proceso)')
+    parser.add_argument('--pid', type=int, help='Proceso cuya memoria medir (por defecto, este)')
+    parser.add_argument('--json', help='Guardar el informe completo en este archivo')
+    args = parser.parse_args(argv)
+
+    tamanos = [int(t) for t in args.filas_ml.split(',')]
+    print(f"Generando libros sintéticos: ML {tamanos} filas, Odoo {args.filas_odoo} filas...")
+    libros = [libros_sinteticos(filas, args.filas_odoo, seed=i) for i, filas in enumerate(tamanos)]
+
+    servidor = carpeta = None
+    if args.objetivo == 'pipeline':
+        sesion = sesion_pipeline
+        cargas = [(ml_bytes, odoo_bytes) for ml_bytes, odoo_bytes, _ in libros]
+    else:
+        url = args.url
+        if url is None:
+            from servidor import crear_servidor
+            # El servidor relee el Odoo al recargar: la carpeta vive hasta apagarlo
+            carpeta = tempfile.TemporaryDirectory()
+            ruta_odoo = Path(carpeta.name) / 'odoo.xlsx'
+            ruta_odoo.write_bytes(libros[0][1])
+            servidor = crear_servidor(ruta_odoo, puerto=0)
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{servidor.server_address[1]}"
+        sesion = sesion_servidor
+        cargas = []
+        for _, _, df_ml in libros:
+            filas = df_ml.head(args.filas_pedido).astype(object).where(df_ml.head(args.filas_pedido).notna(), None)
+            cuerpo = json.dumps({'filas': filas.to_dict('records')}, default=str).encode('utf-8')
+            cargas.append((url, cuerpo, len(filas)))
+
+    print(f"Corriendo {args.sesiones} sesiones × {args.repeticiones} contra '{args.objetivo}'...")
+    try:
+        informe = ejecutar_carga(sesion, cargas, args.sesiones, args.repeticiones, args.escalonado, args.pid)
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+            servidor.server_close()
+        if carpeta is not None:
+            carpeta.cleanup()
+    informe.update(objetivo=args.objetivo, filas_ml=tamanos, filas_odoo=args.filas_odoo, cpus=os.cpu_count())
+    imprimir_informe(informe)
+    if args.json:
+        Path(args.json).write_text(json.dumps(informe, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 1 if informe['errores'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
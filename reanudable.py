@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Corridas reanudables: el pipeline por bloques con puntos de control en disco.
+
+Una corrida de horas que falla en la exportación o se corta a mitad de camino
+no debería volver a empezar desde ``leer_ml``. ``ejecutar_reanudable`` hace
+lo mismo que ``estrategia_carga.procesar_por_bloques`` pero guarda cada
+unidad de trabajo en un directorio de la corrida, con nombre temporal y
+rename (una unidad a medio escribir nunca cuenta como hecha):
+
+- ``odoo.pkl``: el catálogo leído con ``leer_odoo``.
+- ``ml/bloque_NNNNN.pkl``: cada bloque de la hoja de ML ya limpio y parseado.
+- ``unido/bloque_NNNNN.pkl``: el bloque después de ``unir_y_validar``.
+- ``resultado/bloque_NNNNN.pkl``: el bloque de ``preparar_resultado_final``.
+- la salida, escrita en streaming a partir de los resultados.
+
+``manifiesto.json`` registra el hash SHA-256, nombre y tamaño de las
+entradas, las opciones, el formato y el tamaño de bloque, y el avance
+('bloques_leidos', 'lectura_completa', 'exportado'). Al reanudar se verifica
+que las entradas y la configuración sean las mismas (si no, error: usar otro
+directorio o ``reiniciar=True``) y se saltea toda unidad hecha: los bloques
+ya leídos no se vuelven a convertir (la lectura retoma en el primer bloque
+pendiente, recorriendo las filas anteriores sin convertirlas) y los bloques
+con resultado no se vuelven a unir ni a calcular. Si solo falló la
+exportación, se repite solo la exportación.
+
+Con 'asignacion' el cálculo espera a que estén todos los bloques unidos: el
+stock se reparte sobre todos a la vez (``asignar_stock_por_bloques``), así
+da lo mismo que en memoria y que en una corrida sin cortes. Los puntos de
+control son pickles de pandas: el directorio es de trabajo y no debe
+compartirse con terceros.
+
+Uso:
+    python reanudable.py ML.xlsx Odoo.xlsx corrida/ salida.xlsx [--formato xlsx]
+                         [--filas-por-bloque 20000] [--incluir-impuestos] [--reiniciar]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+import pandas as pd
+
+from data_processor import (
+    leer_ml_por_bloques,
+    leer_odoo,
+    ESCRITORES_POR_BLOQUES,
+    FORMATOS_EXPORTACION,
+)
+from estrategia_carga import (
+    FILAS_POR_BLOQUE_CARGA,
+    separar_opciones,
+    unir_y_repartir,
+    calcular_resultado,
+    agregar_argumentos_pipeline,
+    opciones_de_argumentos,
+)
+
+ARCHIVO_MANIFIESTO = 'manifiesto.json'
+VERSION_MANIFIESTO = 2
+ETAPAS_BLOQUE = ('ml', 'unido', 'resultado')
+# Lo que tiene que coincidir para reanudar (el resto del manifiesto es avance)
+CLAVES_CONFIGURACION = ('version', 'entradas', 'opciones', 'formato', 'filas_por_bloque')
+BYTES_LECTURA_HASH = 1 << 20
+
+
+def hash_archivo(archivo) -> dict:
+    """
+    Nombre, tamaño y SHA-256 de un archivo (ruta o buffer binario).
+
+    Un buffer se lee por partes y queda en la misma posición.
+    """
+    sha = hashlib.sha256()
+    if isinstance(archivo, (str, os.PathLike)):
+        with open(archivo, 'rb') as f:
+            for parte in iter(lambda: f.read(BYTES_LECTURA_HASH), b''):
+                sha.update(parte)
+        return {'nombre': Path(archivo).name, 'bytes': os.path.getsize(archivo), 'sha256': sha.hexdigest()}
+    posicion = archivo.tell()
+    archivo.seek(0)
+    total = 0
+    for parte in iter(lambda: archivo.read(BYTES_LECTURA_HASH), b''):
+        sha.update(parte)
+        total += len(parte)
+    archivo.seek(posicion)
+    return {'nombre': getattr(archivo, 'name', None), 'bytes': total, 'sha256': sha.hexdigest()}
+
+
+def _guardar_json(ruta: Path, datos: dict) -> None:
+    temporal = ruta.with_name(f".{ruta.name}.tmp")
+    temporal.write_text(json.dumps(datos, ensure_ascii=False, indent=2), encoding='utf-8')
+    os.replace(temporal, ruta)
+
+
+def _guardar_pickle(df: pd.DataFrame, ruta: Path) -> None:
+    temporal = ruta.with_name(f".{ruta.name}.tmp")
+    df.to_pickle(temporal)
+    os.replace(temporal, ruta)
+
+
+def _ruta_bloque(directorio: Path, etapa: str, numero: int) -> Path:
+    return directorio / etapa / f"bloque_{numero:05d}.pkl"
+
+
+def leer_manifiesto(directorio) -> dict:
+    """Lee el ``manifiesto.json`` de una corrida (None si no existe)."""
+    ruta = Path(directorio) / ARCHIVO_MANIFIESTO
+    if not ruta.exists():
+        return None
+    return json.loads(ruta.read_text(encoding='utf-8'))
+
+
+def _preparar_directorio(directorio: Path, configuracion: dict, reiniciar: bool) -> dict:
+    """Crea o verifica el manifiesto; devuelve el manifiesto vigente."""
+    anterior = leer_manifiesto(directorio)
+    if anterior is not None and reiniciar:
+        for etapa in ETAPAS_BLOQUE:
+            shutil.rmtree(directorio / etapa, ignore_errors=True)
+        (directorio / 'odoo.pkl').unlink(missing_ok=True)
+        anterior = None
+    if anterior is not None:
+        distintas = [
+            clave for clave in CLAVES_CONFIGURACION
+            if json.dumps(anterior.get(clave), sort_keys=True) != json.dumps(configuracion[clave], sort_keys=True)
+        ]
+        if distintas:
+            raise ValueError(
+                f"{directorio} es de otra corrida (cambió: {', '.join(distintas)}); "
+                "usar otro directorio o reiniciar"
+            )
+        return anterior
+
+    for etapa in ETAPAS_BLOQUE:
+        (directorio / etapa).mkdir(parents=True, exist_ok=True)
+    manifiesto = dict(configuracion, estado={'bloques_leidos': 0, 'lectura_completa': False, 'exportado': None})
+    _guardar_json(directorio / ARCHIVO_MANIFIESTO, manifiesto)
+    return manifiesto
+
+
+def ejecutar_reanudable(
+    archivo_ml,
+    archivo_odoo,
+    directorio,
+    output_path,
+    opciones: dict = None,
+    formato: str = 'xlsx',
+    filas_por_bloque: int = FILAS_POR_BLOQUE_CARGA,
+    reiniciar: bool = False
+) -> dict:
+    """
+    Ejecuta (o retoma) el pipeline por bloques con puntos de control.
+
+    Args:
+        archivo_ml: Excel de MercadoLibre (ruta o buffer)
+        archivo_odoo: Excel de Odoo (ruta o buffer)
+        directorio: Directorio de la corrida (se crea)
+        output_path: Archivo de salida
+        opciones: Argumentos de ``calcular`` y opcionalmente 'politica_duplicados',
+            'normalizar_sku', 'equivalencias', 'asignacion' y 'control_precios'
+            (mismo formato que ``estrategia_carga.procesar_por_bloques``)
+        formato: 'xlsx', 'csv', 'parquet' o 'jsonl'
+        filas_por_bloque: Filas de la hoja de ML por bloque
+        reiniciar: Si descartar lo hecho en ``directorio`` y empezar de cero
+
+    Returns:
+        dict con 'filas', 'bloques', 'bloques_reutilizados' (bloques cuyo
+        resultado ya estaba) y 'salida'
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    opciones = dict(opciones or {})
+    configuracion = {
+        'version': VERSION_MANIFIESTO,
+        'entradas': {'ml': hash_archivo(archivo_ml), 'odoo': hash_archivo(archivo_odoo)},
+        'opciones': opciones,
+        'formato': formato,
+        'filas_por_bloque': filas_por_bloque,
+    }
+    manifiesto = _preparar_directorio(directorio, configuracion, reiniciar)
+    estado = manifiesto['estado']
+
+    def _avanzar(**cambios) -> None:
+        estado.update(cambios)
+        _guardar_json(directorio / ARCHIVO_MANIFIESTO, manifiesto)
+
+    ruta_odoo = directorio / 'odoo.pkl'
+    if ruta_odoo.exists():
+        df_odoo = pd.read_pickle(ruta_odoo)
+    else:
+        df_odoo = leer_odoo(archivo_odoo)
+        _guardar_pickle(df_odoo, ruta_odoo)
+
+    procesar = _procesador_de_bloques(directorio, df_odoo, opciones)
+    asignacion = opciones.get('asignacion')
+    reutilizados = 0
+
+    # Bloques ya leídos (en orden), y después la lectura desde el primero pendiente;
+    # un bloque guardado sin llegar a anotarse en el manifiesto se vuelve a leer
+    for ruta in sorted((directorio / 'ml').glob('bloque_*.pkl')):
+        numero = int(ruta.stem.split('_')[1])
+        if numero < estado['bloques_leidos']:
+            reutilizados += procesar(numero, None)
+    if not estado['lectura_completa']:
+        for numero, df_ml in leer_ml_por_bloques(
+            archivo_ml, filas_por_bloque, desde_bloque=estado['bloques_leidos'], numerados=True
+        ):
+            _guardar_pickle(df_ml, _ruta_bloque(directorio, 'ml', numero))
+            procesar(numero, df_ml)
+            # Los bloques sin filas válidas no dejan archivo: el avance queda en el manifiesto
+            _avanzar(bloques_leidos=numero + 1)
+        _avanzar(lectura_completa=True)
+
+    unidos = sorted(int(r.stem.split('_')[1]) for r in (directorio / 'unido').glob('bloque_*.pkl'))
+    if asignacion is not None and any(not _ruta_bloque(directorio, 'resultado', n).exists() for n in unidos):
+        from asignacion_stock import asignar_stock_por_bloques
+        largos = []
+
+        def _bloques_unidos():
+            for numero in unidos:
+                df_merged = pd.read_pickle(_ruta_bloque(directorio, 'unido', numero))
+                largos.append(len(df_merged))
+                yield df_merged
+
+        asignado = asignar_stock_por_bloques(_bloques_unidos(), **asignacion)
+        desde = 0
+        for numero, largo in zip(unidos, largos):
+            procesar(numero, None, asignado, desde)
+            desde += largo
+
+    numeros = sorted(int(r.stem.split('_')[1]) for r in (directorio / 'resultado').glob('bloque_*.pkl'))
+    if not numeros:
+        raise ValueError("No hay publicaciones válidas (ITEM_ID 'ML...' con SKU)")
+
+    filas = 0
+    if estado['exportado'] != str(output_path) or not Path(output_path).exists():
+        temporal = Path(output_path).with_name(f".{Path(output_path).name}.tmp")
+        with ESCRITORES_POR_BLOQUES[formato](str(temporal)) as escritor:
+            for numero in numeros:
+                df_resultado = pd.read_pickle(_ruta_bloque(directorio, 'resultado', numero))
+                escritor.escribir(df_resultado)
+                filas += len(df_resultado)
+            escritor.cerrar()
+        os.replace(temporal, output_path)
+        _avanzar(exportado=str(output_path))
+    else:
+        filas = sum(len(pd.read_pickle(_ruta_bloque(directorio, 'resultado', n))) for n in numeros)
+
+    return {'filas': filas, 'bloques': len(numeros), 'bloques_reutilizados': reutilizados, 'salida': str(output_path)}
+
+
+def _procesador_de_bloques(directorio: Path, df_odoo, opciones: dict):
+    """
+    Devuelve ``procesar(numero, df_ml, asignado, desde) -> int`` que lleva un
+    bloque hasta su resultado salteando las etapas que ya tienen punto de
+    control (1 si el resultado ya estaba). Con ``df_ml`` None el bloque se lee
+    de ``ml/``. Con 'asignacion' y sin ``asignado`` (de
+    ``asignar_stock_por_bloques``; ``desde`` es la primera fila del bloque) el
+    bloque queda solo unido.
+    """
+    union, asignacion, control, calculo = separar_opciones(opciones)
+
+    def procesar(numero: int, df_ml, asignado: pd.DataFrame = None, desde: int = 0) -> int:
+        ruta_unido = _ruta_bloque(directorio, 'unido', numero)
+        ruta_resultado = _ruta_bloque(directorio, 'resultado', numero)
+        if ruta_resultado.exists():
+            return 1
+
+        if ruta_unido.exists():
+            df_merged = pd.read_pickle(ruta_unido)
+        else:
+            if df_ml is None:
+                df_ml = pd.read_pickle(_ruta_bloque(directorio, 'ml', numero))
+            df_merged = unir_y_repartir(df_ml, df_odoo, union)
+            _guardar_pickle(df_merged, ruta_unido)
+        if asignacion is not None:
+            if asignado is None:
+                return 0
+            from asignacion_stock import aplicar_stock_asignado
+            aplicar_stock_asignado(df_merged, asignado, desde)
+
+        df_resultado = calcular_resultado(df_merged, calculo, control)
+        _guardar_pickle(df_resultado, ruta_resultado)
+        return 0
+
+    return procesar
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ml')
+    parser.add_argument('odoo')
+    parser.add_argument('directorio')
+    parser.add_argument('salida')
+    parser.add_argument('--formato', default='xlsx', choices=list(FORMATOS_EXPORTACION))
+    parser.add_argument('--filas-por-bloque', type=int, default=FILAS_POR_BLOQUE_CARGA)
+    parser.add_argument('--reiniciar', action='store_true', help='Descartar lo hecho en el directorio')
+    agregar_argumentos_pipeline(parser)
+    args = parser.parse_args(argv)
+
+    resumen = ejecutar_reanudable(
+        args.ml, args.odoo, args.directorio, args.salida, opciones_de_argumentos(args),
+        args.formato, args.filas_por_bloque, args.reiniciar,
+    )
+    print(
+        f"✅ {resumen['salida']}: {resumen['filas']} filas en {resumen['bloques']} bloques "
+        f"({resumen['bloques_reutilizados']} ya estaban hechos)"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
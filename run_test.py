@@ -1,8 +1,18 @@
 #!/usr/bin/env python3
 """
 Script de prueba para ejecutar el pipeline con los EXCEL reales del proyecto.
-Genera dos archivos de salida (config estándar y alternativa).
+Genera dos archivos de salida (config estándar y alternativa) y la auditoría
+de márgenes de los precios publicados hoy.
+
+Con ``--perfilar`` (o ``ML_PERFILADO=1``) la corrida se perfila y deja el
+volcado y el resumen en ./perfiles (ver ``perfilado.py``). Con
+``--formato csv|parquet|jsonl`` los resultados se escriben en ese formato
+en lugar de xlsx. Con ``--odoo-sql base.sqlite`` el catálogo se lee de la base
+(solo los SKUs del archivo de ML, ver ``catalogo_sql.py``) en lugar del Excel.
+La lectura y la exportación se eligen según el tamaño estimado del archivo y
+``ML_PRESUPUESTO_MEMORIA_MB`` (ver ``estrategia_carga.py``).
 """
+import argparse
 import sys
 import os
 from pathlib import Path
@@ -11,10 +21,29 @@ BASE_DIR = Path(__file__).resolve().parent
 sys.path.insert(0, str(BASE_DIR))
 
 from data_processor import (
-    leer_ml, leer_odoo, unir_y_validar, calcular, preparar_resultado_final, exportar_excel
+    leer_ml, leer_odoo, unir_y_validar, calcular, preparar_resultado_final, exportar,
+    auditar_margenes, FORMATOS_EXPORTACION,
 )
+from catalogo_sql import leer_odoo_sql, TABLA_PREDETERMINADA
+from estrategia_carga import estimar_carga, elegir_estrategia
+from perfilado import perfilar_si_corresponde
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--perfilar', action='store_true', help='Perfilar la corrida (ver perfilado.py)')
+    parser.add_argument('--formato', default='xlsx', choices=list(FORMATOS_EXPORTACION))
+    parser.add_argument('--odoo-sql', help='Base SQLite con el catálogo de Odoo (en lugar del Excel)')
+    parser.add_argument('--odoo-tabla', default=TABLA_PREDETERMINADA, help='Tabla o vista del catálogo')
+    args = parser.parse_args(argv)
+
+    with perfilar_si_corresponde(True if args.perfilar else None) as perfil:
+        codigo = ejecutar(args.formato, args.odoo_sql, args.odoo_tabla)
+    if perfil is not None:
+        print(f"\n🔬 Perfil: {perfil.ruta_perfil}")
+        print(f"   Resumen: {perfil.ruta_resumen}")
+    return codigo
 
-def main():
+def ejecutar(formato='xlsx', odoo_sql=None, odoo_tabla=TABLA_PREDETERMINADA):
     print("🚀 ML Precios Calculator - Prueba con archivos reales")
     print("=" * 70)
 
@@ -25,16 +54,27 @@ def main():
     if not ml_file.exists():
         print(f"❌ No se encontró el archivo ML: {ml_file}")
         return 1
+    if odoo_sql:
+        odoo_file = Path(odoo_sql)
     if not odoo_file.exists():
         print(f"❌ No se encontró el archivo Odoo: {odoo_file}")
         return 1
     try:
         # Leer archivos
+        # Las dos configuraciones comparten el join, así que 'bloques' se lee como 'deduplicado'
+        estimacion = estimar_carga(ml_file)
+        estrategia = elegir_estrategia(estimacion)
+        por_bloques = estrategia != 'memoria'
+        print(f"📏 {estimacion.resumen(estrategia)}")
         print("📖 Leyendo Excel de MercadoLibre...")
-        df_ml = leer_ml(ml_file)
+        df_ml = leer_ml(ml_file, deduplicar=por_bloques)
         print(f"   → Filas válidas ML: {len(df_ml)}")
-        print("📖 Leyendo Excel de Odoo...")
-        df_odoo = leer_odoo(odoo_file)
+        if odoo_sql:
+            print(f"📖 Leyendo catálogo Odoo de {odoo_file.name} ({odoo_tabla})...")
+            df_odoo = leer_odoo_sql(odoo_file, df_ml['SKU'], tabla=odoo_tabla)
+        else:
+            print("📖 Leyendo Excel de Odoo...")
+            df_odoo = leer_odoo(odoo_file)
         print(f"   → Productos Odoo: {len(df_odoo)}")
         # Unir
         print("🔗 Uniendo por SKU (Código Neored ↔ SKU)...")
@@ -44,16 +84,22 @@ def main():
         print("💰 Calculando precios (base_financiacion='tarifa', incluir_impuestos=False)...")
         df_calc_std = calcular(df_merged, base_financiacion='tarifa', incluir_impuestos=False)
         df_res_std = preparar_resultado_final(df_calc_std, incluir_impuestos=False)
-        out1 = BASE_DIR / "ML_precios_y_stock_calculados.xlsx"
-        exportar_excel(df_res_std, output_path=str(out1))
+        extension = FORMATOS_EXPORTACION[formato][0]
+        out1 = BASE_DIR / f"ML_precios_y_stock_calculados{extension}"
+        exportar(df_res_std, formato, output_path=str(out1), por_bloques=por_bloques)
         print(f"✅ Generado: {out1.name} ({len(df_res_std)} filas)")
         # Calcular (modo alternativo: financiación sobre TARIFA + %ML + FIJO)
         print("💰 Calculando precios (base_financiacion='tarifa_mas_ml', incluir_impuestos=False)...")
         df_calc_alt = calcular(df_merged, base_financiacion='tarifa_mas_ml', incluir_impuestos=False)
         df_res_alt = preparar_resultado_final(df_calc_alt, incluir_impuestos=False)
-        out2 = BASE_DIR / "ML_precios_y_stock_calculados_alt.xlsx"
-        exportar_excel(df_res_alt, output_path=str(out2))
+        out2 = BASE_DIR / f"ML_precios_y_stock_calculados_alt{extension}"
+        exportar(df_res_alt, formato, output_path=str(out2), por_bloques=por_bloques)
         print(f"✅ Generado: {out2.name} ({len(df_res_alt)} filas)")
+        # Auditoría de los precios publicados hoy (misma configuración estándar)
+        df_auditoria = auditar_margenes(df_merged)
+        out3 = BASE_DIR / f"ML_auditoria_margenes{extension}"
+        exportar(df_auditoria, formato, output_path=str(out3), por_bloques=por_bloques)
+        print(f"✅ Generado: {out3.name} ({(df_auditoria['Margen ($)'] < 0).sum()} publicaciones con pérdida)")
         # Resumen simple
         con_precio = (df_res_std["Precio final"] > 0).sum()
         con_flags = (df_res_std["Notas/Flags"] != "").sum()
@@ -61,7 +107,7 @@ def main():
         print(f"   Filas totales:       {len(df_res_std)}")
         print(f"   Con precio final >0: {con_precio}")
         print(f"   Con notas/flags:     {con_flags}")
-        print("\n✨ Prueba completada. Revisa los Excel generados en la carpeta del proyecto.")
+        print("\n✨ Prueba completada. Revisa los archivos generados en la carpeta del proyecto.")
         return 0
     except Exception as e:
         import traceback
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Servicio HTTP local de cotización con el catálogo de Odoo en memoria.
+
+El catálogo se lee una sola vez con ``leer_odoo`` y queda indexado por
+'Código Neored'; cada pedido solo parsea sus filas de ML y cruza contra el
+subconjunto del catálogo que necesita, por lo que lotes chicos responden en
+pocos milisegundos. ``POST /recargar`` relee el archivo y reemplaza el catálogo
+de forma atómica: los pedidos en curso terminan con la versión anterior.
+
+Endpoints:
+    GET  /salud      Estado del servicio y del catálogo cargado
+    POST /calcular   {"filas": [{"SKU": ..., "FEE_PER_SALE_MARKETPLACE_V2": ...,
+                      "COST_OF_FINANCING_MARKETPLACE": ..., "SHIPPING_METHOD": ...}, ...],
+                      "opciones": {"incluir_impuestos": false, "tipo_recargo_envio": "Ninguno",
+                      "valor_recargo_envio": 0}}
+    POST /recargar   Relee el Excel de Odoo indicado con ``--odoo`` (no admite otra ruta)
+
+Uso:
+    python servidor.py --odoo "Producto (product.template) (1).xlsx" [--host 127.0.0.1] [--puerto 8765]
+"""
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from data_processor import leer_odoo, parsear_campos_ml, unir_y_validar, calcular
+
+# Columnas de ML que se aceptan en cada fila del pedido
+COLUMNAS_PEDIDO = [
+    'ITEM_ID',
+    'VARIATION_ID',
+    'SKU',
+    'TITLE',
+    'QUANTITY',
+    'PRICE',
+    'CURRENCY_ID',
+    'FEE_PER_SALE_MARKETPLACE_V2',
+    'COST_OF_FINANCING_MARKETPLACE',
+    'LISTING_TYPE_V3',
+    'SHIPPING_METHOD ',
+]
+
+# Columnas de ``calcular`` que se devuelven en la respuesta
+COLUMNAS_RESPUESTA = [
+    'ITEM_ID',
+    'SKU',
+    'Nombre',
+    'Cantidad a mano',
+    'Precio de Tarifa',
+    'Tarifa + impuestos',
+    'Precio final',
+    'IVA',
+    'Recargo % ML (importe)',
+    'Recargo fijo ML ($)',
+    'Cargo por vender ($)',
+    'Recargo financiación (importe)',
+    'Recargo envío ($)',
+    'Retenciones ML ($)',
+    'Recibis ($)',
+    '% ML aplicado',
+    '% financiación aplicado',
+    'Notas/Flags',
+]
+
+OPCIONES_CALCULO = ('base_financiacion', 'incluir_impuestos', 'tipo_recargo_envio', 'valor_recargo_envio')
+
+
+class CatalogoEnMemoria:
+    """
+    Catálogo de Odoo parseado e indexado por 'Código Neored'.
+
+    Las instancias no se modifican después de construidas; recargar implica
+    crear una nueva y reemplazar la referencia.
+    """
+
+    def __init__(self, df_odoo: pd.DataFrame, origen: str = ''):
+        self.df = df_odoo.reset_index(drop=True)
+        self.indice = pd.Index(self.df['Código Neored'])
+        self.origen = origen
+        self.cargado_en = time.time()
+        # Forzar la construcción de la tabla hash ahora y no en el primer pedido
+        self.indice.get_indexer_non_unique(self.indice[:1])
+
+    @classmethod
+    def desde_archivo(cls, ruta) -> 'CatalogoEnMemoria':
+        return cls(leer_odoo(ruta), origen=str(ruta))
+
+    def subconjunto(self, skus) -> pd.DataFrame:
+        """Filas del catálogo cuyos códigos aparecen en ``skus``."""
+        posiciones, _ = self.indice.get_indexer_non_unique(pd.Index(skus).unique())
+        posiciones = np.unique(posiciones[posiciones >= 0])
+        return self.df.take(posiciones)
+
+    def cotizar(self, filas: list, **opciones) -> pd.DataFrame:
+        """
+        Calcula el desglose de ``calcular`` para un lote de filas de ML.
+
+        Args:
+            filas: Lista de diccionarios con columnas de ML (al menos 'SKU')
+            **opciones: Argumentos de ``calcular``
+
+        Returns:
+            DataFrame con las columnas de ``COLUMNAS_RESPUESTA`` presentes
+        """
+        df_ml = pd.DataFrame.from_records(filas)
+        if 'SHIPPING_METHOD' in df_ml.columns and 'SHIPPING_METHOD ' not in df_ml.columns:
+            df_ml = df_ml.rename(columns={'SHIPPING_METHOD': 'SHIPPING_METHOD '})
+        if 'SKU' not in df_ml.columns:
+            raise ValueError("Cada fila debe incluir 'SKU'")
+        df_ml = parsear_campos_ml(df_ml.reindex(columns=COLUMNAS_PEDIDO))
+
+        df_merged = unir_y_validar(df_ml, self.subconjunto(df_ml['SKU']))
+        df_calc = calcular(df_merged, **opciones)
+        return df_calc[[col for col in COLUMNAS_RESPUESTA if col in df_calc.columns]]
+
+
+class ServicioCotizacion:
+    """Estado compartido del servicio: catálogo vigente y recarga serializada."""
+
+    def __init__(self, ruta_odoo):
+        self.ruta_odoo = ruta_odoo
+        self.catalogo = CatalogoEnMemoria.desde_archivo(ruta_odoo)
+        self._lock_recarga = threading.Lock()
+
+    def recargar(self) -> CatalogoEnMemoria:
+        """Relee el catálogo y lo publica; los pedidos siguen usando el anterior mientras tanto."""
+        with self._lock_recarga:
+            nuevo = CatalogoEnMemoria.desde_archivo(self.ruta_odoo)
+            # La asignación de un atributo es atómica: no hace falta bloquear a los lectores
+            self.catalogo = nuevo
+            return nuevo
+
+
+def _a_json(valor):
+    """Convierte valores de numpy/pandas a tipos serializables (NaN -> None)."""
+    if isinstance(valor, (np.integer,)):
+        return int(valor)
+    if isinstance(valor, (float, np.floating)):
+        return None if math.isnan(valor) else float(valor)
+    if valor is pd.NA or valor is None:
+        return None
+    return valor
+
+
+def _crear_handler(servicio: ServicioCotizacion):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _responder(self, estado: int, cuerpo: dict):
+            datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _leer_json(self) -> dict:
+            largo = int(self.headers.get('Content-Length') or 0)
+            if not largo:
+                return {}
+            return json.loads(self.rfile.read(largo).decode('utf-8'))
+
+        def do_GET(self):
+            if self.path != '/salud':
+                self._responder(404, {'error': f'Ruta desconocida: {self.path}'})
+                return
+            catalogo = servicio.catalogo
+            self._responder(200, {
+                'estado': 'ok',
+                'catalogo': catalogo.origen,
+                'productos': len(catalogo.df),
+                'cargado_en': catalogo.cargado_en,
+            })
+
+        def do_POST(self):
+            try:
+                cuerpo = self._leer_json()
+            except (ValueError, UnicodeDecodeError) as e:
+                self._responder(400, {'error': f'JSON inválido: {e}'})
+                return
+            if not isinstance(cuerpo, dict):
+                self._responder(400, {'error': 'Se espera un objeto JSON'})
+                return
+
+            if self.path == '/calcular':
+                filas = cuerpo.get('filas')
+                if not isinstance(filas, list) or not filas:
+                    self._responder(400, {'error': "Se espera 'filas' con una lista no vacía"})
+                    return
+                opciones = cuerpo.get('opciones') or {}
+                if not isinstance(opciones, dict):
+                    self._responder(400, {'error': "Se espera 'opciones' como objeto"})
+                    return
+                opciones = {k: v for k, v in opciones.items() if k in OPCIONES_CALCULO}
+                inicio = time.perf_counter()
+                try:
+                    df = servicio.catalogo.cotizar(filas, **opciones)
+                except Exception as e:
+                    self._responder(400, {'error': str(e)})
+                    return
+                resultados = [
+                    {col: _a_json(v) for col, v in zip(df.columns, fila)}
+                    for fila in df.itertuples(index=False)
+                ]
+                self._responder(200, {
+                    'resultados': resultados,
+                    'ms': round((time.perf_counter() - inicio) * 1000, 3),
+                })
+            elif self.path == '/recargar':
+                # Solo se relee el archivo configurado al iniciar: un cliente no elige rutas del disco
+                if 'odoo' in cuerpo:
+                    self._responder(400, {'error': "No se admite 'odoo': se recarga el archivo configurado"})
+                    return
+                try:
+                    catalogo = servicio.recargar()
+                except Exception:
+                    # El detalle queda en la consola del servidor, no en la respuesta
+                    traceback.print_exc()
+                    self._responder(500, {'error': 'No se pudo recargar el catálogo; se sigue usando el anterior'})
+                    return
+                self._responder(200, {'catalogo': catalogo.origen, 'productos': len(catalogo.df)})
+            else:
+                self._responder(404, {'error': f'Ruta desconocida: {self.path}'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def crear_servidor(ruta_odoo, host: str = '127.0.0.1', puerto: int = 8765) -> ThreadingHTTPServer:
+    """
+    Crea el servidor (sin iniciarlo) con el catálogo ya cargado.
+
+    Args:
+        ruta_odoo: Ruta al Excel de Odoo
+        host: Interfaz de escucha
+        puerto: Puerto TCP (0 para elegir uno libre)
+
+    Returns:
+        ThreadingHTTPServer listo para ``serve_forever``
+    """
+    servicio = ServicioCotizacion(ruta_odoo)
+    servidor = ThreadingHTTPServer((host, puerto), _crear_handler(servicio))
+    servidor.daemon_threads = True
+    servidor.servicio = servicio
+    return servidor
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--odoo', required=True, help='Excel de Odoo (product.template)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    print(f"📖 Cargando catálogo Odoo: {args.odoo}")
+    servidor = crear_servidor(args.odoo, args.host, args.puerto)
+    print(f"   → Productos Odoo: {len(servidor.servicio.catalogo.df)}")
+    print(f"🚀 Escuchando en http://{args.host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
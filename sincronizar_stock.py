@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Sincronización rápida de stock: solo QUANTITY contra 'Cantidad a mano'.
+
+Para publicar el stock cada pocos minutos no hace falta el pipeline
+completo: no se parsean comisiones ni financiación, no se llama a
+``calcular`` ni se arma ``preparar_resultado_final``. De la hoja de ML se
+leen solo ITEM_ID, VARIATION_ID, SKU y QUANTITY y de la de Odoo solo
+'Código Neored' y 'Cantidad a mano', recorriendo el XML de cada hoja con el
+lector por filas de ``parche_ml``: en cada fila se deja de mirar celdas
+después de la última columna pedida y nada se convierte con openpyxl.
+
+``diferencias_stock`` cruza ambos por SKU (con la misma política de códigos
+repetidos de ``unir_y_validar``) y devuelve solo las publicaciones cuyo stock
+cambia. El stock nuevo es el mismo que pondría una corrida completa:
+'Cantidad a mano' (o, con ``asignacion``, el reparto de
+``asignacion_stock.asignar_stock``); un stock vacío cuenta como 0, como en
+``leer_odoo``. Las publicaciones sin código en Odoo no se tocan.
+
+Uso:
+    python sincronizar_stock.py ML.xlsx Odoo.xlsx cambios.csv [--formato csv]
+                                [--libro ML_con_stock.xlsx] [--asignar-stock proporcional]
+"""
+import argparse
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+import pandas as pd
+
+from data_processor import (
+    resolver_duplicados_odoo, exportar, _error_duplicados, FORMATOS_EXPORTACION, POLITICAS_DUPLICADOS,
+)
+from parche_ml import (
+    actualizar_libro_ml, _celdas, _filas, _leer_compartidas, _valor_celda, NOTA_SIN_STOCK,
+)
+from utils import _ruta_hoja_xlsx, _texto_clave, HOJA_POR_TIPO
+
+COLUMNAS_STOCK_ML = ['ITEM_ID', 'VARIATION_ID', 'SKU', 'QUANTITY']
+COLUMNAS_STOCK_ODOO = ['Código Neored', 'Cantidad a mano']
+# Columnas de ``diferencias_stock``
+COLUMNAS_CAMBIOS_STOCK = [
+    'Numero de publicación',
+    'Variación',
+    'SKU',
+    'Código Neored',
+    'Stock actual en ML',
+    'Stock',
+    'Diferencia',
+]
+
+
+def leer_columnas_xlsx(archivo, tipo: str, columnas: list, opcionales: tuple = ()) -> pd.DataFrame:
+    """
+    Lee solo ``columnas`` de la hoja de ML u Odoo, como texto.
+
+    Args:
+        archivo: Ruta o archivo binario .xlsx
+        tipo: 'ml' u 'odoo' (hoja de ``HOJA_POR_TIPO``; si no existe, la primera)
+        columnas: Columnas obligatorias
+        opcionales: Columnas que se leen si están (si no, quedan vacías)
+
+    Returns:
+        DataFrame de texto con una fila por fila de datos de la hoja (las celdas
+        vacías como ''; los números enteros sin '.0')
+    """
+    nombres = list(columnas) + [col for col in opcionales if col not in columnas]
+    valores = {nombre: [] for nombre in nombres}
+    with zipfile.ZipFile(archivo) as z:
+        ruta_hoja = _ruta_hoja_xlsx(z, HOJA_POR_TIPO[tipo])
+        compartidas = _leer_compartidas(z)
+        with z.open(ruta_hoja) as origen:
+            posiciones = None
+            for _, fila in _filas(origen):
+                if fila is None:
+                    break
+                if posiciones is None:
+                    # Primera fila: encabezados
+                    encabezado = {_valor_celda(a, c, compartidas): col for col, _, _, a, c in _celdas(fila)}
+                    faltantes = [nombre for nombre in columnas if nombre not in encabezado]
+                    if faltantes:
+                        raise ValueError(
+                            f"Error en estructura {'ML' if tipo == 'ml' else 'Odoo'}: faltan columnas {', '.join(faltantes)}"
+                        )
+                    posiciones = {encabezado[nombre]: nombre for nombre in nombres if nombre in encabezado}
+                    ultima = max(posiciones)
+                    continue
+                leidos = {}
+                for col, _, _, atributos, contenido in _celdas(fila):
+                    if col > ultima:
+                        break
+                    nombre = posiciones.get(col)
+                    if nombre is not None:
+                        leidos[nombre] = _valor_celda(atributos, contenido, compartidas)
+                for nombre in nombres:
+                    valores[nombre].append(leidos.get(nombre, ''))
+    return pd.DataFrame(valores, dtype=object)
+
+
+def leer_stock_ml(archivo_ml, columnas_extra: tuple = ()) -> pd.DataFrame:
+    """
+    Publicaciones de ML con ITEM_ID, VARIATION_ID, SKU y QUANTITY.
+
+    Conserva las mismas filas que ``clean_ml_data`` (ITEM_ID 'ML...' con SKU)
+    y en el mismo orden.
+
+    Args:
+        archivo_ml: Excel de MercadoLibre (ruta o archivo binario)
+        columnas_extra: Otras columnas a leer si están (p. ej. 'LISTING_TYPE_V3')
+
+    Returns:
+        DataFrame con QUANTITY numérico (NaN si la celda no es un número)
+    """
+    df = leer_columnas_xlsx(
+        archivo_ml, 'ml', ['ITEM_ID', 'SKU', 'QUANTITY'], ('VARIATION_ID',) + tuple(columnas_extra)
+    )
+    validas = df['ITEM_ID'].str.startswith('ML').to_numpy(dtype=bool) & (df['SKU'] != '').to_numpy()
+    df = df.take(np.flatnonzero(validas))
+    df.index = pd.RangeIndex(len(df))
+    df['QUANTITY'] = pd.to_numeric(df['QUANTITY'], errors='coerce')
+    return df
+
+
+def leer_stock_odoo(archivo_odoo) -> pd.DataFrame:
+    """Productos de Odoo con código: 'Código Neored' y 'Cantidad a mano' (numérica)."""
+    df = leer_columnas_xlsx(archivo_odoo, 'odoo', COLUMNAS_STOCK_ODOO)
+    df = df.take(np.flatnonzero((df['Código Neored'] != '').to_numpy()))
+    df.index = pd.RangeIndex(len(df))
+    # Como ``parsear_campos_odoo``: el stock vacío o no numérico es 0
+    df['Cantidad a mano'] = pd.to_numeric(df['Cantidad a mano'], errors='coerce').fillna(0)
+    return df
+
+
+def diferencias_stock(
+    df_ml: pd.DataFrame,
+    df_odoo: pd.DataFrame,
+    politica_duplicados: str = 'primero',
+    asignacion: dict = None
+) -> pd.DataFrame:
+    """
+    Publicaciones cuyo QUANTITY difiere del stock de Odoo.
+
+    Args:
+        df_ml: DataFrame de ``leer_stock_ml`` (o de ``leer_ml``)
+        df_odoo: DataFrame de ``leer_stock_odoo`` (o de ``leer_odoo``)
+        politica_duplicados: 'primero', 'ultimo', 'mayor_stock' o 'error'
+            (ValueError si alguna publicación usa un código repetido)
+        asignacion: Argumentos de ``asignacion_stock.asignar_stock`` para
+            repartir el stock entre publicaciones del mismo código (None = cada
+            una recibe 'Cantidad a mano' completo)
+
+    Returns:
+        DataFrame con ``COLUMNAS_CAMBIOS_STOCK``; el índice es la posición de
+        cada publicación en ``df_ml``
+    """
+    if politica_duplicados not in POLITICAS_DUPLICADOS:
+        raise ValueError(f"Política de duplicados no soportada: {politica_duplicados}")
+
+    catalogo = df_odoo[COLUMNAS_STOCK_ODOO].assign(
+        **{'Código Neored': [_texto_clave(v) for v in df_odoo['Código Neored']]}
+    )
+    catalogo = catalogo[catalogo['Código Neored'] != '']
+    politica_resolucion = 'primero' if politica_duplicados == 'error' else politica_duplicados
+    catalogo, duplicados = resolver_duplicados_odoo(catalogo, politica_resolucion)
+
+    skus = np.array([_texto_clave(v) for v in df_ml['SKU']], dtype=object)
+    posicion = pd.Index(catalogo['Código Neored']).get_indexer(skus)
+    encontrado = posicion >= 0
+    if politica_duplicados == 'error' and len(duplicados):
+        usados = pd.unique(skus[encontrado & pd.Series(skus).isin(duplicados).to_numpy()])
+        if len(usados):
+            raise _error_duplicados(usados)
+
+    stock_odoo = pd.to_numeric(catalogo['Cantidad a mano'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    cantidad = np.where(encontrado, stock_odoo[np.maximum(posicion, 0)], np.nan)
+
+    if asignacion is not None:
+        from asignacion_stock import asignar_stock
+
+        codigos = np.where(encontrado, skus, None)
+        df_reparto = pd.DataFrame({
+            'Código Neored': codigos,
+            'Cantidad a mano': cantidad,
+            'QUANTITY': df_ml['QUANTITY'].to_numpy(),
+            'Notas/Flags': '',
+        })
+        if 'LISTING_TYPE_V3' in df_ml.columns:
+            df_reparto['LISTING_TYPE_V3'] = df_ml['LISTING_TYPE_V3'].to_numpy()
+        nuevo = asignar_stock(df_reparto, **asignacion)['Stock asignado'].to_numpy()
+    else:
+        # Como ``preparar_resultado_final``: entero truncado
+        nuevo = np.nan_to_num(cantidad).astype(np.int64)
+
+    actual = pd.to_numeric(df_ml['QUANTITY'], errors='coerce').to_numpy(dtype=float)
+    # Un QUANTITY vacío o no numérico también se actualiza
+    cambia = encontrado & ~(actual == nuevo)
+    filas = np.flatnonzero(cambia)
+
+    variaciones = df_ml['VARIATION_ID'] if 'VARIATION_ID' in df_ml.columns else pd.Series([''] * len(df_ml))
+    return pd.DataFrame({
+        'Numero de publicación': df_ml['ITEM_ID'].to_numpy(dtype=object)[filas],
+        'Variación': variaciones.to_numpy(dtype=object)[filas],
+        'SKU': df_ml['SKU'].to_numpy(dtype=object)[filas],
+        'Código Neored': skus[filas],
+        'Stock actual en ML': actual[filas],
+        'Stock': nuevo[filas],
+        'Diferencia': nuevo[filas] - actual[filas],
+    }, index=filas)
+
+
+def escribir_stock_en_libro(archivo_ml, df_ml: pd.DataFrame, df_cambios: pd.DataFrame, output_path=None) -> dict:
+    """
+    Escribe el stock nuevo en QUANTITY del Excel de ML original (con ``parche_ml``).
+
+    Args:
+        archivo_ml: Excel de MercadoLibre del que salió ``df_ml``
+        df_ml: DataFrame de ``leer_stock_ml``
+        df_cambios: DataFrame de ``diferencias_stock``
+        output_path: Archivo de salida; None devuelve los bytes en 'datos'
+
+    Returns:
+        El resumen de ``parche_ml.actualizar_libro_ml``
+    """
+    # ``parche_ml`` ubica por (ITEM_ID, SKU) y por orden de aparición: van
+    # todas las publicaciones, y las que no cambian se marcan para saltearlas
+    stock = np.zeros(len(df_ml), dtype=np.int64)
+    stock[df_cambios.index] = df_cambios['Stock'].to_numpy()
+    notas = np.full(len(df_ml), NOTA_SIN_STOCK, dtype=object)
+    notas[df_cambios.index] = ''
+    df_resultado = pd.DataFrame({
+        'Numero de publicación': df_ml['ITEM_ID'].to_numpy(),
+        'SKU': df_ml['SKU'].to_numpy(),
+        'Precio final': 0.0,
+        'Stock': stock,
+        'Notas/Flags': notas,
+    })
+    return actualizar_libro_ml(archivo_ml, df_resultado, output_path, actualizar_precio=False)
+
+
+def sincronizar_stock(
+    archivo_ml,
+    archivo_odoo,
+    output_path=None,
+    formato: str = 'csv',
+    libro_path=None,
+    politica_duplicados: str = 'primero',
+    asignacion: dict = None
+) -> dict:
+    """
+    Lee, compara y exporta solo los cambios de stock.
+
+    Args:
+        archivo_ml: Excel de MercadoLibre
+        archivo_odoo: Excel de Odoo, o un DataFrame ya leído
+        output_path: Archivo para los cambios (None = no exportar)
+        formato: Formato de ``output_path`` ('xlsx', 'csv', 'parquet' o 'jsonl')
+        libro_path: Si se indica, copia del Excel de ML con QUANTITY actualizado
+        politica_duplicados: Ver ``diferencias_stock``
+        asignacion: Ver ``diferencias_stock``
+
+    Returns:
+        dict con 'cambios' (DataFrame de ``diferencias_stock``), 'publicaciones'
+        (leídas de ML) y 'segundos'
+    """
+    inicio = time.perf_counter()
+    extra = ('LISTING_TYPE_V3',) if asignacion is not None else ()
+    df_ml = leer_stock_ml(archivo_ml, extra)
+    df_odoo = archivo_odoo if isinstance(archivo_odoo, pd.DataFrame) else leer_stock_odoo(archivo_odoo)
+    df_cambios = diferencias_stock(df_ml, df_odoo, politica_duplicados, asignacion)
+    if output_path is not None:
+        exportar(df_cambios.reset_index(drop=True), formato, output_path=str(output_path))
+    if libro_path is not None:
+        escribir_stock_en_libro(archivo_ml, df_ml, df_cambios, str(libro_path))
+    return {'cambios': df_cambios, 'publicaciones': len(df_ml), 'segundos': time.perf_counter() - inicio}
+
+
+def main(argv=None) -> int:
+    from asignacion_stock import REGLAS_ASIGNACION
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ml')
+    parser.add_argument('odoo')
+    parser.add_argument('salida', help='Archivo con las publicaciones cuyo stock cambia')
+    parser.add_argument('--formato', default='csv', choices=list(FORMATOS_EXPORTACION))
+    parser.add_argument('--libro', help='Copia del Excel de ML con QUANTITY actualizado')
+    parser.add_argument('--politica-duplicados', default='primero', choices=list(POLITICAS_DUPLICADOS))
+    parser.add_argument(
+        '--asignar-stock', choices=list(REGLAS_ASIGNACION),
+        help='Repartir el stock de cada código entre sus publicaciones (ver asignacion_stock.py)'
+    )
+    parser.add_argument('--stock-seguridad', type=float, default=0, help='Unidades por código que no se publican')
+    parser.add_argument('--tope-por-publicacion', type=float, help='Máximo de stock por publicación')
+    args = parser.parse_args(argv)
+
+    asignacion = None
+    if args.asignar_stock:
+        asignacion = {
+            'regla': args.asignar_stock,
+            'stock_seguridad': args.stock_seguridad,
+            'tope_por_publicacion': args.tope_por_publicacion,
+        }
+    resumen = sincronizar_stock(
+        args.ml, args.odoo, args.salida, args.formato, args.libro, args.politica_duplicados, asignacion
+    )
+    print(
+        f"✅ {len(resumen['cambios'])} de {resumen['publicaciones']} publicaciones cambian de stock "
+        f"({resumen['segundos']:.2f} s)"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,9 +1,14 @@
 import pandas as pd
+import pytest
 import io
 from math import isclose
 from openpyxl import load_workbook
-from data_processor import leer_ml, leer_odoo, unir_y_validar, calcular, preparar_resultado_final, exportar_excel
-from utils import calcular_precio_publicacion_ml
+from data_processor import (
+    leer_ml, leer_odoo, unir_y_validar, calcular, preparar_resultado_final, exportar_excel,
+    construir_tabla_comisiones, comparar_tipos_publicacion, exportar, sugerir_coincidencias,
+    auditar_margenes, comparar_planes_cuotas, construir_tabla_cuotas,
+)
+from utils import calcular_precio_publicacion_ml, extract_tax_percentage
 
 def crear_datos_ejemplo():
     """
@@ -313,6 +318,882 @@ def test_recargo_envio_sin_columna_shipping_no_aplica():
     df_calculado = calcular(df_sin_shipping, tipo_recargo_envio='Fijo ($)', valor_recargo_envio=200)
     assert all(isclose(valor, 0.0, abs_tol=1e-9) for valor in df_calculado['Recargo envío ($)'])
 
+def test_comparar_tipos_publicacion_coincide_con_calculo_individual():
+    df_merged = preparar_df_para_calculo()
+    tabla = {'gold_special': '14.50% + $1095.00', 'gold_pro': (0.12, 800.0)}
+    df_comp = comparar_tipos_publicacion(df_merged, tabla_comisiones=tabla)
+
+    assert len(df_comp) == df_merged['Código Neored'].notna().sum()
+    fila = df_comp[df_comp['SKU'] == 'MMM42385'].iloc[0]
+    fila_merged = df_merged[df_merged['SKU'] == 'MMM42385'].iloc[0]
+    for tipo, (pct, fijo) in {'gold_special': (0.145, 1095.0), 'gold_pro': (0.12, 800.0)}.items():
+        precio, _, _, _, recibis, invalido = calcular_precio_publicacion_ml(
+            tarifa_neta=fila_merged['Precio Tarifa'],
+            porcentaje_comision=pct,
+            porcentaje_financiacion=fila_merged['financing_pct'],
+            porcentaje_retenciones=0.0,
+            costo_fijo=fijo,
+        )
+        assert not invalido
+        assert isclose(fila[f'Precio final ({tipo})'], precio, rel_tol=1e-04)
+        assert isclose(fila[f'Recibis ($) ({tipo})'], recibis, rel_tol=1e-04)
+    assert fila['Tipo más económico'] == 'gold_pro'
+
+    # Financiación no numérica o sin columna: 0, como en ``calcular``
+    sin_columna = comparar_tipos_publicacion(df_merged.drop(columns='financing_pct'), tabla_comisiones=tabla)
+    con_texto = comparar_tipos_publicacion(df_merged.assign(financing_pct='s/d'), tabla_comisiones=tabla)
+    pd.testing.assert_frame_equal(con_texto, sin_columna)
+    assert sin_columna['Precio final (gold_pro)'].notna().all()
+    # Sin 'tax_pct' (como en ``calcular``) los impuestos son 0
+    sin_impuestos = comparar_tipos_publicacion(
+        df_merged.drop(columns='tax_pct'), tabla_comisiones=tabla, incluir_impuestos=True
+    )
+    pd.testing.assert_frame_equal(sin_impuestos, comparar_tipos_publicacion(df_merged, tabla_comisiones=tabla))
+
+def test_comparar_planes_cuotas_coincide_con_calcular_por_plan():
+    df_merged = preparar_df_para_calculo()
+    tabla = {3: '4.50%', 6: 0.09, 12: '17%'}
+    df_cuotas = comparar_planes_cuotas(df_merged, '12: 17%, 3: 4.5%; 6: 9%', incluir_impuestos=True, tolerancia=0.10)
+
+    assert list(construir_tabla_cuotas(tabla).index) == [3, 6, 12]
+    assert len(df_cuotas) == df_merged['Código Neored'].notna().sum()
+    for cuotas, costo in {3: 0.045, 6: 0.09, 12: 0.17}.items():
+        df_calc = calcular(df_merged.assign(financing_pct=costo), incluir_impuestos=True)
+        df_calc = df_calc[df_calc['Código Neored'].notna()]
+        assert df_cuotas[f'Precio final ({cuotas} cuotas)'].tolist() == df_calc['Precio final'].tolist()
+        fila = df_cuotas.iloc[0]
+        recibis = fila['Precio actual en ML'] * (1 - 0.145 - costo) - 1095.0
+        assert isclose(fila[f'Recibis con precio actual ($) ({cuotas} cuotas)'], recibis, abs_tol=0.01)
+
+    # 6 cuotas cuesta ~5% más que 3 y 12 cuotas ~15% más: con 10% de tolerancia se recomienda 6
+    assert (df_cuotas['Plan recomendado (cuotas)'] == 6).all()
+    assert (df_cuotas['Precio plan recomendado'] == df_cuotas['Precio final (6 cuotas)']).all()
+    with pytest.raises(ValueError):
+        construir_tabla_cuotas({3: '4%', '3': '5%'})
+
+def test_construir_tabla_comisiones_usa_combinacion_mas_frecuente():
+    df_ml, _ = crear_datos_ejemplo()
+    df_ml.loc[4, 'LISTING_TYPE_V3'] = 'gold_special'
+    df_ml.loc[4, 'FEE_PER_SALE_MARKETPLACE_V2'] = '13.50% + $750.00'
+    tabla = construir_tabla_comisiones(df_ml)
+    assert list(tabla.index) == ['free', 'gold_pro', 'gold_special']
+    assert isclose(tabla.loc['gold_special', 'fee_pct'], 0.135)
+    assert isclose(tabla.loc['gold_special', 'fee_fixed'], 750.0)
+
+def _excel_en_memoria(df, sheet_name):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, sheet_name=sheet_name, index=False)
+    buffer.seek(0)
+    return buffer
+
+def _valores_excel(excel_bytes):
+    ws = load_workbook(filename=io.BytesIO(excel_bytes)).active
+    return [[cell.value for cell in row] for row in ws.iter_rows()]
+
+def test_modo_cadenas_arrow_exporta_mismo_contenido():
+    pytest.importorskip('pyarrow')
+    df_ml, df_odoo = crear_datos_ejemplo()
+    resultados = []
+    for cadenas_arrow in (False, True):
+        df_ml_leido = leer_ml(_excel_en_memoria(df_ml, 'Hoja1'), cadenas_arrow=cadenas_arrow)
+        df_odoo_leido = leer_odoo(_excel_en_memoria(df_odoo, 'Sheet1'), cadenas_arrow=cadenas_arrow)
+        if cadenas_arrow:
+            assert isinstance(df_ml_leido['SKU'].dtype, pd.StringDtype)
+            assert isinstance(df_odoo_leido['Código Neored'].dtype, pd.StringDtype)
+        df_merged = unir_y_validar(df_ml_leido, df_odoo_leido)
+        df_resultado = preparar_resultado_final(calcular(df_merged))
+        resultados.append(_valores_excel(exportar_excel(df_resultado)))
+    assert resultados[0] == resultados[1]
+
+def _post_json(url, cuerpo):
+    import json
+    import urllib.request
+    pedido = urllib.request.Request(
+        url, data=json.dumps(cuerpo).encode('utf-8'), headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(pedido, timeout=10) as respuesta:
+        return json.loads(respuesta.read().decode('utf-8'))
+
+def test_servidor_cotiza_y_recarga_catalogo(tmp_path):
+    import threading
+    from servidor import crear_servidor
+
+    _, df_odoo = crear_datos_ejemplo()
+    ruta_odoo = tmp_path / 'odoo.xlsx'
+    df_odoo.to_excel(ruta_odoo, sheet_name='Sheet1', index=False)
+
+    servidor = crear_servidor(ruta_odoo, puerto=0)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    url = f'http://127.0.0.1:{servidor.server_address[1]}'
+    try:
+        fila = {
+            'SKU': 'LED7012795',
+            'FEE_PER_SALE_MARKETPLACE_V2': '14.50% + $1095.00',
+            'COST_OF_FINANCING_MARKETPLACE': '4.00%',
+            'SHIPPING_METHOD': 'Mercado Envíos Clásico',
+        }
+        respuesta = _post_json(f'{url}/calcular', {'filas': [fila, {'SKU': 'NOEXISTE123'}]})
+        led, faltante = respuesta['resultados']
+        precio, *_ = calcular_precio_publicacion_ml(18500.0, 0.145, 0.04, 0.0, 1095.0)
+        assert isclose(led['Precio final'], precio, rel_tol=1e-04)
+        assert led['Cantidad a mano'] == 250
+        assert 'SKU no encontrado en Odoo' in faltante['Notas/Flags']
+
+        df_odoo.loc[df_odoo['Código Neored'] == 'LED7012795', 'Precio Tarifa'] = 20000.0
+        df_odoo.to_excel(ruta_odoo, sheet_name='Sheet1', index=False)
+        assert _post_json(f'{url}/recargar', {})['productos'] == len(df_odoo)
+        led = _post_json(f'{url}/calcular', {'filas': [fila]})['resultados'][0]
+        assert led['Precio de Tarifa'] == 20000.0
+
+        # Cuerpos mal formados y rutas elegidas por el cliente: 400 con respuesta
+        import urllib.error
+        for ruta, cuerpo in (
+            ('calcular', [fila]),
+            ('calcular', {'filas': [fila], 'opciones': 'incluir_impuestos'}),
+            ('recargar', 3),
+            ('recargar', {'odoo': str(tmp_path / 'otro.xlsx')}),
+        ):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                _post_json(f'{url}/{ruta}', cuerpo)
+            assert error.value.code == 400
+        # Si el archivo configurado se rompe, no se filtra el detalle y sigue el catálogo anterior
+        ruta_odoo.write_bytes(b'no es un xlsx')
+        with pytest.raises(urllib.error.HTTPError) as error:
+            _post_json(f'{url}/recargar', {})
+        assert error.value.code == 500 and str(ruta_odoo) not in error.value.read().decode('utf-8')
+        assert _post_json(f'{url}/calcular', {'filas': [fila]})['resultados'][0]['Precio de Tarifa'] == 20000.0
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+def test_vigilante_procesa_archivos_completos_y_los_mueve(tmp_path):
+    from vigilante import VigilanteCarpeta
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    entrada, salida = tmp_path / 'entrada', tmp_path / 'salida'
+    entrada.mkdir()
+    df_odoo.to_excel(entrada / 'Producto (product.template) (1).xlsx', sheet_name='Sheet1', index=False)
+    df_ml.to_excel(entrada / 'MercadoLibre-cambiodeprecios-lote1.xlsx', sheet_name='Hoja1', index=False)
+    (entrada / 'MercadoLibre-cambiodeprecios-parcial.xlsx').write_bytes(b'PK\x03\x04incompleto')
+
+    vigilante = VigilanteCarpeta(entrada, salida, workers=1)
+    # El primer escaneo solo registra los archivos; se procesan cuando no cambian
+    assert vigilante.procesar_pendientes() == []
+    generados = vigilante.procesar_pendientes()
+
+    assert [ruta.name for ruta in generados] == ['ML_precios_y_stock_calculados-lote1.xlsx']
+    headers = _valores_excel(generados[0].read_bytes())[0]
+    assert 'Precio final' in headers
+    assert (entrada / 'procesados' / 'MercadoLibre-cambiodeprecios-lote1.xlsx').exists()
+    # El archivo a medio escribir no es un zip válido y queda esperando
+    assert (entrada / 'MercadoLibre-cambiodeprecios-parcial.xlsx').exists()
+    assert not any((entrada / 'errores').iterdir())
+
+def test_vigilante_sobrevive_a_exportacion_de_odoo_invalida(tmp_path, monkeypatch):
+    import os
+    import threading
+    from vigilante import VigilanteCarpeta
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    entrada, salida = tmp_path / 'entrada', tmp_path / 'salida'
+    entrada.mkdir()
+    df_odoo.to_excel(entrada / 'Producto (product.template) (1).xlsx', sheet_name='Sheet1', index=False)
+    vigilante = VigilanteCarpeta(entrada, salida, workers=1)
+    vigilante.procesar_pendientes()
+    vigilante.procesar_pendientes()
+    catalogo = vigilante.df_odoo
+    assert catalogo is not None
+
+    # Exportación más nueva sin las columnas requeridas
+    invalida = entrada / 'Producto (product.template) (2).xlsx'
+    df_odoo[['Código Neored']].to_excel(invalida, sheet_name='Sheet1', index=False)
+    mas_tarde = os.stat(invalida).st_mtime_ns + 10**9
+    os.utime(invalida, ns=(mas_tarde, mas_tarde))
+    df_ml.to_excel(entrada / 'MercadoLibre-cambiodeprecios-lote1.xlsx', sheet_name='Hoja1', index=False)
+    vigilante.procesar_pendientes()
+    generados = vigilante.procesar_pendientes()
+    assert [ruta.name for ruta in generados] == ['ML_precios_y_stock_calculados-lote1.xlsx']
+    assert vigilante.df_odoo is catalogo
+    assert (entrada / 'errores' / invalida.name).exists()
+    assert 'Error en estructura Odoo' in (entrada / 'errores' / invalida.name).with_suffix('.log').read_text()
+
+    # Un escaneo que falla no termina el bucle
+    parada, llamadas = threading.Event(), []
+    def escaneo_que_falla():
+        llamadas.append(1)
+        if len(llamadas) == 2:
+            parada.set()
+        raise RuntimeError('disco no disponible')
+    monkeypatch.setattr(vigilante, 'procesar_pendientes', escaneo_que_falla)
+    vigilante.ejecutar(intervalo=0, evento_parada=parada)
+    assert len(llamadas) == 2
+
+def test_catalogo_compilado_une_igual_que_dataframe(tmp_path):
+    from catalogo_compilado import compilar_catalogo, abrir_catalogo
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    df_ml = preparar_df_para_calculo()[df_ml.columns.tolist() + ['fee_pct', 'fee_fixed', 'financing_pct']]
+    df_odoo['tax_pct'] = df_odoo['Impuestos del cliente'].apply(extract_tax_percentage)
+    # Código duplicado: ambos caminos deben resolverlo igual con cada política
+    df_odoo = pd.concat([df_odoo, df_odoo.iloc[[1]].assign(**{'Cantidad a mano': 7})], ignore_index=True)
+
+    catalogo = abrir_catalogo(compilar_catalogo(df_odoo, tmp_path / 'catalogo.mlcat'))
+    assert len(catalogo) == len(df_odoo)
+    assert list(catalogo.codigos_duplicados()) == ['CORNPR06WW']
+
+    columnas = ['SKU', 'Código Neored', 'Nombre', 'Cantidad a mano', 'Precio Tarifa', 'tax_pct', 'Notas/Flags']
+    for politica in ('primero', 'ultimo', 'mayor_stock'):
+        esperado = unir_y_validar(df_ml, df_odoo, politica)[columnas].reset_index(drop=True)
+        obtenido = unir_y_validar(df_ml, catalogo, politica)[columnas]
+        assert len(obtenido) == len(df_ml)
+        pd.testing.assert_frame_equal(
+            obtenido.astype({'Cantidad a mano': float}),
+            esperado.astype({'Cantidad a mano': float}),
+        )
+
+    # Códigos numéricos: 123.0 coincide con 123 pero un código numérico no coincide con el texto '456'
+    odoo_numerico = pd.DataFrame({
+        'Código Neored': [123.0, 456.0, 789.5], 'Nombre': ['A', 'B', 'C'],
+        'Precio Tarifa': [10.0, 20.0, 30.0], 'Cantidad a mano': [1, 2, 3], 'tax_pct': [21.0, 21.0, 10.5],
+    })
+    catalogo = abrir_catalogo(compilar_catalogo(odoo_numerico, tmp_path / 'numerico.mlcat'))
+    for skus in ([123, 456, 789], [123, '456', 789.5]):
+        ml = pd.DataFrame({'SKU': pd.Series(skus, dtype=object), 'ITEM_ID': ['MLA1', 'MLA2', 'MLA3']})
+        esperado = unir_y_validar(ml, odoo_numerico)[columnas]
+        obtenido = unir_y_validar(ml, catalogo)[columnas]
+        pd.testing.assert_frame_equal(obtenido, esperado)
+    assert obtenido['Código Neored'].isna().tolist() == [False, True, False]
+
+def test_unir_y_validar_resuelve_codigos_duplicados_sin_multiplicar_filas():
+    df_ml, df_odoo = crear_datos_ejemplo()
+    df_ml = preparar_df_para_calculo()[df_ml.columns.tolist() + ['fee_pct', 'fee_fixed', 'financing_pct']]
+    df_odoo['tax_pct'] = df_odoo['Impuestos del cliente'].apply(extract_tax_percentage)
+    # CORNPR06WW tres veces en Odoo (la del medio con más stock) y un SKU repetido en ML
+    df_odoo = pd.concat([
+        df_odoo,
+        df_odoo.iloc[[1]].assign(**{'Cantidad a mano': 900, 'Precio Tarifa': 7000.0}),
+        df_odoo.iloc[[1]].assign(**{'Cantidad a mano': 5, 'Precio Tarifa': 7100.0}),
+    ], ignore_index=True)
+    df_ml = pd.concat([df_ml, df_ml.iloc[[0]].assign(ITEM_ID='MLA000000001')], ignore_index=True)
+
+    esperados = {'primero': 120, 'ultimo': 5, 'mayor_stock': 900}
+    for politica, stock in esperados.items():
+        df_merged = unir_y_validar(df_ml, df_odoo, politica)
+        assert len(df_merged) == len(df_ml)
+        assert df_merged['ITEM_ID'].tolist() == df_ml['ITEM_ID'].tolist()
+        fila = df_merged[df_merged['SKU'] == 'CORNPR06WW'].iloc[0]
+        assert fila['Cantidad a mano'] == stock
+        assert 'Código duplicado en Odoo' in fila['Notas/Flags']
+        repetidas = df_merged[df_merged['SKU'] == 'LED7012795']['Notas/Flags']
+        assert repetidas.str.contains('SKU repetido en otras publicaciones de ML').all()
+
+    with pytest.raises(ValueError, match='CORNPR06WW'):
+        unir_y_validar(df_ml, df_odoo, 'error')
+    # Los duplicados que ninguna publicación usa no impiden el cruce
+    sin_uso = df_ml[df_ml['SKU'] != 'CORNPR06WW']
+    assert len(unir_y_validar(sin_uso, df_odoo, 'error')) == len(sin_uso)
+
+def test_perfilar_genera_volcado_y_resumen(tmp_path):
+    import pstats
+    from perfilado import perfilar, perfilar_si_corresponde
+
+    with perfilar(tmp_path, top_n=5) as perfil:
+        exportar_excel(preparar_resultado_final(calcular(preparar_df_para_calculo())))
+        # tracemalloc es de todo el proceso: no se puede anidar
+        with pytest.raises(RuntimeError):
+            with perfilar(tmp_path):
+                pass
+
+    assert perfil.ruta_perfil.exists() and perfil.ruta_resumen.exists()
+    assert pstats.Stats(str(perfil.ruta_perfil)).total_calls > 0
+    for area in ('utils (parsers)', 'calcular', 'openpyxl en exportar_excel', 'en el pico', 'retenida al terminar'):
+        assert area in perfil.resumen
+
+    with perfilar_si_corresponde(False) as desactivado:
+        assert desactivado is None
+
+def test_normalizacion_y_sugerencias_de_sku():
+    from coincidencia_sku import IndiceNgramas, normalizar_sku, equivalencias_aceptadas
+
+    assert normalizar_sku([' led-007012795 ', 'abc_12', None]).tolist()[:2] == ['LED7012795', 'ABC12']
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    df_ml = preparar_df_para_calculo()[df_ml.columns.tolist() + ['fee_pct', 'fee_fixed', 'financing_pct']]
+    df_ml.loc[0, 'SKU'] = 'led-7012795'
+    df_ml.loc[1, 'SKU'] = 'CORNPR06W'
+
+    exacto = unir_y_validar(df_ml, df_odoo)
+    assert exacto['Código Neored'].isna().sum() == 3
+
+    df_merged = unir_y_validar(df_ml, df_odoo, normalizar_sku=True)
+    assert df_merged.loc[0, 'Código Neored'] == 'LED7012795'
+    assert df_merged.loc[0, 'SKU'] == 'led-7012795'
+    assert 'SKU vinculado por clave normalizada' in df_merged.loc[0, 'Notas/Flags']
+
+    sugerencias = sugerir_coincidencias(df_merged, df_odoo)
+    assert sugerencias['SKU'].tolist() == ['CORNPR06W']
+    assert sugerencias.loc[0, 'Código sugerido'] == 'CORNPR06WW'
+    assert 0.6 <= sugerencias.loc[0, 'Similitud'] < 1
+    # Nada se aplica sin aceptación explícita
+    assert equivalencias_aceptadas(sugerencias) == {}
+
+    sugerencias['Aceptar'] = True
+    aceptado = unir_y_validar(
+        df_ml, df_odoo, normalizar_sku=True, equivalencias=equivalencias_aceptadas(sugerencias)
+    )
+    assert aceptado.loc[1, 'Código Neored'] == 'CORNPR06WW'
+    assert 'SKU vinculado por equivalencia aceptada' in aceptado.loc[1, 'Notas/Flags']
+    assert aceptado['Código Neored'].isna().sum() == 1
+
+    indice = IndiceNgramas(df_odoo['Código Neored'])
+    assert indice.buscar(['ZZZZZZZZ']).empty
+
+def test_leer_odoo_sql_trae_solo_los_skus_de_ml(tmp_path):
+    import sqlite3
+    from catalogo_sql import leer_odoo_sql
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    mapeo = {'Código Neored': 'default_code', 'Nombre': 'nombre_producto'}
+    ruta = tmp_path / 'odoo.sqlite'
+    with sqlite3.connect(ruta) as conexion:
+        df_odoo.rename(columns={
+            'Código Neored': 'default_code',
+            'Nombre': 'nombre_producto',
+            'Cantidad a mano': 'qty_available',
+            'Precio Tarifa': 'list_price',
+            'Impuestos del cliente': 'taxes',
+        }).to_sql('product_template', conexion, index=False)
+    conexion.close()
+
+    df_ml_leido = leer_ml(_excel_en_memoria(df_ml, 'Hoja1'))
+    desde_excel = leer_odoo(_excel_en_memoria(df_odoo, 'Sheet1'))
+    desde_sql = leer_odoo_sql(ruta, df_ml_leido['SKU'], mapeo=mapeo, skus_por_lote=2, orden='rowid')
+
+    assert 'EXTRA12345' not in set(desde_sql['Código Neored'])
+    esperado = desde_excel[desde_excel['Código Neored'].isin(df_ml_leido['SKU'])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(desde_sql.reset_index(drop=True), esperado)
+    pd.testing.assert_frame_equal(
+        unir_y_validar(df_ml_leido, desde_sql), unir_y_validar(df_ml_leido, desde_excel)
+    )
+    assert len(leer_odoo_sql(ruta, mapeo=mapeo)) == len(desde_excel)
+
+def test_entradas_livianas_no_cargan_dependencias_pesadas():
+    from benchmark import medir_importacion, ENTRADAS_LIVIANAS
+
+    for modulo in ENTRADAS_LIVIANAS:
+        _, pesados = medir_importacion(modulo, repeticiones=1)
+        assert pesados == [], f"{modulo} cargó {pesados}"
+
+def test_leer_encabezados_xlsx_sin_pandas():
+    from utils import leer_encabezados_xlsx, validar_columnas
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        df_odoo.to_excel(writer, sheet_name='Sheet1', index=False)
+        df_ml.rename(columns={'SHIPPING_METHOD ': 'SHIPPING_METHOD'}).to_excel(writer, sheet_name='Hoja1', index=False)
+
+    buffer.seek(0)
+    columnas_ml = leer_encabezados_xlsx(buffer, 'Hoja1')
+    assert columnas_ml[:3] == ['ITEM_ID', 'VARIATION_ID', 'SKU']
+    assert validar_columnas(columnas_ml, 'ml') == (True, 'OK')
+    buffer.seek(0)
+    columnas_odoo = leer_encabezados_xlsx(buffer, 'No existe')
+    assert columnas_odoo == list(df_odoo.columns)
+    es_valido, mensaje = validar_columnas(columnas_odoo, 'ml')
+    assert not es_valido and 'SKU' in mensaje
+
+@pytest.mark.parametrize('formato', ['csv', 'jsonl', 'parquet'])
+def test_exportar_formatos_por_bloques_conserva_contenido(tmp_path, formato):
+    if formato == 'parquet':
+        pytest.importorskip('pyarrow')
+    df_resultado = preparar_resultado_final(calcular(preparar_df_para_calculo()))
+    lectores = {
+        'csv': pd.read_csv,
+        'jsonl': lambda f: pd.read_json(f, lines=True),
+        'parquet': pd.read_parquet,
+    }
+
+    ruta = tmp_path / f'resultado.{formato}'
+    assert exportar(df_resultado, formato, output_path=str(ruta)) is None
+    en_memoria = exportar(df_resultado, formato)
+    assert en_memoria == ruta.read_bytes()
+
+    leido = lectores[formato](ruta)
+    assert list(leido.columns) == list(df_resultado.columns)
+    assert len(leido) == len(df_resultado)
+    pd.testing.assert_series_equal(
+        leido['Precio final'], df_resultado['Precio final'], check_dtype=False, check_names=False
+    )
+    assert leido['SKU'].astype(str).tolist() == df_resultado['SKU'].astype(str).tolist()
+
+    with pytest.raises(ValueError):
+        exportar(df_resultado, 'xls')
+    assert exportar(df_resultado, 'xlsx', output_path=str(tmp_path / 'resultado.xlsx')) is None
+
+    # Si la escritura se corta no queda un archivo truncado (ni el temporal)
+    from data_processor import ESCRITORES_POR_BLOQUES
+    with pytest.raises(RuntimeError):
+        with ESCRITORES_POR_BLOQUES[formato](str(tmp_path / f'cortado.{formato}')) as escritor:
+            escritor.escribir(df_resultado)
+            raise RuntimeError('corte')
+    assert not list(tmp_path.glob('*cortado*'))
+
+def test_estrategias_de_carga_dan_el_mismo_resultado(tmp_path):
+    from estrategia_carga import estimar_carga, elegir_estrategia, procesar_por_bloques
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    buffer = _excel_en_memoria(df_ml, 'Hoja1')
+    df_odoo = leer_odoo(_excel_en_memoria(df_odoo, 'Sheet1'))
+
+    estimacion = estimar_carga(buffer)
+    assert (estimacion.filas, estimacion.columnas, estimacion.exacta) == (5, 11, True)
+    assert buffer.tell() == 0
+    memoria = estimacion.memoria_mb
+    assert elegir_estrategia(estimacion, presupuesto_mb=1024) == 'memoria'
+    assert elegir_estrategia(estimacion, presupuesto_mb=(memoria['memoria'] + memoria['deduplicado']) / 2) == 'deduplicado'
+    assert elegir_estrategia(estimacion, presupuesto_mb=0) == 'bloques'
+
+    df_ml_leido = leer_ml(buffer)
+    buffer.seek(0)
+    pd.testing.assert_frame_equal(leer_ml(buffer, deduplicar=True), df_ml_leido)
+
+    df_resultado = preparar_resultado_final(calcular(unir_y_validar(df_ml_leido, df_odoo)))
+    esperado = pd.read_excel(io.BytesIO(exportar_excel(df_resultado)))
+    en_streaming = pd.read_excel(io.BytesIO(exportar(df_resultado, 'xlsx', por_bloques=True)))
+    pd.testing.assert_frame_equal(en_streaming, esperado)
+
+    buffer.seek(0)
+    ruta = tmp_path / 'resultado.xlsx'
+    resumen = procesar_por_bloques(buffer, df_odoo, str(ruta), filas_por_bloque=2)
+    assert (resumen['filas'], resumen['encontrados']) == (5, 4)
+    assert len(resumen['vista_previa']) == 2
+    pd.testing.assert_frame_equal(pd.read_excel(ruta), esperado)
+
+def test_asignar_stock_reparte_sin_sobrevender():
+    from asignacion_stock import asignar_stock, stock_asignado_por_codigo
+
+    df = pd.DataFrame({
+        'Código Neored': ['A', 'A', 'A', 'B', 'B', None],
+        'Cantidad a mano': [10, 10, 10, 5, 5, None],
+        'QUANTITY': [1, 2, 7, 0, 0, 4],
+        'LISTING_TYPE_V3': ['free', 'gold_pro', 'gold_special', 'free', 'gold_pro', 'free'],
+        'Notas/Flags': [''] * 6,
+    })
+    casos = [
+        ({}, [1, 2, 7, 3, 2, 0]),
+        ({'regla': 'igual'}, [4, 3, 3, 3, 2, 0]),
+        ({'regla': 'prioridad'}, [0, 10, 0, 0, 5, 0]),
+        ({'tope_por_publicacion': 4}, [2, 4, 4, 3, 2, 0]),
+        ({'stock_seguridad': 1, 'tope_por_publicacion': {'free': 1}}, [1, 2, 6, 1, 3, 0]),
+        ({'ya_asignado': pd.Series({'A': 4})}, [1, 1, 4, 3, 2, 0]),
+    ]
+    for parametros, esperado in casos:
+        asignado = asignar_stock(df.copy(), **parametros)
+        assert asignado['Stock asignado'].tolist() == esperado, parametros
+    assert stock_asignado_por_codigo(asignado).to_dict() == {'A': 6, 'B': 5}
+    assert 'Stock repartido' in asignado['Notas/Flags'][0] and asignado['Notas/Flags'][5] == ''
+    with pytest.raises(ValueError):
+        asignar_stock(df.copy(), regla='azar')
+
+    # El stock repartido llega a la columna 'Stock' del resultado
+    df_ml, df_odoo = crear_datos_ejemplo()
+    df_ml = pd.concat([df_ml, df_ml.iloc[[0]].assign(ITEM_ID='MLA000000001', QUANTITY=1)], ignore_index=True)
+    df_merged = asignar_stock(unir_y_validar(df_ml, df_odoo))
+    df_resultado = preparar_resultado_final(calcular(df_merged))
+    repartido = df_resultado[df_resultado['SKU'] == 'LED7012795']
+    assert repartido['Stock'].sum() == 250
+    assert sorted(repartido['Stock'].tolist()) == [1, 249]
+
+def test_auditar_margenes_invierte_la_formula_de_calcular():
+    df_merged = preparar_df_para_calculo()
+    df_calc = calcular(df_merged, incluir_impuestos=True)
+
+    # Si el precio publicado es el que calcula ``calcular``, se recibe justo la tarifa objetivo
+    auditoria = auditar_margenes(df_merged.assign(PRICE=df_calc['Precio final'].to_numpy()), incluir_impuestos=True)
+    con_tarifa = auditoria[auditoria['Tarifa objetivo'] > 0]
+    assert len(con_tarifa) == 4
+    assert (con_tarifa['Margen ($)'].abs() <= 0.02).all()
+    assert (con_tarifa['Precio final'] == con_tarifa['Precio actual en ML']).all()
+    assert auditoria['Margen ($)'].isna().tolist() == [False] * 4 + [True]
+
+    # Con los precios actuales del ejemplo: orden de menor a mayor margen y filtro de pérdidas
+    auditoria = auditar_margenes(df_merged)
+    margenes = auditoria['Margen ($)'].dropna().tolist()
+    assert margenes == sorted(margenes)
+    fila = auditoria[auditoria['SKU'] == 'TCL45310'].iloc[0]
+    assert isclose(fila['Recibis ($)'], round(250.00 * (1 - 0.15) - 500.00, 2))
+    assert 'Vende con pérdida' in fila['Notas/Flags']
+    perdidas = auditar_margenes(df_merged, margen_maximo=0)
+    assert (perdidas['Margen (%)'] < 0).all()
+    assert len(perdidas) == (auditoria['Margen (%)'] < 0).sum()
+
+def test_plan_pipeline_ejecuta_solo_lo_necesario():
+    from plan_pipeline import PlanPipeline
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    # Fila de descripción como la del export real y una publicación sin SKU
+    extra = pd.DataFrame({'ITEM_ID': ['Número de publicación', 'MLA000000009'], 'SKU': ['SKU', None]})
+    buffer_ml = _excel_en_memoria(pd.concat([extra, df_ml], ignore_index=True), 'Hoja1')
+    df_odoo = leer_odoo(_excel_en_memoria(df_odoo, 'Sheet1'))
+    opciones = {'incluir_impuestos': True, 'tipo_recargo_envio': 'Fijo ($)', 'valor_recargo_envio': 500}
+
+    df_ml_leido = leer_ml(buffer_ml)
+    df_merged = unir_y_validar(df_ml_leido, df_odoo)
+    esperado = preparar_resultado_final(calcular(df_merged, **opciones), incluir_impuestos=True, incluir_envio=True)
+
+    buffer_ml.seek(0)
+    plan = PlanPipeline(buffer_ml, df_odoo).unir().calcular(**opciones).resultado_final()
+    pd.testing.assert_frame_equal(plan.ejecutar(), esperado)
+
+    # Sin impuestos ni envío no se leen ni se calculan las columnas que se descartan
+    plan = PlanPipeline(buffer_ml, df_odoo).unir().calcular().resultado_final()
+    proyeccion = plan.proyeccion()
+    assert 'SHIPPING_METHOD ' not in proyeccion['ml'] and 'VARIATION_ID' not in proyeccion['ml']
+    assert 'Tarifa + impuestos' not in proyeccion['calcular'] and 'Recargo envío ($)' not in proyeccion['calcular']
+    assert 'no calcula: Tarifa + impuestos, Recargo envío ($)' in plan.explicar()
+    buffer_ml.seek(0)
+    pd.testing.assert_frame_equal(plan.ejecutar(), preparar_resultado_final(calcular(df_merged)))
+
+    buffer_ml.seek(0)
+    auditoria = PlanPipeline(buffer_ml, df_odoo).unir().auditar_margenes().ejecutar()
+    pd.testing.assert_frame_equal(auditoria, auditar_margenes(df_merged))
+
+    with pytest.raises(ValueError):
+        PlanPipeline(buffer_ml, df_odoo).calcular()
+    with pytest.raises(ValueError):
+        PlanPipeline(buffer_ml, df_odoo).unir().calcular().ejecutar()
+
+def test_particionado_por_sku_da_el_mismo_resultado(tmp_path):
+    from particionado import procesar_particionado, particion_por_clave, dividir, procesar_particion, combinar
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    # SKU repetido en ML y código repetido en Odoo: tienen que quedar en la misma partición
+    df_ml = pd.concat([df_ml, df_ml.iloc[[0, 1]].assign(ITEM_ID=['MLA000000001', 'MLA000000002'])], ignore_index=True)
+    df_odoo = pd.concat([df_odoo, df_odoo.iloc[[1]].assign(**{'Cantidad a mano': 999})], ignore_index=True)
+    ruta_ml, ruta_odoo = tmp_path / 'ml.xlsx', tmp_path / 'odoo.xlsx'
+    df_ml.to_excel(ruta_ml, sheet_name='Hoja1', index=False)
+    df_odoo.to_excel(ruta_odoo, sheet_name='Sheet1', index=False)
+
+    opciones = {'incluir_impuestos': True, 'politica_duplicados': 'mayor_stock', 'asignacion': {'regla': 'igual'}}
+    from asignacion_stock import asignar_stock
+    df_merged = asignar_stock(unir_y_validar(leer_ml(ruta_ml), leer_odoo(ruta_odoo), 'mayor_stock'), regla='igual')
+    esperado = preparar_resultado_final(calcular(df_merged, incluir_impuestos=True), incluir_impuestos=True)
+
+    # Mismo código en int, float o texto: misma partición
+    assert len(set(particion_por_clave([123, 123.0, '123'], 7))) == 1
+
+    resultado = procesar_particionado(ruta_ml, ruta_odoo, tmp_path / 'local', n_particiones=3, workers=2, opciones=opciones)
+    pd.testing.assert_frame_equal(resultado, esperado)
+
+    # Por etapas, como en varias máquinas: combinar exige todas las particiones con datos
+    directorio = tmp_path / 'compartido'
+    plan = dividir(ruta_ml, ruta_odoo, directorio, 4, opciones, filas_por_bloque=3)
+    assert sum(plan['filas_ml']) == len(df_ml)
+    con_datos = [i for i, filas in enumerate(plan['filas_ml']) if filas]
+    for indice in con_datos[1:]:
+        procesar_particion(directorio, indice)
+    with pytest.raises(ValueError):
+        combinar(directorio)
+    procesar_particion(directorio, con_datos[0])
+    pd.testing.assert_frame_equal(combinar(directorio), esperado)
+    with pytest.raises(ValueError):
+        dividir(ruta_ml, ruta_odoo, directorio, 4)
+
+    # El control de precios se aplica en cada partición (con una sola, igual que sobre todo el archivo)
+    from control_precios import controlar_cambios_precio
+    control = {'accion': 'retener', 'cambio_maximo': 1.01}
+    dividir(ruta_ml, ruta_odoo, tmp_path / 'control', 1, {**opciones, 'control_precios': control})
+    procesar_particion(tmp_path / 'control', 0)
+    df_calc = calcular(df_merged, incluir_impuestos=True)
+    controlar_cambios_precio(df_calc, **control)
+    esperado = preparar_resultado_final(df_calc, incluir_impuestos=True)
+    assert esperado['Notas/Flags'].str.contains('retenido', case=False).any()
+    pd.testing.assert_frame_equal(combinar(tmp_path / 'control'), esperado)
+
+def test_actualizar_libro_ml_reescribe_solo_precio_y_stock(tmp_path):
+    import zipfile
+    from parche_ml import actualizar_libro_ml
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    # Fila de descripción como la del export real
+    df_ml = pd.concat([pd.DataFrame({'ITEM_ID': ['Número de publicación'], 'SKU': ['SKU']}), df_ml], ignore_index=True)
+    ruta_ml = tmp_path / 'MercadoLibre-cambiodeprecios.xlsx'
+    with pd.ExcelWriter(ruta_ml) as writer:
+        df_ml.to_excel(writer, sheet_name='Hoja1', index=False)
+        pd.DataFrame({'Ayuda': ['no tocar']}).to_excel(writer, sheet_name='Ayuda', index=False)
+
+    df_resultado = preparar_resultado_final(calcular(unir_y_validar(leer_ml(ruta_ml), df_odoo)))
+    ruta_salida = tmp_path / 'subir.xlsx'
+    resumen = actualizar_libro_ml(ruta_ml, df_resultado, ruta_salida)
+    # 'NOEXISTE123' no está en Odoo: su fila queda como estaba
+    assert (resumen['precios'], resumen['stock'], resumen['sin_cambios']) == (4, 4, 1)
+
+    hoja = load_workbook(ruta_salida)['Hoja1']
+    filas = {fila[1]: fila for fila in hoja.iter_rows(min_row=3, values_only=True)}
+    esperado = df_resultado.set_index('SKU')
+    assert filas['LED7012795'][5] == esperado.loc['LED7012795', 'Precio final']
+    assert filas['LED7012795'][4] == esperado.loc['LED7012795', 'Stock']
+    assert filas['TCL45310'][5] == esperado.loc['TCL45310', 'Precio final']
+    assert filas['NOEXISTE123'][4:6] == (10, 1000.0)
+
+    # Todo lo que no es la hoja de publicaciones queda idéntico
+    with zipfile.ZipFile(ruta_ml) as original, zipfile.ZipFile(ruta_salida) as nuevo:
+        assert original.namelist() == nuevo.namelist()
+        for nombre in original.namelist():
+            if nombre != 'xl/worksheets/sheet1.xml':
+                assert original.read(nombre) == nuevo.read(nombre), nombre
+
+    # Sin ``output_path`` devuelve los bytes; solo stock
+    resumen = actualizar_libro_ml(ruta_ml, df_resultado, actualizar_precio=False)
+    assert resumen['precios'] == 0 and resumen['stock'] == 4
+    assert load_workbook(io.BytesIO(resumen['datos']))['Hoja1']['F3'].value == 21997.46
+
+def test_control_precios_marca_y_retiene_cambios_atipicos():
+    from control_precios import controlar_cambios_precio, CAMBIO_ATIPICO, CAMBIO_EXCESIVO, DENOMINADOR_BAJO, PRECIO_NULO
+
+    n = 14
+    tarifa = [1000.0 + 100 * i for i in range(n)]
+    df_merged = pd.DataFrame({
+        'ITEM_ID': [f'MLA{i:03d}' for i in range(n)],
+        'SKU': [f'SKU{i}' for i in range(n)],
+        'LISTING_TYPE_V3': ['gold_special'] * n,
+        'Precio Tarifa': tarifa,
+        'tax_pct': 0.21,
+        'fee_pct': 0.13,
+        'fee_fixed': 0.0,
+        'financing_pct': 0.0,
+    })
+    # Todas suben ~15% salvo: una ×2.5 (atípica), una ×6 (excesiva), una sin solución y una casi al 100%
+    df_merged['PRICE'] = [t / 0.87 / 1.15 for t in tarifa]
+    df_merged.loc[1, 'PRICE'] = tarifa[1] / 0.87 / 2.5
+    df_merged.loc[2, 'PRICE'] = tarifa[2] / 0.87 / 6
+    df_merged.loc[3, 'fee_pct'] = 1.2
+    df_merged.loc[4, 'fee_pct'] = 0.8
+    df_merged.loc[4, 'financing_pct'] = 0.15
+
+    df_calc = calcular(df_merged)
+    controlado = controlar_cambios_precio(df_calc.copy())
+    motivos = controlado['Control de precio'].tolist()
+    assert motivos[1] == CAMBIO_ATIPICO
+    assert motivos[2] == CAMBIO_ATIPICO | CAMBIO_EXCESIVO
+    assert motivos[3] == PRECIO_NULO
+    assert motivos[4] & DENOMINADOR_BAJO
+    assert motivos[0] == 0 and all(m == 0 for m in motivos[5:])
+    assert 'Cambio de precio atípico' in controlado.loc[1, 'Notas/Flags']
+    pd.testing.assert_series_equal(controlado['Precio final'], df_calc['Precio final'])
+
+    retenido = controlar_cambios_precio(df_calc.copy(), accion='retener')
+    marcadas = retenido['Control de precio'] != 0
+    assert (retenido.loc[marcadas, 'Precio final'] == retenido.loc[marcadas, 'PRICE'].round(2)).all()
+    assert retenido.loc[marcadas, 'Notas/Flags'].str.contains('Precio retenido').all()
+    pd.testing.assert_frame_equal(retenido[~marcadas].drop(columns='Control de precio'), df_calc[~marcadas])
+    # El desglose se recalcula sobre el precio retenido
+    fila = retenido.loc[1]
+    assert isclose(fila['Recibis ($)'], fila['PRICE'] * 0.87, abs_tol=0.01)
+
+def test_resolver_kits_suma_componentes_y_arma_stock():
+    from kits import resolver_kits
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    df_odoo.loc[4, 'Impuestos del cliente'] = 'IVA Ventas 10.5%'
+    df_odoo = leer_odoo(_excel_en_memoria(df_odoo, 'Sheet1'))
+    bom = pd.DataFrame({
+        'Kit': ['KIT1', 'KIT1', 'KIT2', 'KIT2', 'KIT3', 'KIT4', 'CICLO1', 'CICLO2', 'KIT5', 'KIT5'],
+        'Componente': ['LED7012795', 'TCL45310', 'KIT1', 'MMM42385', 'NOEXISTE', 'KIT3', 'CICLO2', 'CICLO1',
+                       'MMM42385', 'EXTRA12345'],
+        'Cantidad': [1, 2, 2, 3, 1, 1, 1, 1, 1, 1],
+        'Nombre': ['Kit lámpara', None, 'Kit doble', None, None, None, None, None, None, None],
+    })
+    catalogo, no_resueltos = resolver_kits(df_odoo, bom)
+
+    kits = catalogo.iloc[len(df_odoo):].set_index('Código Neored')
+    assert list(kits.index) == ['KIT1', 'KIT2', 'KIT5']
+    assert isclose(kits.loc['KIT1', 'Precio Tarifa'], 18500.00 + 2 * 184.05)
+    assert isclose(kits.loc['KIT2', 'Precio Tarifa'], 2 * (18500.00 + 2 * 184.05) + 3 * 1915.72)
+    # Stock: min(250 // 1, 60 // 2) = 30 kits; KIT2 usa 2 KIT1 (4 TCL45310) y 3 MMM42385
+    assert kits.loc['KIT1', 'Cantidad a mano'] == 30
+    assert kits.loc['KIT2', 'Cantidad a mano'] == 15
+    assert kits.loc['KIT1', 'Nombre'] == 'Kit lámpara' and kits.loc['KIT5', 'Nombre'] == 'Kit KIT5'
+    assert kits.loc['KIT1', 'Impuestos del cliente'] == 'IVA Ventas 21%'
+    assert isclose(kits.loc['KIT5', 'tax_pct'], (1915.72 * 0.21 + 2000.00 * 0.105) / (1915.72 + 2000.00))
+    motivos = dict(zip(no_resueltos['Kit'], no_resueltos['Motivo']))
+    assert motivos['KIT3'] == motivos['KIT4'] == 'Componente sin producto en Odoo: NOEXISTE'
+    assert motivos['CICLO1'].startswith('Ciclo') and motivos['CICLO2'].startswith('Ciclo')
+
+    # El stock es por producto total: líneas repetidas y componentes compartidos entre kits anidados
+    compartidos = pd.DataFrame({
+        'Kit': ['A', 'A', 'B', 'B', 'C', 'C'],
+        'Componente': ['LED7012795', 'TCL45310', 'A', 'TCL45310', 'TCL45310', 'TCL45310'],
+        'Cantidad': [1, 1, 1, 1, 20, 20],
+    })
+    armados, _ = resolver_kits(df_odoo, compartidos)
+    armados = armados.iloc[len(df_odoo):].set_index('Código Neored')['Cantidad a mano']
+    # TCL45310 tiene 60: B usa 2 por kit y C usa 40
+    assert armados.to_dict() == {'A': 60, 'B': 30, 'C': 1}
+
+    # Un kit que se contiene a sí mismo varias veces se descarta sin expandir, y también quien lo usa
+    bomba = pd.DataFrame({'Kit': ['BOMBA'] * 3 + ['USA_BOMBA'], 'Componente': ['BOMBA'] * 4, 'Cantidad': 1})
+    _, no_resueltos = resolver_kits(df_odoo, pd.concat([bom, bomba], ignore_index=True))
+    motivos = dict(zip(no_resueltos['Kit'], no_resueltos['Motivo']))
+    assert motivos['BOMBA'].startswith('Ciclo') and motivos['USA_BOMBA'].startswith('Ciclo')
+    # Si la lista aplanada supera la cota, los kits anidados quedan sin resolver
+    limitado, no_resueltos = resolver_kits(df_odoo, bom, max_aristas=3)
+    motivos = dict(zip(no_resueltos['Kit'], no_resueltos['Motivo']))
+    assert motivos['KIT2'].startswith('Lista de materiales demasiado grande')
+    assert 'KIT1' in set(limitado['Código Neored'])
+
+    # Un kit se cotiza como cualquier producto
+    df_ml.loc[4, 'SKU'] = 'KIT1'
+    df_merged = unir_y_validar(leer_ml(_excel_en_memoria(df_ml, 'Hoja1')), catalogo)
+    fila = calcular(df_merged, incluir_impuestos=True).set_index('SKU').loc['KIT1']
+    assert fila['Precio de Tarifa'] == 18868.10 and fila['Cantidad a mano'] == 30
+    assert fila['Notas/Flags'] == ''
+
+def test_corrida_reanudable_retoma_donde_fallo(tmp_path, monkeypatch):
+    import reanudable
+    from estrategia_carga import procesar_por_bloques
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    # Un bloque sin publicaciones válidas en el medio
+    extra = pd.DataFrame({'ITEM_ID': ['Número de publicación', 'MLA000000009'], 'SKU': ['SKU', None]})
+    # El SKU de la primera publicación se repite en el último bloque
+    repetida = df_ml.iloc[[0]].assign(ITEM_ID='MLA000000001', QUANTITY=50)
+    df_ml = pd.concat([df_ml.iloc[:2], extra, df_ml.iloc[2:], repetida], ignore_index=True)
+    ruta_ml, ruta_odoo = tmp_path / 'ml.xlsx', tmp_path / 'odoo.xlsx'
+    df_ml.to_excel(ruta_ml, sheet_name='Hoja1', index=False)
+    df_odoo.to_excel(ruta_odoo, sheet_name='Sheet1', index=False)
+    opciones = {'incluir_impuestos': True, 'asignacion': {'regla': 'proporcional'}}
+    esperado_ruta = tmp_path / 'esperado.xlsx'
+    procesar_por_bloques(str(ruta_ml), leer_odoo(ruta_odoo), str(esperado_ruta), dict(opciones), filas_por_bloque=2)
+
+    # El reparto de stock no depende de en qué bloque cae cada publicación
+    from asignacion_stock import asignar_stock
+    en_memoria = asignar_stock(unir_y_validar(leer_ml(ruta_ml), leer_odoo(ruta_odoo)), regla='proporcional')
+    assert pd.read_excel(esperado_ruta)['Stock'].tolist() == en_memoria['Stock asignado'].tolist()
+
+    # Primera corrida: con el reparto de stock se calcula después de leer todo; se corta en el tercer bloque
+    calcular_real, llamadas = reanudable.calcular_resultado, []
+    def calcular_que_falla(*args, **kwargs):
+        llamadas.append(1)
+        if len(llamadas) == 3:
+            raise RuntimeError('corte')
+        return calcular_real(*args, **kwargs)
+    monkeypatch.setattr(reanudable, 'calcular_resultado', calcular_que_falla)
+    directorio, salida = tmp_path / 'corrida', tmp_path / 'salida.xlsx'
+    with pytest.raises(RuntimeError):
+        reanudable.ejecutar_reanudable(ruta_ml, ruta_odoo, directorio, salida, opciones, filas_por_bloque=2)
+    assert reanudable.leer_manifiesto(directorio)['estado']['lectura_completa']
+    assert not salida.exists()
+
+    # Al reanudar solo se calcula lo pendiente y el resultado es el de una corrida sin cortes
+    llamadas.clear()
+    resumen = reanudable.ejecutar_reanudable(ruta_ml, ruta_odoo, directorio, salida, opciones, filas_por_bloque=2)
+    assert (resumen['filas'], resumen['bloques'], resumen['bloques_reutilizados']) == (6, 3, 2)
+    assert len(llamadas) == 1
+    pd.testing.assert_frame_equal(pd.read_excel(salida), pd.read_excel(esperado_ruta))
+
+    # Todo hecho: no se recalcula nada; la salida se regenera si falta
+    salida.unlink()
+    resumen = reanudable.ejecutar_reanudable(ruta_ml, ruta_odoo, directorio, salida, opciones, filas_por_bloque=2)
+    assert resumen['bloques_reutilizados'] == 3 and len(llamadas) == 1
+    pd.testing.assert_frame_equal(pd.read_excel(salida), pd.read_excel(esperado_ruta))
+
+    with pytest.raises(ValueError, match='opciones'):
+        reanudable.ejecutar_reanudable(ruta_ml, ruta_odoo, directorio, salida, {}, filas_por_bloque=2)
+
+def test_sincronizar_stock_solo_emite_cambios(tmp_path):
+    from asignacion_stock import asignar_stock
+    from sincronizar_stock import sincronizar_stock
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    df_ml.loc[3, 'QUANTITY'] = 576  # ya coincide con Odoo
+    # Otra publicación del mismo código y una fila que ``clean_ml_data`` descarta
+    extra = pd.DataFrame({'ITEM_ID': ['MLA000000001', 'Número'], 'SKU': ['LED7012795', 'SKU'], 'QUANTITY': [5, 0]})
+    df_ml = pd.concat([df_ml, extra], ignore_index=True)
+    df_odoo.loc[1, 'Cantidad a mano'] = None
+    ruta_ml, ruta_odoo = tmp_path / 'ml.xlsx', tmp_path / 'odoo.xlsx'
+    df_ml.to_excel(ruta_ml, sheet_name='Hoja1', index=False)
+    df_odoo.to_excel(ruta_odoo, sheet_name='Sheet1', index=False)
+
+    for asignacion in (None, {'regla': 'igual'}):
+        # Lo mismo que escribiría una corrida completa con ``parche_ml``
+        df_merged = unir_y_validar(leer_ml(ruta_ml), leer_odoo(ruta_odoo))
+        if asignacion:
+            asignar_stock(df_merged, **asignacion)
+        completo = preparar_resultado_final(calcular(df_merged))
+        actualizable = ~completo['Notas/Flags'].str.contains('SKU no encontrado|Stock faltante')
+        esperado = completo[actualizable & (completo['Stock'] != df_merged['QUANTITY'])]
+
+        resumen = sincronizar_stock(ruta_ml, ruta_odoo, asignacion=asignacion, libro_path=tmp_path / 'libro.xlsx')
+        cambios = resumen['cambios']
+        assert resumen['publicaciones'] == 6
+        assert list(cambios.index) == list(esperado.index)
+        assert cambios['Stock'].tolist() == esperado['Stock'].tolist()
+        assert (cambios['Diferencia'] == cambios['Stock'] - cambios['Stock actual en ML']).all()
+        libro = pd.read_excel(tmp_path / 'libro.xlsx', sheet_name='Hoja1')
+        assert libro['QUANTITY'].iloc[:6].tolist() == [
+            esperado['Stock'].get(i, df_ml['QUANTITY'].iloc[i]) for i in range(6)
+        ]
+        assert libro['PRICE'].equals(df_ml['PRICE'])
+
+    assert sincronizar_stock(ruta_ml, ruta_odoo)['cambios'].index.tolist() == [0, 1, 2, 5]
+
+def test_prueba_carga_informa_latencias_y_memoria(tmp_path):
+    import json
+    import prueba_carga
+
+    salida = tmp_path / 'informe.json'
+    assert prueba_carga.main([
+        '--sesiones', '2', '--repeticiones', '2', '--filas-ml', '30,60', '--filas-odoo', '40',
+        '--json', str(salida),
+    ]) == 0
+    informe = json.loads(salida.read_text(encoding='utf-8'))
+    assert informe['recorridos'] == 4 and informe['errores'] == []
+    assert list(informe['latencias_ms']) == ['leer_ml', 'leer_odoo', 'unir_y_validar', 'calcular', 'descargar', 'total']
+    total = informe['latencias_ms']['total']
+    assert 0 < total['p50'] <= total['p99'] <= total['max']
+    assert informe['filas_por_segundo'] > 0 and informe['memoria_mb'][0][1] > 0
+
+    assert prueba_carga.main([
+        '--objetivo', 'servidor', '--sesiones', '3', '--repeticiones', '2', '--filas-ml', '50',
+        '--filas-odoo', '40', '--filas-pedido', '20', '--json', str(salida),
+    ]) == 0
+    informe = json.loads(salida.read_text(encoding='utf-8'))
+    assert informe['recorridos'] == 6 and list(informe['latencias_ms']) == ['calcular', 'total']
+
+def test_indice_resultados_busca_por_clave_palabras_y_rangos():
+    from busqueda_resultados import IndiceResultados, COLUMNA_CAMBIO
+
+    df_ml, df_odoo = crear_datos_ejemplo()
+    df_resultado = preparar_resultado_final(calcular(unir_y_validar(df_ml, df_odoo)))
+    indice = IndiceResultados(df_resultado)
+
+    assert indice.buscar('led7012795 ').tolist() == [0]
+    assert indice.buscar('MLA987654321').tolist() == [3]
+    # Sin acentos ni mayúsculas, y cada palabra vale como comienzo
+    assert indice.buscar('lampara 250').tolist() == [0]
+    assert indice.buscar('CAL').tolist() == [1]
+    assert indice.buscar('producto odoo').tolist() == [4]
+    assert indice.buscar('producto inexistente').tolist() == []
+    assert len(indice.buscar()) == len(df_resultado)
+
+    precio = df_resultado['Precio final']
+    cambio = (precio / df_resultado['Precio actual en ML'] - 1) * 100
+    assert indice.buscar(precio_min=1000, precio_max=20000).tolist() == list(
+        df_resultado.index[(precio >= 1000) & (precio <= 20000)]
+    )
+    assert indice.buscar(cambio_min=-20).tolist() == list(df_resultado.index[cambio >= -20]) == [0, 1]
+    assert indice.buscar('o', cambio_max=-20).tolist() == list(
+        df_resultado.index[(cambio <= -20) & df_resultado['Descripción del producto'].str.contains(r'\bo', case=False)]
+    )
+
+    filas = indice.filas(df_resultado, indice.buscar(cambio_min=-20), 1)
+    assert len(filas) == 1
+    assert list(filas.columns).index(COLUMNA_CAMBIO) == list(filas.columns).index('Precio actual en ML') + 1
+    assert filas[COLUMNA_CAMBIO].iloc[0] == round(cambio.iloc[0], 2)
+
 def test_parseo_individual():
     """
     Prueba las funciones de parseo individualmente.
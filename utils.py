@@ -1,14 +1,50 @@
+"""
+Parsers y fórmulas de precio sin dependencias pesadas al importar.
+
+pandas y numpy se importan dentro de las funciones que trabajan con
+DataFrames o arrays, de modo que los caminos puramente aritméticos
+(``calcular_precio_publicacion_ml``, los parsers de texto) y la validación de
+encabezados (``leer_encabezados_xlsx`` + ``validar_columnas``) arrancan sin
+cargarlos.
+"""
+from __future__ import annotations
+
 import re
-import pandas as pd
-import numpy as np
-from typing import Tuple, Optional
+from typing import TYPE_CHECKING, Tuple, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+def _es_nulo(valor) -> bool:
+    """Equivalente a ``pd.isna`` para escalares (None, NaN, NaT, pd.NA)."""
+    if valor is None or type(valor).__name__ == 'NAType':
+        return True
+    try:
+        return bool(valor != valor)
+    except (TypeError, ValueError):
+        return False
+
+def _texto_clave(valor) -> str:
+    """
+    Texto de un SKU, código o ITEM_ID para comparar claves.
+
+    123.0 y 123 dan lo mismo (el join de pandas los iguala), los bordes se
+    recortan y los nulos quedan como ''.
+    """
+    if _es_nulo(valor):
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
 
 def parse_money(text: str) -> float:
     """
     Parsea texto monetario a float.
     Ej: "$1,095.00", "1095", "1.095,50" -> 1095.0
     """
-    if pd.isna(text) or text is None:
+    if _es_nulo(text):
         return 0.0
     text = str(text).strip()
     if not text:
@@ -37,7 +73,7 @@ def parse_pct(text: str) -> float:
     Parsea texto de porcentaje a decimal.
     Ej: "14.50%", "4.00%", "0.04", "4" -> 0.145, 0.04, 0.04, 0.04
     """
-    if pd.isna(text) or text is None:
+    if _es_nulo(text):
         return 0.0
     text = str(text).strip()
     if not text:
@@ -59,7 +95,7 @@ def parse_fee_combo(text: str) -> Tuple[float, float]:
     Formato típico: "14.50% + $1095.00"
     Returns: (porcentaje_decimal, fijo_pesos)
     """
-    if pd.isna(text) or text is None:
+    if _es_nulo(text):
         return 0.0, 0.0
     text = str(text).strip()
     if not text:
@@ -81,16 +117,98 @@ def clean_ml_data(df: pd.DataFrame) -> pd.DataFrame:
     - SKU no esté vacío
     - Elimina filas de encabezado inválidas
     """
-    df_clean = df.copy()
+    import numpy as np
+    import pandas as pd
+
     valid_mask = (
-        df_clean['ITEM_ID'].notna() &
-        df_clean['ITEM_ID'].astype(str).str.startswith('ML', na=False) &
-        df_clean['SKU'].notna() &
-        (df_clean['SKU'].astype(str).str.strip() != '')
+        df['ITEM_ID'].notna() &
+        df['ITEM_ID'].astype(str).str.startswith('ML', na=False) &
+        df['SKU'].notna() &
+        (df['SKU'].astype(str).str.strip() != '')
     )
-    df_clean = df_clean[valid_mask].reset_index(drop=True)
+    # ``take`` + índice nuevo evita la copia previa y la de ``reset_index``
+    df_clean = df.take(np.flatnonzero(valid_mask.to_numpy()))
+    df_clean.index = pd.RangeIndex(len(df_clean))
     return df_clean
 
+# Columnas de texto que admiten almacenamiento Arrow (ver ``convertir_columnas_arrow``)
+COLUMNAS_TEXTO = ['TITLE', 'Nombre', 'SKU', 'Código Neored', 'ITEM_ID', 'VARIATION_ID']
+
+def tipo_texto_arrow() -> pd.StringDtype:
+    """
+    Devuelve el dtype de texto respaldado por Arrow ("string[pyarrow]").
+
+    Raises:
+        ImportError: Si pyarrow no está instalado
+    """
+    import pandas as pd
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "El modo de texto Arrow requiere el paquete 'pyarrow' (pip install pyarrow)"
+        ) from e
+    return pd.StringDtype('pyarrow')
+
+def convertir_columnas_arrow(df: pd.DataFrame, columnas=None) -> pd.DataFrame:
+    """
+    Convierte in situ columnas de texto a almacenamiento Arrow.
+
+    Solo se convierten las columnas cuyos valores no nulos son todos cadenas,
+    de modo que códigos numéricos (p. ej. SKU leídos como enteros) conservan
+    su tipo y el contenido exportado no cambia.
+
+    Args:
+        df: DataFrame a modificar
+        columnas: Columnas candidatas (por defecto ``COLUMNAS_TEXTO``)
+
+    Returns:
+        El mismo DataFrame, para encadenar
+    """
+    import pandas as pd
+
+    dtype = tipo_texto_arrow()
+    for col in (COLUMNAS_TEXTO if columnas is None else columnas):
+        if col not in df.columns or isinstance(df[col].dtype, pd.StringDtype):
+            continue
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) in ('string', 'empty'):
+            df[col] = df[col].astype(dtype)
+    return df
+
+# Columnas obligatorias de cada tipo de archivo
+COLUMNAS_REQUERIDAS = {
+    'ml': ['ITEM_ID', 'SKU', 'TITLE', 'QUANTITY', 'PRICE',
+           'CURRENCY_ID', 'FEE_PER_SALE_MARKETPLACE_V2',
+           'COST_OF_FINANCING_MARKETPLACE', 'LISTING_TYPE_V3',
+           'SHIPPING_METHOD '],
+    'odoo': ['Código Neored', 'Nombre', 'Cantidad a mano',
+             'Precio Tarifa', 'Impuestos del cliente'],
+}
+
+# Hoja que leen ``leer_ml``/``leer_odoo`` (si no existe, la primera)
+HOJA_POR_TIPO = {'ml': 'Hoja1', 'odoo': 'Sheet1'}
+
+def validar_columnas(columnas, file_type: str) -> Tuple[bool, str]:
+    """
+    Valida una lista de nombres de columna sin necesitar un DataFrame.
+    'SHIPPING_METHOD' (sin espacio final) se acepta como 'SHIPPING_METHOD '.
+    Args:
+        columnas: Nombres de las columnas del archivo
+        file_type: 'ml' o 'odoo'
+    Returns:
+        (es_valido, mensaje_error)
+    """
+    if file_type not in COLUMNAS_REQUERIDAS:
+        return False, f"Tipo de archivo desconocido: {file_type}"
+    columnas = set(columnas)
+    if file_type == 'ml' and 'SHIPPING_METHOD' in columnas:
+        columnas.add('SHIPPING_METHOD ')
+    missing_cols = [col for col in COLUMNAS_REQUERIDAS[file_type] if col not in columnas]
+    if missing_cols:
+        return False, f"Columnas faltantes en archivo {file_type}: {', '.join(missing_cols)}"
+    return True, "OK"
+
 def validate_excel_structure(df: pd.DataFrame, file_type: str) -> Tuple[bool, str]:
     """
     Valida que el Excel tenga las columnas requeridas.
@@ -101,30 +219,165 @@ def validate_excel_structure(df: pd.DataFrame, file_type: str) -> Tuple[bool, st
         (es_valido, mensaje_error)
     """
     if file_type == 'ml':
-        required_cols = ['ITEM_ID', 'SKU', 'TITLE', 'QUANTITY', 'PRICE',
-                        'CURRENCY_ID', 'FEE_PER_SALE_MARKETPLACE_V2',
-                        'COST_OF_FINANCING_MARKETPLACE', 'LISTING_TYPE_V3',
-                        'SHIPPING_METHOD ']
         shipping_variants = ['SHIPPING_METHOD ', 'SHIPPING_METHOD']
         shipping_col = next((col for col in shipping_variants if col in df.columns), None)
         if shipping_col and shipping_col != 'SHIPPING_METHOD ':
             df.rename(columns={shipping_col: 'SHIPPING_METHOD '}, inplace=True)
-    elif file_type == 'odoo':
-        required_cols = ['Código Neored', 'Nombre', 'Cantidad a mano',
-                        'Precio Tarifa', 'Impuestos del cliente']
-    else:
-        return False, f"Tipo de archivo desconocido: {file_type}"
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
-        return False, f"Columnas faltantes en archivo {file_type}: {', '.join(missing_cols)}"
-    return True, "OK"
+    return validar_columnas(df.columns, file_type)
+
+_NS_XLSX = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+def _ruta_hoja_xlsx(z, hoja: Optional[str] = None) -> str:
+    """Ruta dentro del zip del XML de la hoja ``hoja`` (o de la primera)."""
+    import posixpath
+    import xml.etree.ElementTree as ET
+
+    ns_rel = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+    libro = ET.fromstring(z.read('xl/workbook.xml'))
+    hojas = [(h.get('name'), h.get(f'{ns_rel}id')) for h in libro.iter(f'{_NS_XLSX}sheet')]
+    if not hojas:
+        raise ValueError("El libro no tiene hojas")
+    rel_id = next((rid for nombre, rid in hojas if nombre == hoja), hojas[0][1])
+    relaciones = ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))
+    destino = next(r.get('Target') for r in relaciones if r.get('Id') == rel_id)
+    return destino.lstrip('/') if destino.startswith('/') else posixpath.normpath(posixpath.join('xl', destino))
+
+def leer_encabezados_xlsx(file_path_or_buffer, hoja: Optional[str] = None) -> list:
+    """
+    Lee solo la fila de encabezados de un .xlsx, sin pandas ni openpyxl.
+
+    Recorre el XML de la hoja hasta terminar la primera fila y de las cadenas
+    compartidas lee solo hasta la última que usa el encabezado, así que el
+    costo no depende de la cantidad de filas del archivo.
+
+    Args:
+        file_path_or_buffer: Ruta o archivo binario
+        hoja: Nombre de la hoja; si no existe (o es None) se usa la primera
+
+    Returns:
+        Lista con los nombres de columna (celdas vacías como '')
+    """
+    import zipfile
+    import xml.etree.ElementTree as ET
+
+    ns = _NS_XLSX
+
+    with zipfile.ZipFile(file_path_or_buffer) as z:
+        ruta_hoja = _ruta_hoja_xlsx(z, hoja)
+
+        celdas = []
+        with z.open(ruta_hoja) as f:
+            for evento, elem in ET.iterparse(f, events=('end',)):
+                if elem.tag == f'{ns}c':
+                    tipo = elem.get('t')
+                    if tipo == 'inlineStr':
+                        valor = ''.join(t.text or '' for t in elem.iter(f'{ns}t'))
+                    else:
+                        v = elem.find(f'{ns}v')
+                        valor = v.text if v is not None else None
+                    celdas.append((elem.get('r'), tipo, valor))
+                elif elem.tag == f'{ns}row':
+                    break
+
+        indices = [int(valor) for _, tipo, valor in celdas if tipo == 's' and valor is not None]
+        compartidas = []
+        if indices and 'xl/sharedStrings.xml' in z.namelist():
+            ultimo = max(indices)
+            with z.open('xl/sharedStrings.xml') as f:
+                for evento, elem in ET.iterparse(f, events=('end',)):
+                    if elem.tag == f'{ns}si':
+                        compartidas.append(''.join(t.text or '' for t in elem.iter(f'{ns}t')))
+                        elem.clear()
+                        if len(compartidas) > ultimo:
+                            break
+
+    encabezados = []
+    for referencia, tipo, valor in celdas:
+        # Respetar huecos: la columna sale de la referencia (A1, B1, ...)
+        posicion = _posicion_columna(referencia or '')
+        if posicion:
+            encabezados.extend([''] * (posicion - 1 - len(encabezados)))
+        if valor is None:
+            texto = ''
+        elif tipo == 's':
+            texto = compartidas[int(valor)]
+        else:
+            texto = valor
+        encabezados.append(texto)
+    return encabezados
+
+def _posicion_columna(referencia: str) -> int:
+    """Número de columna (1 = A) de una referencia como 'K12'."""
+    posicion = 0
+    for letra in re.match(r'[A-Z]*', referencia.upper()).group(0):
+        posicion = posicion * 26 + ord(letra) - 64
+    return posicion
+
+def leer_dimension_xlsx(file_path_or_buffer, hoja: Optional[str] = None, filas_muestra: int = 200) -> dict:
+    """
+    Estima el tamaño de una hoja .xlsx sin cargarla, sin pandas ni openpyxl.
+
+    Usa la etiqueta ``<dimension ref="A1:K50001">`` que Excel y Odoo escriben
+    al principio de la hoja. Si falta (o solo dice "A1"), cuenta las primeras
+    ``filas_muestra`` filas y extrapola con el tamaño descomprimido del XML.
+
+    Args:
+        file_path_or_buffer: Ruta o archivo binario
+        hoja: Nombre de la hoja; si no existe (o es None) se usa la primera
+        filas_muestra: Filas a recorrer cuando no hay dimensión
+
+    Returns:
+        dict con 'filas' (incluye el encabezado), 'columnas', 'bytes_hoja'
+        (XML descomprimido) y 'exacta' (False si se extrapoló)
+    """
+    import zipfile
+    import xml.etree.ElementTree as ET
+
+    ns = _NS_XLSX
+    with zipfile.ZipFile(file_path_or_buffer) as z:
+        ruta_hoja = _ruta_hoja_xlsx(z, hoja)
+        bytes_hoja = z.getinfo(ruta_hoja).file_size
+
+        with z.open(ruta_hoja) as f:
+            referencia = None
+            for evento, elem in ET.iterparse(f, events=('start',)):
+                if elem.tag == f'{ns}dimension':
+                    referencia = elem.get('ref')
+                    break
+                if elem.tag == f'{ns}sheetData':
+                    break
+        if referencia and ':' in referencia:
+            inicio, fin = referencia.split(':', 1)
+            filas = int(re.sub(r'[^0-9]', '', fin) or 0) - int(re.sub(r'[^0-9]', '', inicio) or 1) + 1
+            columnas = _posicion_columna(fin) - _posicion_columna(inicio) + 1
+            return {'filas': filas, 'columnas': columnas, 'bytes_hoja': bytes_hoja, 'exacta': True}
+
+        # Se alimenta el parser de a poco para saber cuántos bytes ocupan las filas leídas
+        filas, columnas, leidos = 0, 0, 0
+        parser = ET.XMLPullParser(events=('end',))
+        with z.open(ruta_hoja) as f:
+            while filas < filas_muestra:
+                trozo = f.read(4096)
+                if not trozo:
+                    break
+                leidos += len(trozo)
+                parser.feed(trozo)
+                for evento, elem in parser.read_events():
+                    if elem.tag == f'{ns}row':
+                        filas += 1
+                        columnas = max(columnas, len(elem))
+                        elem.clear()
+        completa = leidos >= bytes_hoja
+        if not completa:
+            filas = int(filas * bytes_hoja / leidos)
+    return {'filas': filas, 'columnas': columnas, 'bytes_hoja': bytes_hoja, 'exacta': completa}
 
 def extract_tax_percentage(tax_text: str) -> float:
     """
     Extrae el porcentaje de impuesto del texto.
     Ej: "IVA Ventas 21%" -> 0.21
     """
-    if pd.isna(tax_text) or tax_text is None:
+    if _es_nulo(tax_text):
         return 0.0
     tax_text = str(tax_text).strip()
     match = re.search(r'(\d+(?:\.\d+)?)\s*%', tax_text)
@@ -183,3 +436,104 @@ def calcular_precio_publicacion_ml(
         recibis,
         False,
     )
+
+
+def calcular_precio_publicacion_ml_vectorizado(
+    tarifa_neta,
+    porcentaje_comision,
+    porcentaje_financiacion,
+    porcentaje_retenciones,
+    costo_fijo,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Versión vectorizada de ``calcular_precio_publicacion_ml``.
+
+    Acepta escalares o arrays compatibles por *broadcasting* (por ejemplo
+    ``(n, 1)`` contra ``(1, k)`` para evaluar n productos bajo k esquemas de
+    comisión en una sola pasada). Los valores nulos se tratan como 0.
+
+    Returns:
+        Una tupla de arrays con (precio_publicacion, cargo_por_vender,
+        costo_por_ofrecer_cuotas, retenciones, recibis, denominador_invalido).
+        Donde el denominador es inválido todos los importes valen 0.
+    """
+
+    import numpy as np
+
+    def _as_float(valor) -> np.ndarray:
+        return np.nan_to_num(np.asarray(valor, dtype=float), nan=0.0)
+
+    tarifa_neta = _as_float(tarifa_neta)
+    porcentaje_comision = _as_float(porcentaje_comision)
+    porcentaje_financiacion = _as_float(porcentaje_financiacion)
+    porcentaje_retenciones = _as_float(porcentaje_retenciones)
+    costo_fijo = _as_float(costo_fijo)
+
+    denominador = 1.0 - (
+        porcentaje_comision + porcentaje_financiacion + porcentaje_retenciones
+    )
+    denominador_invalido = denominador <= 0
+    denominador_seguro = np.where(denominador_invalido, 1.0, denominador)
+
+    precio_publicacion = np.where(
+        denominador_invalido, 0.0, (tarifa_neta + costo_fijo) / denominador_seguro
+    )
+    cargo_por_vender = np.where(
+        denominador_invalido, 0.0, precio_publicacion * porcentaje_comision + costo_fijo
+    )
+    costo_por_ofrecer_cuotas = precio_publicacion * porcentaje_financiacion
+    retenciones = precio_publicacion * porcentaje_retenciones
+    recibis = precio_publicacion - (
+        cargo_por_vender + costo_por_ofrecer_cuotas + retenciones
+    )
+
+    return (
+        precio_publicacion,
+        cargo_por_vender,
+        costo_por_ofrecer_cuotas,
+        retenciones,
+        recibis,
+        denominador_invalido,
+    )
+
+
+def desglosar_precio_publicacion_ml_vectorizado(
+    precio_publicacion,
+    porcentaje_comision,
+    porcentaje_financiacion,
+    porcentaje_retenciones,
+    costo_fijo,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Inversa de ``calcular_precio_publicacion_ml_vectorizado``.
+
+    Parte del precio ya publicado y calcula qué se descuenta y qué se recibe:
+    ``recibis = precio × (1 − %comisión − %financiación − %retenciones) − fijo``.
+    Acepta escalares o arrays compatibles por *broadcasting*; los nulos se
+    tratan como 0.
+
+    Returns:
+        Una tupla de arrays con (cargo_por_vender, costo_por_ofrecer_cuotas,
+        retenciones, recibis). ``recibis`` puede ser negativo.
+    """
+
+    import numpy as np
+
+    def _as_float(valor) -> np.ndarray:
+        return np.nan_to_num(np.asarray(valor, dtype=float), nan=0.0)
+
+    precio_publicacion = _as_float(precio_publicacion)
+    porcentaje_comision = _as_float(porcentaje_comision)
+    costo_fijo = _as_float(costo_fijo)
+
+    cargo_por_vender = precio_publicacion * porcentaje_comision + costo_fijo
+    costo_por_ofrecer_cuotas = precio_publicacion * _as_float(porcentaje_financiacion)
+    retenciones = precio_publicacion * _as_float(porcentaje_retenciones)
+    recibis = precio_publicacion - (
+        cargo_por_vender + costo_por_ofrecer_cuotas + retenciones
+    )
+
+    return (
+        cargo_por_vender,
+        costo_por_ofrecer_cuotas,
+        retenciones,
+        recibis,
+    )
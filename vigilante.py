@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Demonio que vigila carpetas y procesa automáticamente los Excel de ML nuevos.
+
+Cada archivo ``MercadoLibre-cambiodeprecios-*.xlsx`` que aparece en la carpeta
+de entrada pasa por ``leer_ml`` → ``unir_y_validar`` → ``calcular`` →
+``preparar_resultado_final`` → ``exportar`` (xlsx por defecto, o ``--formato``
+csv/parquet/jsonl); el resultado se escribe en la carpeta de salida y el
+original se mueve a ``procesados`` (o a ``errores`` junto con un .log si falla).
+
+El catálogo de Odoo (el ``Producto (product.template)*.xlsx`` más reciente) se
+mantiene cargado y solo se relee cuando aparece una exportación más nueva.
+Un archivo se considera completo cuando su tamaño y fecha no cambian entre dos
+escaneos consecutivos y ya es un .xlsx (zip) válido, así que las copias a
+medio escribir se ignoran hasta que terminan.
+
+Uso:
+    python vigilante.py --entrada compartida/ --salida resultados/ [--odoo-dir compartida/]
+                        [--workers 4] [--intervalo 5] [--incluir-impuestos]
+                        [--asignar-stock proporcional --stock-seguridad 2 --tope-por-publicacion 50]
+                        [--control-precios retener] [--kits lista_materiales.xlsx]
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+import traceback
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from data_processor import leer_ml, leer_odoo, exportar, FORMATOS_EXPORTACION
+from catalogo_compilado import compilar_catalogo, abrir_catalogo
+from estrategia_carga import (
+    estimar_carga, elegir_estrategia, procesar_por_bloques,
+    separar_opciones, unir_y_repartir, calcular_resultado,
+    agregar_argumentos_pipeline, opciones_de_argumentos,
+)
+from kits import leer_lista_materiales, resolver_kits
+
+PATRON_ML = 'MercadoLibre-cambiodeprecios-*.xlsx'
+PATRON_ODOO = 'Producto (product.template)*.xlsx'
+
+# Catálogo de Odoo de cada proceso worker (se carga en ``_inicializar_worker``)
+_catalogo_worker = None
+
+
+def procesar_archivo_ml(ruta_ml, df_odoo, dir_salida, opciones: dict = None, formato: str = 'xlsx') -> Path:
+    """
+    Ejecuta el pipeline completo sobre un Excel de ML y escribe el resultado.
+
+    El archivo se escribe con un nombre temporal y se renombra al final, de
+    modo que la carpeta de salida nunca contiene resultados a medio escribir.
+    Los archivos grandes se leen (o se procesan enteros) por bloques según
+    ``estrategia_carga.elegir_estrategia``.
+
+    Args:
+        ruta_ml: Ruta al Excel de MercadoLibre
+        df_odoo: DataFrame de Odoo ya leído con ``leer_odoo`` o catálogo compilado
+        dir_salida: Carpeta donde dejar el resultado
+        opciones: Argumentos de ``calcular`` (incluir_impuestos, tipo_recargo_envio, ...)
+            y opcionalmente 'politica_duplicados', 'normalizar_sku' y 'equivalencias' para ``unir_y_validar``
+            y 'asignacion' (argumentos de ``asignacion_stock.asignar_stock``)
+            y 'control_precios' (argumentos de ``control_precios.controlar_cambios_precio``)
+        formato: Formato de salida ('xlsx', 'csv', 'parquet' o 'jsonl')
+
+    Returns:
+        Ruta del archivo generado
+    """
+    ruta_ml = Path(ruta_ml)
+    sufijo = ruta_ml.stem.replace('MercadoLibre-cambiodeprecios-', '') or ruta_ml.stem
+    extension = FORMATOS_EXPORTACION[formato][0]
+    destino = Path(dir_salida) / f"ML_precios_y_stock_calculados-{sufijo}{extension}"
+    temporal = destino.with_name(f".{destino.name}.tmp")
+
+    # Estrategia según el tamaño de la hoja y ML_PRESUPUESTO_MEMORIA_MB (ver estrategia_carga.py)
+    estrategia = elegir_estrategia(estimar_carga(ruta_ml))
+    if estrategia == 'bloques':
+        procesar_por_bloques(ruta_ml, df_odoo, str(temporal), opciones, formato)
+        os.replace(temporal, destino)
+        return destino
+
+    union, asignacion, control, calculo = separar_opciones(opciones)
+    df_ml = leer_ml(ruta_ml, deduplicar=(estrategia == 'deduplicado'))
+    df_merged = unir_y_repartir(df_ml, df_odoo, union, asignacion)
+    df_resultado = calcular_resultado(df_merged, calculo, control)
+    exportar(df_resultado, formato, output_path=str(temporal), por_bloques=(estrategia == 'deduplicado'))
+    os.replace(temporal, destino)
+    return destino
+
+
+def _inicializar_worker(ruta_catalogo: str) -> None:
+    global _catalogo_worker
+    _catalogo_worker = abrir_catalogo(ruta_catalogo)
+
+
+def _procesar_en_worker(ruta_ml: str, dir_salida: str, opciones: dict, formato: str) -> str:
+    return str(procesar_archivo_ml(ruta_ml, _catalogo_worker, dir_salida, opciones, formato))
+
+
+def _firma(ruta: Path):
+    estado = ruta.stat()
+    return estado.st_size, estado.st_mtime_ns
+
+
+class VigilanteCarpeta:
+    """
+    Vigila las carpetas de entrada y procesa los Excel de ML completos.
+
+    Con ``workers`` > 1 los archivos pendientes se procesan en paralelo en un
+    pool de procesos. El catálogo se lee una vez, se compila a
+    ``<salida>/.catalogo_odoo.mlcat`` y cada proceso lo mapea en memoria (las
+    páginas se comparten); el pool se recrea cuando cambia la exportación de
+    Odoo. Con ``workers`` <= 1 todo corre en el proceso actual.
+    """
+
+    def __init__(
+        self,
+        dir_entrada,
+        dir_salida,
+        dir_odoo=None,
+        dir_procesados=None,
+        dir_errores=None,
+        workers: int = 1,
+        opciones: dict = None,
+        formato: str = 'xlsx',
+        lista_materiales=None,
+    ):
+        self.dir_entrada = Path(dir_entrada)
+        self.dir_odoo = Path(dir_odoo) if dir_odoo else self.dir_entrada
+        self.dir_salida = Path(dir_salida)
+        self.dir_procesados = Path(dir_procesados) if dir_procesados else self.dir_entrada / 'procesados'
+        self.dir_errores = Path(dir_errores) if dir_errores else self.dir_entrada / 'errores'
+        for carpeta in (self.dir_salida, self.dir_procesados, self.dir_errores):
+            carpeta.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.opciones = opciones or {}
+        self.formato = formato
+        # Kits (``kits.leer_lista_materiales``) que se agregan a cada catálogo cargado
+        self.lista_materiales = lista_materiales
+
+        self._firmas_vistas = {}
+        self._odoo_actual = None
+        self._odoo_firma = None
+        # Exportación de Odoo que no se pudo leer: no se reintenta hasta que cambie
+        self._odoo_fallido = None
+        self.df_odoo = None
+        self._pool = None
+
+    def _archivos_completos(self, carpeta: Path, patron: str) -> list:
+        """Archivos cuyo tamaño/fecha no cambiaron desde el escaneo anterior."""
+        anteriores = self._firmas_vistas.get((carpeta, patron), {})
+        listos = []
+        vistos = {}
+        for ruta in sorted(carpeta.glob(patron)):
+            if ruta.name.startswith(('~$', '.')):
+                continue
+            try:
+                firma = _firma(ruta)
+            except FileNotFoundError:
+                continue
+            vistos[ruta] = firma
+            if anteriores.get(ruta) == firma and zipfile.is_zipfile(ruta):
+                listos.append(ruta)
+        self._firmas_vistas[(carpeta, patron)] = vistos
+        return listos
+
+    def _actualizar_catalogo(self) -> bool:
+        """Recarga Odoo si hay una exportación completa más nueva. Devuelve True si cambió."""
+        candidatos = self._archivos_completos(self.dir_odoo, PATRON_ODOO)
+        if not candidatos:
+            return False
+        mas_nuevo = max(candidatos, key=lambda r: r.stat().st_mtime_ns)
+        firma = _firma(mas_nuevo)
+        if (mas_nuevo, firma) in ((self._odoo_actual, self._odoo_firma), self._odoo_fallido):
+            return False
+
+        print(f"📖 Cargando catálogo Odoo: {mas_nuevo.name}")
+        try:
+            df_odoo = leer_odoo(mas_nuevo)
+            if self.lista_materiales is not None:
+                df_odoo, no_resueltos = resolver_kits(df_odoo, self.lista_materiales)
+                if len(no_resueltos):
+                    print(f"⚠️ {len(no_resueltos)} kits sin resolver (p. ej. {no_resueltos['Kit'].iloc[0]}: "
+                          f"{no_resueltos['Motivo'].iloc[0]})")
+        except Exception:
+            # Se sigue con el catálogo anterior (si hay) y el archivo va a errores
+            self._odoo_fallido = (mas_nuevo, firma)
+            try:
+                self._registrar_error(mas_nuevo, traceback.format_exc())
+            except OSError as e:
+                print(f"❌ {mas_nuevo.name}: no se pudo mover a {self.dir_errores} ({e})")
+            return False
+        if self.workers > 1:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+            ruta_catalogo = compilar_catalogo(df_odoo, self.dir_salida / '.catalogo_odoo.mlcat')
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_inicializar_worker,
+                initargs=(str(ruta_catalogo),),
+            )
+        else:
+            self.df_odoo = df_odoo
+        self._odoo_actual, self._odoo_firma = mas_nuevo, firma
+        return True
+
+    def _mover(self, ruta: Path, carpeta: Path) -> Path:
+        destino = carpeta / ruta.name
+        if destino.exists():
+            destino = carpeta / f"{ruta.stem}-{time.strftime('%Y%m%d-%H%M%S')}{ruta.suffix}"
+        shutil.move(str(ruta), str(destino))
+        return destino
+
+    def _registrar_error(self, ruta: Path, detalle: str) -> None:
+        destino = self._mover(ruta, self.dir_errores)
+        destino.with_suffix('.log').write_text(detalle, encoding='utf-8')
+        print(f"❌ {ruta.name}: {detalle.strip().splitlines()[-1]}")
+
+    def procesar_pendientes(self) -> list:
+        """
+        Realiza un escaneo y procesa los archivos de ML completos.
+
+        Returns:
+            Lista de rutas de resultados generados en este escaneo
+        """
+        self._actualizar_catalogo()
+        pendientes = self._archivos_completos(self.dir_entrada, PATRON_ML)
+        if not pendientes or self._odoo_actual is None:
+            return []
+
+        generados = []
+        if self.workers > 1:
+            futuros = {
+                ruta: self._pool.submit(
+                    _procesar_en_worker, str(ruta), str(self.dir_salida), self.opciones, self.formato
+                )
+                for ruta in pendientes
+            }
+            for ruta, futuro in futuros.items():
+                try:
+                    generados.append(Path(futuro.result()))
+                    self._mover(ruta, self.dir_procesados)
+                except Exception:
+                    self._registrar_error(ruta, traceback.format_exc())
+        else:
+            for ruta in pendientes:
+                try:
+                    generados.append(
+                        procesar_archivo_ml(ruta, self.df_odoo, self.dir_salida, self.opciones, self.formato)
+                    )
+                    self._mover(ruta, self.dir_procesados)
+                except Exception:
+                    self._registrar_error(ruta, traceback.format_exc())
+
+        for ruta in generados:
+            print(f"✅ Generado: {ruta.name}")
+        return generados
+
+    def ejecutar(self, intervalo: float = 5.0, evento_parada=None) -> None:
+        """Escanea en bucle hasta Ctrl+C o hasta que se active ``evento_parada``."""
+        try:
+            while evento_parada is None or not evento_parada.is_set():
+                try:
+                    self.procesar_pendientes()
+                except Exception:
+                    # Un escaneo fallido no detiene el demonio: se reintenta en el siguiente
+                    print(f"❌ Error en el escaneo:\n{traceback.format_exc()}")
+                if evento_parada is not None:
+                    evento_parada.wait(intervalo)
+                else:
+                    time.sleep(intervalo)
+        finally:
+            self.cerrar()
+
+    def cerrar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entrada', required=True, help='Carpeta donde llegan los Excel de ML')
+    parser.add_argument('--salida', required=True, help='Carpeta para los resultados')
+    parser.add_argument('--odoo-dir', help='Carpeta de las exportaciones de Odoo (por defecto, la de entrada)')
+    parser.add_argument('--procesados', help='Carpeta para los ML ya procesados')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos entre escaneos')
+    parser.add_argument('--formato', default='xlsx', choices=list(FORMATOS_EXPORTACION))
+    agregar_argumentos_pipeline(parser)
+    parser.add_argument('--kits', help='Lista de materiales de los kits, xlsx o csv (ver kits.py)')
+    args = parser.parse_args(argv)
+
+    vigilante = VigilanteCarpeta(
+        args.entrada,
+        args.salida,
+        dir_odoo=args.odoo_dir,
+        dir_procesados=args.procesados,
+        workers=args.workers,
+        opciones=opciones_de_argumentos(args),
+        formato=args.formato,
+        lista_materiales=leer_lista_materiales(args.kits) if args.kits else None,
+    )
+    print(f"👀 Vigilando {vigilante.dir_entrada} cada {args.intervalo:g}s ({args.workers} workers)")
+    try:
+        vigilante.ejecutar(args.intervalo)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())